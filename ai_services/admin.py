@@ -6,7 +6,7 @@ from django.utils.html import format_html
 from .models import (
     LLMModel, PromptTemplate, VectorStore, 
     AIAnalysisRequest, AIAnalysisResult, DocumentEmbedding,
-    AIGeneratedDocument, AISettings
+    DocumentChunkEmbedding, AIGeneratedDocument, AISettings
 )
 
 
@@ -115,6 +115,15 @@ class DocumentEmbeddingAdmin(admin.ModelAdmin):
     raw_id_fields = ('document', 'vector_store')
 
 
+@admin.register(DocumentChunkEmbedding)
+class DocumentChunkEmbeddingAdmin(admin.ModelAdmin):
+    list_display = ('document', 'chunk_index', 'start_offset', 'end_offset', 'vector_store', 'created_at')
+    list_filter = ('vector_store', 'embedding_model')
+    search_fields = ('document__title',)
+    readonly_fields = ('created_at',)
+    raw_id_fields = ('document', 'vector_store')
+
+
 @admin.register(AIGeneratedDocument)
 class AIGeneratedDocumentAdmin(admin.ModelAdmin):
     list_display = ('title', 'case', 'is_approved', 'created_by', 'created_at')
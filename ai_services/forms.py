@@ -163,12 +163,15 @@ class VectorStoreForm(forms.ModelForm):
     class Meta:
         model = VectorStore
         fields = ['name', 'store_type', 'connection_string', 'embedding_model',
-                  'dimensions', 'is_active']
+                  'dimensions', 'index_type', 'ivf_nlist', 'ivf_nprobe', 'is_active']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
             'store_type': forms.Select(attrs={'class': 'form-select'}),
             'connection_string': forms.TextInput(attrs={'class': 'form-control'}),
             'embedding_model': forms.TextInput(attrs={'class': 'form-control'}),
             'dimensions': forms.NumberInput(attrs={'class': 'form-control'}),
+            'index_type': forms.Select(attrs={'class': 'form-select'}),
+            'ivf_nlist': forms.NumberInput(attrs={'class': 'form-control'}),
+            'ivf_nprobe': forms.NumberInput(attrs={'class': 'form-control'}),
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
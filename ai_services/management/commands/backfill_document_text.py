@@ -0,0 +1,276 @@
+"""
+Management command to backfill extracted text, previews, the keyword
+index and (optionally) embeddings for existing documents.
+
+Documents are walked in primary-key order with keyset pagination. Text
+extraction, the expensive part, is fanned out to a process pool while
+the main process writes the previous batch in one transaction. After
+each committed batch the last document ID is written to a checkpoint
+file, so an interrupted run resumes where it stopped.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from documents.models import Document
+from documents.text_store import stored_hashes, store_texts, get_stored_text
+from documents.utils import extract_text_from_document, preview_from_text, TEXT_EXTRACTOR_VERSION
+from ai_services.models import VectorStore
+from ai_services.services.text_index import index_document_text
+
+
+def _init_worker():
+    """Set up Django in worker processes started with 'spawn'."""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _extract_document(document_id, file_name, content_hash):
+    """
+    Hash and extract one file (runs in a worker process, without database access).
+
+    Returns:
+        Tuple of (document ID, content hash, text or None, error message or None)
+    """
+    document = Document(id=document_id, file=file_name, content_hash=content_hash)
+    try:
+        if not content_hash:
+            content_hash = document.compute_content_hash()
+        return document_id, content_hash, extract_text_from_document(document, use_store=False), None
+    except Exception as e:
+        return document_id, content_hash, None, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Extract text, previews, keyword index entries and embeddings for existing documents in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Extraction processes (default: number of CPUs; 0 extracts in this process)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Documents per batch and transaction (default: 100)',
+        )
+        parser.add_argument(
+            '--case',
+            type=int,
+            help='Only process documents of this case',
+        )
+        parser.add_argument(
+            '--since',
+            help='Only process documents modified on or after this date or datetime (ISO 8601)',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default='backfill_document_text.checkpoint',
+            help='File recording the last processed document ID (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore an existing checkpoint and start from the first document',
+        )
+        parser.add_argument(
+            '--embed',
+            action='store_true',
+            help='Also create missing embeddings with the active vector store',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+        if options['workers'] < 0:
+            raise CommandError('--workers must not be negative')
+
+        queryset = Document.objects.exclude(file='')
+        if options['case']:
+            queryset = queryset.filter(case_id=options['case'])
+        if options['since']:
+            queryset = queryset.filter(modified_at__gte=self.parse_since(options['since']))
+
+        self.embedding_service = None
+        if options['embed']:
+            vector_store = VectorStore.objects.filter(is_active=True).first()
+            if not vector_store:
+                raise CommandError('No active vector store configured')
+            from ai_services.services.service_factory import AIServiceFactory
+            self.embedding_service = AIServiceFactory.get_embedding_service(vector_store)
+
+        checkpoint = options['checkpoint']
+        self.filters = {'case': options['case'], 'since': options['since']}
+        last_id = 0 if options['restart'] else self.read_checkpoint(checkpoint)
+        if last_id:
+            self.stdout.write(f'Resuming after document {last_id}')
+
+        self.started = time.monotonic()
+        self.totals = {'documents': 0, 'extracted': 0, 'bytes': 0, 'failed': 0}
+
+        executor = None
+        if options['workers']:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker)
+
+        try:
+            # Extraction of the next batch overlaps with writing the current one
+            batch = self.fetch_batch(queryset, last_id, batch_size)
+            pending = self.submit_batch(executor, batch)
+            while batch:
+                next_batch = self.fetch_batch(queryset, batch[-1].id, batch_size)
+                next_pending = self.submit_batch(executor, next_batch)
+
+                self.write_batch(batch, pending)
+                self.write_checkpoint(checkpoint, batch[-1].id)
+                self.report_progress(batch[-1].id)
+
+                batch, pending = next_batch, next_pending
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {self.totals['documents']} documents "
+            f"({self.totals['extracted']} extracted, {self.totals['failed']} failed) in {elapsed:.1f}s: "
+            f"{self.totals['documents'] / max(elapsed, 1e-9):.1f} docs/s, "
+            f"{self.totals['bytes'] / (1024 * 1024) / max(elapsed, 1e-9):.2f} MB/s"
+        ))
+
+    def parse_since(self, value):
+        """Parse the --since option into an aware datetime."""
+        since = parse_datetime(value)
+        if since is None:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError(f'Invalid --since value: {value}')
+            since = datetime(day.year, day.month, day.day)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
+    def fetch_batch(self, queryset, last_id, batch_size):
+        """Fetch the next batch of documents after last_id (keyset pagination)."""
+        return list(queryset.filter(id__gt=last_id).order_by('id')[:batch_size])
+
+    def submit_batch(self, executor, batch):
+        """
+        Start extracting the documents of a batch whose text is not stored yet.
+
+        Returns:
+            Dictionary mapping document IDs to futures of _extract_document results
+        """
+        known = stored_hashes([d.content_hash for d in batch if d.content_hash], TEXT_EXTRACTOR_VERSION)
+        pending = {}
+        for document in batch:
+            if document.content_hash in known:
+                continue
+            args = (document.id, document.file.name, document.content_hash)
+            if executor is None:
+                pending[document.id] = Future()
+                pending[document.id].set_result(_extract_document(*args))
+            else:
+                pending[document.id] = executor.submit(_extract_document, *args)
+        return pending
+
+    def write_batch(self, batch, pending):
+        """Store the extracted texts, previews and keyword index entries of a batch."""
+        texts = {}
+        rehashed = set()
+        for document in batch:
+            if document.id not in pending:
+                continue
+            _, content_hash, text, error = pending[document.id].result()
+            if error or text is None:
+                self.totals['failed'] += 1
+                self.stderr.write(f'Error extracting document {document.id}: {error or "no text"}')
+                continue
+            if content_hash != document.content_hash:
+                document.content_hash = content_hash
+                rehashed.add(document.id)
+            texts[document.id] = text
+            self.totals['extracted'] += 1
+            self.totals['bytes'] += document.file_size or 0
+
+        with transaction.atomic():
+            store_texts({batch_document.content_hash: texts[batch_document.id]
+                         for batch_document in batch if batch_document.id in texts},
+                        TEXT_EXTRACTOR_VERSION)
+
+            changed = []
+            for document in batch:
+                text = texts.get(document.id)
+                if text is None and document.content_hash:
+                    text = get_stored_text(document.content_hash, TEXT_EXTRACTOR_VERSION)
+                if text is None:
+                    continue
+                texts[document.id] = text
+                preview = preview_from_text(text)
+                if preview != document.preview or document.id in rehashed:
+                    document.preview = preview
+                    changed.append(document)
+                index_document_text(document, text)
+            Document.objects.bulk_update(changed, ['content_hash', 'preview'])
+
+        if self.embedding_service is not None:
+            from ai_services.models import DocumentEmbedding
+            embedded = set(DocumentEmbedding.objects.filter(
+                document_id__in=list(texts)
+            ).values_list('document_id', flat=True))
+            missing = [document for document in batch if document.id in texts and document.id not in embedded]
+            if missing:
+                self.embedding_service.create_document_embeddings(missing)
+
+        self.totals['documents'] += len(batch)
+
+    def report_progress(self, last_id):
+        """Print running totals and throughput."""
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f"  up to document {last_id}: {self.totals['documents']} documents, "
+            f"{self.totals['documents'] / max(elapsed, 1e-9):.1f} docs/s, "
+            f"{self.totals['bytes'] / (1024 * 1024) / max(elapsed, 1e-9):.2f} MB/s"
+        )
+
+    def read_checkpoint(self, path):
+        """Return the last document ID recorded in the checkpoint file, or 0."""
+        try:
+            with open(path) as f:
+                state = json.load(f)
+            last_id = int(state['last_id'])
+        except FileNotFoundError:
+            return 0
+        except (ValueError, KeyError, TypeError):
+            raise CommandError(f'Unreadable checkpoint file {path}; use --restart to ignore it')
+        if state.get('filters') != self.filters:
+            raise CommandError(
+                f"Checkpoint {path} was written with filters {state.get('filters')}; "
+                f"use the same --case/--since or --restart"
+            )
+        return last_id
+
+    def write_checkpoint(self, path, last_id):
+        """Record the last processed document ID, replacing the file atomically."""
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'last_id': last_id, 'filters': self.filters}, f)
+        os.replace(temporary, path)
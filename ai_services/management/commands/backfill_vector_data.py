@@ -0,0 +1,177 @@
+"""
+Management command to backfill the binary vector column of DocumentEmbedding.
+
+Rows are processed in primary-key order in fixed-size batches, so the
+command can be interrupted and re-run safely: rows that already have
+binary vector data are skipped unless --rewrite is given.
+"""
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from ai_services.models import DocumentEmbedding, VectorStore
+from ai_services.services.vector_codec import encode_vector, decode_vector, DTYPE_CODES
+from ai_services.services.vector_index import bump_store_generation
+from ai_services import settings as ai_settings
+
+
+class Command(BaseCommand):
+    help = 'Backfill binary vector data for document embeddings in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of rows per batch (default: 500)',
+        )
+        parser.add_argument(
+            '--store',
+            type=int,
+            help='Only backfill embeddings of this vector store ID',
+        )
+        parser.add_argument(
+            '--dtype',
+            choices=sorted(DTYPE_CODES),
+            default=ai_settings.VECTOR_STORAGE_DTYPE,
+            help='Storage dtype for the encoded vectors',
+        )
+        parser.add_argument(
+            '--rewrite',
+            action='store_true',
+            help='Re-encode rows that already have vector data (e.g. to change dtype)',
+        )
+        parser.add_argument(
+            '--reembed',
+            action='store_true',
+            help='Recompute vectors from document text when the vector store has no copy',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be converted without writing',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dtype = options['dtype']
+        dry_run = options['dry_run']
+
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        stores = VectorStore.objects.all()
+        if options['store']:
+            stores = stores.filter(id=options['store'])
+            if not stores.exists():
+                raise CommandError(f"Vector store {options['store']} does not exist")
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN - No data will be written'))
+
+        for store in stores:
+            self.backfill_store(store, batch_size, dtype, options['rewrite'], options['reembed'], dry_run)
+
+    def backfill_store(self, store, batch_size, dtype, rewrite, reembed, dry_run):
+        """Backfill all embeddings of one vector store."""
+        self.stdout.write(f'Backfilling vector data for store "{store.name}" ({store.store_type})...')
+
+        queryset = DocumentEmbedding.objects.filter(vector_store=store)
+        if not rewrite:
+            queryset = queryset.filter(vector_data__isnull=True)
+
+        converted = 0
+        missing = 0
+        last_id = 0
+        while True:
+            batch = list(
+                queryset.filter(id__gt=last_id).select_related('document').order_by('id')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            vectors = self.load_vectors(store, batch, reembed)
+
+            updated = []
+            for doc_embedding in batch:
+                vector = vectors.get(doc_embedding.document_id)
+                if vector is None or not np.any(vector):
+                    missing += 1
+                    continue
+                doc_embedding.vector_data = encode_vector(vector, dtype)
+                updated.append(doc_embedding)
+
+            if updated and not dry_run:
+                with transaction.atomic():
+                    DocumentEmbedding.objects.bulk_update(updated, ['vector_data'])
+                    # Make resident fallback indexes pick up the new data
+                    bump_store_generation(store.id)
+            converted += len(updated)
+
+            self.stdout.write(f'  processed up to id {last_id}: {converted} converted, {missing} without a vector')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Store "{store.name}": converted {converted} embeddings, {missing} without a recoverable vector'
+        ))
+
+    def load_vectors(self, store, batch, reembed):
+        """
+        Load the vectors for a batch of embeddings, keyed by document ID.
+
+        Existing binary data is used first (for --rewrite), then the vector
+        store's own copy, then optionally a fresh embedding of the document text.
+        """
+        vectors = {}
+        for doc_embedding in batch:
+            if doc_embedding.vector_data:
+                vectors[doc_embedding.document_id] = decode_vector(doc_embedding.vector_data)
+
+        pending = [e.document_id for e in batch if e.document_id not in vectors]
+        if pending:
+            try:
+                if store.store_type == 'pgvector':
+                    vectors.update(self.load_pgvector(pending))
+                elif store.store_type == 'chroma':
+                    vectors.update(self.load_chroma(store, pending))
+            except Exception as e:
+                self.stderr.write(f'  could not read vectors from {store.store_type}: {str(e)}')
+
+        pending = [e for e in batch if e.document_id not in vectors]
+        if pending and reembed:
+            from ai_services.services.embedding_service import EmbeddingService
+            from documents.utils import extract_text_from_document
+
+            embedding_service = EmbeddingService(store)
+            texts = {}
+            for doc_embedding in pending:
+                text = extract_text_from_document(doc_embedding.document)
+                if text:
+                    texts[doc_embedding.document_id] = text
+            if texts:
+                vectors.update(zip(texts, embedding_service.get_embeddings(list(texts.values()))))
+
+        return vectors
+
+    def load_pgvector(self, document_ids):
+        """Read vectors for the given documents from the pgvector table."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT document_id, embedding::text FROM document_vectors WHERE document_id = ANY(%s)",
+                [list(document_ids)]
+            )
+            return {
+                document_id: np.array(embedding.strip('[]').split(','), dtype=np.float32)
+                for document_id, embedding in cursor.fetchall()
+            }
+
+    def load_chroma(self, store, document_ids):
+        """Read vectors for the given documents from the ChromaDB collection."""
+        from ai_services.services.chroma_pool import get_chroma_collection
+
+        collection = get_chroma_collection(store)
+        result = collection.get(ids=[str(doc_id) for doc_id in document_ids], include=["embeddings"])
+        return {
+            int(doc_id): np.asarray(embedding, dtype=np.float32)
+            for doc_id, embedding in zip(result["ids"], result["embeddings"])
+        }
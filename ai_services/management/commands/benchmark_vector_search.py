@@ -0,0 +1,135 @@
+"""
+Management command to benchmark approximate (IVF) against exact vector search.
+
+Reports recall@k of the IVF-Flat index relative to exact brute-force
+search, and query latency, for a range of nprobe values. Runs on the
+stored vectors of a vector store or on synthetic clustered data.
+"""
+
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from ai_services.models import VectorStore
+from ai_services.services.ann_index import IVFIndex
+from ai_services.services.vector_index import VectorIndex, load_store_vectors, NO_CASE
+
+
+class Command(BaseCommand):
+    help = 'Benchmark recall@k and latency of IVF-Flat search against exact search'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--store',
+            type=int,
+            help='Benchmark on the stored vectors of this vector store ID',
+        )
+        parser.add_argument(
+            '--synthetic',
+            type=int,
+            default=100000,
+            help='Number of synthetic vectors when no store is given (default: 100000)',
+        )
+        parser.add_argument(
+            '--dims',
+            type=int,
+            default=768,
+            help='Dimensions of synthetic vectors (default: 768)',
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Number of queries (default: 200)',
+        )
+        parser.add_argument(
+            '--k',
+            type=int,
+            default=10,
+            help='Number of results per query (default: 10)',
+        )
+        parser.add_argument(
+            '--nlist',
+            type=int,
+            help='Number of IVF lists (default: about 4 x sqrt(N))',
+        )
+        parser.add_argument(
+            '--nprobe',
+            default='1,4,8,16,32',
+            help='Comma-separated nprobe values to test (default: 1,4,8,16,32)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed (default: 0)',
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        k = options['k']
+
+        try:
+            nprobes = [int(value) for value in options['nprobe'].split(',') if value.strip()]
+        except ValueError:
+            raise CommandError('--nprobe must be a comma-separated list of integers')
+
+        if options['store']:
+            try:
+                store = VectorStore.objects.get(id=options['store'])
+            except VectorStore.DoesNotExist:
+                raise CommandError(f"Vector store {options['store']} does not exist")
+            document_ids, case_ids, vectors = load_store_vectors(store)
+            if not len(vectors):
+                raise CommandError(f'Vector store "{store.name}" has no stored vectors')
+            self.stdout.write(f'Benchmarking on {len(vectors)} vectors of store "{store.name}"')
+        else:
+            vectors = self.synthetic_vectors(rng, options['synthetic'], options['dims'])
+            document_ids = np.arange(1, len(vectors) + 1, dtype=np.int64)
+            case_ids = np.full(len(vectors), NO_CASE, dtype=np.int64)
+            self.stdout.write(f'Benchmarking on {len(vectors)} synthetic {options["dims"]}-dimensional vectors')
+
+        # Queries are perturbed copies of indexed vectors
+        picks = rng.choice(len(vectors), min(options['queries'], len(vectors)), replace=False)
+        queries = vectors[picks] + rng.normal(scale=0.05, size=(len(picks), vectors.shape[1])).astype(np.float32)
+
+        exact = VectorIndex()
+        exact.add_many(document_ids, case_ids, vectors)
+
+        start_time = time.time()
+        ivf = IVFIndex.train(document_ids, case_ids, vectors, nlist=options['nlist'], seed=options['seed'])
+        self.stdout.write(f'Trained {ivf.nlist} IVF lists in {time.time() - start_time:.1f}s')
+
+        baseline, exact_latencies = [], []
+        for query in queries:
+            start_time = time.perf_counter()
+            hits = exact.search(query, k, threshold=-1.0)
+            exact_latencies.append(time.perf_counter() - start_time)
+            baseline.append({doc_id for doc_id, _ in hits})
+
+        self.stdout.write('')
+        self.stdout.write(f'{"search":>14} {"recall@" + str(k):>10} {"mean ms":>9} {"p95 ms":>9}')
+        self.report('exact', 1.0, exact_latencies)
+
+        for nprobe in nprobes:
+            recalls, latencies = [], []
+            for query, expected in zip(queries, baseline):
+                start_time = time.perf_counter()
+                hits = ivf.search(query, k, threshold=-1.0, nprobe=nprobe)
+                latencies.append(time.perf_counter() - start_time)
+                found = {doc_id for doc_id, _ in hits}
+                recalls.append(len(found & expected) / max(len(expected), 1))
+            self.report(f'ivf nprobe={nprobe}', float(np.mean(recalls)), latencies)
+
+    def report(self, label, recall, latencies):
+        """Print one result row."""
+        latencies_ms = np.array(latencies) * 1000
+        self.stdout.write(
+            f'{label:>14} {recall:>10.3f} {latencies_ms.mean():>9.2f} {np.percentile(latencies_ms, 95):>9.2f}'
+        )
+
+    def synthetic_vectors(self, rng, count, dims):
+        """Generate clustered vectors resembling document embeddings."""
+        centers = rng.normal(size=(max(1, count // 500), dims)).astype(np.float32)
+        assignments = rng.integers(0, len(centers), size=count)
+        vectors = centers[assignments] + rng.normal(scale=0.6, size=(count, dims)).astype(np.float32)
+        return vectors.astype(np.float32)
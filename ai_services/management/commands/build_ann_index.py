@@ -0,0 +1,65 @@
+"""
+Management command to (re)train the IVF centroids of a vector store.
+
+Training runs once here instead of in every worker: workers load the
+persisted centroids and only assign vectors to clusters when they build
+their resident index.
+"""
+
+import time
+from django.core.management.base import BaseCommand, CommandError
+from ai_services.models import VectorStore
+from ai_services.services.ann_index import IVFIndex, get_centroids_path
+from ai_services.services.vector_index import load_store_vectors, bump_store_generation
+
+
+class Command(BaseCommand):
+    help = 'Train and persist IVF-Flat centroids for vector stores using the ivf_flat index type'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--store',
+            type=int,
+            help='Only train this vector store ID',
+        )
+        parser.add_argument(
+            '--nlist',
+            type=int,
+            help='Number of clusters (default: the store setting or about 4 x sqrt(N))',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Number of k-means iterations (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        stores = VectorStore.objects.filter(index_type='ivf_flat')
+        if options['store']:
+            stores = stores.filter(id=options['store'])
+            if not stores.exists():
+                raise CommandError(f"Vector store {options['store']} does not exist or does not use the ivf_flat index")
+
+        for store in stores:
+            document_ids, case_ids, vectors = load_store_vectors(store)
+            if not len(vectors):
+                self.stdout.write(self.style.WARNING(f'Store "{store.name}" has no stored vectors, skipping'))
+                continue
+
+            self.stdout.write(f'Training IVF index for store "{store.name}" on {len(vectors)} vectors...')
+            start_time = time.time()
+            index = IVFIndex.train(
+                document_ids, case_ids, vectors,
+                nlist=options['nlist'] or store.ivf_nlist,
+                nprobe=store.ivf_nprobe,
+                iterations=options['iterations'],
+            )
+            index.save_centroids(get_centroids_path(store))
+
+            # Make workers rebuild their resident index with the new centroids
+            bump_store_generation(store.id)
+
+            self.stdout.write(self.style.SUCCESS(
+                f'  trained {index.nlist} lists in {time.time() - start_time:.1f}s'
+            ))
@@ -0,0 +1,45 @@
+"""
+Management command to build the keyword (BM25) text index for existing documents.
+"""
+
+from django.core.management.base import BaseCommand
+from documents.models import Document
+from ai_services.models import TextIndexDocument
+from ai_services.services.text_index import index_document_text
+
+
+class Command(BaseCommand):
+    help = 'Index the extracted text of documents for BM25 keyword and hybrid search'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--case',
+            type=int,
+            help='Only index documents of this case',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Reindex documents whose file and title have not changed',
+        )
+
+    def handle(self, *args, **options):
+        documents = Document.objects.order_by('id')
+        if options['case']:
+            documents = documents.filter(case_id=options['case'])
+
+        indexed = skipped = failed = 0
+        for document in documents.iterator():
+            try:
+                if index_document_text(document, force=options['force']):
+                    indexed += 1
+                else:
+                    skipped += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Error indexing document {document.id}: {str(e)}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} documents, {skipped} up to date, {failed} failed '
+            f'({TextIndexDocument.objects.count()} in index)'
+        ))
@@ -0,0 +1,75 @@
+"""
+Management command to compact the segment files of 'local_mmap' vector stores.
+
+Compaction merges the small segments produced by incremental writes into
+full-size segments and drops tombstoned (deleted or superseded) rows.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from ai_services.models import DocumentEmbedding, VectorStore
+from ai_services.services.segment_store import get_segment_store
+
+
+class Command(BaseCommand):
+    help = 'Merge vector segment files and drop deleted rows for local_mmap vector stores'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--store',
+            type=int,
+            help='Only compact this vector store ID',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Load all binary vectors from DocumentEmbedding into the segments before compacting',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Rows per batch when rebuilding (default: 2000)',
+        )
+
+    def handle(self, *args, **options):
+        stores = VectorStore.objects.filter(store_type='local_mmap')
+        if options['store']:
+            stores = stores.filter(id=options['store'])
+            if not stores.exists():
+                raise CommandError(f"Vector store {options['store']} does not exist or is not a local_mmap store")
+
+        for store in stores:
+            segment_store = get_segment_store(store)
+            self.stdout.write(f'Compacting vector store "{store.name}" in {segment_store.directory}...')
+
+            if options['rebuild']:
+                self.rebuild(store, segment_store, options['batch_size'])
+
+            stats = segment_store.compact()
+            self.stdout.write(self.style.SUCCESS(
+                f'  {stats["segments_before"]} segments / {stats["rows_before"]} rows -> '
+                f'{stats["segments_after"]} segments / {stats["rows_after"]} rows'
+            ))
+
+    def rebuild(self, store, segment_store, batch_size):
+        """Write every stored DocumentEmbedding vector of a store into its segments."""
+        rows = DocumentEmbedding.objects.filter(
+            vector_store=store,
+            vector_data__isnull=False
+        ).order_by('id')
+
+        written = 0
+        last_id = 0
+        while True:
+            batch = list(
+                rows.filter(id__gt=last_id).values_list('id', 'document_id', 'document__case_id', 'vector_data')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            items = []
+            for _, document_id, case_id, vector_data in batch:
+                items.append((document_id, case_id, DocumentEmbedding(vector_data=vector_data).get_vector()))
+            written += segment_store.upsert(items)
+            self.stdout.write(f'  loaded {written} vectors')
@@ -0,0 +1,31 @@
+"""
+Management command to evict least recently used embedding cache entries.
+"""
+
+from django.core.management.base import BaseCommand
+from ai_services.models import EmbeddingCacheEntry
+from ai_services.services.embedding_cache import evict_embedding_cache
+
+
+class Command(BaseCommand):
+    help = 'Evict least recently used entries from the embedding cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-entries',
+            type=int,
+            help='Number of entries to keep (default: EMBEDDING_CACHE_MAX_ENTRIES)',
+        )
+        parser.add_argument(
+            '--model',
+            help='Delete all entries of this embedding model, e.g. after switching models',
+        )
+
+    def handle(self, *args, **options):
+        if options['model']:
+            deleted, _ = EmbeddingCacheEntry.objects.filter(embedding_model=options['model']).delete()
+            self.stdout.write(f'Deleted {deleted} entries for model {options["model"]}')
+
+        deleted = evict_embedding_cache(options['max_entries'])
+        remaining = EmbeddingCacheEntry.objects.count()
+        self.stdout.write(self.style.SUCCESS(f'Evicted {deleted} entries, {remaining} remaining'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-17 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0008_merge_20250505_0251'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentembedding',
+            name='vector_data',
+            field=models.BinaryField(blank=True, help_text='Header-prefixed float32/float16 vector', null=True, verbose_name='Vector Data'),
+        ),
+    ]
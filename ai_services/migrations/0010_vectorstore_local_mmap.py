@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-17 02:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0009_documentembedding_vector_data'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vectorstore',
+            name='store_type',
+            field=models.CharField(choices=[('pgvector', 'PostgreSQL pgvector'), ('chroma', 'ChromaDB'), ('pinecone', 'Pinecone'), ('qdrant', 'Qdrant'), ('local_mmap', 'Local Memory-Mapped Segments'), ('mock', 'Mock Store')], default='pgvector', max_length=50, verbose_name='Store Type'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.7 on 2026-10-17 02:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0010_vectorstore_local_mmap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vectorstore',
+            name='index_type',
+            field=models.CharField(choices=[('flat', 'Exact (brute force)'), ('ivf_flat', 'IVF-Flat (approximate)')], default='flat', help_text='In-process index used for fallback search', max_length=20, verbose_name='Index Type'),
+        ),
+        migrations.AddField(
+            model_name='vectorstore',
+            name='ivf_nlist',
+            field=models.PositiveIntegerField(blank=True, help_text='Number of k-means clusters (default: about 4 x sqrt(N))', null=True, verbose_name='IVF Lists'),
+        ),
+        migrations.AddField(
+            model_name='vectorstore',
+            name='ivf_nprobe',
+            field=models.PositiveIntegerField(default=8, help_text='Clusters scanned per query; higher is slower but more accurate', verbose_name='IVF Probes'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.7 on 2026-10-17 03:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0011_vectorstore_ann_index'),
+        ('documents', '0005_documentversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentChunkEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chunk_index', models.PositiveIntegerField(verbose_name='Chunk Index')),
+                ('start_offset', models.PositiveIntegerField(help_text='Character offset of the passage in the extracted text', verbose_name='Start Offset')),
+                ('end_offset', models.PositiveIntegerField(verbose_name='End Offset')),
+                ('vector_data', models.BinaryField(help_text='Header-prefixed float32/float16 vector', verbose_name='Vector Data')),
+                ('embedding_model', models.CharField(max_length=100, verbose_name='Embedding Model')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunk_embeddings', to='documents.document', verbose_name='Document')),
+                ('vector_store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunk_embeddings', to='ai_services.vectorstore', verbose_name='Vector Store')),
+            ],
+            options={
+                'verbose_name': 'Document Chunk Embedding',
+                'verbose_name_plural': 'Document Chunk Embeddings',
+                'ordering': ['document', 'chunk_index'],
+                'unique_together': {('document', 'chunk_index')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.7 on 2026-10-17 03:06
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0012_documentchunkembedding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('embedding_model', models.CharField(max_length=100, verbose_name='Embedding Model')),
+                ('dimensions', models.PositiveIntegerField(verbose_name='Dimensions')),
+                ('text_hash', models.CharField(help_text='SHA-256 of the normalized text', max_length=64, verbose_name='Text Hash')),
+                ('vector_data', models.BinaryField(help_text='Header-prefixed float32/float16 vector', verbose_name='Vector Data')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Last Used At')),
+            ],
+            options={
+                'verbose_name': 'Embedding Cache Entry',
+                'verbose_name_plural': 'Embedding Cache Entries',
+                'unique_together': {('embedding_model', 'dimensions', 'text_hash')},
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.7 on 2026-10-17 03:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0013_embeddingcacheentry'),
+        ('documents', '0005_documentversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextIndexDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('length', models.PositiveIntegerField(help_text='Number of indexed terms in the document', verbose_name='Length')),
+                ('source_hash', models.CharField(help_text='SHA-256 of the indexed file name, size and title', max_length=64, verbose_name='Source Hash')),
+                ('indexed_at', models.DateTimeField(auto_now=True, verbose_name='Indexed At')),
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='text_index', to='documents.document', verbose_name='Document')),
+            ],
+            options={
+                'verbose_name': 'Text Index Document',
+                'verbose_name_plural': 'Text Index Documents',
+            },
+        ),
+        migrations.CreateModel(
+            name='TextIndexPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Term')),
+                ('frequency', models.PositiveIntegerField(verbose_name='Frequency')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='text_postings', to='documents.document', verbose_name='Document')),
+            ],
+            options={
+                'verbose_name': 'Text Index Posting',
+                'verbose_name_plural': 'Text Index Postings',
+                'unique_together': {('term', 'document')},
+            },
+        ),
+    ]
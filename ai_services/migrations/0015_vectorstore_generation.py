@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-17 04:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0014_text_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vectorstore',
+            name='generation',
+            field=models.PositiveBigIntegerField(default=0, editable=False, help_text='Incremented by every embedding write to the store', verbose_name='Generation'),
+        ),
+    ]
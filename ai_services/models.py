@@ -120,14 +120,27 @@ class VectorStore(models.Model):
         ('chroma', 'ChromaDB'),
         ('pinecone', 'Pinecone'),
         ('qdrant', 'Qdrant'),
+        ('local_mmap', 'Local Memory-Mapped Segments'),
         ('mock', 'Mock Store'),
     ]
+    INDEX_TYPE_CHOICES = [
+        ('flat', 'Exact (brute force)'),
+        ('ivf_flat', 'IVF-Flat (approximate)'),
+    ]
 
     name = models.CharField(_("Store Name"), max_length=100)
     store_type = models.CharField(_("Store Type"), max_length=50, choices=STORE_TYPE_CHOICES, default='pgvector')
     connection_string = models.CharField(_("Connection String"), max_length=255, blank=True, null=True)
     dimensions = models.IntegerField(_("Dimensions"), default=768)
     embedding_model = models.CharField(_("Embedding Model"), max_length=100, default="gemma-3-embedding")
+    index_type = models.CharField(_("Index Type"), max_length=20, choices=INDEX_TYPE_CHOICES, default='flat',
+                                  help_text=_("In-process index used for fallback search"))
+    ivf_nlist = models.PositiveIntegerField(_("IVF Lists"), null=True, blank=True,
+                                            help_text=_("Number of k-means clusters (default: about 4 x sqrt(N))"))
+    ivf_nprobe = models.PositiveIntegerField(_("IVF Probes"), default=8,
+                                             help_text=_("Clusters scanned per query; higher is slower but more accurate"))
+    generation = models.PositiveBigIntegerField(_("Generation"), default=0, editable=False,
+                                                help_text=_("Incremented by every embedding write to the store"))
     is_active = models.BooleanField(_("Is Active"), default=True)
     created_at = models.DateTimeField(_("Created At"), auto_now_add=True, null=True, blank=True)
     updated_at = models.DateTimeField(_("Updated At"), auto_now=True, null=True, blank=True)
@@ -248,6 +261,8 @@ class DocumentEmbedding(models.Model):
     document = models.OneToOneField('documents.Document', on_delete=models.CASCADE, related_name='embedding', verbose_name=_("Document"))
     vector_store = models.ForeignKey(VectorStore, on_delete=models.CASCADE, related_name='document_embeddings', verbose_name=_("Vector Store"))
     vector_id = models.CharField(_("Vector ID"), max_length=100, help_text=_("ID in the vector store"))
+    vector_data = models.BinaryField(_("Vector Data"), null=True, blank=True, editable=False,
+                                     help_text=_("Header-prefixed float32/float16 vector"))
     embedding_model = models.CharField(_("Embedding Model"), max_length=100)
     created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
     last_updated = models.DateTimeField(_("Last Updated"), auto_now=True)
@@ -255,12 +270,113 @@ class DocumentEmbedding(models.Model):
     def __str__(self):
         return f"Embedding for {self.document}"
 
+    def get_vector(self):
+        """Return the stored vector as a numpy array, or None if not stored locally."""
+        from .services.vector_codec import decode_vector
+        return decode_vector(self.vector_data)
+
+    def set_vector(self, vector, dtype=None):
+        """Encode and store a vector in the binary column."""
+        from .services.vector_codec import encode_vector
+        from . import settings as ai_settings
+        self.vector_data = encode_vector(vector, dtype or ai_settings.VECTOR_STORAGE_DTYPE)
+
     class Meta:
         verbose_name = _("Document Embedding")
         verbose_name_plural = _("Document Embeddings")
         ordering = ['-created_at']
 
 
+class DocumentChunkEmbedding(models.Model):
+    """
+    Vector embeddings of passages (chunks) of a document's text.
+    """
+    document = models.ForeignKey('documents.Document', on_delete=models.CASCADE, related_name='chunk_embeddings', verbose_name=_("Document"))
+    vector_store = models.ForeignKey(VectorStore, on_delete=models.CASCADE, related_name='chunk_embeddings', verbose_name=_("Vector Store"))
+    chunk_index = models.PositiveIntegerField(_("Chunk Index"))
+    start_offset = models.PositiveIntegerField(_("Start Offset"), help_text=_("Character offset of the passage in the extracted text"))
+    end_offset = models.PositiveIntegerField(_("End Offset"))
+    vector_data = models.BinaryField(_("Vector Data"), editable=False,
+                                     help_text=_("Header-prefixed float32/float16 vector"))
+    embedding_model = models.CharField(_("Embedding Model"), max_length=100)
+    created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
+
+    def __str__(self):
+        return f"Chunk {self.chunk_index} of {self.document}"
+
+    def get_vector(self):
+        """Return the stored vector as a numpy array."""
+        from .services.vector_codec import decode_vector
+        return decode_vector(self.vector_data)
+
+    def set_vector(self, vector, dtype=None):
+        """Encode and store a vector in the binary column."""
+        from .services.vector_codec import encode_vector
+        from . import settings as ai_settings
+        self.vector_data = encode_vector(vector, dtype or ai_settings.VECTOR_STORAGE_DTYPE)
+
+    class Meta:
+        verbose_name = _("Document Chunk Embedding")
+        verbose_name_plural = _("Document Chunk Embeddings")
+        ordering = ['document', 'chunk_index']
+        unique_together = ['document', 'chunk_index']
+
+
+class EmbeddingCacheEntry(models.Model):
+    """
+    Cached embedding of a text, keyed by model, dimensions and text hash.
+    """
+    embedding_model = models.CharField(_("Embedding Model"), max_length=100)
+    dimensions = models.PositiveIntegerField(_("Dimensions"))
+    text_hash = models.CharField(_("Text Hash"), max_length=64, help_text=_("SHA-256 of the normalized text"))
+    vector_data = models.BinaryField(_("Vector Data"), editable=False,
+                                     help_text=_("Header-prefixed float32/float16 vector"))
+    created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
+    last_used_at = models.DateTimeField(_("Last Used At"), default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.embedding_model} embedding {self.text_hash[:12]}"
+
+    class Meta:
+        verbose_name = _("Embedding Cache Entry")
+        verbose_name_plural = _("Embedding Cache Entries")
+        unique_together = ['embedding_model', 'dimensions', 'text_hash']
+
+
+class TextIndexDocument(models.Model):
+    """
+    Per-document statistics of the keyword (BM25) text index.
+    """
+    document = models.OneToOneField('documents.Document', on_delete=models.CASCADE, related_name='text_index', verbose_name=_("Document"))
+    length = models.PositiveIntegerField(_("Length"), help_text=_("Number of indexed terms in the document"))
+    source_hash = models.CharField(_("Source Hash"), max_length=64, help_text=_("SHA-256 of the indexed file name, size and title"))
+    indexed_at = models.DateTimeField(_("Indexed At"), auto_now=True)
+
+    def __str__(self):
+        return f"Text index of {self.document}"
+
+    class Meta:
+        verbose_name = _("Text Index Document")
+        verbose_name_plural = _("Text Index Documents")
+
+
+class TextIndexPosting(models.Model):
+    """
+    Posting of the keyword text index: how often a term occurs in a document.
+    """
+    term = models.CharField(_("Term"), max_length=64)
+    document = models.ForeignKey('documents.Document', on_delete=models.CASCADE, related_name='text_postings', verbose_name=_("Document"))
+    frequency = models.PositiveIntegerField(_("Frequency"))
+
+    def __str__(self):
+        return f"{self.term} in {self.document_id} ({self.frequency})"
+
+    class Meta:
+        verbose_name = _("Text Index Posting")
+        verbose_name_plural = _("Text Index Postings")
+        unique_together = ['term', 'document']
+
+
 class AIGeneratedDocument(models.Model):
     """
     Documents generated by AI.
@@ -0,0 +1,354 @@
+"""
+Approximate nearest neighbour (IVF-Flat) index for semantic search.
+
+Vectors are partitioned into ``nlist`` clusters by spherical k-means; a
+query only scans the ``nprobe`` clusters whose centroids are closest to it.
+Each cluster is an exact VectorIndex, so incremental adds and deletes work
+the same way as for the flat index. ``nprobe`` is the recall/latency knob:
+``nprobe == nlist`` is equivalent to exact search.
+
+Trained centroids are persisted next to the store's vector data so that
+worker restarts only pay for assigning vectors, not for re-training.
+"""
+
+import heapq
+import logging
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from ..models import VectorStore
+from .. import settings as ai_settings
+from .vector_index import VectorIndex, load_store_vectors
+
+logger = logging.getLogger(__name__)
+
+# Rows scored against the centroids at a time when assigning vectors
+ASSIGN_CHUNK_ROWS = 8192
+
+
+def default_nlist(count: int) -> int:
+    """Number of clusters used when the store does not configure one."""
+    return max(1, min(count, int(4 * np.sqrt(max(count, 1)))))
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def assign_clusters(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Assign each (normalized) vector to its most similar centroid.
+
+    Args:
+        vectors: Matrix with one normalized vector per row
+        centroids: Matrix with one normalized centroid per row
+
+    Returns:
+        Array of cluster numbers
+    """
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_ROWS):
+        chunk = vectors[start:start + ASSIGN_CHUNK_ROWS]
+        assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(vectors: np.ndarray,
+                    nlist: int,
+                    iterations: int = 20,
+                    sample_size: int = 100000,
+                    seed: int = 0) -> np.ndarray:
+    """
+    Train cluster centroids with spherical k-means (Lloyd iterations).
+
+    Args:
+        vectors: Matrix with one vector per row
+        nlist: Number of clusters
+        iterations: Number of k-means iterations
+        sample_size: Maximum number of vectors used for training
+        seed: Random seed
+
+    Returns:
+        Matrix of L2-normalized float32 centroids
+    """
+    rng = np.random.default_rng(seed)
+    sample = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+    if len(sample) > sample_size:
+        sample = sample[rng.choice(len(sample), sample_size, replace=False)]
+
+    nlist = max(1, min(nlist, len(sample)))
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = assign_clusters(sample, centroids)
+        counts = np.bincount(assignments, minlength=nlist)
+
+        sums = np.zeros_like(centroids)
+        order = np.argsort(assignments, kind='stable')
+        boundaries = np.concatenate([[0], np.cumsum(counts)])
+        sorted_sample = sample[order]
+        for cluster in np.flatnonzero(counts):
+            sums[cluster] = sorted_sample[boundaries[cluster]:boundaries[cluster + 1]].sum(axis=0)
+
+        # Re-seed empty clusters with random training vectors
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            sums[empty] = sample[rng.choice(len(sample), empty.size, replace=False)]
+
+        centroids = _normalize_rows(sums)
+
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """
+    Inverted-file index: k-means centroids plus one flat index per cluster.
+    """
+
+    index_type = 'ivf_flat'
+
+    def __init__(self, centroids: np.ndarray, nprobe: int = 8):
+        """
+        Initialize an empty index with trained centroids.
+
+        Args:
+            centroids: Matrix of cluster centroids
+            nprobe: Default number of clusters scanned per query
+        """
+        self.centroids = _normalize_rows(np.asarray(centroids, dtype=np.float32))
+        self.nlist, self.dimensions = self.centroids.shape
+        self.nprobe = nprobe
+        self.generation = None
+        self._lists = [VectorIndex(self.dimensions) for _ in range(self.nlist)]
+        self._assignments = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._assignments)
+
+    def __contains__(self, document_id):
+        return document_id in self._assignments
+
+    def _nearest_clusters(self, vector: np.ndarray, count: int) -> np.ndarray:
+        scores = self.centroids @ vector
+        if count >= self.nlist:
+            return np.argsort(-scores)
+        top = np.argpartition(-scores, count - 1)[:count]
+        return top[np.argsort(-scores[top])]
+
+    def upsert(self, document_id: int, case_id: Optional[int], vector) -> bool:
+        """
+        Insert or replace the vector of a document.
+
+        Args:
+            document_id: Document ID
+            case_id: Case ID of the document (None if not linked to a case)
+            vector: Embedding vector
+
+        Returns:
+            True if the vector was stored, False if it was rejected
+        """
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        if vector.shape[0] != self.dimensions:
+            logger.warning(f"Skipping vector for document {document_id}: expected {self.dimensions} dimensions")
+            return False
+
+        cluster = int(self._nearest_clusters(vector, 1)[0])
+        with self._lock:
+            previous = self._assignments.get(document_id)
+            if previous is not None and previous != cluster:
+                self._lists[previous].remove(document_id)
+            if not self._lists[cluster].upsert(document_id, case_id, vector):
+                self._assignments.pop(document_id, None)
+                return False
+            self._assignments[document_id] = cluster
+            return True
+
+    def add_many(self, document_ids: np.ndarray, case_ids: np.ndarray, vectors: np.ndarray) -> int:
+        """
+        Bulk-insert vectors, assigning clusters in one vectorized pass.
+
+        Args:
+            document_ids: Document IDs
+            case_ids: Case IDs (NO_CASE for documents without a case)
+            vectors: Matrix with one embedding per row
+
+        Returns:
+            Number of vectors stored
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return 0
+        document_ids = np.asarray(document_ids, dtype=np.int64)
+        case_ids = np.asarray(case_ids, dtype=np.int64)
+
+        # Keep the last occurrence of documents repeated within the batch
+        _, last = np.unique(document_ids[::-1], return_index=True)
+        rows = np.sort(len(document_ids) - 1 - last)
+        document_ids, case_ids, vectors = document_ids[rows], case_ids[rows], vectors[rows]
+
+        with self._lock:
+            existing = np.array([doc_id in self._assignments for doc_id in document_ids.tolist()], dtype=bool)
+            stored = sum(
+                self.upsert(int(document_ids[row]), int(case_ids[row]), vectors[row])
+                for row in np.flatnonzero(existing)
+            )
+
+            fresh = np.flatnonzero(~existing)
+            clusters = assign_clusters(_normalize_rows(vectors[fresh]), self.centroids)
+            for cluster in np.unique(clusters):
+                rows = fresh[clusters == cluster]
+                stored += self._lists[cluster].add_many(document_ids[rows], case_ids[rows], vectors[rows])
+                for doc_id in document_ids[rows].tolist():
+                    if doc_id in self._lists[cluster]:
+                        self._assignments[doc_id] = int(cluster)
+            return stored
+
+    def remove(self, document_id: int) -> bool:
+        """
+        Remove the vector of a document.
+
+        Args:
+            document_id: Document ID
+
+        Returns:
+            True if the document was indexed, False otherwise
+        """
+        with self._lock:
+            cluster = self._assignments.pop(document_id, None)
+            if cluster is None:
+                return False
+            return self._lists[cluster].remove(document_id)
+
+    def get_vector(self, document_id: int) -> Optional[np.ndarray]:
+        """
+        Get a copy of the normalized vector stored for a document.
+
+        Args:
+            document_id: Document ID
+
+        Returns:
+            Normalized vector or None if the document is not indexed
+        """
+        cluster = self._assignments.get(document_id)
+        if cluster is None:
+            return None
+        return self._lists[cluster].get_vector(document_id)
+
+    def search(self,
+               query_vector,
+               limit: int,
+               threshold: float,
+               case_id: Optional[int] = None,
+               exclude_document_id: Optional[int] = None,
+               nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Find the documents most similar to a query vector.
+
+        Args:
+            query_vector: Query embedding
+            limit: Maximum number of results
+            threshold: Minimum cosine similarity
+            case_id: Optional case ID to restrict results to
+            exclude_document_id: Optional document ID to leave out of the results
+            nprobe: Clusters to scan (default: the index's nprobe); higher
+                values raise recall at the cost of latency
+
+        Returns:
+            List of (document_id, similarity) tuples, most similar first
+        """
+        query = np.asarray(query_vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if not norm or limit <= 0 or query.shape[0] != self.dimensions:
+            return []
+        query = query / norm
+
+        nprobe = max(1, min(nprobe or self.nprobe, self.nlist))
+        hits = []
+        for cluster in self._nearest_clusters(query, nprobe):
+            hits.extend(self._lists[cluster].search(
+                query, limit, threshold, case_id=case_id, exclude_document_id=exclude_document_id
+            ))
+        return heapq.nlargest(limit, hits, key=lambda hit: hit[1])
+
+    def save_centroids(self, path: str) -> None:
+        """Persist the trained centroids."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, self.centroids, allow_pickle=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def train(cls, document_ids: np.ndarray, case_ids: np.ndarray, vectors: np.ndarray,
+              nlist: Optional[int] = None, nprobe: int = 8, iterations: int = 20,
+              seed: int = 0) -> 'IVFIndex':
+        """
+        Train centroids on a set of vectors and index them.
+
+        Args:
+            document_ids: Document IDs
+            case_ids: Case IDs
+            vectors: Matrix with one embedding per row
+            nlist: Number of clusters (default: about 4 x sqrt(N))
+            nprobe: Default number of clusters scanned per query
+            iterations: Number of k-means iterations
+            seed: Random seed
+
+        Returns:
+            Populated IVFIndex
+        """
+        centroids = train_centroids(vectors, nlist or default_nlist(len(vectors)), iterations=iterations, seed=seed)
+        index = cls(centroids, nprobe=nprobe)
+        index.add_many(document_ids, case_ids, vectors)
+        return index
+
+    @classmethod
+    def build(cls, vector_store: VectorStore) -> 'IVFIndex':
+        """
+        Build an index from the DocumentEmbedding rows of a vector store.
+
+        Persisted centroids are reused when present and compatible;
+        otherwise they are trained and saved.
+
+        Args:
+            vector_store: Vector store to index
+
+        Returns:
+            Populated IVFIndex
+        """
+        document_ids, case_ids, vectors = load_store_vectors(vector_store)
+        path = get_centroids_path(vector_store)
+
+        centroids = None
+        if os.path.exists(path):
+            centroids = np.load(path)
+            if len(vectors) and centroids.shape[1] != vectors.shape[1]:
+                logger.warning(f"Ignoring persisted centroids for store {vector_store.name}: dimension mismatch")
+                centroids = None
+
+        if centroids is None:
+            if not len(vectors):
+                # Nothing to train on yet; a single cluster is exact search
+                return cls(np.ones((1, vector_store.dimensions), dtype=np.float32), nprobe=vector_store.ivf_nprobe)
+            index = cls.train(document_ids, case_ids, vectors,
+                              nlist=vector_store.ivf_nlist, nprobe=vector_store.ivf_nprobe)
+            index.save_centroids(path)
+        else:
+            index = cls(centroids, nprobe=vector_store.ivf_nprobe)
+            index.add_many(document_ids, case_ids, vectors)
+
+        logger.info(
+            f"Built IVF index for store {vector_store.name}: {len(index)} vectors in {index.nlist} lists"
+        )
+        return index
+
+
+def get_centroids_path(vector_store: VectorStore) -> str:
+    """Path of the persisted IVF centroids of a vector store."""
+    return os.path.join(ai_settings.VECTOR_SEGMENT_ROOT, f"store_{vector_store.id}", "ivf_centroids.npy")
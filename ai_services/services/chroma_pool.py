@@ -0,0 +1,166 @@
+"""
+Process-wide pool of ChromaDB clients and collection handles.
+
+Creating a ChromaDB client parses the connection string and, in persistent
+mode, reopens the on-disk database, which is far more expensive than the
+query itself. Clients are therefore created lazily, once per VectorStore,
+and reused by every search and write in the process.
+
+Entries are fingerprinted with the store's connection string and
+``updated_at``, so editing the VectorStore row makes every process build a
+fresh client on its next lookup.
+
+Connection strings:
+    ``http://host:port``      HTTP client for a ChromaDB server
+    ``:memory:``              Embedded in-memory client (tests)
+    ``chroma:///some/path``   Embedded persistent client (also a bare path;
+                              default ./chroma_db)
+"""
+
+import logging
+import threading
+from typing import Dict, Optional
+
+from ..models import VectorStore
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "legal_documents"
+
+# Connection string selecting the embedded in-memory client
+MEMORY_CONNECTION = ":memory:"
+
+# URL schemes that name a local persistent directory rather than a server
+LOCAL_SCHEMES = ("chroma", "file")
+
+
+class _PoolEntry:
+    """A client and its collection handles for one vector store."""
+
+    def __init__(self, fingerprint, client):
+        self.fingerprint = fingerprint
+        self.client = client
+        self.collections = {}
+        self.lock = threading.Lock()
+
+
+_entries: Dict[int, _PoolEntry] = {}
+_pool_lock = threading.Lock()
+
+
+def _fingerprint(vector_store: VectorStore):
+    return (vector_store.connection_string or "", vector_store.updated_at)
+
+
+def create_chroma_client(connection_string: Optional[str]):
+    """
+    Create a ChromaDB client for a connection string.
+
+    Args:
+        connection_string: Server URL, ':memory:' or a local directory
+
+    Returns:
+        ChromaDB client
+    """
+    import chromadb
+    from chromadb import Settings
+
+    connection_parts = (connection_string or "").split('://')
+    if len(connection_parts) > 1 and connection_parts[0] in LOCAL_SCHEMES:
+        # chroma:///path/to/directory
+        connection_string = connection_parts[1]
+    elif len(connection_parts) > 1:
+        protocol, rest = connection_parts
+        host, port = rest.rstrip('/').split(':')
+        if hasattr(chromadb, 'HttpClient'):
+            return chromadb.HttpClient(host=host, port=int(port))
+        return chromadb.Client(Settings(
+            chroma_api_impl="rest",
+            chroma_server_host=host,
+            chroma_server_http_port=port
+        ))
+
+    if connection_string == MEMORY_CONNECTION:
+        if hasattr(chromadb, 'EphemeralClient'):
+            return chromadb.EphemeralClient()
+        return chromadb.Client(Settings())
+
+    # Local persistent client
+    path = connection_string or "./chroma_db"
+    if hasattr(chromadb, 'PersistentClient'):
+        return chromadb.PersistentClient(path=path)
+    return chromadb.Client(Settings(persist_directory=path))
+
+
+def _get_entry(vector_store: VectorStore) -> _PoolEntry:
+    fingerprint = _fingerprint(vector_store)
+    entry = _entries.get(vector_store.id)
+    if entry is not None and entry.fingerprint == fingerprint:
+        return entry
+
+    with _pool_lock:
+        entry = _entries.get(vector_store.id)
+        if entry is None or entry.fingerprint != fingerprint:
+            logger.info(f"Creating ChromaDB client for store {vector_store.name}")
+            entry = _PoolEntry(fingerprint, create_chroma_client(vector_store.connection_string))
+            _entries[vector_store.id] = entry
+    return entry
+
+
+def get_chroma_client(vector_store: VectorStore):
+    """
+    Get the pooled ChromaDB client of a vector store, creating it on first use.
+
+    Args:
+        vector_store: Vector store configuration
+
+    Returns:
+        ChromaDB client
+    """
+    return _get_entry(vector_store).client
+
+
+def get_chroma_collection(vector_store: VectorStore, create: bool = False, name: str = COLLECTION_NAME):
+    """
+    Get a pooled collection handle of a vector store.
+
+    Args:
+        vector_store: Vector store configuration
+        create: Create the collection if it does not exist
+        name: Collection name
+
+    Returns:
+        ChromaDB collection
+    """
+    entry = _get_entry(vector_store)
+    collection = entry.collections.get(name)
+    if collection is not None:
+        return collection
+
+    with entry.lock:
+        collection = entry.collections.get(name)
+        if collection is None:
+            if create:
+                collection = entry.client.get_or_create_collection(
+                    name=name,
+                    embedding_function=None  # We're providing our own embeddings
+                )
+            else:
+                collection = entry.client.get_collection(name=name)
+            entry.collections[name] = collection
+    return collection
+
+
+def release_chroma_client(store_id: Optional[int] = None) -> None:
+    """
+    Drop pooled clients so they are recreated on next use, e.g. after a
+    connection error.
+
+    Args:
+        store_id: VectorStore ID to release (all stores if None)
+    """
+    with _pool_lock:
+        if store_id is None:
+            _entries.clear()
+        else:
+            _entries.pop(store_id, None)
@@ -0,0 +1,249 @@
+"""
+In-process index of passage (chunk) vectors for passage-level search.
+
+Chunk vectors live in a VectorIndex keyed by DocumentChunkEmbedding ID; a
+query's chunk hits are then aggregated to one score per document, either
+the best passage ('max') or the sum of the document's top passages ('sum').
+The index shares the write generation of its vector store with the
+document-level index.
+"""
+
+import heapq
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..models import VectorStore, DocumentChunkEmbedding
+from .vector_codec import decode_vector, VectorDecodeError
+from .vector_index import VectorIndex, NO_CASE, get_store_generation
+
+logger = logging.getLogger(__name__)
+
+# Chunk hits fetched per requested document before aggregation
+CANDIDATES_PER_RESULT = 4
+
+
+class ChunkIndex:
+    """
+    Chunk vectors plus the chunk -> document mapping and passage offsets.
+    """
+
+    index_type = 'flat'
+
+    def __init__(self, dimensions: Optional[int] = None):
+        """
+        Initialize an empty index.
+
+        Args:
+            dimensions: Vector dimensionality (inferred from the first vector if None)
+        """
+        self.generation = None
+        self._index = VectorIndex(dimensions)
+        self._chunks: Dict[int, Tuple[int, int, int]] = {}
+        self._document_chunks: Dict[int, List[int]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._index)
+
+    def add_many(self, chunk_ids, document_ids, case_ids, offsets, vectors) -> int:
+        """
+        Bulk-insert chunk vectors.
+
+        Args:
+            chunk_ids: DocumentChunkEmbedding IDs
+            document_ids: Document ID of each chunk
+            case_ids: Case ID of each chunk (NO_CASE for documents without a case)
+            offsets: (start, end) character offsets of each chunk
+            vectors: Matrix with one embedding per row
+
+        Returns:
+            Number of vectors stored
+        """
+        with self._lock:
+            for chunk_id, document_id, (start, end) in zip(chunk_ids, document_ids, offsets):
+                self._chunks[int(chunk_id)] = (int(document_id), int(start), int(end))
+                self._document_chunks.setdefault(int(document_id), []).append(int(chunk_id))
+            return self._index.add_many(chunk_ids, case_ids, vectors)
+
+    def replace_document(self, document_id: int, case_id: Optional[int], chunk_ids, offsets, vectors) -> None:
+        """
+        Replace all chunks of a document.
+
+        Args:
+            document_id: Document ID
+            case_id: Case ID of the document (None if not linked to a case)
+            chunk_ids: New DocumentChunkEmbedding IDs
+            offsets: (start, end) character offsets of each chunk
+            vectors: Embedding of each chunk
+        """
+        with self._lock:
+            self.remove_document(document_id)
+            if len(chunk_ids):
+                self.add_many(
+                    chunk_ids,
+                    [document_id] * len(chunk_ids),
+                    [NO_CASE if case_id is None else case_id] * len(chunk_ids),
+                    offsets,
+                    np.vstack(vectors),
+                )
+
+    def remove_document(self, document_id: int) -> None:
+        """
+        Remove all chunks of a document.
+
+        Args:
+            document_id: Document ID
+        """
+        with self._lock:
+            for chunk_id in self._document_chunks.pop(document_id, []):
+                self._chunks.pop(chunk_id, None)
+                self._index.remove(chunk_id)
+
+    def search(self,
+               query_vector,
+               limit: int,
+               threshold: float,
+               case_id: Optional[int] = None,
+               exclude_document_id: Optional[int] = None,
+               aggregation: str = 'max',
+               top_k: int = 3) -> List[Tuple[int, float, int, int]]:
+        """
+        Find the documents with the passages most similar to a query vector.
+
+        Args:
+            query_vector: Query embedding
+            limit: Maximum number of documents
+            threshold: Minimum cosine similarity of a passage
+            case_id: Optional case ID to restrict results to
+            exclude_document_id: Optional document ID to leave out of the results
+            aggregation: 'max' scores a document by its best passage, 'sum' by
+                the sum of its top_k passages
+            top_k: Number of passages summed per document for 'sum'
+
+        Returns:
+            List of (document_id, score, start, end) tuples, best first; start
+            and end are the offsets of the document's best passage
+        """
+        if limit <= 0:
+            return []
+        hits = self._index.search(
+            query_vector, limit * max(top_k, 1) * CANDIDATES_PER_RESULT, threshold, case_id=case_id
+        )
+
+        # Hits arrive best first, so each document's list is sorted too
+        per_document: Dict[int, List[Tuple[float, int]]] = {}
+        for chunk_id, similarity in hits:
+            chunk = self._chunks.get(chunk_id)
+            if chunk is None or chunk[0] == exclude_document_id:
+                continue
+            per_document.setdefault(chunk[0], []).append((similarity, chunk_id))
+
+        results = []
+        for document_id, passages in per_document.items():
+            if aggregation == 'sum':
+                score = sum(similarity for similarity, _ in passages[:top_k])
+            else:
+                score = passages[0][0]
+            _, start, end = self._chunks[passages[0][1]]
+            results.append((document_id, score, start, end))
+
+        return heapq.nlargest(limit, results, key=lambda result: result[1])
+
+    @classmethod
+    def build(cls, vector_store: VectorStore) -> 'ChunkIndex':
+        """
+        Build an index from the DocumentChunkEmbedding rows of a vector store.
+
+        Args:
+            vector_store: Vector store to index
+
+        Returns:
+            Populated ChunkIndex
+        """
+        rows = DocumentChunkEmbedding.objects.filter(vector_store=vector_store).values_list(
+            'id', 'document_id', 'document__case_id', 'start_offset', 'end_offset', 'vector_data'
+        ).iterator(chunk_size=2000)
+
+        chunk_ids, document_ids, case_ids, offsets, vectors = [], [], [], [], []
+        skipped = 0
+        for chunk_id, document_id, case_id, start, end, vector_data in rows:
+            try:
+                vector = decode_vector(vector_data)
+            except VectorDecodeError as e:
+                logger.warning(f"Could not decode chunk embedding {chunk_id}: {str(e)}")
+                vector = None
+            if vector is None or (vectors and vector.shape[0] != vectors[0].shape[0]):
+                skipped += 1
+                continue
+            chunk_ids.append(chunk_id)
+            document_ids.append(document_id)
+            case_ids.append(NO_CASE if case_id is None else case_id)
+            offsets.append((start, end))
+            vectors.append(vector)
+
+        if skipped:
+            logger.warning(f"Skipped {skipped} undecodable or mismatched chunk vectors in store {vector_store.name}")
+
+        index = cls()
+        if vectors:
+            index.add_many(chunk_ids, document_ids, case_ids, offsets, np.vstack(vectors))
+        logger.info(f"Built chunk index for store {vector_store.name}: {len(index)} passages")
+        return index
+
+
+# Process-wide registry of resident chunk indexes, keyed by VectorStore ID
+_chunk_indexes: Dict[int, ChunkIndex] = {}
+_registry_lock = threading.Lock()
+
+
+def get_chunk_index(vector_store: VectorStore) -> ChunkIndex:
+    """
+    Get the resident chunk index for a vector store, (re)building it if stale.
+
+    Args:
+        vector_store: Vector store configuration
+
+    Returns:
+        Up-to-date ChunkIndex
+    """
+    generation = get_store_generation(vector_store.id)
+    index = _chunk_indexes.get(vector_store.id)
+    if index is not None and index.generation == generation:
+        return index
+
+    with _registry_lock:
+        index = _chunk_indexes.get(vector_store.id)
+        if index is None or index.generation != generation:
+            index = ChunkIndex.build(vector_store)
+            index.generation = generation
+            _chunk_indexes[vector_store.id] = index
+    return index
+
+
+def patch_chunk_index(store_id: int, document_id: int, case_id: Optional[int], chunks, generation: int) -> None:
+    """
+    Update this process's chunk index after a document's chunks were rewritten.
+
+    Args:
+        store_id: VectorStore ID
+        document_id: ID of the document whose chunks were written
+        case_id: Case ID of the document
+        chunks: Tuple of (chunk IDs, (start, end) offsets, vectors), or None
+            if the document's chunks were deleted
+        generation: Store generation produced by the write
+    """
+    index = _chunk_indexes.get(store_id)
+    if index is None:
+        return
+    with index._lock:
+        if chunks is None:
+            index.remove_document(document_id)
+        else:
+            chunk_ids, offsets, vectors = chunks
+            index.replace_document(document_id, case_id, chunk_ids, offsets, vectors)
+        # Only fast-forward if no write from elsewhere was missed
+        if index.generation == generation - 1:
+            index.generation = generation
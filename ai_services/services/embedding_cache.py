@@ -0,0 +1,164 @@
+"""
+Persistent embedding cache keyed by text content.
+
+Embeddings are stored in the database keyed by (embedding model,
+dimensions, SHA-256 of the whitespace-normalized text), so re-embedding
+unchanged documents or passages costs a lookup instead of a request to
+the embedding endpoint. Least recently used entries are evicted once the
+cache grows past EMBEDDING_CACHE_MAX_ENTRIES.
+"""
+
+import hashlib
+import logging
+import threading
+import unicodedata
+from datetime import timedelta
+from typing import Dict, Iterable
+
+import numpy as np
+from django.utils import timezone
+
+from ..models import EmbeddingCacheEntry
+from .. import settings as ai_settings
+from .vector_codec import encode_vector, decode_vector
+
+logger = logging.getLogger(__name__)
+
+# Inserts between two eviction checks, per process
+EVICTION_CHECK_INTERVAL = 1000
+
+_inserts_since_eviction = 0
+_eviction_lock = threading.Lock()
+
+
+def normalize_text(text: str) -> str:
+    """Normalize Unicode and collapse whitespace so cosmetic changes still hit the cache."""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 hex digest of the normalized text."""
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Cache of embeddings for one embedding model and dimensionality."""
+
+    def __init__(self, embedding_model: str, dimensions: int):
+        """
+        Initialize the cache.
+
+        Args:
+            embedding_model: Name of the embedding model
+            dimensions: Embedding dimensions
+        """
+        self.embedding_model = embedding_model
+        self.dimensions = dimensions
+
+    def _entries(self):
+        return EmbeddingCacheEntry.objects.filter(embedding_model=self.embedding_model, dimensions=self.dimensions)
+
+    def get_many(self, texts: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up cached embeddings.
+
+        Args:
+            texts: Texts to look up
+
+        Returns:
+            Dictionary mapping each cached text to its embedding
+        """
+        hashes = {}
+        for text in texts:
+            hashes.setdefault(text_hash(text), []).append(text)
+        if not hashes:
+            return {}
+
+        found = {}
+        try:
+            rows = self._entries().filter(text_hash__in=list(hashes)).values_list('text_hash', 'vector_data')
+            for digest, vector_data in rows:
+                vector = decode_vector(vector_data)
+                for text in hashes[digest]:
+                    found[text] = vector
+
+            if found:
+                # Refresh recency for LRU eviction, at most once per touch interval
+                now = timezone.now()
+                hit_hashes = [digest for digest in hashes if hashes[digest][0] in found]
+                self._entries().filter(
+                    text_hash__in=hit_hashes,
+                    last_used_at__lt=now - timedelta(seconds=ai_settings.EMBEDDING_CACHE_TOUCH_INTERVAL)
+                ).update(last_used_at=now)
+        except Exception as e:
+            logger.warning(f"Error reading embedding cache: {str(e)}")
+            return {}
+
+        logger.debug(f"Embedding cache: {len(found)} hits for {len(hashes)} texts")
+        return found
+
+    def set_many(self, embeddings: Dict[str, np.ndarray]) -> None:
+        """
+        Store embeddings; texts with zero (failed) embeddings are skipped.
+
+        Args:
+            embeddings: Dictionary mapping texts to their embeddings
+        """
+        global _inserts_since_eviction
+
+        entries = {}
+        for text, vector in embeddings.items():
+            if vector is None or not np.any(vector):
+                continue
+            digest = text_hash(text)
+            entries[digest] = EmbeddingCacheEntry(
+                embedding_model=self.embedding_model,
+                dimensions=self.dimensions,
+                text_hash=digest,
+                vector_data=encode_vector(vector, ai_settings.VECTOR_STORAGE_DTYPE),
+            )
+        if not entries:
+            return
+
+        try:
+            EmbeddingCacheEntry.objects.bulk_create(list(entries.values()), ignore_conflicts=True)
+        except Exception as e:
+            logger.warning(f"Error writing embedding cache: {str(e)}")
+            return
+
+        with _eviction_lock:
+            _inserts_since_eviction += len(entries)
+            check = _inserts_since_eviction >= EVICTION_CHECK_INTERVAL
+            if check:
+                _inserts_since_eviction = 0
+        if check:
+            evict_embedding_cache()
+
+
+def evict_embedding_cache(max_entries: int = None) -> int:
+    """
+    Delete the least recently used cache entries beyond the size limit.
+
+    Args:
+        max_entries: Number of entries to keep (default: from settings)
+
+    Returns:
+        Number of entries deleted
+    """
+    if max_entries is None:
+        max_entries = ai_settings.EMBEDDING_CACHE_MAX_ENTRIES
+
+    try:
+        excess = EmbeddingCacheEntry.objects.count() - max_entries
+        if excess <= 0:
+            return 0
+
+        cutoff = EmbeddingCacheEntry.objects.order_by('last_used_at').values_list(
+            'last_used_at', flat=True
+        )[excess - 1]
+        deleted, _ = EmbeddingCacheEntry.objects.filter(last_used_at__lte=cutoff).delete()
+        logger.info(f"Evicted {deleted} embedding cache entries")
+        return deleted
+    except Exception as e:
+        logger.warning(f"Error evicting embedding cache entries: {str(e)}")
+        return 0
@@ -9,10 +9,19 @@ import numpy as np
 import logging
 import requests
 import json
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Tuple, Union
 from django.conf import settings
-from ..models import VectorStore, Document
+from django.db import transaction
+from documents.models import Document
+from ..models import VectorStore, DocumentEmbedding, DocumentChunkEmbedding
 from .. import settings as ai_settings
+from .vector_codec import encode_vector
+from .vector_index import record_document_vector, discard_document_vector
+from .segment_store import get_segment_store
+from .chroma_pool import get_chroma_collection
+from .text_chunker import iter_chunk_text, TextChunk
+from .embedding_cache import EmbeddingCache
+from .text_index import TermCounter, index_document_terms, index_document_text, is_indexed
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +38,7 @@ class EmbeddingService:
         self.vector_store = vector_store
         self.embedding_model = vector_store.embedding_model
         self.dimensions = vector_store.dimensions
+        self.cache = EmbeddingCache(self.embedding_model, self.dimensions) if ai_settings.ENABLE_EMBEDDING_CACHE else None
         logger.info(f"Initialized EmbeddingService with store: {vector_store.name}")
     
     def get_embedding(self, text: str) -> np.ndarray:
@@ -41,6 +51,11 @@ class EmbeddingService:
         Returns:
             Numpy array containing the embedding vector
         """
+        if self.cache:
+            cached = self.cache.get_many([text]).get(text)
+            if cached is not None:
+                return cached
+        
         logger.info(f"Getting embedding with model: {self.embedding_model}")
         
         try:
@@ -75,13 +90,114 @@ class EmbeddingService:
                 embedding = result['embedding']
             else:
                 raise ValueError(f"Unexpected embedding API response format: {result}")
-                
-            return np.array(embedding)
+            
+            embedding = np.array(embedding)
+            if self.cache:
+                self.cache.set_many({text: embedding})
+            return embedding
             
         except Exception as e:
             logger.error(f"Error getting embedding: {str(e)}")
             # Return zeros array as fallback
             return np.zeros(self.dimensions)
+
+    def get_embeddings(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Get embeddings for several texts with as few requests as possible.
+        
+        Identical texts are embedded once and cached texts are not sent at
+        all. The remaining texts are packed into requests of at most
+        EMBEDDING_BATCH_SIZE inputs and EMBEDDING_BATCH_MAX_CHARS characters,
+        and the results are mapped back by the ``index`` of each returned item.
+        
+        Args:
+            texts: Texts to create embeddings for
+            
+        Returns:
+            List of embedding vectors in the same order as ``texts``
+        """
+        unique_texts = list(dict.fromkeys(texts))
+        embeddings = self.cache.get_many(unique_texts) if self.cache else {}
+        missing = [text for text in unique_texts if text not in embeddings]
+        if embeddings:
+            logger.info(f"Reusing {len(embeddings)} cached embeddings, requesting {len(missing)}")
+        
+        for batch in self._pack_batches(missing):
+            logger.info(f"Getting {len(batch)} embeddings with model: {self.embedding_model}")
+            try:
+                vectors = self._request_embeddings(batch)
+            except Exception as e:
+                logger.error(f"Error getting batch of {len(batch)} embeddings: {str(e)}")
+                # Return zeros arrays as fallback, like get_embedding
+                vectors = [np.zeros(self.dimensions) for _ in batch]
+            
+            if vectors is None:
+                # The endpoint does not accept list input; embed one by one
+                logger.warning("Embedding API does not support batched input, falling back to single requests")
+                vectors = [self.get_embedding(text) for text in batch]
+            elif self.cache:
+                self.cache.set_many(dict(zip(batch, vectors)))
+            
+            embeddings.update(zip(batch, vectors))
+        
+        return [embeddings[text] for text in texts]
+
+    def _pack_batches(self, texts: List[str]) -> List[List[str]]:
+        """Split texts into request batches within the size and character budget."""
+        batches = []
+        batch = []
+        batch_chars = 0
+        for text in texts:
+            if batch and (len(batch) >= ai_settings.EMBEDDING_BATCH_SIZE or
+                          batch_chars + len(text) > ai_settings.EMBEDDING_BATCH_MAX_CHARS):
+                batches.append(batch)
+                batch = []
+                batch_chars = 0
+            batch.append(text)
+            batch_chars += len(text)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _request_embeddings(self, texts: List[str]) -> Optional[List[np.ndarray]]:
+        """
+        Send one embedding request with a list of inputs.
+        
+        Args:
+            texts: Texts to embed
+            
+        Returns:
+            List of embedding vectors in input order, or None if the API
+            answered with a single embedding instead of one per input
+        """
+        payload = {
+            "model": self.embedding_model,
+            "input": texts,
+        }
+        
+        response = requests.post(
+            ai_settings.DEFAULT_EMBEDDING_ENDPOINT,
+            json=payload,
+            headers={"Content-Type": "application/json"},
+            timeout=ai_settings.LLM_REQUEST_TIMEOUT
+        )
+        response.raise_for_status()
+        result = response.json()
+        
+        if 'data' not in result:
+            if 'embedding' in result:
+                # Simple format only carries one embedding
+                return None
+            raise ValueError(f"Unexpected embedding API response format: {result}")
+        
+        vectors = [None] * len(texts)
+        for position, item in enumerate(result['data']):
+            vectors[item.get('index', position)] = np.array(item['embedding'])
+        
+        if any(vector is None for vector in vectors):
+            raise ValueError(f"Embedding API returned {len(result['data'])} embeddings for {len(texts)} inputs")
+        
+        return vectors
     
     def create_document_embedding(self, document: Document) -> bool:
         """
@@ -98,75 +214,294 @@ class EmbeddingService:
         try:
             logger.info(f"Creating embedding for document: {document.title}")
             
+            if ai_settings.ENABLE_CHUNK_EMBEDDINGS:
+                # Chunk the text as it is extracted instead of holding it whole
+                chunks = self._stream_chunks(document)
+                if not chunks:
+                    logger.warning(f"No text content extracted from document: {document.title}")
+                    return False
+                embedding_vector, chunks, chunk_vectors = self._embed_chunks([chunks])[0]
+                return self._store_document_embedding(document, None, embedding_vector, chunks, chunk_vectors)
+            
             # Get document text content
             text = extract_text_from_document(document)
             if not text:
                 logger.warning(f"No text content extracted from document: {document.title}")
                 return False
+            self._index_text(document, text)
             
             # Get embedding
-            embedding_vector = self.get_embedding(text)
+            embedding_vector, chunks, chunk_vectors = self._embed_texts([text])[0]
+            return self._store_document_embedding(document, text, embedding_vector, chunks, chunk_vectors)
             
-            # Store in vector database based on the type
-            if self.vector_store.store_type == 'pgvector':
-                # Using Django ORM with pgvector extension
-                from django.db import connection
-                with connection.cursor() as cursor:
-                    cursor.execute(
-                        "INSERT INTO document_vectors (document_id, embedding) VALUES (%s, %s) RETURNING id",
-                        [document.id, embedding_vector.tolist()]
-                    )
-                    vector_id = cursor.fetchone()[0]
-                    logger.info(f"Stored embedding in pgvector with ID: {vector_id}")
-            elif self.vector_store.store_type == 'chroma':
-                # Using ChromaDB
-                from chromadb import Client, Settings
-                
-                # Parse connection string
-                connection_parts = self.vector_store.connection_string.split('://')
-                if len(connection_parts) > 1:
-                    protocol, rest = connection_parts
-                    host, port = rest.split(':')
-                    
-                    client = Client(Settings(
-                        chroma_api_impl="rest",
-                        chroma_server_host=host,
-                        chroma_server_http_port=port
-                    ))
+        except Exception as e:
+            logger.error(f"Error creating document embedding: {str(e)}")
+            return False
+
+    def create_document_embeddings(self, documents: List[Document]) -> Dict[int, bool]:
+        """
+        Create and store embeddings for several documents with batched requests.
+        
+        Args:
+            documents: Documents to create embeddings for
+            
+        Returns:
+            Dictionary mapping document IDs to True if successful, False otherwise
+        """
+        from documents.utils import extract_text_from_document
+        
+        results = {}
+        pending = []
+        for document in documents:
+            # Chunks of the streamed text, or the whole text without chunking
+            try:
+                if ai_settings.ENABLE_CHUNK_EMBEDDINGS:
+                    content = self._stream_chunks(document)
                 else:
-                    # Local persistent client
-                    client = Client(Settings(
-                        persist_directory=self.vector_store.connection_string or "./chroma_db"
-                    ))
-                
-                # Get or create collection
-                collection = client.get_or_create_collection(
-                    name="legal_documents",
-                    embedding_function=None  # We're providing our own embeddings
-                )
-                
-                # Add document to collection
-                collection.add(
-                    ids=[str(document.id)],
-                    embeddings=[embedding_vector.tolist()],
-                    metadatas=[{
-                        "title": document.title,
-                        "document_type": document.document_type,
-                        "case_id": str(document.case.id) if document.case else None,
-                    }],
-                    documents=[text]
-                )
-                logger.info(f"Stored embedding in ChromaDB for document: {document.title}")
+                    content = extract_text_from_document(document)
+                    if content:
+                        self._index_text(document, content)
+            except Exception as e:
+                logger.error(f"Error extracting text from document {document.id}: {str(e)}")
+                content = None
+            if content:
+                pending.append((document, content))
             else:
-                # Mock or other vector store
-                logger.info(f"Using mock vector store for document: {document.title}")
-                # Just log that we would store it
-                
-            return True
+                logger.warning(f"No text content extracted from document: {document.title}")
+                results[document.id] = False
+        
+        if not pending:
+            return results
+        
+        logger.info(f"Creating embeddings for {len(pending)} documents")
+        if ai_settings.ENABLE_CHUNK_EMBEDDINGS:
+            embedded = self._embed_chunks([content for _, content in pending])
+        else:
+            embedded = self._embed_texts([content for _, content in pending])
+        
+        for (document, content), (embedding_vector, chunks, chunk_vectors) in zip(pending, embedded):
+            text = None if ai_settings.ENABLE_CHUNK_EMBEDDINGS else content
+            try:
+                results[document.id] = self._store_document_embedding(
+                    document, text, embedding_vector, chunks, chunk_vectors
+                )
+            except Exception as e:
+                logger.error(f"Error storing embedding for document {document.id}: {str(e)}")
+                results[document.id] = False
+        
+        return results
+
+    def _index_text(self, document: Document, text: str) -> None:
+        """Add already extracted text to the keyword index unless it is up to date."""
+        try:
+            index_document_text(document, text)
+        except Exception as e:
+            logger.warning(f"Error indexing text of document {document.id}: {str(e)}")
+
+    def _stream_chunks(self, document: Document) -> List[TextChunk]:
+        """
+        Chunk a document's text while it is extracted.
+        
+        The pieces from stream_document_text go straight into the chunker,
+        which buffers only a few windows. Unless the document is already in
+        the keyword index, its terms are counted from the same pieces and
+        indexed.
+        
+        Args:
+            document: Document to chunk
             
+        Returns:
+            Chunks of the document text (empty if there is no text)
+        """
+        from documents.utils import stream_document_text
+        
+        try:
+            terms = None if is_indexed(document) else TermCounter()
         except Exception as e:
-            logger.error(f"Error creating document embedding: {str(e)}")
+            logger.warning(f"Error checking text index of document {document.id}: {str(e)}")
+            terms = None
+        
+        def pieces():
+            for piece in stream_document_text(document):
+                if terms is not None:
+                    terms.update(piece)
+                yield piece
+        
+        chunks = list(iter_chunk_text(pieces()))
+        if chunks and terms is not None:
+            terms.close()
+            try:
+                index_document_terms(document, terms)
+            except Exception as e:
+                logger.warning(f"Error indexing text of document {document.id}: {str(e)}")
+        return chunks
+
+    def _embed_texts(self, texts: List[str]) -> List[Tuple[np.ndarray, List[TextChunk], List[np.ndarray]]]:
+        """
+        Embed whole document texts, for when chunking is disabled.
+        
+        Args:
+            texts: Document texts
+            
+        Returns:
+            List of (document vector, no chunks, no chunk vectors) per text
+        """
+        return [(vector, [], []) for vector in self.get_embeddings(texts)]
+
+    def _embed_chunks(self, chunked: List[List[TextChunk]]) -> List[Tuple[np.ndarray, List[TextChunk], List[np.ndarray]]]:
+        """
+        Embed documents passage by passage.
+        
+        All passages of all documents go through one get_embeddings call, so
+        request size stays bounded by the batch budget. The document vector
+        is the mean of its normalized passage vectors, which keeps long
+        documents from exceeding the model's context in a single request.
+        
+        Args:
+            chunked: Chunks of each document text
+            
+        Returns:
+            List of (document vector, chunks, chunk vectors) per document; the
+            document vector is all zeros if any of its passages failed
+        """
+        vectors = self.get_embeddings([chunk.text for chunks in chunked for chunk in chunks])
+        
+        results = []
+        position = 0
+        for chunks in chunked:
+            chunk_vectors = vectors[position:position + len(chunks)]
+            position += len(chunks)
+            if not chunk_vectors or not all(np.any(vector) for vector in chunk_vectors):
+                results.append((np.zeros(self.dimensions), [], []))
+                continue
+            normalized = [vector / np.linalg.norm(vector) for vector in chunk_vectors]
+            results.append((np.mean(normalized, axis=0), chunks, chunk_vectors))
+        return results
+
+    def _store_chunk_embeddings(self,
+                                document: Document,
+                                chunks: List[TextChunk],
+                                chunk_vectors: List[np.ndarray]) -> Tuple[List[int], List[Tuple[int, int]]]:
+        """
+        Replace the stored passage embeddings of a document.
+        
+        Args:
+            document: Document the passages belong to
+            chunks: Passages of the document text
+            chunk_vectors: Embedding of each passage
+            
+        Returns:
+            Tuple of (DocumentChunkEmbedding IDs, (start, end) offsets)
+        """
+        DocumentChunkEmbedding.objects.filter(document=document).delete()
+        if not chunks:
+            return [], []
+        
+        rows = DocumentChunkEmbedding.objects.bulk_create([
+            DocumentChunkEmbedding(
+                document=document,
+                vector_store=self.vector_store,
+                chunk_index=chunk.index,
+                start_offset=chunk.start,
+                end_offset=chunk.end,
+                embedding_model=self.embedding_model,
+                vector_data=encode_vector(vector, ai_settings.VECTOR_STORAGE_DTYPE),
+            )
+            for chunk, vector in zip(chunks, chunk_vectors)
+        ])
+        if any(row.pk is None for row in rows):
+            # Backends that don't return IDs from bulk inserts
+            rows = list(DocumentChunkEmbedding.objects.filter(document=document).order_by('chunk_index'))
+        
+        return [row.pk for row in rows], [(row.start_offset, row.end_offset) for row in rows]
+
+    def _stored_text(self, document: Document) -> str:
+        """Text of a streamed document, read back from the extracted-text store."""
+        from documents.utils import extract_text_from_document
+        return extract_text_from_document(document) or ''
+
+    def _store_document_embedding(self,
+                                  document: Document,
+                                  text: Optional[str],
+                                  embedding_vector: np.ndarray,
+                                  chunks: List[TextChunk] = (),
+                                  chunk_vectors: List[np.ndarray] = ()) -> bool:
+        """
+        Store an embedding in the vector store and the local fallback copy.
+        
+        Args:
+            document: Document the embedding belongs to
+            text: Text content of the document (None if it was streamed)
+            embedding_vector: Embedding of the text
+            chunks: Passages of the text, if embedded separately
+            chunk_vectors: Embedding of each passage
+            
+        Returns:
+            True if stored, False if the embedding was empty
+        """
+        if not np.any(embedding_vector):
+            logger.warning(f"Embedding service returned an empty vector for document: {document.title}")
             return False
+
+        vector_id = str(document.id)
+        
+        # Store in vector database based on the type
+        if self.vector_store.store_type == 'pgvector':
+            # Using Django ORM with pgvector extension
+            from django.db import connection
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO document_vectors (document_id, embedding) VALUES (%s, %s) RETURNING id",
+                    [document.id, embedding_vector.tolist()]
+                )
+                vector_id = str(cursor.fetchone()[0])
+                logger.info(f"Stored embedding in pgvector with ID: {vector_id}")
+        elif self.vector_store.store_type == 'chroma':
+            # Using ChromaDB through the pooled client
+            collection = get_chroma_collection(self.vector_store, create=True)
+            
+            # Add document to collection
+            collection.add(
+                ids=[str(document.id)],
+                embeddings=[embedding_vector.tolist()],
+                metadatas=[{
+                    "title": document.title,
+                    "document_type": document.document_type,
+                    "case_id": str(document.case.id) if document.case else None,
+                }],
+                documents=[text if text is not None else self._stored_text(document)]
+            )
+            logger.info(f"Stored embedding in ChromaDB for document: {document.title}")
+        elif self.vector_store.store_type == 'local_mmap':
+            # Using memory-mapped segment files
+            get_segment_store(self.vector_store).upsert([(document.id, document.case_id, embedding_vector)])
+            logger.info(f"Stored embedding in local segment store for document: {document.title}")
+        else:
+            # Mock or other vector store
+            logger.info(f"Using mock vector store for document: {document.title}")
+            # Just log that we would store it
+
+        with transaction.atomic():
+            # Keep a compact local copy of the vector for the fallback index
+            DocumentEmbedding.objects.update_or_create(
+                document=document,
+                defaults={
+                    'vector_store': self.vector_store,
+                    'vector_id': vector_id,
+                    'embedding_model': self.embedding_model,
+                    'vector_data': encode_vector(embedding_vector, ai_settings.VECTOR_STORAGE_DTYPE),
+                }
+            )
+
+            # Keep passage vectors for passage-level search
+            chunk_ids, offsets = self._store_chunk_embeddings(document, list(chunks), list(chunk_vectors))
+
+            # Bump the store generation with the write and patch the resident indexes
+            record_document_vector(
+                self.vector_store, document, embedding_vector, chunks=(chunk_ids, offsets, list(chunk_vectors))
+            )
+
+        return True
     
     def update_document_embedding(self, document: Document) -> bool:
         """
@@ -190,30 +525,16 @@ class EmbeddingService:
                         [document.id]
                     )
             elif self.vector_store.store_type == 'chroma':
-                from chromadb import Client, Settings
-                
-                # Parse connection string
-                connection_parts = self.vector_store.connection_string.split('://')
-                if len(connection_parts) > 1:
-                    protocol, rest = connection_parts
-                    host, port = rest.split(':')
-                    
-                    client = Client(Settings(
-                        chroma_api_impl="rest",
-                        chroma_server_host=host,
-                        chroma_server_http_port=port
-                    ))
-                else:
-                    # Local persistent client
-                    client = Client(Settings(
-                        persist_directory=self.vector_store.connection_string or "./chroma_db"
-                    ))
-                
-                # Get collection
-                collection = client.get_collection(name="legal_documents")
+                # Get pooled collection
+                collection = get_chroma_collection(self.vector_store)
                 
                 # Delete document from collection
                 collection.delete(ids=[str(document.id)])
+            elif self.vector_store.store_type == 'local_mmap':
+                get_segment_store(self.vector_store).remove([document.id])
+
+            # Drop the stale vector from the resident fallback index
+            discard_document_vector(self.vector_store, document.id)
             
             # Create new embedding
             return self.create_document_embedding(document)
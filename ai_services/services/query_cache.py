@@ -0,0 +1,158 @@
+"""
+Caches for semantic search queries.
+
+Two levels sit in front of the vector search:
+
+1. A per-process LRU mapping query text to its embedding, so repeated
+   queries skip the HTTP round trip to the embedding endpoint.
+2. A Django cache entry mapping (store, query, filters) to the ranked
+   document IDs. The key includes the store's write generation, read from
+   the VectorStore row and bumped whenever embeddings are written, so
+   stale results are never served and simply expire, whichever process
+   wrote the embeddings.
+
+Hits and misses of both levels are counted through ServiceMonitor, in the
+Django cache; with the default LocMemCache the counts are per process.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from django.core.cache import cache
+
+from .. import settings as ai_settings
+from .embedding_cache import normalize_text
+from .service_monitor import ServiceMonitor
+from .vector_index import get_store_generation
+
+logger = logging.getLogger(__name__)
+
+RESULT_KEY = "vector_search_results:{store_id}:{generation}:{digest}"
+
+# Optional result fields kept with the cached IDs and similarities
+RESULT_FIELDS = ("passage", "keyword_score")
+
+
+class LRUCache:
+    """Thread-safe bounded mapping that evicts the least recently used entry."""
+
+    def __init__(self, max_size: int):
+        """
+        Initialize the cache.
+
+        Args:
+            max_size: Maximum number of entries
+        """
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the cached value (marking it recently used), or None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        """Store a value, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+
+
+_query_embeddings = LRUCache(ai_settings.QUERY_EMBEDDING_CACHE_SIZE)
+
+
+def get_query_embedding(embedding_service, query: str) -> np.ndarray:
+    """
+    Embed a search query, reusing the embedding of an identical earlier query.
+
+    Args:
+        embedding_service: Service used to embed cache misses
+        query: Search query
+
+    Returns:
+        Query embedding
+    """
+    key = (
+        getattr(embedding_service, 'embedding_model', None),
+        getattr(embedding_service, 'dimensions', None),
+        normalize_text(query),
+    )
+    embedding = _query_embeddings.get(key)
+    ServiceMonitor.record_cache_access("query_embedding", embedding is not None)
+    if embedding is not None:
+        return embedding
+
+    embedding = embedding_service.get_embedding(query)
+    if np.any(embedding):
+        # Failed (zero) embeddings are retried next time
+        _query_embeddings.set(key, embedding)
+    return embedding
+
+
+def search_result_key(store_id: int, query: str, **params) -> str:
+    """
+    Cache key for the results of a search at the store's current generation.
+
+    Args:
+        store_id: VectorStore ID
+        query: Search query
+        **params: Search parameters that affect the results (case_id, limit, ...)
+
+    Returns:
+        Cache key
+    """
+    payload = json.dumps([normalize_text(query), sorted(params.items())], default=str)
+    digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    return RESULT_KEY.format(store_id=store_id, generation=get_store_generation(store_id), digest=digest)
+
+
+def get_cached_results(key: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Look up cached ranked results.
+
+    Args:
+        key: Key from search_result_key
+
+    Returns:
+        List of {"id", "similarity"[, "passage", "keyword_score"]} dictionaries, or None on a miss
+    """
+    hits = cache.get(key)
+    ServiceMonitor.record_cache_access("search_results", hits is not None)
+    return hits
+
+
+def cache_results(key: str, documents: List[Dict[str, Any]]) -> None:
+    """
+    Store the ranked document IDs and scores of a search.
+
+    Args:
+        key: Key from search_result_key
+        documents: Search results
+    """
+    hits = []
+    for document in documents:
+        hit = {"id": document["id"], "similarity": document["similarity"]}
+        for field in RESULT_FIELDS:
+            if field in document:
+                hit[field] = document[field]
+        hits.append(hit)
+    cache.set(key, hits, timeout=ai_settings.SEARCH_RESULT_CACHE_TIMEOUT)
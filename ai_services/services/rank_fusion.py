@@ -0,0 +1,37 @@
+"""
+Fusion of rankings from different retrievers.
+
+Reciprocal rank fusion (RRF) combines rankings by position only, so
+scores on incompatible scales (BM25 and cosine similarity) can be merged
+without calibration: each list contributes 1 / (k + rank) to a document.
+"""
+
+from typing import Dict, Hashable, List, Sequence, Tuple
+
+from .. import settings as ai_settings
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]],
+                           k: int = None,
+                           weights: Sequence[float] = None) -> List[Tuple[Hashable, float]]:
+    """
+    Fuse ranked lists of IDs.
+
+    Args:
+        rankings: Ranked lists of IDs, best first
+        k: Rank offset damping the weight of top positions (default: from settings)
+        weights: Optional weight per ranking (default: 1.0 each)
+
+    Returns:
+        List of (id, fused score), best first; ties keep first-seen order
+    """
+    if k is None:
+        k = ai_settings.HYBRID_RRF_K
+    if weights is None:
+        weights = [1.0] * len(rankings)
+
+    scores: Dict[Hashable, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda hit: hit[1], reverse=True)
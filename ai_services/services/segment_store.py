@@ -0,0 +1,520 @@
+"""
+Memory-mapped on-disk vector segments for the 'local_mmap' vector store.
+
+Vectors are kept in append-only ``.npy`` segment files next to a JSON
+manifest. Readers ``np.memmap`` the segments, so every Gunicorn or Celery
+worker on a host shares one copy of the data in the OS page cache instead
+of holding all embeddings in its own heap.
+
+Layout of a store directory::
+
+    manifest.json                   segment list, dimensions and version
+    segment-000001.npy              float32 (rows, dimensions), L2-normalized
+    segment-000001.ids.npy          int64 document IDs
+    segment-000001.cases.npy        int64 case IDs (-1 if none)
+    segment-000001.tomb.npy         packed tombstone bitmap
+
+Writes never modify a segment's vectors in place: updated or deleted
+documents are tombstoned and re-appended, and the small unsealed tail
+segment is rewritten under a new name until it reaches
+VECTOR_SEGMENT_TAIL_ROWS. The compact_vector_segments management command
+merges segments and drops tombstoned rows.
+"""
+
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ..models import VectorStore
+from .. import settings as ai_settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+NO_CASE = -1
+
+
+def _normalize_rows(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    L2-normalize the rows of a matrix.
+
+    Returns:
+        Tuple of (normalized float32 matrix, boolean mask of valid rows)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1)
+    valid = np.isfinite(norms) & (norms > 0)
+    normalized = np.zeros_like(vectors)
+    normalized[valid] = vectors[valid] / norms[valid, None]
+    return normalized, valid
+
+
+def _write_array(path: str, array: np.ndarray) -> None:
+    """Atomically write an array as an .npy file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array, allow_pickle=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _top_k(document_ids: np.ndarray, scores: np.ndarray, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Keep the ``limit`` best-scoring entries, best first."""
+    if scores.size > limit:
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        document_ids, scores = document_ids[top], scores[top]
+    order = np.argsort(-scores, kind='stable')
+    return document_ids[order], scores[order]
+
+
+class _Segment:
+    """A single opened segment: memory-mapped vectors plus side arrays."""
+
+    def __init__(self, directory: str, name: str, rows: int, sealed: bool):
+        self.name = name
+        self.rows = rows
+        self.sealed = sealed
+        self.vectors = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+        self.document_ids = np.load(os.path.join(directory, f"{name}.ids.npy"), mmap_mode='r')
+        self.case_ids = np.load(os.path.join(directory, f"{name}.cases.npy"), mmap_mode='r')
+        self.tombstones = np.zeros(rows, dtype=bool)
+        self.load_tombstones(directory)
+
+    def load_tombstones(self, directory: str) -> None:
+        """(Re)load the tombstone bitmap of this segment."""
+        path = os.path.join(directory, f"{self.name}.tomb.npy")
+        if os.path.exists(path):
+            packed = np.load(path)
+            self.tombstones = np.unpackbits(packed, count=self.rows).astype(bool)
+        else:
+            self.tombstones = np.zeros(self.rows, dtype=bool)
+
+    @property
+    def live_rows(self) -> int:
+        return int(self.rows - self.tombstones.sum())
+
+
+class SegmentStore:
+    """
+    Reader/writer for the segment files of one vector store directory.
+
+    Instances are cheap to keep around: they only re-open files when the
+    manifest on disk changes.
+    """
+
+    MANIFEST = 'manifest.json'
+    LOCK_FILE = '.lock'
+
+    def __init__(self, directory: str, segment_rows: int = None, tail_rows: int = None):
+        """
+        Initialize with a store directory.
+
+        Args:
+            directory: Directory holding the segment files (created if missing)
+            segment_rows: Maximum rows per segment (default: from settings)
+            tail_rows: Rows at which the tail segment is sealed instead of
+                being rewritten on the next write (default: from settings)
+        """
+        self.directory = directory
+        self.segment_rows = segment_rows or ai_settings.VECTOR_SEGMENT_ROWS
+        self.tail_rows = min(tail_rows or ai_settings.VECTOR_SEGMENT_TAIL_ROWS, self.segment_rows)
+        self.dimensions: Optional[int] = None
+        self.version = 0
+        self._next_segment = 1
+        self._segments: List[_Segment] = []
+        self._manifest_stamp = None
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+    # Reading
+
+    def _stat_manifest(self):
+        try:
+            stat = os.stat(os.path.join(self.directory, self.MANIFEST))
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def refresh(self) -> None:
+        """Re-open segments if another process has changed the manifest."""
+        stamp = self._stat_manifest()
+        if stamp == self._manifest_stamp:
+            return
+
+        with self._lock:
+            if stamp is None:
+                self._segments, self.version, self.dimensions, self._next_segment = [], 0, None, 1
+                self._manifest_stamp = None
+                return
+
+            for attempt in range(3):
+                with open(os.path.join(self.directory, self.MANIFEST)) as f:
+                    manifest = json.load(f)
+                if manifest.get('format') != FORMAT_VERSION:
+                    raise ValueError(f"Unsupported segment manifest format: {manifest.get('format')}")
+
+                try:
+                    segments = self._open_segments(manifest)
+                    break
+                except FileNotFoundError:
+                    # A concurrent compaction replaced the segments; re-read the manifest
+                    if attempt == 2:
+                        raise
+                    stamp = self._stat_manifest()
+
+            self._segments = segments
+            self.dimensions = manifest.get('dimensions')
+            self.version = manifest.get('version', 0)
+            self._next_segment = manifest.get('next_segment', 1)
+            self._manifest_stamp = stamp
+
+    def _open_segments(self, manifest: dict) -> List[_Segment]:
+        """Open the segments listed in a manifest, reusing already-mapped ones."""
+        opened = {segment.name: segment for segment in self._segments}
+        segments = []
+        for entry in manifest['segments']:
+            segment = opened.get(entry['name'])
+            if segment is None:
+                segment = _Segment(self.directory, entry['name'], entry['rows'], entry['sealed'])
+            else:
+                segment.load_tombstones(self.directory)
+            segments.append(segment)
+        return segments
+
+    def __len__(self):
+        self.refresh()
+        return sum(segment.live_rows for segment in self._segments)
+
+    def get_vector(self, document_id: int) -> Optional[np.ndarray]:
+        """
+        Get a copy of the live vector stored for a document.
+
+        Args:
+            document_id: Document ID
+
+        Returns:
+            Normalized vector or None if the document is not stored
+        """
+        self.refresh()
+        for segment in reversed(self._segments):
+            rows = np.flatnonzero((segment.document_ids == document_id) & ~segment.tombstones)
+            if rows.size:
+                return np.array(segment.vectors[rows[-1]])
+        return None
+
+    def search(self,
+               query_vector,
+               limit: int,
+               threshold: float,
+               case_id: Optional[int] = None,
+               exclude_document_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Find the documents most similar to a query vector.
+
+        Args:
+            query_vector: Query embedding
+            limit: Maximum number of results
+            threshold: Minimum cosine similarity
+            case_id: Optional case ID to restrict results to
+            exclude_document_id: Optional document ID to leave out of the results
+
+        Returns:
+            List of (document_id, similarity) tuples, most similar first
+        """
+        self.refresh()
+        query, valid = _normalize_rows(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))
+        if not valid[0] or limit <= 0 or query.shape[1] != self.dimensions:
+            return []
+        query = query[0]
+
+        found_ids, found_scores = [], []
+        for segment in self._segments:
+            scores = segment.vectors @ query
+            mask = (scores >= threshold) & ~segment.tombstones
+            if case_id is not None:
+                mask &= segment.case_ids == case_id
+            if exclude_document_id is not None:
+                mask &= segment.document_ids != exclude_document_id
+
+            candidates = np.flatnonzero(mask)
+            if not candidates.size:
+                continue
+            ids, best = _top_k(np.asarray(segment.document_ids[candidates]), scores[candidates], limit)
+            found_ids.append(ids)
+            found_scores.append(best)
+
+        if not found_ids:
+            return []
+        ids, scores = _top_k(np.concatenate(found_ids), np.concatenate(found_scores), limit)
+        return [(int(doc_id), float(score)) for doc_id, score in zip(ids, scores)]
+
+    # Writing
+
+    @contextmanager
+    def _writer(self):
+        """Hold the cross-process write lock with an up-to-date view of the manifest."""
+        with self._lock:
+            with open(os.path.join(self.directory, self.LOCK_FILE), 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._manifest_stamp = None
+                    self.refresh()
+                    yield
+                except Exception:
+                    # In-memory state may be ahead of disk; re-read it next time
+                    self._manifest_stamp = None
+                    raise
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _path(self, name: str, suffix: str = '') -> str:
+        return os.path.join(self.directory, f"{name}{suffix}.npy")
+
+    def _new_segment_name(self) -> str:
+        name = f"segment-{self._next_segment:06d}"
+        self._next_segment += 1
+        return name
+
+    def _write_segment(self, vectors: np.ndarray, document_ids: np.ndarray,
+                       case_ids: np.ndarray, tombstones: np.ndarray, sealed: bool) -> _Segment:
+        """Write a new segment's files and open it."""
+        name = self._new_segment_name()
+        _write_array(self._path(name), np.ascontiguousarray(vectors, dtype=np.float32))
+        _write_array(self._path(name, '.ids'), np.asarray(document_ids, dtype=np.int64))
+        _write_array(self._path(name, '.cases'), np.asarray(case_ids, dtype=np.int64))
+        if tombstones.any():
+            _write_array(self._path(name, '.tomb'), np.packbits(tombstones))
+        return _Segment(self.directory, name, len(document_ids), sealed)
+
+    def _write_manifest(self, segments: List[_Segment]) -> None:
+        """Atomically publish a new segment list."""
+        manifest = {
+            'format': FORMAT_VERSION,
+            'dimensions': self.dimensions,
+            'version': self.version + 1,
+            'next_segment': self._next_segment,
+            'segments': [
+                {'name': s.name, 'rows': s.rows, 'sealed': s.sealed} for s in segments
+            ],
+        }
+        path = os.path.join(self.directory, self.MANIFEST)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        self._segments = segments
+        self.version = manifest['version']
+        self._manifest_stamp = self._stat_manifest()
+
+    def _delete_segment_files(self, segments: Iterable[_Segment]) -> None:
+        """Remove the files of segments that are no longer in the manifest."""
+        for segment in segments:
+            for suffix in ('', '.ids', '.cases', '.tomb'):
+                try:
+                    os.remove(self._path(segment.name, suffix))
+                except FileNotFoundError:
+                    pass
+
+    def _tombstone(self, document_ids: np.ndarray) -> List[_Segment]:
+        """Mark all live rows of the given documents as deleted; return dirty segments."""
+        dirty = []
+        for segment in self._segments:
+            hits = np.isin(segment.document_ids, document_ids) & ~segment.tombstones
+            if hits.any():
+                segment.tombstones = segment.tombstones | hits
+                dirty.append(segment)
+        return dirty
+
+    def upsert(self, items: Iterable[Tuple[int, Optional[int], object]]) -> int:
+        """
+        Insert or replace vectors.
+
+        Args:
+            items: Iterable of (document_id, case_id, vector) tuples
+
+        Returns:
+            Number of vectors written
+        """
+        items = list(items)
+        if not items:
+            return 0
+
+        vectors, valid = _normalize_rows(np.vstack([np.asarray(v, dtype=np.float32).ravel() for _, _, v in items]))
+        document_ids = np.array([doc_id for doc_id, _, _ in items], dtype=np.int64)
+        case_ids = np.array([NO_CASE if c is None else c for _, c, _ in items], dtype=np.int64)
+
+        with self._writer():
+            if self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+            if vectors.shape[1] != self.dimensions:
+                raise ValueError(f"Expected {self.dimensions} dimensions, got {vectors.shape[1]}")
+
+            # Only the last occurrence of a document in the batch is kept
+            _, last = np.unique(document_ids[::-1], return_index=True)
+            keep = np.zeros(len(document_ids), dtype=bool)
+            keep[len(document_ids) - 1 - last] = True
+            keep &= valid
+
+            dirty = self._tombstone(document_ids)
+            vectors, document_ids, case_ids = vectors[keep], document_ids[keep], case_ids[keep]
+            tombstones = np.zeros(len(document_ids), dtype=bool)
+
+            # Fold the unsealed tail segment into the new rows
+            segments = list(self._segments)
+            replaced = []
+            if segments and not segments[-1].sealed:
+                tail = segments.pop()
+                replaced.append(tail)
+                vectors = np.concatenate([np.asarray(tail.vectors), vectors])
+                document_ids = np.concatenate([np.asarray(tail.document_ids), document_ids])
+                case_ids = np.concatenate([np.asarray(tail.case_ids), case_ids])
+                tombstones = np.concatenate([tail.tombstones, tombstones])
+
+            for start in range(0, len(document_ids), self.segment_rows):
+                end = min(start + self.segment_rows, len(document_ids))
+                segments.append(self._write_segment(
+                    vectors[start:end], document_ids[start:end], case_ids[start:end],
+                    tombstones[start:end], sealed=end - start >= self.tail_rows
+                ))
+
+            for segment in dirty:
+                if segment not in replaced:
+                    _write_array(self._path(segment.name, '.tomb'), np.packbits(segment.tombstones))
+
+            self._write_manifest(segments)
+            self._delete_segment_files(replaced)
+
+        return int(keep.sum())
+
+    def remove(self, document_ids: Iterable[int]) -> int:
+        """
+        Tombstone the vectors of the given documents.
+
+        Args:
+            document_ids: Document IDs to remove
+
+        Returns:
+            Number of rows tombstoned
+        """
+        document_ids = np.asarray(list(document_ids), dtype=np.int64)
+        if not document_ids.size:
+            return 0
+
+        with self._writer():
+            before = sum(int(s.tombstones.sum()) for s in self._segments)
+            dirty = self._tombstone(document_ids)
+            if not dirty:
+                return 0
+            for segment in dirty:
+                _write_array(self._path(segment.name, '.tomb'), np.packbits(segment.tombstones))
+            self._write_manifest(list(self._segments))
+            return sum(int(s.tombstones.sum()) for s in self._segments) - before
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Merge all segments into sealed segments and drop tombstoned rows.
+
+        Returns:
+            Dictionary with segment and row counts before and after compaction
+        """
+        with self._writer():
+            old_segments = list(self._segments)
+            stats = {
+                'segments_before': len(old_segments),
+                'rows_before': sum(s.rows for s in old_segments),
+            }
+
+            segments = []
+            buffers: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+            buffered = 0
+
+            def flush(sealed):
+                nonlocal buffers, buffered
+                if not buffered:
+                    return
+                segments.append(self._write_segment(
+                    np.concatenate([b[0] for b in buffers]),
+                    np.concatenate([b[1] for b in buffers]),
+                    np.concatenate([b[2] for b in buffers]),
+                    np.zeros(buffered, dtype=bool),
+                    sealed=sealed
+                ))
+                buffers, buffered = [], 0
+
+            # Stream live rows segment by segment to bound memory use
+            for segment in old_segments:
+                live = np.flatnonzero(~segment.tombstones)
+                position = 0
+                while position < live.size:
+                    take = min(self.segment_rows - buffered, live.size - position)
+                    rows = live[position:position + take]
+                    buffers.append((segment.vectors[rows], segment.document_ids[rows], segment.case_ids[rows]))
+                    buffered += take
+                    position += take
+                    if buffered == self.segment_rows:
+                        flush(sealed=True)
+            flush(sealed=buffered >= self.tail_rows)
+
+            self._write_manifest(segments)
+            self._delete_segment_files(old_segments)
+
+            stats['segments_after'] = len(segments)
+            stats['rows_after'] = sum(s.rows for s in segments)
+            logger.info(f"Compacted vector segments in {self.directory}: {stats}")
+            return stats
+
+
+# Process-wide registry of opened segment stores, keyed by VectorStore ID
+_stores: Dict[int, SegmentStore] = {}
+_registry_lock = threading.Lock()
+
+
+def get_store_directory(vector_store: VectorStore) -> str:
+    """
+    Get the segment directory of a vector store.
+
+    The connection string is used as the directory if set; otherwise a
+    per-store directory under VECTOR_SEGMENT_ROOT.
+    """
+    if vector_store.connection_string:
+        return vector_store.connection_string
+    return os.path.join(ai_settings.VECTOR_SEGMENT_ROOT, f"store_{vector_store.id}")
+
+
+def get_segment_store(vector_store: VectorStore) -> SegmentStore:
+    """
+    Get the shared SegmentStore for a 'local_mmap' vector store.
+
+    Args:
+        vector_store: Vector store configuration
+
+    Returns:
+        SegmentStore for the store's directory
+    """
+    directory = get_store_directory(vector_store)
+    store = _stores.get(vector_store.id)
+    if store is not None and store.directory == directory:
+        return store
+
+    with _registry_lock:
+        store = _stores.get(vector_store.id)
+        if store is None or store.directory != directory:
+            store = SegmentStore(directory)
+            _stores[vector_store.id] = store
+    return store
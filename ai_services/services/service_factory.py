@@ -507,9 +507,9 @@ class AIServiceFactory:
                 backoff_factor=2.0,
                 jitter=True
             )
-            def search(self, query, limit=10, case_id=None):
+            def search(self, query, limit=10, case_id=None, **kwargs):
                 """Search with retry capability."""
-                return self.service.search(query, limit, case_id)
+                return self.service.search(query, limit=limit, case_id=case_id, **kwargs)
 
         return VectorSearchWithRetry(service, vector_store)
 
@@ -541,13 +541,13 @@ class AIServiceFactory:
                 self.vector_store = vector_store
                 self.service_name = "VectorSearchService"
 
-            def search(self, query, limit=10, case_id=None):
+            def search(self, query, limit=10, case_id=None, **kwargs):
                 """Search with fallback to mock service if real service fails."""
                 start_time = time.time()
 
                 try:
                     logger.info(f"Attempting to use real vector search service")
-                    results = self.real_service.search(query, limit, case_id)
+                    results = self.real_service.search(query, limit, case_id, **kwargs)
 
                     # Record successful service call
                     end_time = time.time()
@@ -631,6 +631,21 @@ class AIServiceFactory:
                 """Create document embedding with retry capability."""
                 return self.service.create_document_embedding(document)
 
+            @retry_with_exponential_backoff(
+                max_retries=max_retries,
+                initial_delay=1.0,
+                max_delay=10.0,
+                backoff_factor=2.0,
+                jitter=True
+            )
+            def get_embeddings(self, texts):
+                """Get a batch of embeddings with retry capability."""
+                return self.service.get_embeddings(texts)
+
+            def create_document_embeddings(self, documents):
+                """Create document embeddings in batches."""
+                return self.service.create_document_embeddings(documents)
+
         return EmbeddingServiceWithRetry(service, vector_store)
 
     @classmethod
@@ -743,4 +758,56 @@ class AIServiceFactory:
                     logger.warning(f"Error creating real document embedding: {error_message}. Falling back to mock service.")
                     return self.mock_service.create_document_embedding(document)
 
+            def get_embeddings(self, texts):
+                """Get a batch of embeddings with fallback to mock service if real service fails."""
+                start_time = time.time()
+
+                try:
+                    logger.info(f"Attempting to use real embedding service for {len(texts)} texts")
+                    embeddings = self.real_service.get_embeddings(texts)
+
+                    # Record successful service call
+                    end_time = time.time()
+                    ServiceMonitor.record_service_call(
+                        service_name=self.service_name,
+                        endpoint=self.vector_store.connection_string,
+                        success=True,
+                        response_time=end_time - start_time
+                    )
+
+                    return embeddings
+
+                except Exception as e:
+                    # Record failed service call
+                    end_time = time.time()
+                    error_type = type(e).__name__
+                    error_message = str(e)
+
+                    ServiceMonitor.record_service_call(
+                        service_name=self.service_name,
+                        endpoint=self.vector_store.connection_string,
+                        success=False,
+                        response_time=end_time - start_time,
+                        error_type=error_type,
+                        error_message=error_message
+                    )
+
+                    logger.warning(f"Error using real embedding service: {error_message}. Falling back to mock service.")
+                    return [self.mock_service.get_embedding(text) for text in texts]
+
+            def create_document_embeddings(self, documents):
+                """Create document embeddings in batches, retrying failed documents one by one."""
+                try:
+                    results = self.real_service.create_document_embeddings(documents)
+                except Exception as e:
+                    logger.warning(f"Error creating batched document embeddings: {str(e)}. Falling back to single documents.")
+                    results = {}
+
+                # Failed documents go through the single-document path and its mock fallback
+                for document in documents:
+                    if not results.get(document.id):
+                        results[document.id] = bool(self.create_document_embedding(document))
+
+                return results
+
         return EmbeddingServiceWithFallback(real_service, mock_service, vector_store)
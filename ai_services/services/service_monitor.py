@@ -28,6 +28,10 @@ class ServiceMonitor:
     HEALTH_STATUS_KEY = "ai_service_health:{service_name}"
     ERROR_COUNT_KEY = "ai_service_errors:{service_name}:{error_type}"
     PERFORMANCE_KEY = "ai_service_performance:{service_name}"
+    CACHE_STATS_KEY = "ai_service_cache:{cache_name}:{outcome}"
+    
+    # Caches whose hit rates are tracked
+    MONITORED_CACHES = ["query_embedding", "search_results"]
     
     # Status constants
     STATUS_HEALTHY = "healthy"
@@ -190,3 +194,53 @@ class ServiceMonitor:
             result[service_name] = cls.get_service_health(service_name)
             
         return result
+    
+    @classmethod
+    def record_cache_access(cls, cache_name: str, hit: bool) -> None:
+        """
+        Count a cache hit or miss.
+        
+        Counters live in the Django cache, so with a per-process backend
+        such as LocMemCache each worker keeps its own counts.
+        
+        Args:
+            cache_name: Name of the cache (e.g., "query_embedding")
+            hit: Whether the lookup was a hit
+        """
+        key = cls.CACHE_STATS_KEY.format(cache_name=cache_name, outcome="hits" if hit else "misses")
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Key was evicted between add() and incr()
+            cache.set(key, 1, timeout=None)
+    
+    @classmethod
+    def get_cache_stats(cls, cache_name: str) -> Dict[str, Any]:
+        """
+        Get hit/miss counters of a cache.
+        
+        Args:
+            cache_name: Name of the cache
+            
+        Returns:
+            Dictionary with hits, misses and hit rate
+        """
+        hits = cache.get(cls.CACHE_STATS_KEY.format(cache_name=cache_name, outcome="hits"), 0)
+        misses = cache.get(cls.CACHE_STATS_KEY.format(cache_name=cache_name, outcome="misses"), 0)
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0
+        }
+    
+    @classmethod
+    def get_all_cache_stats(cls) -> Dict[str, Dict[str, Any]]:
+        """
+        Get hit/miss counters for all monitored caches.
+        
+        Returns:
+            Dictionary mapping cache names to their counters
+        """
+        return {cache_name: cls.get_cache_stats(cache_name) for cache_name in cls.MONITORED_CACHES}
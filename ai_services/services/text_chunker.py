@@ -0,0 +1,166 @@
+"""
+Text chunking for passage-level embeddings.
+
+Long documents are split into overlapping windows of whole sentences so that
+each window fits comfortably in the embedding model's context and yields a
+focused vector. Chunks keep their character offsets into the source text.
+
+Window boundaries are content-defined: once a window is half full it ends
+after the next "anchor" sentence, chosen by a hash of its text. An edit
+therefore only moves the windows around it, and later windows line up with
+those of the previous version, so their cached embeddings are reused.
+"""
+
+import re
+import zlib
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .. import settings as ai_settings
+
+# Sentence ends (after ., !, ? or ;) and paragraph breaks
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?;])\s+|\n\s*\n')
+
+# On average one sentence in ANCHOR_PERIOD may end a window early
+ANCHOR_PERIOD = 4
+
+# Text buffered by iter_chunk_text before emitting chunks, in chunk lengths
+STREAM_BUFFER_CHUNKS = 4
+
+
+class TextChunk(NamedTuple):
+    """A window of the source text."""
+    index: int
+    start: int
+    end: int
+    text: str
+
+
+def _split_long_span(text: str, start: int, end: int, max_chars: int) -> List[Tuple[int, int]]:
+    """Split a span longer than max_chars at whitespace (or hard, if there is none)."""
+    spans = []
+    while end - start > max_chars:
+        cut = text.rfind(' ', start + 1, start + max_chars)
+        if cut <= start:
+            cut = start + max_chars
+        spans.append((start, cut))
+        start = cut
+        while start < end and text[start].isspace():
+            start += 1
+    if end > start:
+        spans.append((start, end))
+    return spans
+
+
+def _sentence_spans(text: str, max_chars: int) -> List[Tuple[int, int]]:
+    """Character spans of the sentences in text, none longer than max_chars."""
+    spans = []
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        if match.start() > start:
+            spans.extend(_split_long_span(text, start, match.start(), max_chars))
+        start = match.end()
+    if start < len(text):
+        spans.extend(_split_long_span(text, start, len(text), max_chars))
+    return [(s, e) for s, e in spans if text[s:e].strip()]
+
+
+def _is_anchor(sentence: str) -> bool:
+    """Whether a window may end after this sentence, decided by its content alone."""
+    return zlib.crc32(' '.join(sentence.split()).encode('utf-8')) % ANCHOR_PERIOD == 0
+
+
+def _windows(text: str, spans: List[Tuple[int, int]], max_chars: int, overlap: int) -> Iterator[Tuple[int, int]]:
+    """Yield the (first, last) sentence indexes of each window over the spans."""
+    anchors = [_is_anchor(text[start:end]) for start, end in spans]
+    first = 0
+    while first < len(spans):
+        # Extend the window with whole sentences while it fits, stopping
+        # early at an anchor once the window is half full
+        last = first
+        while last + 1 < len(spans) and spans[last + 1][1] - spans[first][0] <= max_chars:
+            if anchors[last] and spans[last][1] - spans[first][0] >= max_chars // 2:
+                break
+            last += 1
+
+        yield first, last
+        if last == len(spans) - 1:
+            break
+
+        # Start the next window with the trailing sentences that fit in the overlap
+        end = spans[last][1]
+        next_first = last + 1
+        while next_first - 1 > first and end - spans[next_first - 1][0] <= overlap:
+            next_first -= 1
+        first = next_first
+
+
+def iter_chunk_text(pieces: Iterable[str],
+                    max_chars: Optional[int] = None,
+                    overlap: Optional[int] = None) -> Iterator[TextChunk]:
+    """
+    Split streamed text into the same chunks as chunk_text, incrementally.
+
+    Only a few windows of text are buffered: once the buffer is large
+    enough, every window that later text cannot change is emitted and the
+    buffer is cut at the start of the next window.
+
+    Args:
+        pieces: Consecutive pieces of the text, e.g. extracted pages
+        max_chars: Maximum chunk length in characters (default: from settings)
+        overlap: Characters of a chunk repeated at the start of the next one,
+            rounded to whole sentences (default: from settings)
+
+    Returns:
+        Iterator of chunks in document order, with offsets into the whole text
+    """
+    if max_chars is None:
+        max_chars = ai_settings.EMBEDDING_CHUNK_CHARS
+    if overlap is None:
+        overlap = ai_settings.EMBEDDING_CHUNK_OVERLAP
+
+    pieces = iter(pieces)
+    buffer = ''
+    base = 0
+    index = 0
+    exhausted = False
+    while not exhausted:
+        piece = next(pieces, None)
+        if piece is None:
+            exhausted = True
+        else:
+            buffer += piece
+            if len(buffer) < STREAM_BUFFER_CHUNKS * max_chars:
+                continue
+
+        spans = _sentence_spans(buffer, max_chars)
+        resume = len(buffer)
+        for first, last in _windows(buffer, spans, max_chars, overlap):
+            # The last sentence may continue in the next piece, which can
+            # change any window that reaches it or the sentence before it
+            if not exhausted and last > len(spans) - 3:
+                resume = spans[first][0]
+                break
+            start, end = spans[first][0], spans[last][1]
+            yield TextChunk(index, base + start, base + end, buffer[start:end])
+            index += 1
+
+        buffer = buffer[resume:]
+        base += resume
+
+
+def chunk_text(text: str,
+               max_chars: Optional[int] = None,
+               overlap: Optional[int] = None) -> List[TextChunk]:
+    """
+    Split text into overlapping, sentence-aligned chunks.
+
+    Args:
+        text: Text to split
+        max_chars: Maximum chunk length in characters (default: from settings)
+        overlap: Number of trailing characters of a chunk repeated at the
+            start of the next one, rounded to whole sentences (default: from settings)
+
+    Returns:
+        List of chunks in document order
+    """
+    return list(iter_chunk_text([text or ''], max_chars, overlap))
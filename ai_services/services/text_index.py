@@ -0,0 +1,341 @@
+"""
+Keyword (BM25) index over the extracted text of documents.
+
+Postings (term, document, frequency) are stored in the database, indexed
+by term, so a query reads only the postings of its own terms instead of
+scanning every document. Per-document lengths live in TextIndexDocument;
+corpus statistics (document count, average length) are aggregated from it
+for each query, so every process sees a change as soon as it commits.
+
+Documents are indexed incrementally when they are uploaded or a new
+version is saved (see ai_services.signals), and when they are embedded.
+"""
+
+import hashlib
+import heapq
+import logging
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Avg, Count, Max
+
+from ..models import TextIndexDocument, TextIndexPosting
+from .. import settings as ai_settings
+
+logger = logging.getLogger(__name__)
+
+# Runs of letters and digits
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+# Longer tokens are noise (hashes, encoded blobs) and don't fit the term column
+MAX_TERM_LENGTH = 64
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by for from had has have he her his if in into is it its
+not of on or our she so such than that the their them then there these they this to
+was we were which while who will with would you your
+""".split())
+
+# Most frequent terms of a document weighed by document_query_terms
+CANDIDATE_TERMS = 200
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into index terms.
+
+    Terms are lowercased runs of letters and digits; stopwords, single
+    letters and over-long tokens are dropped.
+
+    Args:
+        text: Text to tokenize
+
+    Returns:
+        Terms in text order
+    """
+    return [
+        token for token in TOKEN_PATTERN.findall((text or '').lower())
+        if (len(token) > 1 or token.isdigit())
+        and len(token) <= MAX_TERM_LENGTH
+        and token not in STOPWORDS
+    ]
+
+
+class TermCounter:
+    """
+    Count the index terms of a text that arrives piece by piece.
+
+    A run of letters and digits at the end of a piece is held back until
+    the next piece, so the counts are those of tokenize() over the whole
+    text.
+    """
+
+    def __init__(self):
+        """Initialize the counter."""
+        self.frequencies = Counter()
+        self.length = 0
+        self._tail = ''
+
+    def update(self, piece: str) -> None:
+        """Count the terms of the next piece of the text."""
+        text = self._tail + piece
+        cut = len(text)
+        while cut and text[cut - 1].isalnum():
+            cut -= 1
+        self._add(text[:cut])
+        self._tail = text[cut:]
+
+    def close(self) -> None:
+        """Count the terms held back at the end of the text."""
+        self._add(self._tail)
+        self._tail = ''
+
+    def _add(self, text: str) -> None:
+        terms = tokenize(text)
+        self.frequencies.update(terms)
+        self.length += len(terms)
+
+
+def bm25_scores(query_terms: Iterable[str],
+                postings: Dict[str, List[Tuple[int, int]]],
+                document_frequencies: Dict[str, int],
+                document_lengths: Dict[int, int],
+                document_count: int,
+                average_length: float,
+                k1: float = None,
+                b: float = None) -> Dict[int, float]:
+    """
+    Score documents against query terms with Okapi BM25.
+
+    Args:
+        query_terms: Distinct query terms
+        postings: Term to [(document_id, term frequency)] for the candidate documents
+        document_frequencies: Term to number of indexed documents containing it
+        document_lengths: Document ID to number of terms in the document
+        document_count: Number of indexed documents
+        average_length: Average number of terms per document
+        k1: Term frequency saturation (default: from settings)
+        b: Length normalization (default: from settings)
+
+    Returns:
+        Dictionary mapping document IDs to scores
+    """
+    if k1 is None:
+        k1 = ai_settings.BM25_K1
+    if b is None:
+        b = ai_settings.BM25_B
+    average_length = average_length or 1.0
+
+    scores = {}
+    for term in query_terms:
+        df = document_frequencies.get(term, 0)
+        if not df:
+            continue
+        idf = math.log(1 + (document_count - df + 0.5) / (df + 0.5))
+        for doc_id, frequency in postings.get(term, ()):
+            norm = k1 * (1 - b + b * document_lengths.get(doc_id, average_length) / average_length)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (k1 + 1) / (frequency + norm)
+    return scores
+
+
+def get_text_index_generation() -> str:
+    """
+    Version of the text index, which changes whenever a document is indexed or removed.
+
+    It is derived from the TextIndexDocument rows (their count and latest
+    indexed_at), so it is the same in every process and only changes once
+    the indexing transaction commits.
+    """
+    aggregate = TextIndexDocument.objects.aggregate(count=Count('id'), last_indexed=Max('indexed_at'))
+    last_indexed = aggregate['last_indexed']
+    return f"{aggregate['count']}:{last_indexed.isoformat() if last_indexed else ''}"
+
+
+def corpus_stats() -> Tuple[int, float]:
+    """
+    Number of indexed documents and their average length.
+
+    Returns:
+        Tuple of (document count, average length)
+    """
+    aggregate = TextIndexDocument.objects.aggregate(count=Count('id'), average=Avg('length'))
+    return aggregate['count'], float(aggregate['average'] or 0.0)
+
+
+def source_hash(document) -> str:
+    """Fingerprint of the indexed content of a document: its file and title."""
+    source = f"{document.file.name if document.file else ''}\0{document.file_size}\0{document.title}"
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def is_indexed(document) -> bool:
+    """Whether the document's current file and title are already in the text index."""
+    return TextIndexDocument.objects.filter(document_id=document.id, source_hash=source_hash(document)).exists()
+
+
+def index_document_text(document, text: Optional[str] = None, force: bool = False) -> bool:
+    """
+    Add a document to the text index, replacing its previous postings.
+
+    The title is indexed along with the body, so documents whose text
+    could not be extracted are still found by title.
+
+    Args:
+        document: Document to index
+        text: Extracted text (extracted from the file if None)
+        force: Reindex even if the document's file and title have not changed
+
+    Returns:
+        True if the document was (re)indexed, False if it was up to date
+    """
+    if not force and is_indexed(document):
+        return False
+
+    if text is None:
+        from documents.utils import extract_text_from_document
+        try:
+            text = extract_text_from_document(document) or ''
+        except Exception as e:
+            logger.warning(f"Error extracting text from document {document.id}: {str(e)}")
+            text = ''
+
+    terms = TermCounter()
+    terms.update(text)
+    terms.close()
+    index_document_terms(document, terms)
+    return True
+
+
+def index_document_terms(document, terms: TermCounter) -> None:
+    """
+    Replace the postings of a document with terms counted from its text.
+
+    Used when the text was streamed rather than held in memory; the title
+    is indexed along with them.
+
+    Args:
+        document: Document to index
+        terms: Closed counter of the terms of the document text
+    """
+    title_terms = tokenize(document.title)
+    frequencies = terms.frequencies + Counter(title_terms)
+
+    with transaction.atomic():
+        TextIndexPosting.objects.filter(document_id=document.id).delete()
+        TextIndexPosting.objects.bulk_create([
+            TextIndexPosting(term=term, document_id=document.id, frequency=frequency)
+            for term, frequency in frequencies.items()
+        ])
+        TextIndexDocument.objects.update_or_create(
+            document_id=document.id,
+            defaults={
+                'length': terms.length + len(title_terms),
+                'source_hash': source_hash(document),
+            }
+        )
+
+    logger.info(f"Indexed {len(frequencies)} terms of document {document.id}")
+
+
+def remove_document_text(document_id: int) -> None:
+    """
+    Remove a document from the text index.
+
+    Args:
+        document_id: ID of the document
+    """
+    with transaction.atomic():
+        TextIndexPosting.objects.filter(document_id=document_id).delete()
+        TextIndexDocument.objects.filter(document_id=document_id).delete()
+
+
+def bm25_search(query: str,
+                limit: int,
+                case_id: Optional[int] = None,
+                exclude_document_id: Optional[int] = None) -> List[Tuple[int, float]]:
+    """
+    Rank indexed documents against a keyword query.
+
+    Args:
+        query: Search query
+        limit: Maximum number of results
+        case_id: Optional case ID to filter results
+        exclude_document_id: Optional document to leave out of the results
+
+    Returns:
+        Ranked list of (document_id, BM25 score) tuples
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+
+    document_count, average_length = corpus_stats()
+    if not document_count:
+        return []
+
+    document_frequencies = dict(
+        TextIndexPosting.objects.filter(term__in=terms)
+        .values('term').annotate(df=Count('id')).values_list('term', 'df')
+    )
+
+    # Terms found in most documents barely move the ranking but have the
+    # longest posting lists; skip them when the query has rarer terms
+    common = {
+        term for term, df in document_frequencies.items()
+        if df > document_count * ai_settings.BM25_MAX_DF_RATIO
+    }
+    if common and len(common) < len(document_frequencies):
+        terms = [term for term in terms if term not in common]
+    terms = [term for term in terms if term in document_frequencies]
+    if not terms:
+        return []
+
+    rows = TextIndexPosting.objects.filter(term__in=terms)
+    if case_id:
+        rows = rows.filter(document__case_id=case_id)
+    if exclude_document_id:
+        rows = rows.exclude(document_id=exclude_document_id)
+
+    postings = {}
+    document_lengths = {}
+    for term, doc_id, frequency, length in rows.values_list(
+            'term', 'document_id', 'frequency', 'document__text_index__length'):
+        postings.setdefault(term, []).append((doc_id, frequency))
+        document_lengths[doc_id] = length or average_length
+
+    scores = bm25_scores(terms, postings, document_frequencies, document_lengths,
+                         document_count, average_length)
+    return heapq.nlargest(limit, scores.items(), key=lambda hit: hit[1])
+
+
+def document_query_terms(document_id: int, limit: int = 20) -> List[str]:
+    """
+    The most distinctive terms of an indexed document, for "more like this" queries.
+
+    Args:
+        document_id: ID of the document
+        limit: Maximum number of terms
+
+    Returns:
+        Terms ordered by tf-idf weight
+    """
+    document_count, _ = corpus_stats()
+    frequencies = dict(
+        TextIndexPosting.objects.filter(document_id=document_id)
+        .order_by('-frequency').values_list('term', 'frequency')[:CANDIDATE_TERMS]
+    )
+    if not frequencies:
+        return []
+
+    document_frequencies = dict(
+        TextIndexPosting.objects.filter(term__in=list(frequencies))
+        .values('term').annotate(df=Count('id')).values_list('term', 'df')
+    )
+    weights = {
+        term: frequency * math.log(1 + document_count / document_frequencies.get(term, 1))
+        for term, frequency in frequencies.items()
+    }
+    return heapq.nlargest(limit, weights, key=weights.get)
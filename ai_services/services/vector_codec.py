@@ -0,0 +1,83 @@
+"""
+Binary encoding for stored embedding vectors.
+
+Vectors are stored as a fixed 8-byte header followed by the raw
+little-endian array bytes, so that decoding is a zero-copy
+``np.frombuffer`` instead of parsing a text literal.
+
+Header layout (little-endian):
+    version (uint8) | dtype code (uint8) | reserved (uint16) | dimensions (uint32)
+"""
+
+import struct
+from typing import Optional, Union
+
+import numpy as np
+
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<BBHI')
+
+# Supported storage dtypes and their header codes
+DTYPE_CODES = {
+    'float32': 1,
+    'float16': 2,
+}
+CODE_DTYPES = {
+    1: np.dtype('<f4'),
+    2: np.dtype('<f2'),
+}
+
+
+class VectorDecodeError(ValueError):
+    """Raised when a stored vector blob is malformed."""
+
+
+def encode_vector(vector, dtype: str = 'float32') -> bytes:
+    """
+    Encode a vector as a header-prefixed binary blob.
+
+    Args:
+        vector: Embedding vector (any array-like of numbers)
+        dtype: Storage dtype, 'float32' or 'float16'
+
+    Returns:
+        Encoded bytes
+    """
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Unsupported vector storage dtype: {dtype}")
+
+    code = DTYPE_CODES[dtype]
+    array = np.asarray(vector, dtype=CODE_DTYPES[code]).ravel()
+    return HEADER.pack(FORMAT_VERSION, code, 0, array.shape[0]) + array.tobytes()
+
+
+def decode_vector(data: Union[bytes, memoryview, None]) -> Optional[np.ndarray]:
+    """
+    Decode a header-prefixed binary blob into a read-only array view.
+
+    The returned array shares memory with ``data``; callers that need
+    a writable or float32 copy should convert it explicitly.
+
+    Args:
+        data: Encoded bytes (bytes or memoryview as returned by the database)
+
+    Returns:
+        Vector as a numpy array, or None if ``data`` is empty
+    """
+    if not data:
+        return None
+    if len(data) < HEADER.size:
+        raise VectorDecodeError("Vector blob is shorter than its header")
+
+    version, code, _, dimensions = HEADER.unpack_from(data)
+    if version != FORMAT_VERSION:
+        raise VectorDecodeError(f"Unsupported vector blob version: {version}")
+    if code not in CODE_DTYPES:
+        raise VectorDecodeError(f"Unknown vector dtype code: {code}")
+
+    dtype = CODE_DTYPES[code]
+    expected = HEADER.size + dimensions * dtype.itemsize
+    if len(data) != expected:
+        raise VectorDecodeError(f"Vector blob has {len(data)} bytes, expected {expected}")
+
+    return np.frombuffer(data, dtype=dtype, count=dimensions, offset=HEADER.size)
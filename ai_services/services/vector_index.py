@@ -0,0 +1,482 @@
+"""
+In-process vector index for fallback semantic search.
+
+This module keeps a resident, per-VectorStore matrix of L2-normalized
+document vectors so that a fallback search is a single matrix-vector
+product instead of a Python loop over every DocumentEmbedding row.
+"""
+
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F
+
+from ..models import VectorStore, DocumentEmbedding
+from .vector_codec import decode_vector, VectorDecodeError
+
+logger = logging.getLogger(__name__)
+
+# Sentinel stored in the case column for documents without a case
+NO_CASE = -1
+
+
+def decode_embedding(doc_embedding: DocumentEmbedding) -> Optional[np.ndarray]:
+    """
+    Decode the locally stored vector of a DocumentEmbedding row.
+
+    Args:
+        doc_embedding: DocumentEmbedding instance
+
+    Returns:
+        Vector view over the stored bytes, or None if the row has no local vector
+    """
+    return decode_vector(doc_embedding.vector_data)
+
+
+def _normalize(vector) -> Optional[np.ndarray]:
+    """Return an L2-normalized float32 copy of a vector, or None for zero vectors."""
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    if not norm or not np.isfinite(norm):
+        return None
+    return vector / norm
+
+
+class VectorIndex:
+    """
+    Contiguous float32 matrix of normalized vectors with id/case side arrays.
+
+    Rows are stored in insertion order; removals swap the last row into the
+    freed slot so the live rows are always the first ``size`` rows.
+    """
+
+    index_type = 'flat'
+
+    def __init__(self, dimensions: Optional[int] = None):
+        """
+        Initialize an empty index.
+
+        Args:
+            dimensions: Vector dimensionality (inferred from the first vector if None)
+        """
+        self.dimensions = dimensions
+        self.generation = None
+        self.size = 0
+        self._vectors = np.empty((0, dimensions or 0), dtype=np.float32)
+        self._document_ids = np.empty(0, dtype=np.int64)
+        self._case_ids = np.empty(0, dtype=np.int64)
+        self._positions: Dict[int, int] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, document_id):
+        return document_id in self._positions
+
+    def _reserve(self, capacity: int) -> None:
+        """Grow the backing arrays so that at least ``capacity`` rows fit."""
+        current = self._vectors.shape[0]
+        if capacity <= current:
+            return
+        new_capacity = max(capacity, current * 2, 64)
+
+        vectors = np.empty((new_capacity, self.dimensions), dtype=np.float32)
+        vectors[:self.size] = self._vectors[:self.size]
+        document_ids = np.empty(new_capacity, dtype=np.int64)
+        document_ids[:self.size] = self._document_ids[:self.size]
+        case_ids = np.empty(new_capacity, dtype=np.int64)
+        case_ids[:self.size] = self._case_ids[:self.size]
+
+        self._vectors, self._document_ids, self._case_ids = vectors, document_ids, case_ids
+
+    def upsert(self, document_id: int, case_id: Optional[int], vector) -> bool:
+        """
+        Insert or replace the vector of a document.
+
+        Args:
+            document_id: Document ID
+            case_id: Case ID of the document (None if not linked to a case)
+            vector: Embedding vector
+
+        Returns:
+            True if the vector was stored, False if it was rejected
+        """
+        normalized = _normalize(vector)
+        if normalized is None:
+            logger.warning(f"Skipping zero or invalid vector for document {document_id}")
+            return False
+
+        with self._lock:
+            if self.dimensions is None:
+                self.dimensions = normalized.shape[0]
+                self._vectors = np.empty((0, self.dimensions), dtype=np.float32)
+            if normalized.shape[0] != self.dimensions:
+                logger.warning(
+                    f"Skipping vector for document {document_id}: expected {self.dimensions} "
+                    f"dimensions, got {normalized.shape[0]}"
+                )
+                return False
+
+            position = self._positions.get(document_id)
+            if position is None:
+                self._reserve(self.size + 1)
+                position = self.size
+                self.size += 1
+                self._positions[document_id] = position
+
+            self._vectors[position] = normalized
+            self._document_ids[position] = document_id
+            self._case_ids[position] = NO_CASE if case_id is None else case_id
+            return True
+
+    def add_many(self, document_ids: np.ndarray, case_ids: np.ndarray, vectors: np.ndarray) -> int:
+        """
+        Bulk-insert vectors, normalizing them in one vectorized pass.
+
+        Documents that are already indexed are replaced one by one.
+
+        Args:
+            document_ids: Document IDs
+            case_ids: Case IDs (NO_CASE for documents without a case)
+            vectors: Matrix with one embedding per row
+
+        Returns:
+            Number of vectors stored
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return 0
+        norms = np.linalg.norm(vectors, axis=1)
+        valid = np.isfinite(norms) & (norms > 0)
+
+        with self._lock:
+            if self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+                self._vectors = np.empty((0, self.dimensions), dtype=np.float32)
+            if vectors.shape[1] != self.dimensions:
+                logger.warning(f"Skipping {len(vectors)} vectors: expected {self.dimensions} dimensions, got {vectors.shape[1]}")
+                return 0
+
+            stored = 0
+            fresh = valid.copy()
+            for row in np.flatnonzero(valid):
+                document_id = int(document_ids[row])
+                if document_id in self._positions:
+                    fresh[row] = False
+                    stored += self.upsert(document_id, int(case_ids[row]), vectors[row])
+
+            rows = np.flatnonzero(fresh)
+            # Keep the last occurrence of documents repeated within the batch
+            _, last = np.unique(np.asarray(document_ids)[rows][::-1], return_index=True)
+            rows = rows[len(rows) - 1 - last]
+            if rows.size:
+                start = self.size
+                self._reserve(start + rows.size)
+                end = start + rows.size
+                self._vectors[start:end] = vectors[rows] / norms[rows, None]
+                self._document_ids[start:end] = np.asarray(document_ids)[rows]
+                self._case_ids[start:end] = np.asarray(case_ids)[rows]
+                for position in range(start, end):
+                    self._positions[int(self._document_ids[position])] = position
+                self.size = end
+            return stored + int(rows.size)
+
+    def remove(self, document_id: int) -> bool:
+        """
+        Remove the vector of a document.
+
+        Args:
+            document_id: Document ID
+
+        Returns:
+            True if the document was indexed, False otherwise
+        """
+        with self._lock:
+            position = self._positions.pop(document_id, None)
+            if position is None:
+                return False
+
+            last = self.size - 1
+            if position != last:
+                # Move the last row into the freed slot
+                self._vectors[position] = self._vectors[last]
+                self._document_ids[position] = self._document_ids[last]
+                self._case_ids[position] = self._case_ids[last]
+                self._positions[int(self._document_ids[position])] = position
+            self.size = last
+            return True
+
+    def get_vector(self, document_id: int) -> Optional[np.ndarray]:
+        """
+        Get a copy of the normalized vector stored for a document.
+
+        Args:
+            document_id: Document ID
+
+        Returns:
+            Normalized vector or None if the document is not indexed
+        """
+        with self._lock:
+            position = self._positions.get(document_id)
+            if position is None:
+                return None
+            return self._vectors[position].copy()
+
+    def search(self,
+               query_vector,
+               limit: int,
+               threshold: float,
+               case_id: Optional[int] = None,
+               exclude_document_id: Optional[int] = None,
+               nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Find the documents most similar to a query vector.
+
+        Args:
+            query_vector: Query embedding
+            limit: Maximum number of results
+            threshold: Minimum cosine similarity
+            case_id: Optional case ID to restrict results to
+            exclude_document_id: Optional document ID to leave out of the results
+            nprobe: Ignored; exact search always scans every vector
+
+        Returns:
+            List of (document_id, similarity) tuples, most similar first
+        """
+        query = _normalize(query_vector)
+        if query is None or limit <= 0:
+            return []
+
+        with self._lock:
+            if not self.size or query.shape[0] != self.dimensions:
+                return []
+
+            scores = self._vectors[:self.size] @ query
+
+            mask = scores >= threshold
+            if case_id is not None:
+                mask &= self._case_ids[:self.size] == case_id
+            if exclude_document_id is not None:
+                mask &= self._document_ids[:self.size] != exclude_document_id
+
+            candidates = np.flatnonzero(mask)
+            if candidates.size > limit:
+                top = np.argpartition(-scores[candidates], limit - 1)[:limit]
+                candidates = candidates[top]
+            candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+            return [
+                (int(self._document_ids[position]), float(scores[position]))
+                for position in candidates
+            ]
+
+    @classmethod
+    def build(cls, vector_store: VectorStore) -> 'VectorIndex':
+        """
+        Build an index from the DocumentEmbedding rows of a vector store.
+
+        Args:
+            vector_store: Vector store to index
+
+        Returns:
+            Populated VectorIndex
+        """
+        index = cls()
+        index.add_many(*load_store_vectors(vector_store))
+        logger.info(f"Built vector index for store {vector_store.name}: {index.size} vectors")
+        return index
+
+
+def load_store_vectors(vector_store: VectorStore) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Load every locally stored vector of a vector store.
+
+    Args:
+        vector_store: Vector store to load
+
+    Returns:
+        Tuple of (document IDs, case IDs, float32 vector matrix)
+    """
+    rows = DocumentEmbedding.objects.filter(
+        vector_store=vector_store,
+        vector_data__isnull=False
+    ).values_list('document_id', 'document__case_id', 'vector_data').iterator(chunk_size=2000)
+
+    document_ids, case_ids, vectors = [], [], []
+    dimensions = None
+    skipped = 0
+    for document_id, case_id, vector_data in rows:
+        try:
+            vector = decode_vector(vector_data)
+        except VectorDecodeError as e:
+            logger.warning(f"Could not decode embedding for document {document_id}: {str(e)}")
+            vector = None
+        if vector is None or (dimensions is not None and vector.shape[0] != dimensions):
+            skipped += 1
+            continue
+        dimensions = vector.shape[0]
+        document_ids.append(document_id)
+        case_ids.append(NO_CASE if case_id is None else case_id)
+        vectors.append(vector)
+
+    if skipped:
+        logger.warning(f"Skipped {skipped} undecodable or mismatched vectors in store {vector_store.name}")
+    if not vectors:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+    return (
+        np.array(document_ids, dtype=np.int64),
+        np.array(case_ids, dtype=np.int64),
+        np.vstack(vectors).astype(np.float32, copy=False),
+    )
+
+
+def _build_index(vector_store: VectorStore):
+    """Build the resident index type configured for a vector store."""
+    if vector_store.index_type == 'ivf_flat':
+        from .ann_index import IVFIndex
+        return IVFIndex.build(vector_store)
+    return VectorIndex.build(vector_store)
+
+
+# Process-wide registry of resident indexes, keyed by VectorStore ID
+_indexes: Dict[int, VectorIndex] = {}
+_registry_lock = threading.Lock()
+
+
+def get_store_generation(store_id: int) -> int:
+    """
+    Get the current write generation of a vector store.
+
+    The generation is a column of the VectorStore row, so every process
+    sees writes made by the others once they commit.
+
+    Args:
+        store_id: VectorStore ID
+
+    Returns:
+        Generation counter (0 if the store does not exist)
+    """
+    generation = VectorStore.objects.filter(pk=store_id).values_list('generation', flat=True).first()
+    return generation or 0
+
+
+def bump_store_generation(store_id: int) -> int:
+    """
+    Increment the write generation of a vector store.
+
+    Call it in the transaction that writes the embeddings, so that the new
+    generation becomes visible together with them.
+
+    Args:
+        store_id: VectorStore ID
+
+    Returns:
+        The new generation counter
+    """
+    with transaction.atomic():
+        VectorStore.objects.filter(pk=store_id).update(generation=F('generation') + 1)
+        return get_store_generation(store_id)
+
+
+def get_vector_index(vector_store: VectorStore):
+    """
+    Get the resident index for a vector store, (re)building it if stale.
+
+    Args:
+        vector_store: Vector store configuration
+
+    Returns:
+        Up-to-date VectorIndex, or IVFIndex for 'ivf_flat' stores
+    """
+    generation = get_store_generation(vector_store.id)
+    index = _indexes.get(vector_store.id)
+    if index is not None and index.generation == generation and index.index_type == vector_store.index_type:
+        return index
+
+    with _registry_lock:
+        index = _indexes.get(vector_store.id)
+        if index is None or index.generation != generation or index.index_type != vector_store.index_type:
+            index = _build_index(vector_store)
+            index.generation = generation
+            _indexes[vector_store.id] = index
+
+    if index.index_type == 'ivf_flat':
+        # Pick up nprobe changes without a rebuild
+        index.nprobe = vector_store.ivf_nprobe
+    return index
+
+
+def invalidate_vector_index(store_id: Optional[int] = None) -> None:
+    """
+    Drop resident indexes so they are rebuilt on next use.
+
+    Args:
+        store_id: VectorStore ID to invalidate (all stores if None)
+    """
+    with _registry_lock:
+        if store_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(store_id, None)
+
+
+def _advance_generation(index: VectorIndex, generation: int) -> None:
+    """
+    Mark a patched index as current, unless writes from elsewhere were missed.
+
+    If another process wrote in between, the index is left stale so that the
+    next lookup rebuilds it from the database.
+    """
+    if index.generation == generation - 1:
+        index.generation = generation
+
+
+def record_document_vector(vector_store: VectorStore, document, vector, chunks=None) -> None:
+    """
+    Patch the resident indexes after a document embedding has been written.
+
+    Bumps the store generation in the caller's transaction, so that other
+    processes rebuild their copy once it commits, and updates this
+    process's copy in place after the commit.
+
+    Args:
+        vector_store: Vector store the embedding was written to
+        document: Document that was embedded
+        vector: The new embedding vector
+        chunks: Optional tuple of (chunk IDs, (start, end) offsets, vectors)
+            for the document's passage embeddings
+    """
+    generation = bump_store_generation(vector_store.id)
+    transaction.on_commit(lambda: _patch_indexes(
+        vector_store.id, document.id, document.case_id, vector, chunks, generation
+    ))
+
+
+def discard_document_vector(vector_store: VectorStore, document_id: int) -> None:
+    """
+    Patch the resident index after a document embedding has been deleted.
+
+    Args:
+        vector_store: Vector store the embedding was removed from
+        document_id: ID of the document whose embedding was removed
+    """
+    generation = bump_store_generation(vector_store.id)
+    transaction.on_commit(lambda: _patch_indexes(vector_store.id, document_id, None, None, None, generation))
+
+
+def _patch_indexes(store_id: int, document_id: int, case_id: Optional[int], vector, chunks, generation: int) -> None:
+    """Apply a committed write to this process's resident indexes (vector None removes the document)."""
+    from .chunk_index import patch_chunk_index
+
+    patch_chunk_index(store_id, document_id, case_id, chunks, generation)
+    index = _indexes.get(store_id)
+    if index is None:
+        return
+    with index._lock:
+        if vector is None or not index.upsert(document_id, case_id, vector):
+            index.remove(document_id)
+        _advance_generation(index, generation)
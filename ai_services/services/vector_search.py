@@ -6,11 +6,19 @@ This module provides services for semantic search using vector databases.
 
 import numpy as np
 import logging
-import ast
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Tuple, Union
 from django.db import connection
 from ..models import VectorStore, DocumentEmbedding
 from .embedding_service import EmbeddingService
+from .vector_index import get_vector_index, decode_embedding
+from .chunk_index import get_chunk_index
+from .query_cache import (
+    RESULT_FIELDS, get_query_embedding, search_result_key, get_cached_results, cache_results
+)
+from .text_index import bm25_search, document_query_terms, get_text_index_generation
+from .rank_fusion import reciprocal_rank_fusion
+from .segment_store import get_segment_store
+from .chroma_pool import get_chroma_collection, release_chroma_client
 from .. import settings as ai_settings
 
 logger = logging.getLogger(__name__)
@@ -34,7 +42,10 @@ class VectorSearchService:
                query: str,
                limit: int = None,
                threshold: float = None,
-               case_id: Optional[int] = None) -> List[Dict[str, Any]]:
+               case_id: Optional[int] = None,
+               nprobe: Optional[int] = None,
+               mode: str = 'document',
+               aggregation: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Search for documents similar to the query.
 
@@ -43,6 +54,12 @@ class VectorSearchService:
             limit: Maximum number of results (default: from settings)
             threshold: Minimum similarity threshold (default: from settings)
             case_id: Optional case ID to filter results
+            nprobe: Recall/latency knob for approximate (IVF) indexes: number of
+                clusters scanned (default: the vector store's ivf_nprobe)
+            mode: 'document' matches whole-document vectors; 'passage' matches
+                passage vectors and aggregates them per document
+            aggregation: Passage score aggregation, 'max' or 'sum' of the top
+                passages (default: from settings)
 
         Returns:
             List of documents with similarity scores
@@ -53,6 +70,35 @@ class VectorSearchService:
         if threshold is None:
             threshold = ai_settings.VECTOR_SEARCH_THRESHOLD
 
+        if not ai_settings.ENABLE_SEARCH_CACHE:
+            return self._search(query, limit, threshold, case_id, nprobe, mode, aggregation)
+
+        cache_key = search_result_key(
+            self.vector_store.id, query, case_id=case_id, limit=limit, threshold=threshold,
+            nprobe=nprobe, mode=mode, aggregation=aggregation,
+            # Keyword matches change as documents are (re)indexed
+            text_index=get_text_index_generation() if ai_settings.ENABLE_HYBRID_SEARCH else None
+        )
+        hits = get_cached_results(cache_key)
+        if hits is not None:
+            logger.info(f"Serving cached results for: '{query}'")
+            documents = self._documents_for_hits([(hit["id"], hit["similarity"]) for hit in hits])
+            hits_by_id = {hit["id"]: hit for hit in hits}
+            for document in documents:
+                for field in RESULT_FIELDS:
+                    if field in hits_by_id[document["id"]]:
+                        document[field] = hits_by_id[document["id"]][field]
+            return documents
+
+        documents = self._search(query, limit, threshold, case_id, nprobe, mode, aggregation)
+        if documents:
+            # Empty results may come from a failed embedding or search; don't pin them
+            cache_results(cache_key, documents)
+        return documents
+
+    def _search(self, query: str, limit: int, threshold: float, case_id: Optional[int],
+                nprobe: Optional[int], mode: str, aggregation: Optional[str]) -> List[Dict[str, Any]]:
+        """Run a search against the vector store (see search)."""
         logger.info(f"Searching for: '{query}' (limit={limit}, threshold={threshold})")
 
         # Get query embedding
@@ -60,8 +106,21 @@ class VectorSearchService:
             from .embedding_service import EmbeddingService
             self.embedding_service = EmbeddingService(self.vector_store)
 
-        query_embedding = self.embedding_service.get_embedding(query)
+        if ai_settings.ENABLE_SEARCH_CACHE:
+            query_embedding = get_query_embedding(self.embedding_service, query)
+        else:
+            query_embedding = self.embedding_service.get_embedding(query)
+
+        if mode == 'passage':
+            return self._passage_search(query, limit, threshold, case_id, query_embedding, aggregation)
+
+        if ai_settings.ENABLE_HYBRID_SEARCH:
+            return self._hybrid_search(query, limit, threshold, case_id, query_embedding, nprobe)
+        return self._vector_search(query, limit, threshold, case_id, query_embedding, nprobe)
 
+    def _vector_search(self, query: str, limit: int, threshold: float, case_id: Optional[int],
+                       query_embedding: np.ndarray, nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Rank documents by the similarity of their vectors to the query embedding."""
         # Perform search based on vector store type
         if self.vector_store.store_type == 'pgvector':
             try:
@@ -102,30 +161,11 @@ class VectorSearchService:
             except Exception as e:
                 logger.error(f"Error searching with pgvector: {str(e)}")
                 # Fall back to basic search using DocumentEmbedding model
-                return self._fallback_search(query, limit, threshold, case_id)
+                return self._fallback_search(query, limit, threshold, case_id, query_embedding, nprobe)
         elif self.vector_store.store_type == 'chroma':
             try:
-                from chromadb import Client, Settings
-
-                # Parse connection string
-                connection_parts = self.vector_store.connection_string.split('://')
-                if len(connection_parts) > 1:
-                    protocol, rest = connection_parts
-                    host, port = rest.split(':')
-
-                    client = Client(Settings(
-                        chroma_api_impl="rest",
-                        chroma_server_host=host,
-                        chroma_server_http_port=port
-                    ))
-                else:
-                    # Local persistent client
-                    client = Client(Settings(
-                        persist_directory=self.vector_store.connection_string or "./chroma_db"
-                    ))
-
-                # Get collection
-                collection = client.get_collection(name="legal_documents")
+                # Get pooled collection
+                collection = get_chroma_collection(self.vector_store)
 
                 # Prepare filter if case_id is provided
                 where_filter = None
@@ -166,96 +206,225 @@ class VectorSearchService:
                 return documents
             except Exception as e:
                 logger.error(f"Error searching with ChromaDB: {str(e)}")
-                return self._fallback_search(query, limit, threshold, case_id)
+                release_chroma_client(self.vector_store.id)
+                return self._fallback_search(query, limit, threshold, case_id, query_embedding, nprobe)
+        elif self.vector_store.store_type == 'local_mmap':
+            try:
+                hits = get_segment_store(self.vector_store).search(
+                    query_embedding, limit, threshold, case_id=case_id
+                )
+                documents = self._documents_for_hits(hits)
+                logger.info(f"Found {len(documents)} documents with local segment store")
+                return documents
+            except Exception as e:
+                logger.error(f"Error searching local segment store: {str(e)}")
+                return self._fallback_search(query, limit, threshold, case_id, query_embedding, nprobe)
         else:
             # Fall back to basic search using DocumentEmbedding model
-            return self._fallback_search(query, limit, threshold, case_id)
+            return self._fallback_search(query, limit, threshold, case_id, query_embedding, nprobe)
 
-    def _fallback_search(self, query: str, limit: int, threshold: float, case_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    def _fallback_search(self, query: str, limit: int, threshold: float, case_id: Optional[int] = None,
+                         query_embedding: Optional[np.ndarray] = None,
+                         nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Fallback search method when vector database is not available.
-        Uses the DocumentEmbedding model directly or falls back to keyword search.
+        Uses the resident vector index built from DocumentEmbedding rows or
+        falls back to keyword search.
 
         Args:
             query: Search query
             limit: Maximum number of results
             threshold: Minimum similarity threshold
             case_id: Optional case ID to filter results
+            query_embedding: Optional precomputed query embedding
+            nprobe: Clusters scanned by approximate indexes
 
         Returns:
             List of documents with similarity scores
         """
         logger.info("Using fallback search method")
         try:
-            # First try using DocumentEmbedding model if available
+            # First try using the resident vector index if available
             try:
-                # Get query embedding
-                query_embedding = self.embedding_service.get_embedding(query)
+                if query_embedding is None:
+                    if not self.embedding_service:
+                        from .embedding_service import EmbeddingService
+                        self.embedding_service = EmbeddingService(self.vector_store)
+                    query_embedding = self.embedding_service.get_embedding(query)
+
+                index = get_vector_index(self.vector_store)
+                if not len(index):
+                    logger.info("No document embeddings found, falling back to keyword search")
+                    return self._keyword_search(query, limit, case_id)
 
-                # Get all document embeddings
-                embeddings_query = DocumentEmbedding.objects.select_related('document')
+                hits = index.search(query_embedding, limit, threshold, case_id=case_id, nprobe=nprobe)
+                return self._documents_for_hits(hits)
 
-                # Filter by case if specified
-                if case_id:
-                    embeddings_query = embeddings_query.filter(document__case_id=case_id)
+            except Exception as e:
+                logger.warning(f"Error in embedding-based fallback search: {str(e)}")
+                return self._keyword_search(query, limit, case_id)
 
-                embeddings = list(embeddings_query)
+        except Exception as e:
+            logger.error(f"Error in fallback search: {str(e)}")
+            return []
 
-                if not embeddings:
-                    logger.info("No document embeddings found, falling back to keyword search")
-                    return self._keyword_search(query, limit, case_id)
+    def _hybrid_search(self, query: str, limit: int, threshold: float, case_id: Optional[int],
+                       query_embedding: np.ndarray, nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Fuse the vector ranking with the BM25 keyword ranking.
 
-                # Calculate similarity scores
-                documents = []
-                for doc_embedding in embeddings:
-                    try:
-                        # Get the embedding vector
-                        if hasattr(doc_embedding, 'embedding_data'):
-                            # If stored as string
-                            doc_vector = np.array(ast.literal_eval(doc_embedding.embedding_data))
-                        elif hasattr(doc_embedding, 'vector_id'):
-                            # If using external vector store
-                            # This is a placeholder - in a real implementation, you would
-                            # retrieve the vector from the external store
-                            continue
-                        else:
-                            logger.warning(f"No embedding data found for document {doc_embedding.document.id}")
-                            continue
+        Both retrievers return up to HYBRID_CANDIDATES documents, which are
+        merged with reciprocal rank fusion. Documents found only by keyword
+        report their keyword score (relative to the best keyword match) as
+        similarity.
 
-                        # Calculate cosine similarity
-                        similarity = np.dot(query_embedding, doc_vector) / (np.linalg.norm(query_embedding) * np.linalg.norm(doc_vector))
+        Args:
+            query: Search query
+            limit: Maximum number of results
+            threshold: Minimum similarity of vector matches
+            case_id: Optional case ID to filter results
+            query_embedding: Query embedding
+            nprobe: Clusters scanned by approximate indexes
 
-                        # Skip if below threshold
-                        if similarity < threshold:
-                            continue
+        Returns:
+            List of documents with similarity scores, in fused order
+        """
+        candidates = max(limit, ai_settings.HYBRID_CANDIDATES)
+        vector_results = self._vector_search(query, candidates, threshold, case_id, query_embedding, nprobe)
+        try:
+            keyword_hits = bm25_search(query, candidates, case_id=case_id)
+        except Exception as e:
+            logger.warning(f"Error in keyword search: {str(e)}")
+            keyword_hits = []
+
+        if not keyword_hits:
+            return vector_results[:limit]
+        if not vector_results:
+            return self._keyword_results(keyword_hits[:limit])
+
+        fused = reciprocal_rank_fusion([
+            [document["id"] for document in vector_results],
+            [doc_id for doc_id, _ in keyword_hits],
+        ])[:limit]
+
+        by_id = {document["id"]: document for document in vector_results}
+        fused_ids = {doc_id for doc_id, _ in fused}
+        keyword_only = [(doc_id, score) for doc_id, score in keyword_hits
+                        if doc_id not in by_id and doc_id in fused_ids]
+        for document in self._keyword_results(keyword_only, top_score=keyword_hits[0][1]):
+            by_id[document["id"]] = document
+
+        keyword_scores = dict(keyword_hits)
+        documents = []
+        for doc_id, _ in fused:
+            document = by_id.get(doc_id)
+            if document is None:
+                # Document deleted since it was indexed
+                continue
+            if doc_id in keyword_scores:
+                document["keyword_score"] = keyword_scores[doc_id]
+            documents.append(document)
+
+        logger.info(f"Fused {len(vector_results)} vector and {len(keyword_hits)} keyword matches")
+        return documents
+
+    def _keyword_results(self, hits: List[Tuple[int, float]],
+                         top_score: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Turn ranked (document_id, BM25 score) hits into result dictionaries.
 
-                        documents.append({
-                            "id": doc_embedding.document.id,
-                            "title": doc_embedding.document.title,
-                            "document_type": doc_embedding.document.document_type,
-                            "similarity": float(similarity)
-                        })
-                    except Exception as e:
-                        logger.warning(f"Error calculating similarity for document {doc_embedding.document.id}: {str(e)}")
-                        continue
+        Args:
+            hits: Ranked list of (document_id, BM25 score) tuples
+            top_score: Score mapped to similarity 1.0 (default: the first hit's)
 
-                # Sort by similarity score
-                documents.sort(key=lambda x: x['similarity'], reverse=True)
+        Returns:
+            List of documents with similarity and keyword scores, in hit order
+        """
+        if not hits:
+            return []
+        top_score = top_score or hits[0][1]
+        documents = self._documents_for_hits([(doc_id, score / top_score) for doc_id, score in hits])
+        keyword_scores = dict(hits)
+        for document in documents:
+            document["keyword_score"] = keyword_scores[document["id"]]
+        return documents
+
+    def _passage_search(self, query: str, limit: int, threshold: float, case_id: Optional[int],
+                        query_embedding: np.ndarray, aggregation: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Search passage vectors and rank documents by their matching passages.
 
-                # Limit results
-                return documents[:limit]
+        Passage vectors are kept locally for every store type, so this uses
+        the resident chunk index and falls back to document-level search if
+        no passages have been embedded yet.
 
-            except Exception as e:
-                logger.warning(f"Error in embedding-based fallback search: {str(e)}")
-                return self._keyword_search(query, limit, case_id)
+        Args:
+            query: Search query
+            limit: Maximum number of results
+            threshold: Minimum similarity of a passage
+            case_id: Optional case ID to filter results
+            query_embedding: Query embedding
+            aggregation: 'max' or 'sum' (default: from settings)
 
+        Returns:
+            List of documents with similarity scores and best passage offsets
+        """
+        try:
+            index = get_chunk_index(self.vector_store)
+            if not len(index):
+                logger.info("No passage embeddings found, falling back to document search")
+                return self._fallback_search(query, limit, threshold, case_id, query_embedding)
+
+            hits = index.search(
+                query_embedding, limit, threshold, case_id=case_id,
+                aggregation=aggregation or ai_settings.CHUNK_SEARCH_AGGREGATION,
+                top_k=ai_settings.CHUNK_SEARCH_TOP_K
+            )
+            documents = self._documents_for_hits([(doc_id, score) for doc_id, score, _, _ in hits])
+
+            passages = {doc_id: {"start": start, "end": end} for doc_id, _, start, end in hits}
+            for document in documents:
+                document["passage"] = passages[document["id"]]
+
+            logger.info(f"Found {len(documents)} documents with passage search")
+            return documents
         except Exception as e:
-            logger.error(f"Error in fallback search: {str(e)}")
-            return []
+            logger.error(f"Error in passage search: {str(e)}")
+            return self._fallback_search(query, limit, threshold, case_id, query_embedding)
+
+    def _documents_for_hits(self, hits: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+        """
+        Turn ranked (document_id, similarity) hits into result dictionaries.
+
+        Args:
+            hits: Ranked list of (document_id, similarity) tuples
+
+        Returns:
+            List of documents with similarity scores, in hit order
+        """
+        from documents.models import Document
+
+        documents_by_id = Document.objects.only('id', 'title', 'document_type').in_bulk(
+            [doc_id for doc_id, _ in hits]
+        )
+
+        documents = []
+        for doc_id, similarity in hits:
+            document = documents_by_id.get(doc_id)
+            if document is None:
+                # Document deleted since the index was built
+                continue
+            documents.append({
+                "id": document.id,
+                "title": document.title,
+                "document_type": document.document_type,
+                "similarity": similarity
+            })
+        return documents
 
     def _keyword_search(self, query: str, limit: int, case_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """
-        Simple keyword search as a last resort fallback.
+        BM25 keyword search over the text index, falling back to a title match.
 
         Args:
             query: Search query
@@ -263,14 +432,23 @@ class VectorSearchService:
             case_id: Optional case ID to filter results
 
         Returns:
-            List of documents with mock similarity scores
+            List of documents with keyword-based similarity scores
         """
         logger.info(f"Using keyword search for query: '{query}'")
 
+        try:
+            hits = bm25_search(query, limit, case_id=case_id)
+            if hits:
+                documents = self._keyword_results(hits)
+                logger.info(f"Found {len(documents)} documents with BM25 keyword search")
+                return documents
+        except Exception as e:
+            logger.warning(f"Error in BM25 keyword search: {str(e)}")
+
         try:
             from documents.models import Document
 
-            # Simple keyword search
+            # Title match for documents not in the text index yet
             queryset = Document.objects.filter(title__icontains=query)
 
             if case_id:
@@ -384,27 +562,8 @@ class VectorSearchService:
                     return self._fallback_similar_documents(document, limit, threshold)
             elif self.vector_store.store_type == 'chroma':
                 try:
-                    from chromadb import Client, Settings
-
-                    # Parse connection string
-                    connection_parts = self.vector_store.connection_string.split('://')
-                    if len(connection_parts) > 1:
-                        protocol, rest = connection_parts
-                        host, port = rest.split(':')
-
-                        client = Client(Settings(
-                            chroma_api_impl="rest",
-                            chroma_server_host=host,
-                            chroma_server_http_port=port
-                        ))
-                    else:
-                        # Local persistent client
-                        client = Client(Settings(
-                            persist_directory=self.vector_store.connection_string or "./chroma_db"
-                        ))
-
-                    # Get collection
-                    collection = client.get_collection(name="legal_documents")
+                    # Get pooled collection
+                    collection = get_chroma_collection(self.vector_store)
 
                     # Prepare filter
                     where_filter = None
@@ -456,6 +615,30 @@ class VectorSearchService:
                     return documents
                 except Exception as e:
                     logger.error(f"Error finding similar documents with ChromaDB: {str(e)}")
+                    release_chroma_client(self.vector_store.id)
+                    return self._fallback_similar_documents(document, limit, threshold)
+            elif self.vector_store.store_type == 'local_mmap':
+                try:
+                    segment_store = get_segment_store(self.vector_store)
+                    source_vector = segment_store.get_vector(document_id)
+                    if source_vector is None:
+                        source_vector = decode_embedding(doc_embedding)
+                    if source_vector is None:
+                        logger.warning(f"No embedding found in local segment store for document {document_id}")
+                        return self._fallback_similar_documents(document, limit, threshold)
+
+                    hits = segment_store.search(
+                        source_vector,
+                        limit,
+                        threshold,
+                        case_id=document.case_id,
+                        exclude_document_id=document.id
+                    )
+                    documents = self._documents_for_hits(hits)
+                    logger.info(f"Found {len(documents)} similar documents with local segment store")
+                    return documents
+                except Exception as e:
+                    logger.error(f"Error finding similar documents with local segment store: {str(e)}")
                     return self._fallback_similar_documents(document, limit, threshold)
             else:
                 # Fall back to basic similarity calculation
@@ -479,17 +662,18 @@ class VectorSearchService:
         """
         logger.info(f"Using fallback method to find documents similar to {document.id}")
         try:
-            # Get document embedding
-            try:
-                doc_embedding = DocumentEmbedding.objects.get(document=document)
-                if hasattr(doc_embedding, 'embedding_data'):
-                    source_vector = np.array(ast.literal_eval(doc_embedding.embedding_data))
-                else:
-                    # If using external vector store with no local embedding data
-                    logger.warning(f"No embedding data available for document {document.id}")
-                    return self._keyword_similar_documents(document, limit)
-            except (DocumentEmbedding.DoesNotExist, Exception) as e:
-                logger.warning(f"Could not get embedding for document {document.id}: {str(e)}")
+            index = get_vector_index(self.vector_store)
+
+            # Get document embedding, preferring the copy already in the index
+            source_vector = index.get_vector(document.id)
+            if source_vector is None:
+                try:
+                    doc_embedding = DocumentEmbedding.objects.get(document=document)
+                    source_vector = decode_embedding(doc_embedding)
+                except (DocumentEmbedding.DoesNotExist, Exception) as e:
+                    logger.warning(f"Could not get embedding for document {document.id}: {str(e)}")
+
+            if source_vector is None:
                 # If no embedding exists, create one
                 if not self.embedding_service:
                     from .embedding_service import EmbeddingService
@@ -505,47 +689,15 @@ class VectorSearchService:
                 # Create embedding
                 source_vector = self.embedding_service.get_embedding(text)
 
-            # Get all other document embeddings
-            other_embeddings = DocumentEmbedding.objects.exclude(document=document).select_related('document')
-
-            # Filter by same case if document has a case
-            if hasattr(document, 'case') and document.case:
-                other_embeddings = other_embeddings.filter(document__case=document.case)
-
-            # Calculate similarity scores
-            documents = []
-            for other_embedding in other_embeddings:
-                try:
-                    # Get the embedding vector
-                    if hasattr(other_embedding, 'embedding_data'):
-                        # If stored as string
-                        other_vector = np.array(ast.literal_eval(other_embedding.embedding_data))
-                    else:
-                        # Skip if no embedding data available
-                        continue
-
-                    # Calculate cosine similarity
-                    similarity = np.dot(source_vector, other_vector) / (np.linalg.norm(source_vector) * np.linalg.norm(other_vector))
-
-                    # Skip if below threshold
-                    if similarity < threshold:
-                        continue
-
-                    documents.append({
-                        "id": other_embedding.document.id,
-                        "title": other_embedding.document.title,
-                        "document_type": other_embedding.document.document_type,
-                        "similarity": float(similarity)
-                    })
-                except Exception as e:
-                    logger.warning(f"Error calculating similarity for document {other_embedding.document.id}: {str(e)}")
-                    continue
-
-            # Sort by similarity score
-            documents.sort(key=lambda x: x['similarity'], reverse=True)
-
-            # Limit results
-            return documents[:limit]
+            # Search the other documents of the same case
+            hits = index.search(
+                source_vector,
+                limit,
+                threshold,
+                case_id=document.case_id,
+                exclude_document_id=document.id
+            )
+            return self._documents_for_hits(hits)
 
         except Exception as e:
             logger.error(f"Error in fallback similar documents: {str(e)}")
@@ -553,17 +705,27 @@ class VectorSearchService:
 
     def _keyword_similar_documents(self, document, limit: int) -> List[Dict[str, Any]]:
         """
-        Find similar documents using keyword matching as a last resort.
+        Find similar documents by the document's most distinctive terms as a last resort.
 
         Args:
             document: Document to find similar documents for
             limit: Maximum number of results
 
         Returns:
-            List of documents with mock similarity scores
+            List of documents with keyword-based similarity scores
         """
         logger.info(f"Using keyword matching to find documents similar to {document.id}")
 
+        try:
+            terms = document_query_terms(document.id)
+            if terms:
+                hits = bm25_search(' '.join(terms), limit, case_id=document.case_id,
+                                   exclude_document_id=document.id)
+                if hits:
+                    return self._keyword_results(hits)
+        except Exception as e:
+            logger.warning(f"Error in BM25 similar documents: {str(e)}")
+
         try:
             from documents.models import Document
 
@@ -43,6 +43,30 @@ DEFAULT_TEMPERATURE = getattr(settings, 'DEFAULT_TEMPERATURE', 0.7)
 DEFAULT_VECTOR_DIMENSIONS = getattr(settings, 'DEFAULT_VECTOR_DIMENSIONS', 768)
 VECTOR_SEARCH_TOP_K = getattr(settings, 'VECTOR_SEARCH_TOP_K', 5)
 VECTOR_SEARCH_THRESHOLD = getattr(settings, 'VECTOR_SEARCH_THRESHOLD', 0.7)
+EMBEDDING_BATCH_SIZE = getattr(settings, 'EMBEDDING_BATCH_SIZE', 64)  # Max inputs per embedding request
+EMBEDDING_BATCH_MAX_CHARS = getattr(settings, 'EMBEDDING_BATCH_MAX_CHARS', 200000)  # Max characters per embedding request
+ENABLE_CHUNK_EMBEDDINGS = getattr(settings, 'ENABLE_CHUNK_EMBEDDINGS', True)  # Embed documents as passages
+EMBEDDING_CHUNK_CHARS = getattr(settings, 'EMBEDDING_CHUNK_CHARS', 2000)  # Max characters per passage
+EMBEDDING_CHUNK_OVERLAP = getattr(settings, 'EMBEDDING_CHUNK_OVERLAP', 200)  # Characters shared by adjacent passages
+CHUNK_SEARCH_AGGREGATION = getattr(settings, 'CHUNK_SEARCH_AGGREGATION', 'max')  # 'max' or 'sum' of top passages
+CHUNK_SEARCH_TOP_K = getattr(settings, 'CHUNK_SEARCH_TOP_K', 3)  # Passages per document summed by 'sum'
+ENABLE_EMBEDDING_CACHE = getattr(settings, 'ENABLE_EMBEDDING_CACHE', True)  # Reuse embeddings of unchanged text
+EMBEDDING_CACHE_MAX_ENTRIES = getattr(settings, 'EMBEDDING_CACHE_MAX_ENTRIES', 500000)  # LRU eviction bound
+EMBEDDING_CACHE_TOUCH_INTERVAL = getattr(settings, 'EMBEDDING_CACHE_TOUCH_INTERVAL', 3600)  # Seconds between last-used updates
+ENABLE_SEARCH_CACHE = getattr(settings, 'ENABLE_SEARCH_CACHE', True)  # Cache query embeddings and search results
+QUERY_EMBEDDING_CACHE_SIZE = getattr(settings, 'QUERY_EMBEDDING_CACHE_SIZE', 1024)  # Query vectors kept per process
+SEARCH_RESULT_CACHE_TIMEOUT = getattr(settings, 'SEARCH_RESULT_CACHE_TIMEOUT', 300)  # Seconds
+ENABLE_HYBRID_SEARCH = getattr(settings, 'ENABLE_HYBRID_SEARCH', True)  # Fuse BM25 keyword and vector rankings
+HYBRID_RRF_K = getattr(settings, 'HYBRID_RRF_K', 60)  # Reciprocal rank fusion offset
+HYBRID_CANDIDATES = getattr(settings, 'HYBRID_CANDIDATES', 50)  # Results of each ranking fed into fusion
+BM25_K1 = getattr(settings, 'BM25_K1', 1.2)  # Term frequency saturation
+BM25_B = getattr(settings, 'BM25_B', 0.75)  # Document length normalization
+BM25_MAX_DF_RATIO = getattr(settings, 'BM25_MAX_DF_RATIO', 0.5)  # Skip terms in more documents than this share
+TEXT_INDEX_ON_SAVE = getattr(settings, 'TEXT_INDEX_ON_SAVE', 'sync')  # 'sync', 'async' (Celery) or 'off'
+VECTOR_STORAGE_DTYPE = getattr(settings, 'VECTOR_STORAGE_DTYPE', 'float32')  # 'float32' or 'float16'
+VECTOR_SEGMENT_ROOT = getattr(settings, 'VECTOR_SEGMENT_ROOT', os.path.join(settings.BASE_DIR, 'vector_segments'))
+VECTOR_SEGMENT_ROWS = getattr(settings, 'VECTOR_SEGMENT_ROWS', 65536)  # Rows per compacted segment
+VECTOR_SEGMENT_TAIL_ROWS = getattr(settings, 'VECTOR_SEGMENT_TAIL_ROWS', 1024)  # Tail size before sealing
 
 # Document processing settings
 MAX_DOCUMENT_SIZE = getattr(settings, 'MAX_DOCUMENT_SIZE', 10 * 1024 * 1024)  # 10MB
@@ -0,0 +1,74 @@
+"""
+Signal handlers keeping the keyword text index in step with documents.
+
+Uploads and new versions are indexed once the saving transaction
+commits (after documents.signals has stored their extracted text),
+either in-process or through Celery (TEXT_INDEX_ON_SAVE). Saves that
+change neither the file nor the title are skipped after a single lookup.
+"""
+
+import logging
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from documents.models import Document
+from . import settings as ai_settings
+
+logger = logging.getLogger(__name__)
+
+
+def schedule_text_indexing(document_id: int) -> None:
+    """
+    Index a document's text according to TEXT_INDEX_ON_SAVE.
+
+    Args:
+        document_id: ID of the document to index
+    """
+    from .services.text_index import index_document_text, is_indexed
+    try:
+        document = Document.objects.get(id=document_id)
+        if is_indexed(document):
+            return
+
+        if ai_settings.TEXT_INDEX_ON_SAVE == 'async':
+            from .tasks import index_document_text as index_document_text_task
+            index_document_text_task.delay(document_id)
+        else:
+            index_document_text(document)
+    except Document.DoesNotExist:
+        pass
+    except Exception as e:
+        # Never fail an upload because of the keyword index
+        logger.error(f"Error indexing text of document {document_id}: {str(e)}")
+
+
+@receiver(post_save, sender=Document)
+def handle_document_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Queue a saved document for text indexing.
+
+    Args:
+        sender: The model class (Document)
+        instance: The Document instance that was saved
+        created: True if the instance was created, False if it was updated
+        raw: True when loading fixtures
+    """
+    if raw or ai_settings.TEXT_INDEX_ON_SAVE == 'off':
+        return
+
+    document_id = instance.id
+    transaction.on_commit(lambda: schedule_text_indexing(document_id))
+
+
+@receiver(post_delete, sender=Document)
+def handle_document_delete(sender, instance, **kwargs):
+    """
+    Refresh the text index statistics after a document (and its postings) is deleted.
+
+    Args:
+        sender: The model class (Document)
+        instance: The Document instance that was deleted
+    """
+    from .services.text_index import remove_document_text
+    remove_document_text(instance.id)
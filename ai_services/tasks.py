@@ -58,12 +58,63 @@ def create_document_embeddings(document_id: int, vector_store_id: int):
         return False
 
 @shared_task
-def batch_process_documents(case_id: int = None):
+def create_document_embeddings_batch(document_ids: list, vector_store_id: int):
+    """
+    Create embeddings for a batch of documents with batched embedding requests.
+
+    Args:
+        document_ids: IDs of the Documents to create embeddings for
+        vector_store_id: ID of the VectorStore to use
+    """
+    logger.info(f"Creating embeddings for batch of {len(document_ids)} documents")
+
+    try:
+        documents = list(Document.objects.filter(id__in=document_ids).select_related('case'))
+        vector_store = VectorStore.objects.get(id=vector_store_id)
+
+        # Get the appropriate embedding service with fallback capability
+        embedding_service = AIServiceFactory.get_embedding_service(vector_store)
+        if hasattr(embedding_service, 'create_document_embeddings'):
+            results = embedding_service.create_document_embeddings(documents)
+        else:
+            results = {
+                document.id: bool(embedding_service.create_document_embedding(document))
+                for document in documents
+            }
+
+        created = sum(1 for success in results.values() if success)
+        return {"created": created, "failed": len(document_ids) - created}
+
+    except Exception as e:
+        logger.error(f"Error creating batch document embeddings: {str(e)}", exc_info=True)
+        return {"created": 0, "failed": len(document_ids)}
+
+@shared_task
+def index_document_text(document_id: int):
+    """
+    Add a document's extracted text to the keyword (BM25) index.
+
+    Args:
+        document_id: ID of the Document to index
+    """
+    from .services.text_index import index_document_text as index_text
+
+    try:
+        document = Document.objects.get(id=document_id)
+        return index_text(document)
+    except Exception as e:
+        logger.error(f"Error indexing text of document {document_id}: {str(e)}", exc_info=True)
+        return False
+
+@shared_task
+def batch_process_documents(case_id: int = None, batch_size: int = None):
     """
     Process all unembedded documents in a case or the entire system.
 
     Args:
         case_id: Optional case ID to filter documents
+        batch_size: If set, schedule one task per batch of this many documents,
+            embedded with batched requests, instead of one task per document
     """
     logger.info(f"Batch processing documents for case {case_id if case_id else 'all'}")
 
@@ -82,6 +133,9 @@ def batch_process_documents(case_id: int = None):
         logger.error("No active vector store configured")
         return {"error": "No active vector store configured"}
 
+    if batch_size:
+        return _schedule_document_batches(query, vector_store, batch_size)
+
     # Process each document
     success_count = 0
     error_count = 0
@@ -99,3 +153,37 @@ def batch_process_documents(case_id: int = None):
         "errors": error_count,
         "total": success_count + error_count
     }
+
+def _schedule_document_batches(query, vector_store: VectorStore, batch_size: int):
+    """
+    Schedule batched embedding tasks for the documents of a query.
+
+    Args:
+        query: Document queryset to embed
+        vector_store: Vector store to use
+        batch_size: Number of documents per task
+
+    Returns:
+        Scheduling summary
+    """
+    success_count = 0
+    error_count = 0
+    batch_count = 0
+
+    document_ids = list(query.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(document_ids), batch_size):
+        batch = document_ids[start:start + batch_size]
+        try:
+            create_document_embeddings_batch.delay(batch, vector_store.id)
+            success_count += len(batch)
+            batch_count += 1
+        except Exception as e:
+            logger.error(f"Error scheduling batch of {len(batch)} documents: {str(e)}")
+            error_count += len(batch)
+
+    return {
+        "scheduled": success_count,
+        "batches": batch_count,
+        "errors": error_count,
+        "total": success_count + error_count
+    }
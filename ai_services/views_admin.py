@@ -46,6 +46,7 @@ def service_health_dashboard(request):
     context = {
         'services_health': services_health,
         'performance_metrics': performance_metrics,
+        'cache_stats': ServiceMonitor.get_all_cache_stats(),
         'llm_models': llm_models,
         'vector_stores': vector_stores,
         'last_updated': timezone.now(),
@@ -73,6 +74,7 @@ def service_health_api(request):
     data = {
         'services_health': services_health,
         'performance_metrics': performance_metrics,
+        'cache_stats': ServiceMonitor.get_all_cache_stats(),
         'last_updated': timezone.now().isoformat(),
     }
     
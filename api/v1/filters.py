@@ -0,0 +1,33 @@
+"""
+Filter backends for v1.
+"""
+from rest_framework import filters
+
+from clients.search import CONTAINS, EXACT, PREFIX, client_search_q
+
+
+class ClientSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter for the encrypted fields of Client.
+
+    The fields are matched through their blind indexes instead of SQL
+    lookups on ciphertext. As with SearchFilter, a field name prefixed with
+    '=' matches the whole value and '^' the start of a word; unprefixed
+    fields match anywhere in a word. Terms are combined with AND, fields
+    with OR.
+    """
+    search_modes = {'=': EXACT, '^': PREFIX}
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+        if not search_fields or not search_terms:
+            return queryset
+
+        fields = [
+            (field[1:], self.search_modes[field[0]]) if field[0] in self.search_modes else (field, CONTAINS)
+            for field in search_fields
+        ]
+        for term in search_terms:
+            queryset = queryset.filter(client_search_q(term, fields))
+        return queryset
@@ -14,6 +14,7 @@ from clients.models import Client
 from documents.models import Document, DocumentVersion
 from ai_services.models import AIAnalysisRequest, AIAnalysisResult
 
+from .filters import ClientSearchFilter
 from .serializers import (
     CaseSerializer, CaseNoteSerializer, CaseEventSerializer,
     PracticeAreaSerializer, CourtSerializer, ClientSerializer,
@@ -62,8 +63,9 @@ class ClientViewSet(viewsets.ModelViewSet):
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
-    search_fields = ['name', 'email', 'company_name']
+    filter_backends = [ClientSearchFilter, filters.OrderingFilter, DjangoFilterBackend]
+    # Encrypted fields, searched through their blind indexes
+    search_fields = ['first_name', 'last_name', '^email', 'company_name']
     filterset_fields = ['is_active', 'city', 'state', 'country']
     ordering_fields = ['name', 'created_at']
     ordering = ['-created_at']
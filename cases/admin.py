@@ -1,6 +1,6 @@
 # cases/admin.py
 from django.contrib import admin
-from .models import Case, CaseNote, CaseEvent, ConflictCheck, PracticeArea, Court, CaseTeamMember
+from .models import Case, CaseNote, CaseEvent, ConflictCheck, Party, PracticeArea, Court, CaseTeamMember
 
 class CaseNoteInline(admin.TabularInline):
     model = CaseNote
@@ -16,12 +16,18 @@ class ConflictCheckInline(admin.TabularInline):
     readonly_fields = ('check_date', 'conflicts_found')
     fields = ('check_source', 'checked_by', 'check_date', 'conflicts_found', 'resolution_status')
 
+class PartyInline(admin.TabularInline):
+    model = Party
+    fk_name = 'case'
+    extra = 0
+    fields = ('name', 'role')
+
 @admin.register(Case)
 class CaseAdmin(admin.ModelAdmin):
     list_display = ('title', 'case_number', 'client', 'assigned_attorney', 'status', 'case_type', 'open_date')
     list_filter = ('status', 'case_type', 'open_date', 'priority')
     search_fields = ('title', 'case_number', 'client__user__username', 'assigned_attorney__username', 'description')
-    inlines = [CaseNoteInline, CaseEventInline, ConflictCheckInline]
+    inlines = [CaseNoteInline, CaseEventInline, PartyInline, ConflictCheckInline]
     fieldsets = (
         ('Basic Information', {
             'fields': ('title', 'case_number', 'internal_reference', 'client', 'practice_area')
@@ -51,6 +57,14 @@ class ConflictCheckAdmin(admin.ModelAdmin):
     readonly_fields = ('check_date', 'conflict_details')
     date_hierarchy = 'check_date'
 
+@admin.register(Party)
+class PartyAdmin(admin.ModelAdmin):
+    # Names are encrypted and can't be searched in the database
+    list_display = ('name', 'role', 'case', 'client', 'created_at')
+    list_filter = ('role',)
+    raw_id_fields = ('case', 'client', 'contact')
+    readonly_fields = ('name_key', 'created_at')
+
 @admin.register(PracticeArea)
 class PracticeAreaAdmin(admin.ModelAdmin):
     list_display = ('name',)
@@ -0,0 +1,151 @@
+"""
+Management command to benchmark fuzzy name matching in conflict checks.
+
+Registers synthetic parties (100,000 by default) with their trigram
+tokens, then times looking up names in the registry the way a conflict
+check does (cases.parties.match_names): misspelt, reordered and
+re-suffixed variants of registered names, which should be found, and
+unregistered names. A few names are also scored against every registered
+name, the naive way, for comparison.
+
+Everything runs in a transaction that is rolled back, with throwaway
+encryption and blind index keys, so no data is left behind; run it
+against a database like the production one for meaningful numbers.
+"""
+
+import random
+import statistics
+import string
+import time
+
+from cryptography.fernet import Fernet
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from cases.models import Party
+from cases.parties import (
+    MATCH_THRESHOLD, compare_names, create_parties, match_names, normalize_party_name,
+)
+from core.utils import encryption
+
+SYLLABLES = [
+    'al', 'an', 'ar', 'ba', 'be', 'bo', 'ca', 'da', 'de', 'di', 'el', 'en', 'fa', 'ga', 'ha', 'he',
+    'in', 'ja', 'ka', 'ko', 'la', 'le', 'li', 'lo', 'ma', 'me', 'mi', 'mo', 'na', 'ne', 'ni', 'no',
+    'or', 'pa', 'ra', 're', 'ri', 'ro', 'sa', 'se', 'si', 'so', 'ta', 'te', 'ti', 'to', 'va', 'vi',
+    'ya', 'za', 'ber', 'chen', 'dor', 'gan', 'ham', 'kin', 'lin', 'man', 'mar', 'son', 'ton', 'wen',
+]
+ORGANIZATION_WORDS = ['Holdings', 'Partners', 'Capital', 'Industries', 'Logistics', 'Foods', 'Energy', 'Labs']
+SUFFIXES = ['Inc.', 'Corp.', 'Corporation', 'LLC', 'Ltd', 'Limited', 'Co.']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark fuzzy party name matching for conflict checks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--parties',
+            type=int,
+            default=100000,
+            help='Synthetic parties registered (default: 100000)',
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=100,
+            help='Names looked up, half of them variants of registered names (default: 100)',
+        )
+        parser.add_argument(
+            '--naive-queries',
+            type=int,
+            default=3,
+            help='Names scored against every registered name for comparison (default: 3)',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=None,
+            help=f'Minimum similarity (default: CONFLICT_MATCH_THRESHOLD, {MATCH_THRESHOLD})',
+        )
+
+    def handle(self, *args, **options):
+        if options['parties'] < 1 or options['queries'] < 2:
+            raise CommandError('--parties must be positive and --queries at least 2')
+
+        with override_settings(ENCRYPTION_KEY=Fernet.generate_key().decode(),
+                               BLIND_INDEX_KEY=Fernet.generate_key().decode()):
+            encryption.encryption_service = None
+            try:
+                with transaction.atomic():
+                    self.run(options)
+                    transaction.set_rollback(True)
+            finally:
+                encryption.encryption_service = None
+
+    def run(self, options):
+        rng = random.Random(0)
+        names = [self._name(rng) for _ in range(options['parties'])]
+
+        started = time.perf_counter()
+        for i in range(0, len(names), 5000):
+            create_parties([Party(name=name, role='RELATED_ENTITY') for name in names[i:i + 5000]])
+        self.stdout.write(f'Registered {len(names)} parties in {time.perf_counter() - started:.1f}s')
+
+        half = options['queries'] // 2
+        variants = [(self._variant(rng, name), name) for name in rng.sample(names, half)]
+        unregistered = [self._name(rng) for _ in range(options['queries'] - half)]
+
+        timings, found, matches = [], 0, 0
+        for query, source in variants + [(name, None) for name in unregistered]:
+            started = time.perf_counter()
+            result = match_names([query], threshold=options['threshold'])[query]
+            timings.append(time.perf_counter() - started)
+            matches += len(result)
+            if source and any(party.name == source for party, _ in result):
+                found += 1
+
+        timings.sort()
+        self.stdout.write(
+            f'Indexed lookup: median {statistics.median(timings) * 1000:.1f} ms, '
+            f'p95 {timings[int(len(timings) * 0.95) - 1] * 1000:.1f} ms, max {timings[-1] * 1000:.1f} ms per name'
+        )
+        self.stdout.write(
+            f'Variants found: {found}/{len(variants)}; '
+            f'{matches / len(timings):.1f} matches per name on average'
+        )
+
+        if options['naive_queries']:
+            registered = [normalize_party_name(name) for name in names]
+            started = time.perf_counter()
+            for query, _ in variants[:options['naive_queries']]:
+                checked = normalize_party_name(query)
+                for name in registered:
+                    compare_names(checked, name)
+            elapsed = (time.perf_counter() - started) / min(options['naive_queries'], len(variants))
+            self.stdout.write(
+                f'Naive scan: {elapsed * 1000:.0f} ms per name, without decrypting the registered names'
+            )
+
+    def _word(self, rng):
+        return ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 3))).capitalize()
+
+    def _name(self, rng):
+        if rng.random() < 0.7:
+            return f'{self._word(rng)} {self._word(rng)}'
+        words = [self._word(rng)] + rng.sample(ORGANIZATION_WORDS, rng.randint(0, 1))
+        return ' '.join(words + [rng.choice(SUFFIXES)])
+
+    def _variant(self, rng, name):
+        """A misspelt, reordered or re-suffixed version of name."""
+        words = name.split()
+        kind = rng.choice(['typo', 'typo', 'order', 'suffix'])
+        if kind == 'order' and len(words) > 1:
+            words.reverse()
+        elif kind == 'suffix' and words[-1] in SUFFIXES:
+            words[-1] = rng.choice([suffix for suffix in SUFFIXES if suffix != words[-1]])
+        else:
+            i = rng.randrange(len(words))
+            word = words[i]
+            position = rng.randrange(1, len(word))
+            words[i] = word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:]
+        return ' '.join(words)
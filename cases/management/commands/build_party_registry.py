@@ -0,0 +1,122 @@
+"""
+Management command to build the party registry used by conflict checks.
+
+cases.signals registers clients, contacts and opposing counsel as they
+are saved; this command (re)registers every one of them, e.g. after
+deploying the registry, after changing BLIND_INDEX_KEY or after rows were
+written with queryset.update(). The parties named in earlier conflict
+checks are registered for their cases as well, and the trigram tokens of
+every registered name used for fuzzy matching are rebuilt. The entries
+created here are not re-screened (see cases.screening). Rows are
+processed in primary-key order with keyset pagination, one transaction
+per batch, so the command can be interrupted and rerun at any time.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from cases.models import Case, ConflictCheck, Party
+from cases.parties import (
+    checked_parties, index_party_names, register_checked_parties, sync_case_parties, sync_client_parties,
+    sync_contact_parties,
+)
+from clients.models import Client, ClientContact
+from core.fields import decrypt_fields
+
+
+class Command(BaseCommand):
+    help = 'Build the party registry searched by conflict checks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows registered per transaction (default: 500)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.0,
+            help='Seconds to pause after each batch, to limit load (default: 0)',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Delete the registry first; keys computed with another BLIND_INDEX_KEY are dropped',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        self.batch_size = options['batch_size']
+        self.sleep = options['sleep']
+
+        if options['rebuild']:
+            deleted, _ = Party.objects.all().delete()
+            self.stdout.write(f'Deleted {deleted} registry entries')
+
+        def register_clients(clients):
+            decrypt_fields(clients, ['first_name', 'last_name', 'company_name'])
+            for client in clients:
+                sync_client_parties(client)
+
+        def register_contacts(contacts):
+            decrypt_fields(contacts, ['first_name', 'last_name'])
+            for contact in contacts:
+                sync_contact_parties(contact)
+
+        def register_cases(cases):
+            for case in cases:
+                sync_case_parties(case)
+
+        def register_checks(checks):
+            for check in checks:
+                register_checked_parties(check.case, checked_parties(check.parties_checked))
+
+        def index_names(parties):
+            decrypt_fields(parties, ['name'])
+            index_party_names(parties)
+
+        # Entries registered from here on get their tokens when created
+        last_party = Party.objects.order_by('pk').values_list('pk', flat=True).last()
+        counts = [
+            self._process(Client.objects.only('pk', 'client_type', 'first_name', 'last_name', 'company_name'),
+                          register_clients, 'clients'),
+            self._process(ClientContact.objects.only('pk', 'client_id', 'first_name', 'last_name'),
+                          register_contacts, 'contacts'),
+            self._process(Case.objects.only('pk', 'opposing_counsel'), register_cases, 'cases'),
+            self._process(ConflictCheck.objects.select_related('case').only('pk', 'case', 'parties_checked'),
+                          register_checks, 'conflict checks'),
+            self._process(Party.objects.filter(pk__lte=last_party or 0).only('pk', 'name'),
+                          index_names, 'party names'),
+        ]
+
+        self.stdout.write(self.style.SUCCESS(
+            'Registered the parties of {} clients, {} contacts, {} cases and {} conflict checks, '
+            'indexed {} party names'.format(*counts)
+        ))
+
+    def _process(self, queryset, register, label):
+        """Call register on the rows of queryset in batches."""
+        count = 0
+        queryset = queryset.order_by('pk')
+
+        last_pk = None
+        while True:
+            batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            rows = list(batch[:self.batch_size])
+            if not rows:
+                break
+            last_pk = rows[-1].pk
+
+            with transaction.atomic():
+                register(rows)
+            count += len(rows)
+            self.stdout.write(f'Registered {count} {label}')
+            if self.sleep:
+                time.sleep(self.sleep)
+
+        return count
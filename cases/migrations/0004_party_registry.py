@@ -0,0 +1,35 @@
+# Generated by Django 5.0.7 on 2026-10-17 03:48
+
+import core.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0003_conflictcheck'),
+        ('clients', '0005_client_blind_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Party',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', core.fields.EncryptedCharField(max_length=255, verbose_name='Name')),
+                ('name_key', models.CharField(db_index=True, editable=False, help_text='Blind index of the normalized name', max_length=32, verbose_name='Name Key')),
+                ('role', models.CharField(choices=[('CLIENT', 'Client'), ('CLIENT_CONTACT', 'Client Contact'), ('OPPOSING_PARTY', 'Opposing Party'), ('OPPOSING_COUNSEL', 'Opposing Counsel'), ('WITNESS', 'Witness'), ('RELATED_ENTITY', 'Related Entity')], max_length=20, verbose_name='Role')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('case', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='parties', to='cases.case', verbose_name='Case')),
+                ('client', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='parties', to='clients.client', verbose_name='Client')),
+                ('contact', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='parties', to='clients.clientcontact', verbose_name='Contact')),
+            ],
+            options={
+                'verbose_name': 'Party',
+                'verbose_name_plural': 'Parties',
+                'ordering': ['role', 'created_at'],
+                'indexes': [models.Index(fields=['role', 'case'], name='cases_party_role_c2422a_idx')],
+            },
+        ),
+    ]
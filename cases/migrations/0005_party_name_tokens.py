@@ -0,0 +1,27 @@
+# Generated by Django 5.0.7 on 2026-10-17 03:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0004_party_registry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartyNameToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=32, verbose_name='Token')),
+                ('party', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='name_tokens', to='cases.party', verbose_name='Party')),
+            ],
+            options={
+                'verbose_name': 'Party Name Token',
+                'verbose_name_plural': 'Party Name Tokens',
+                'indexes': [models.Index(fields=['token', 'party'], name='cases_party_token_d48c0b_idx')],
+            },
+        ),
+    ]
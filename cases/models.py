@@ -1,8 +1,9 @@
 # cases/models.py
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from accounts.models import User
-from clients.models import Client
+from clients.models import Client, ClientContact
+from core.fields import EncryptedCharField
 import uuid
 
 class PracticeArea(models.Model):
@@ -257,6 +258,78 @@ class CaseEvent(models.Model):
         ordering = ['date', 'time']
 
 
+class Party(models.Model):
+    """
+    Entry of the party registry searched by conflict checks.
+
+    Every client, client contact, opposing counsel and party named on a
+    matter is registered under the blind index of its normalized name
+    (see cases.parties), so a conflict check is a few indexed lookups
+    instead of a scan of every case. The name itself is stored encrypted.
+    """
+    ROLE_CHOICES = [
+        ('CLIENT', 'Client'),
+        ('CLIENT_CONTACT', 'Client Contact'),
+        ('OPPOSING_PARTY', 'Opposing Party'),
+        ('OPPOSING_COUNSEL', 'Opposing Counsel'),
+        ('WITNESS', 'Witness'),
+        ('RELATED_ENTITY', 'Related Entity'),
+    ]
+
+    name = EncryptedCharField(_('Name'), max_length=255)
+    name_key = models.CharField(_('Name Key'), max_length=32, editable=False, db_index=True,
+                                help_text=_('Blind index of the normalized name'))
+    role = models.CharField(_('Role'), max_length=20, choices=ROLE_CHOICES)
+
+    # What the party is linked to; clients and contacts are linked to their client, the others to a case
+    case = models.ForeignKey(Case, on_delete=models.CASCADE, null=True, blank=True, related_name='parties', verbose_name=_('Case'))
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, null=True, blank=True, related_name='parties', verbose_name=_('Client'))
+    contact = models.ForeignKey(ClientContact, on_delete=models.CASCADE, null=True, blank=True, related_name='parties', verbose_name=_('Contact'))
+
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.get_role_display()})"
+
+    def save(self, *args, **kwargs):
+        from .parties import index_party_names, party_name_key
+        self.name_key = party_name_key(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'name_key'}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if update_fields is None or 'name' in update_fields:
+                index_party_names([self])
+
+    class Meta:
+        verbose_name = _('Party')
+        verbose_name_plural = _('Parties')
+        ordering = ['role', 'created_at']
+        indexes = [
+            models.Index(fields=['role', 'case']),
+        ]
+
+
+class PartyNameToken(models.Model):
+    """
+    Blind-index token of a character trigram of a party name, for fuzzy
+    name matching in conflict checks (see cases.parties).
+    """
+    party = models.ForeignKey(Party, on_delete=models.CASCADE, related_name='name_tokens', verbose_name=_('Party'))
+    token = models.CharField(_('Token'), max_length=32)
+
+    def __str__(self):
+        return f"Name token of party #{self.party_id}"
+
+    class Meta:
+        verbose_name = _('Party Name Token')
+        verbose_name_plural = _('Party Name Tokens')
+        indexes = [
+            models.Index(fields=['token', 'party']),
+        ]
+
+
 class ConflictCheck(models.Model):
     """
     Automated conflict of interest checking.
@@ -307,58 +380,27 @@ class ConflictCheck(models.Model):
     def __str__(self):
         return f"Conflict Check for {self.case} on {self.check_date.strftime('%Y-%m-%d')}"
 
-    def perform_check(self):
+    def perform_check(self, threshold=None):
         """
         Run automated conflict check algorithms.
 
-        This method checks for conflicts against:
-        1. Existing clients
-        2. Opposing parties in other cases
+        Every party in parties_checked, and the case's client, is matched
+        by name, fuzzily, in the party registry (see cases.parties) against:
+        1. Existing clients and their contacts
+        2. Opposing parties and counsel in other cases
         3. Related entities
 
+        The checked parties are then registered for the case.
+
+        Args:
+            threshold: Minimum name similarity (default: CONFLICT_MATCH_THRESHOLD)
+
         Returns:
             Dictionary with check results
         """
-        # Get case client and related parties
-        client = self.case.client
-
-        # Initialize results
-        results = {
-            'conflicts_found': False,
-            'potential_conflicts': [],
-            'details': {}
-        }
+        from .parties import screen_case
 
-        # Check against opposing parties in other cases
-        from clients.models import Client
-        opposing_parties = []
-
-        # Get all cases
-        all_cases = Case.objects.exclude(id=self.case.id)
-
-        # Check each case for potential conflicts
-        for other_case in all_cases:
-            # Skip cases for the same client
-            if other_case.client_id == client.id:
-                continue
-
-            # Check if this client is opposing party in another case
-            # This is a simplified check - in a real system, you would have a more
-            # comprehensive opposing party tracking system
-            if hasattr(other_case, 'opposing_parties'):
-                for party in other_case.opposing_parties.all():
-                    if party.name.lower() == client.name.lower():
-                        opposing_parties.append({
-                            'case_id': other_case.id,
-                            'case_number': other_case.case_number,
-                            'case_title': other_case.title,
-                            'relationship': 'Opposing Party'
-                        })
-
-        if opposing_parties:
-            results['conflicts_found'] = True
-            results['potential_conflicts'].extend(opposing_parties)
-            results['details']['opposing_parties'] = opposing_parties
+        results = screen_case(self.case, self.parties_checked, threshold)
 
         # Update the model with results
         self.conflicts_found = results['conflicts_found']
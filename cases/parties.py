@@ -0,0 +1,557 @@
+"""
+Party registry for conflict-of-interest checks.
+
+Every person or organization the firm knows from its matters is a Party:
+clients and their contacts (linked to the client), opposing counsel and
+the parties named in a case's conflict checks (linked to the case). A
+party is registered under the blind index of its normalized name (see
+core.utils.blind_index), so names that differ only in case, accents,
+punctuation or spacing share a key, and the encrypted client names never
+have to be decrypted to be compared.
+
+Names are also matched fuzzily, so "Acme Corp." finds "ACME Corporation"
+and "Mohammed Al-Rashid" finds "Muhammad Alrashid". Each party keeps the
+blind indexes of the character trigrams of its name as PartyNameToken
+rows. A checked name selects as candidates the parties sharing enough of
+its trigrams, with one indexed aggregate query, and only those (at most
+MAX_CANDIDATES) are decrypted and scored with Jaro-Winkler and a
+word-by-word token-set similarity. Candidates scoring MATCH_THRESHOLD or
+more are reported, with an explanation of the match.
+
+cases.signals keeps the registry in step with clients, contacts and
+cases; build_party_registry (re)builds it.
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from core.fields import decrypt_fields
+from core.utils.blind_index import EXACT, TRIGRAM, blind_index, normalize, words
+from .models import Case, Party, PartyNameToken
+
+PARTY_DOMAIN = 'cases.Party.name'
+
+# Similarity, from 0 to 1, from which a registered name is a potential conflict
+MATCH_THRESHOLD = getattr(settings, 'CONFLICT_MATCH_THRESHOLD', 0.85)
+
+# Registered names scored per checked name
+MAX_CANDIDATES = getattr(settings, 'CONFLICT_MAX_CANDIDATES', 200)
+
+# Share of a checked name's trigrams a registered name needs to be scored
+MIN_TRIGRAM_OVERLAP = getattr(settings, 'CONFLICT_MIN_TRIGRAM_OVERLAP', 0.25)
+
+# Words that only give the legal form of an organization; ignored when comparing names
+ORGANIZATION_SUFFIXES = frozenset({
+    'the', 'inc', 'incorporated', 'corp', 'corporation', 'co', 'company', 'ltd', 'limited',
+    'llc', 'llp', 'lp', 'plc', 'pc', 'pllc', 'gmbh', 'ag', 'sa', 'sarl', 'bv', 'nv',
+})
+
+# Shortest length, relative to the other, at which whole names are compared
+MIN_LENGTH_RATIO = 0.8
+
+EXACT_MATCH = 'exact'
+JARO_WINKLER = 'jaro_winkler'
+TOKEN_SET = 'token_set'
+
+# Party types of the conflict check form and the registry role they get
+CHECKED_TYPE_ROLES = {
+    'INDIVIDUAL': 'RELATED_ENTITY',
+    'ORGANIZATION': 'RELATED_ENTITY',
+    'OPPOSING_PARTY': 'OPPOSING_PARTY',
+    'OPPOSING_COUNSEL': 'OPPOSING_COUNSEL',
+    'WITNESS': 'WITNESS',
+    'RELATED_ENTITY': 'RELATED_ENTITY',
+}
+
+RELATIONSHIPS = {
+    'CLIENT': 'Existing Client',
+    'CLIENT_CONTACT': 'Contact of Existing Client',
+    'OPPOSING_PARTY': 'Opposing Party',
+    'OPPOSING_COUNSEL': 'Opposing Counsel',
+    'WITNESS': 'Witness',
+    'RELATED_ENTITY': 'Related Entity',
+}
+
+
+def normalize_party_name(name: str) -> str:
+    """
+    Normalize a party name for the registry.
+
+    Case, accents, punctuation and spacing are ignored, so "ACME Corp." and
+    "Acme  corp" are the same name.
+
+    Args:
+        name: Party name as entered
+
+    Returns:
+        Normalized name
+    """
+    return ' '.join(words(normalize(name)))
+
+
+def party_name_key(name: str) -> str:
+    """
+    Registry key of a party name.
+
+    Args:
+        name: Party name as entered
+
+    Returns:
+        Blind index of the normalized name, or '' for an empty name
+    """
+    normalized = normalize_party_name(name)
+    return blind_index(PARTY_DOMAIN, EXACT, normalized) if normalized else ''
+
+
+def core_words(normalized: str) -> List[str]:
+    """Words of a normalized name without organization suffixes, unless that leaves none."""
+    name_words = normalized.split()
+    core = [word for word in name_words if word not in ORGANIZATION_SUFFIXES]
+    return core or name_words
+
+
+def name_trigrams(normalized: str) -> Set[str]:
+    """Character trigrams of the core words of a normalized name, each word padded with spaces."""
+    result = set()
+    for word in core_words(normalized):
+        padded = f' {word} '
+        for i in range(len(padded) - 2):
+            result.add(padded[i:i + 3])
+    return result
+
+
+def name_tokens(normalized: str) -> Set[str]:
+    """Blind indexes of the trigrams of a normalized name."""
+    return {blind_index(PARTY_DOMAIN, TRIGRAM, trigram) for trigram in name_trigrams(normalized)}
+
+
+def jaro_winkler(a: str, b: str, prefix_scale: float = 0.1) -> float:
+    """
+    Jaro-Winkler similarity of two strings.
+
+    Args:
+        a: First string
+        b: Second string
+        prefix_scale: Weight of a common prefix of up to four characters
+
+    Returns:
+        Similarity from 0 (nothing in common) to 1 (equal)
+    """
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+
+    window = max(max(len(a), len(b)) // 2 - 1, 0)
+    a_matched = [False] * len(a)
+    b_matched = [False] * len(b)
+    matches = 0
+    for i, char in enumerate(a):
+        for j in range(max(0, i - window), min(len(b), i + window + 1)):
+            if not b_matched[j] and b[j] == char:
+                a_matched[i] = b_matched[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+
+    transpositions = 0
+    j = 0
+    for i, char in enumerate(a):
+        if a_matched[i]:
+            while not b_matched[j]:
+                j += 1
+            if char != b[j]:
+                transpositions += 1
+            j += 1
+
+    jaro = (matches / len(a) + matches / len(b) + (matches - transpositions / 2) / matches) / 3
+    prefix = 0
+    for char_a, char_b in zip(a[:4], b[:4]):
+        if char_a != char_b:
+            break
+        prefix += 1
+    return jaro + prefix * prefix_scale * (1 - jaro)
+
+
+def token_set_similarity(a_words: List[str], b_words: List[str]) -> Tuple[float, List[Tuple[str, str, float]]]:
+    """
+    Word-by-word similarity of two names, in any word order.
+
+    Words are paired greedily by Jaro-Winkler similarity; the score is the
+    similarity of the pairs weighted by their length over the length of all
+    words, so unpaired words ("John" against "John Smith") lower it.
+
+    Args:
+        a_words: Words of the first name
+        b_words: Words of the second name
+
+    Returns:
+        (similarity from 0 to 1, paired words with their similarity)
+    """
+    total = sum(map(len, a_words)) + sum(map(len, b_words))
+    if not total:
+        return 0.0, []
+
+    scored = sorted(
+        ((jaro_winkler(a, b), i, j) for i, a in enumerate(a_words) for j, b in enumerate(b_words)),
+        reverse=True,
+    )
+    used_a, used_b = set(), set()
+    pairs = []
+    weight = 0.0
+    for score, i, j in scored:
+        if i in used_a or j in used_b:
+            continue
+        used_a.add(i)
+        used_b.add(j)
+        pairs.append((a_words[i], b_words[j], round(score, 3)))
+        weight += score * (len(a_words[i]) + len(b_words[j]))
+    return weight / total, pairs
+
+
+def compare_names(checked: str, registered: str) -> dict:
+    """
+    Score a registered name against a checked one.
+
+    Args:
+        checked: Normalized checked name
+        registered: Normalized registered name
+
+    Returns:
+        Explanation with the score, the method giving it and what matched
+    """
+    if checked == registered:
+        return {'score': 1.0, 'method': EXACT_MATCH}
+
+    checked_words, registered_words = core_words(checked), core_words(registered)
+    ignored = sorted((set(checked.split()) - set(checked_words)) | (set(registered.split()) - set(registered_words)))
+
+    by_word, pairs = token_set_similarity(checked_words, registered_words)
+    if ignored:
+        # With the suffixes too, in case one of them is misspelt ("Corporatoin")
+        with_suffixes, suffix_pairs = token_set_similarity(checked.split(), registered.split())
+        if with_suffixes > by_word:
+            by_word, pairs, ignored = with_suffixes, suffix_pairs, []
+
+    # Names split into words differently ("Al-Rashid" and "Alrashid") are compared
+    # whole, without spaces; not when one is much shorter, as the prefix bonus
+    # would match "John" to "John Smith"
+    whole = 0.0
+    checked_compact, registered_compact = ''.join(checked_words), ''.join(registered_words)
+    lengths = sorted((len(checked_compact), len(registered_compact)))
+    if len(checked_words) != len(registered_words) and lengths[0] >= MIN_LENGTH_RATIO * lengths[1]:
+        whole = jaro_winkler(checked_compact, registered_compact)
+
+    if by_word >= whole:
+        explanation = {'score': round(by_word, 3), 'method': TOKEN_SET, 'word_pairs': pairs}
+    else:
+        explanation = {'score': round(whole, 3), 'method': JARO_WINKLER}
+    if ignored:
+        explanation['ignored_words'] = ignored
+    return explanation
+
+
+def _candidate_ids(normalized: str, parties=None) -> List[int]:
+    """Parties of the parties queryset (default: all) sharing most trigrams with a normalized name, best first."""
+    tokens = name_tokens(normalized)
+    if not tokens:
+        return []
+    min_shared = max(1, math.ceil(len(tokens) * MIN_TRIGRAM_OVERLAP))
+    rows = PartyNameToken.objects.filter(token__in=tokens)
+    if parties is not None:
+        # Filter before capping, so excluded entries can't take up the candidate slots
+        rows = rows.filter(party__in=parties)
+    return list(
+        rows.values('party_id')
+        .annotate(shared=Count('pk'))
+        .filter(shared__gte=min_shared)
+        .order_by('-shared', 'party_id')
+        .values_list('party_id', flat=True)[:MAX_CANDIDATES]
+    )
+
+
+def match_names(names: Iterable[str], parties=None, threshold: Optional[float] = None) -> Dict[str, List[Tuple[Party, dict]]]:
+    """
+    Find the registered parties whose name matches each of names.
+
+    Args:
+        names: Names to look up, as entered
+        parties: Party queryset to match against (default: the whole registry)
+        threshold: Minimum similarity (default: MATCH_THRESHOLD)
+
+    Returns:
+        For each name, the matching parties with the explanation of the
+        match, best first
+    """
+    threshold = MATCH_THRESHOLD if threshold is None else threshold
+
+    normalized = {name: normalize_party_name(name) for name in names}
+    normalized = {name: value for name, value in normalized.items() if value}
+    candidates = {name: set(_candidate_ids(value, parties)) for name, value in normalized.items()}
+    parties = Party.objects.all() if parties is None else parties
+    keys = {party_name_key(name): name for name in normalized}
+
+    all_ids = set().union(*candidates.values()) if candidates else set()
+    found = list(
+        parties.filter(Q(pk__in=all_ids) | Q(name_key__in=list(keys)))
+        .select_related('case')
+        .order_by('pk')
+    ) if normalized else []
+    decrypt_fields(found, ['name'])
+
+    matches: Dict[str, List[Tuple[Party, dict]]] = {name: [] for name in normalized}
+    for party in found:
+        registered = None
+        for name, value in normalized.items():
+            if party.pk not in candidates[name] and keys.get(party.name_key) != name:
+                continue
+            if registered is None:
+                registered = normalize_party_name(party.name)
+            explanation = compare_names(value, registered)
+            if explanation['score'] >= threshold:
+                explanation['matched_name'] = party.name
+                matches[name].append((party, explanation))
+
+    for name_matches in matches.values():
+        name_matches.sort(key=lambda match: -match[1]['score'])
+    return matches
+
+
+def checked_parties(parties_checked) -> List[Tuple[str, str]]:
+    """
+    Parties of ConflictCheck.parties_checked as (name, type) pairs.
+
+    Entries are {'name': ..., 'type': ...} dicts as saved by the conflict
+    check form; plain strings are accepted as untyped names.
+
+    Args:
+        parties_checked: Value of ConflictCheck.parties_checked
+
+    Returns:
+        List of (name, type) pairs with a non-empty name
+    """
+    parties = []
+    for party in parties_checked or []:
+        if isinstance(party, dict):
+            name, party_type = party.get('name'), party.get('type') or ''
+        else:
+            name, party_type = party, ''
+        if name and str(name).strip():
+            parties.append((str(name).strip(), party_type))
+    return parties
+
+
+def client_names(client) -> List[str]:
+    """Names a client is known by: the display name and the company name."""
+    names = [client.get_display_name(), client.company_name]
+    return [name for name in names if name]
+
+
+def index_party_names(parties: Iterable[Party]):
+    """
+    Replace the trigram tokens of saved parties.
+
+    Args:
+        parties: Saved parties, with their names loaded
+    """
+    parties = list(parties)
+    PartyNameToken.objects.filter(party__in=parties).delete()
+    PartyNameToken.objects.bulk_create([
+        PartyNameToken(party=party, token=token)
+        for party in parties for token in name_tokens(normalize_party_name(party.name))
+    ], batch_size=1000)
+
+
+def create_parties(parties: List[Party]) -> List[Party]:
+    """
+    Register new parties with their name key and trigram tokens.
+
+    Args:
+        parties: Unsaved parties
+
+    Returns:
+        The saved parties
+    """
+    for party in parties:
+        party.name_key = party_name_key(party.name)
+    parties = Party.objects.bulk_create(parties, batch_size=1000)
+    PartyNameToken.objects.bulk_create([
+        PartyNameToken(party=party, token=token)
+        for party in parties for token in name_tokens(normalize_party_name(party.name))
+    ], batch_size=1000)
+    return parties
+
+
+def _sync(role: str, names: Iterable[str], **links) -> List[Party]:
+    """Make the parties with role and links match names, keeping unchanged entries; returns the new ones."""
+    wanted = {}
+    for name in names:
+        key = party_name_key(name)
+        if key:
+            wanted.setdefault(key, name)
+
+    existing = dict(Party.objects.filter(role=role, **links).values_list('name_key', 'pk'))
+    stale = [pk for key, pk in existing.items() if key not in wanted]
+    if stale:
+        Party.objects.filter(pk__in=stale).delete()
+    return create_parties([Party(name=name, role=role, **links) for key, name in wanted.items() if key not in existing])
+
+
+def sync_client_parties(client) -> List[Party]:
+    """Register the names of a client; returns the new registry entries."""
+    return _sync('CLIENT', client_names(client), client_id=client.pk, contact=None)
+
+
+def sync_contact_parties(contact) -> List[Party]:
+    """Register the name of a client contact; returns the new registry entries."""
+    name = f"{contact.first_name} {contact.last_name}".strip()
+    return _sync('CLIENT_CONTACT', [name], client_id=contact.client_id, contact_id=contact.pk)
+
+
+def sync_case_parties(case) -> List[Party]:
+    """Register the opposing counsel of a case; returns the new registry entries."""
+    return _sync('OPPOSING_COUNSEL', [case.opposing_counsel], case_id=case.pk)
+
+
+def register_checked_parties(case, parties: Iterable[Tuple[str, str]]) -> List[Party]:
+    """
+    Register the parties named in a conflict check of a case.
+
+    The case's own client is already registered and is skipped, as are
+    names registered for the case with the same role.
+
+    Args:
+        case: Case checked
+        parties: (name, type) pairs, see checked_parties()
+
+    Returns:
+        The new registry entries
+    """
+    existing = set(Party.objects.filter(case=case).values_list('role', 'name_key'))
+    new_parties = []
+    for name, party_type in parties:
+        if party_type == 'CLIENT':
+            continue
+        role = CHECKED_TYPE_ROLES.get(party_type, 'RELATED_ENTITY')
+        key = party_name_key(name)
+        if key and (role, key) not in existing:
+            existing.add((role, key))
+            new_parties.append(Party(name=name, role=role, case=case))
+    return create_parties(new_parties)
+
+
+def conflict_entry(name: str, party_type: str, party: Party, explanation: dict, case=None) -> dict:
+    """
+    Potential conflict as stored in ConflictCheck.conflict_details.
+
+    Args:
+        name: Checked name
+        party_type: Type of the checked party
+        party: Matching registry entry
+        explanation: Explanation of the match, see compare_names()
+        case: Case of the matching party, if any
+
+    Returns:
+        Dictionary describing the conflict
+    """
+    return {
+        'party_name': name,
+        'party_type': party_type,
+        'role': party.role,
+        'relationship': RELATIONSHIPS.get(party.role, party.get_role_display()),
+        'party_id': party.pk,
+        'client_id': party.client_id,
+        'case_id': case.pk if case else None,
+        'case_number': case.case_number if case else '',
+        'case_title': case.title if case else '',
+        'match': explanation,
+    }
+
+
+def find_conflicts(case, parties: Iterable[Tuple[str, str]], threshold: Optional[float] = None) -> dict:
+    """
+    Look up the parties of a conflict check in the registry.
+
+    Registry entries of the case itself and of its client (including the
+    client's other cases) are not conflicts. A matching client or contact
+    is reported once per case of that client. Each conflict carries the
+    explanation of the name match (see compare_names()).
+
+    Args:
+        case: Case being checked
+        parties: (name, type) pairs, see checked_parties()
+        threshold: Minimum name similarity (default: MATCH_THRESHOLD)
+
+    Returns:
+        Dictionary with conflicts_found, potential_conflicts and details
+    """
+    parties = list(parties)
+    registry = Party.objects.exclude(case_id=case.pk).exclude(client_id=case.client_id) \
+        .exclude(case__client_id=case.client_id)
+    matches = match_names([name for name, _ in parties], registry, threshold)
+
+    matched = {party.pk: party for name_matches in matches.values() for party, _ in name_matches}
+
+    # Cases of matching clients and contacts, in one query
+    client_cases: Dict[int, List[Case]] = {}
+    client_ids = {party.client_id for party in matched.values() if party.client_id}
+    if client_ids:
+        for other_case in Case.objects.filter(client_id__in=client_ids).only(
+                'id', 'client_id', 'case_number', 'title').order_by('-open_date'):
+            client_cases.setdefault(other_case.client_id, []).append(other_case)
+
+    conflicts = []
+    for name, party_type in parties:
+        for party, explanation in matches.get(name, []):
+            cases = [party.case] if party.case_id else client_cases.get(party.client_id) or [None]
+            conflicts.extend(conflict_entry(name, party_type, party, explanation, other_case) for other_case in cases)
+
+    by_role: Dict[str, int] = {}
+    for party in matched.values():
+        by_role[party.role] = by_role.get(party.role, 0) + 1
+
+    return {
+        'conflicts_found': bool(conflicts),
+        'potential_conflicts': conflicts,
+        'details': {
+            'names_checked': len(matches),
+            'registry_matches': len(matched),
+            'matches_by_role': by_role,
+            'threshold': MATCH_THRESHOLD if threshold is None else threshold,
+        },
+    }
+
+
+def screen_case(case, parties_checked, threshold: Optional[float] = None) -> dict:
+    """
+    Check the parties of a case against the registry and register them.
+
+    The case's client is always checked, whether listed or not. Parties
+    new to the registry are then re-screened against the other open cases
+    (see cases.screening).
+
+    Args:
+        case: Case being checked
+        parties_checked: Value of ConflictCheck.parties_checked
+        threshold: Minimum name similarity (default: MATCH_THRESHOLD)
+
+    Returns:
+        Results of find_conflicts()
+    """
+    parties = checked_parties(parties_checked)
+    listed = {normalize_party_name(name) for name, _ in parties}
+    for name in client_names(case.client):
+        if normalize_party_name(name) not in listed:
+            parties.append((name, 'CLIENT'))
+
+    from .screening import schedule_rescreening
+
+    with transaction.atomic():
+        results = find_conflicts(case, parties, threshold)
+        schedule_rescreening(register_checked_parties(case, parties), skip_case_id=case.pk)
+    return results
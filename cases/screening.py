@@ -0,0 +1,201 @@
+"""
+Incremental conflict re-screening of the party registry.
+
+A conflict check screens a case when someone opens one, so a client
+onboarded later who is adverse to an open matter would go unnoticed.
+Instead, whenever names are added to the party registry (a new or renamed
+client or contact, a new opposing counsel, parties named in a conflict
+check or added by hand), only those names are matched against the
+registry (see cases.parties.match_names). A match involving a client or
+client contact is a potential conflict: every open case on either side
+of it gets an automated ConflictCheck listing the potential conflicts,
+assigned to the case's attorney for review, unless an unresolved check
+of that case already flags the same pair of parties. Matches between
+other parties, such as the opposing parties of two matters, are not
+flagged. The cost follows the number of new names, not the size of the
+firm.
+
+Re-screening runs once the saving transaction commits, in-process by
+default or through Celery where a broker is configured
+(CONFLICT_RESCREEN_ON_SAVE).
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from core.fields import decrypt_fields
+from .models import Case, ConflictCheck, Party
+from .parties import MATCH_THRESHOLD, conflict_entry, match_names
+
+logger = logging.getLogger(__name__)
+
+# 'sync', 'async' (Celery, needs a broker) or 'off'
+RESCREEN_ON_SAVE = getattr(settings, 'CONFLICT_RESCREEN_ON_SAVE', 'sync')
+
+# Statuses of cases that are no longer screened, as in Case.is_active
+CLOSED_STATUSES = ('CLOSED', 'ARCHIVED')
+
+# Registry roles of the firm's own clients; a conflict needs one on either side
+CLIENT_ROLES = ('CLIENT', 'CLIENT_CONTACT')
+
+# Resolutions of conflict checks still awaiting review
+UNRESOLVED_STATUSES = ('POTENTIAL_CONFLICT', 'CONFLICT_UNRESOLVED')
+
+
+def schedule_rescreening(parties: Iterable[Party], skip_case_id: Optional[int] = None) -> None:
+    """
+    Re-screen new registry entries once the current transaction commits.
+
+    Args:
+        parties: Saved registry entries to re-screen
+        skip_case_id: Case not to create a check for, e.g. the one just checked
+    """
+    party_ids = [party.pk for party in parties]
+    if not party_ids or RESCREEN_ON_SAVE == 'off':
+        return
+    transaction.on_commit(lambda: _dispatch(party_ids, skip_case_id))
+
+
+def _dispatch(party_ids: List[int], skip_case_id: Optional[int]) -> None:
+    try:
+        if RESCREEN_ON_SAVE == 'async':
+            from .tasks import rescreen_parties as rescreen_parties_task
+            rescreen_parties_task.delay(party_ids, skip_case_id)
+        else:
+            rescreen_parties(party_ids, skip_case_id)
+    except Exception as e:
+        # Never fail a save because of re-screening
+        logger.error(f"Error re-screening parties {party_ids}: {str(e)}")
+
+
+def _client_id(party: Party) -> Optional[int]:
+    return party.client_id or (party.case.client_id if party.case_id else None)
+
+
+def _pair_key(party: Party, other: Party) -> Tuple[int, int]:
+    return tuple(sorted((party.pk, other.pk)))
+
+
+def flagged_pairs(case_ids: Iterable[int]) -> Dict[int, Set[Tuple[int, int]]]:
+    """
+    Party pairs already flagged by unresolved re-screening checks.
+
+    Args:
+        case_ids: Cases to look at
+
+    Returns:
+        Dictionary mapping case IDs to (party ID, party ID) pairs, lower ID first
+    """
+    flagged: Dict[int, Set[Tuple[int, int]]] = {}
+    checks = ConflictCheck.objects.filter(
+        case_id__in=list(case_ids), check_source='AUTOMATED', resolution_status__in=UNRESOLVED_STATUSES,
+    ).values_list('case_id', 'conflict_details')
+    for case_id, conflict_details in checks:
+        details = (conflict_details or {}).get('details') or {}
+        for pair in details.get('party_pairs', []):
+            flagged.setdefault(case_id, set()).add(tuple(pair))
+    return flagged
+
+
+def rescreen_parties(party_ids: List[int], skip_case_id: Optional[int] = None) -> List[ConflictCheck]:
+    """
+    Match new registry entries against the registry and flag the open cases involved.
+
+    Only matches involving a client or client contact are conflicts, and
+    not between parties of the same client or case. For a match between a
+    new party and a registered one, the open cases of each side (the
+    party's case, or every case of its client) get the other side as a
+    potential conflict, unless an unresolved check of the case already
+    flags that pair. One automated ConflictCheck is created per affected
+    case, recording the pairs it flags.
+
+    Args:
+        party_ids: IDs of the new registry entries
+        skip_case_id: Case not to create a check for
+
+    Returns:
+        The conflict checks created
+    """
+    new_parties = list(Party.objects.filter(pk__in=party_ids).select_related('case'))
+    if not new_parties:
+        return []
+    decrypt_fields(new_parties, ['name'])
+    matches = match_names([party.name for party in new_parties])
+
+    # Pairs of matching parties, each with the match as seen from the first
+    pairs: Dict[Tuple[int, int], Tuple[Party, Party, dict]] = {}
+    for party in new_parties:
+        for other, explanation in matches.get(party.name, []):
+            if other.pk == party.pk or _pair_key(party, other) in pairs:
+                continue
+            if party.role not in CLIENT_ROLES and other.role not in CLIENT_ROLES:
+                continue
+            if party.case_id and party.case_id == other.case_id:
+                continue
+            client_id = _client_id(party)
+            if client_id and client_id == _client_id(other):
+                continue
+            pairs[_pair_key(party, other)] = (party, other, explanation)
+    if not pairs:
+        return []
+
+    # Open cases of every client involved, in one query
+    client_ids = {party.client_id for pair in pairs.values() for party in pair[:2] if party.client_id}
+    client_cases: Dict[int, List[Case]] = {}
+    for case in Case.objects.filter(client_id__in=client_ids).order_by('-open_date'):
+        client_cases.setdefault(case.client_id, []).append(case)
+
+    def cases_of(party: Party) -> List[Case]:
+        return [party.case] if party.case_id else client_cases.get(party.client_id, [])
+
+    flagged = flagged_pairs({case.pk for pair in pairs.values() for party in pair[:2] for case in cases_of(party)})
+
+    # Potential conflicts of each affected case, its parties that were checked and the pairs flagged
+    affected: Dict[int, Tuple[Case, List[dict], Set[Tuple[str, str]], Set[Tuple[int, int]]]] = {}
+    for key, (party, other, explanation) in pairs.items():
+        reverse = dict(explanation, matched_name=party.name)
+        for own, conflicting, match in ((party, other, explanation), (other, party, reverse)):
+            for case in cases_of(own):
+                if case.pk == skip_case_id or case.status in CLOSED_STATUSES:
+                    continue
+                if key in flagged.get(case.pk, ()):
+                    continue
+                _, conflicts, checked, case_pairs = affected.setdefault(case.pk, (case, [], set(), set()))
+                checked.add((own.name, own.role))
+                case_pairs.add(key)
+                conflicts.extend(
+                    conflict_entry(own.name, own.role, conflicting, match, other_case)
+                    for other_case in cases_of(conflicting) or [None]
+                )
+
+    checks = []
+    for case, conflicts, checked, case_pairs in affected.values():
+        checked_by_id = case.assigned_attorney_id or case.created_by_id
+        if checked_by_id is None:
+            logger.warning(f"Potential conflicts found for case {case.pk}, which has no attorney to review them")
+            continue
+        checks.append(ConflictCheck(
+            case=case,
+            checked_by_id=checked_by_id,
+            check_source='AUTOMATED',
+            parties_checked=[{'name': name, 'type': role} for name, role in sorted(checked)],
+            conflicts_found=True,
+            conflict_details={
+                'conflicts_found': True,
+                'potential_conflicts': conflicts,
+                'details': {
+                    'rescreening': True,
+                    'new_parties': sorted(party_ids),
+                    'party_pairs': sorted(case_pairs),
+                    'threshold': MATCH_THRESHOLD,
+                },
+            },
+            resolution_status='POTENTIAL_CONFLICT',
+        ))
+    checks = ConflictCheck.objects.bulk_create(checks)
+    if checks:
+        logger.info(f"Re-screening parties {party_ids} flagged {len(checks)} open cases")
+    return checks
@@ -0,0 +1,90 @@
+"""
+Signal handlers keeping the conflict-check party registry in step with
+clients, client contacts and cases (see cases.parties).
+
+Saves that can't have changed a registered name (an update_fields
+without any name field) are skipped; deleted clients, contacts and cases
+take their registry entries with them through the foreign keys. Names
+new to the registry, including parties added by hand, are re-screened
+against the open cases (see cases.screening).
+"""
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from clients.models import Client, ClientContact
+from .models import Case, Party
+from .parties import sync_case_parties, sync_client_parties, sync_contact_parties
+from .screening import schedule_rescreening
+
+CLIENT_NAME_FIELDS = {'client_type', 'first_name', 'last_name', 'company_name'}
+CONTACT_NAME_FIELDS = {'client', 'first_name', 'last_name'}
+CASE_PARTY_FIELDS = {'opposing_counsel'}
+
+
+def _names_saved(update_fields, name_fields) -> bool:
+    return update_fields is None or bool(name_fields & set(update_fields))
+
+
+@receiver(post_save, sender=Client)
+def handle_client_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Register the names of a saved client and re-screen new ones.
+
+    Args:
+        sender: The model class (Client)
+        instance: The Client instance that was saved
+        raw: True when loading fixtures
+        update_fields: Fields saved, or None for all
+    """
+    if raw or not _names_saved(update_fields, CLIENT_NAME_FIELDS):
+        return
+    schedule_rescreening(sync_client_parties(instance))
+
+
+@receiver(post_save, sender=ClientContact)
+def handle_contact_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Register the name of a saved client contact and re-screen it if new.
+
+    Args:
+        sender: The model class (ClientContact)
+        instance: The ClientContact instance that was saved
+        raw: True when loading fixtures
+        update_fields: Fields saved, or None for all
+    """
+    if raw or not _names_saved(update_fields, CONTACT_NAME_FIELDS):
+        return
+    schedule_rescreening(sync_contact_parties(instance))
+
+
+@receiver(post_save, sender=Case)
+def handle_case_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Register the opposing counsel of a saved case and re-screen it if new.
+
+    Args:
+        sender: The model class (Case)
+        instance: The Case instance that was saved
+        raw: True when loading fixtures
+        update_fields: Fields saved, or None for all
+    """
+    if raw or not _names_saved(update_fields, CASE_PARTY_FIELDS):
+        return
+    schedule_rescreening(sync_case_parties(instance))
+
+
+@receiver(post_save, sender=Party)
+def handle_party_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Re-screen a party saved on its own, e.g. added in the admin.
+
+    Args:
+        sender: The model class (Party)
+        instance: The Party instance that was saved
+        raw: True when loading fixtures
+        update_fields: Fields saved, or None for all
+    """
+    if raw or not _names_saved(update_fields, {'name'}):
+        return
+    schedule_rescreening([instance])
@@ -0,0 +1,24 @@
+import logging
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def rescreen_parties(party_ids, skip_case_id=None):
+    """
+    Screen new party registry entries against the open cases.
+
+    Args:
+        party_ids: IDs of the new Party entries
+        skip_case_id: Optional ID of a case not to create a check for
+
+    Returns:
+        Number of conflict checks created
+    """
+    from .screening import rescreen_parties as rescreen
+
+    try:
+        return len(rescreen(party_ids, skip_case_id))
+    except Exception as e:
+        logger.error(f"Error re-screening parties {party_ids}: {str(e)}", exc_info=True)
+        return 0
@@ -56,7 +56,7 @@ def conflict_check_create(request, case_id):
         form = ConflictCheckForm(initial={
             'check_source': 'AUTOMATED',
             'parties_checked': [
-                {'name': case.client.get_full_name(), 'type': 'CLIENT'},
+                {'name': case.client.get_display_name(), 'type': 'CLIENT'},
             ]
         })
     
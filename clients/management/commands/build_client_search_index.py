@@ -0,0 +1,76 @@
+"""
+Management command to build the blind indexes of encrypted client fields.
+
+Client.save keeps the indexes of the fields it changes up to date; this
+command (re)builds them for every client, e.g. after deploying blind
+indexes, after changing BLIND_INDEX_KEY or the indexed fields, or after
+rows were written with queryset.update(). Clients are processed in
+primary-key order with keyset pagination, each batch decrypted together,
+locked and rewritten in its own transaction, so the command can be
+interrupted and rerun at any time.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from clients.models import Client, ClientSearchToken
+from clients.search import BLIND_INDEXED_FIELDS, build_search_tokens, index_column, update_blind_indexes
+from core.fields import decrypt_fields
+
+
+class Command(BaseCommand):
+    help = 'Build the blind indexes used to search encrypted client fields'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Clients indexed per transaction (default: 500)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.0,
+            help='Seconds to pause after each batch, to limit load (default: 0)',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        field_names = list(BLIND_INDEXED_FIELDS)
+        columns = [index_column(name) for name in field_names]
+        queryset = Client.objects.order_by('pk').only('pk', *field_names, *columns)
+        indexed = 0
+
+        last_pk = None
+        while True:
+            with transaction.atomic():
+                batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+                clients = list(batch.select_for_update()[:options['batch_size']])
+                if not clients:
+                    break
+                last_pk = clients[-1].pk
+
+                decrypt_fields(clients, field_names)
+                for client in clients:
+                    # Recompute every index, not only the changed ones
+                    for column in columns:
+                        setattr(client, column, None)
+                    update_blind_indexes(client)
+
+                Client.objects.bulk_update(clients, columns)
+                ClientSearchToken.objects.filter(client__in=clients).delete()
+                ClientSearchToken.objects.bulk_create(
+                    [token for client in clients for token in build_search_tokens(client, field_names)],
+                    batch_size=1000,
+                )
+            indexed += len(clients)
+            self.stdout.write(f'Indexed {indexed} clients')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Built search indexes for {indexed} clients'))
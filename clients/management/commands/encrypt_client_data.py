@@ -2,121 +2,64 @@
 Management command to encrypt client data.
 
 This command encrypts sensitive client data for privacy and security.
+Values of the encrypted client and contact fields still stored as
+plaintext are encrypted, and values encrypted with a retired key are
+re-encrypted with the current one, in resumable batches (see
+core.utils.key_rotation).
 """
 
-import uuid
-import base64
-from django.core.management.base import BaseCommand
-from django.conf import settings
-from cryptography.fernet import Fernet
+import os
+
+from django.core.management.base import BaseCommand, CommandError
 from clients.models import Client, ClientContact
-from core.utils.encryption import encrypt_text
+from core.utils.key_rotation import KeyRotation
 
 
 class Command(BaseCommand):
     help = 'Encrypts sensitive client data'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows per batch and transaction (default: 500)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=min(os.cpu_count() or 1, 4),
+            help='Worker processes for the crypto (default: CPU count, at most 4)',
+        )
+        parser.add_argument(
+            '--rows-per-second',
+            type=float,
+            default=None,
+            help='Throughput cap (default: KEY_ROTATION_ROWS_PER_SECOND, 0 for none)',
+        )
+
     def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
         self.stdout.write(self.style.NOTICE('Starting client data encryption...'))
-        
-        # Process all clients
-        clients_count = 0
-        for client in Client.objects.all():
-            # Generate salt if needed
-            if not client.encryption_salt:
-                client.encryption_salt = uuid.uuid4().bytes
-                
-            # Skip already encrypted data
-            if self._is_encrypted(client.first_name):
-                self.stdout.write(f'Client {client.id} already encrypted, skipping')
-                continue
-                
-            # Encrypt individual client fields
-            if client.first_name:
-                client.first_name = encrypt_text(client.first_name)
-            if client.last_name:
-                client.last_name = encrypt_text(client.last_name)
-            if client.ssn_last_four:
-                client.ssn_last_four = encrypt_text(client.ssn_last_four)
-            
-            # Encrypt organization fields
-            if client.company_name:
-                client.company_name = encrypt_text(client.company_name)
-            if client.tax_id:
-                client.tax_id = encrypt_text(client.tax_id)
-            
-            # Encrypt contact information
-            if client.email:
-                client.email = encrypt_text(client.email)
-            if client.phone:
-                client.phone = encrypt_text(client.phone)
-            if client.mobile:
-                client.mobile = encrypt_text(client.mobile)
-            if client.address_line1:
-                client.address_line1 = encrypt_text(client.address_line1)
-            if client.address_line2:
-                client.address_line2 = encrypt_text(client.address_line2)
-            if client.city:
-                client.city = encrypt_text(client.city)
-            if client.state:
-                client.state = encrypt_text(client.state)
-            if client.postal_code:
-                client.postal_code = encrypt_text(client.postal_code)
-            if client.country:
-                client.country = encrypt_text(client.country)
-            if client.notes:
-                client.notes = encrypt_text(client.notes)
-            
-            # Save the client with encrypted data
-            client.save()
-            clients_count += 1
-            
-            if clients_count % 10 == 0:
-                self.stdout.write(f'Encrypted {clients_count} clients')
-        
-        # Process all client contacts
-        contacts_count = 0
-        for contact in ClientContact.objects.all():
-            # Generate salt if needed
-            if not contact.encryption_salt:
-                contact.encryption_salt = uuid.uuid4().bytes
-                
-            # Skip already encrypted data
-            if self._is_encrypted(contact.first_name):
-                self.stdout.write(f'Contact {contact.id} already encrypted, skipping')
-                continue
-            
-            # Encrypt contact fields
-            if contact.first_name:
-                contact.first_name = encrypt_text(contact.first_name)
-            if contact.last_name:
-                contact.last_name = encrypt_text(contact.last_name)
-            if contact.email:
-                contact.email = encrypt_text(contact.email)
-            if contact.phone:
-                contact.phone = encrypt_text(contact.phone)
-            if contact.mobile:
-                contact.mobile = encrypt_text(contact.mobile)
-            if contact.notes:
-                contact.notes = encrypt_text(contact.notes)
-            
-            # Save the contact with encrypted data
-            contact.save()
-            contacts_count += 1
-            
-            if contacts_count % 10 == 0:
-                self.stdout.write(f'Encrypted {contacts_count} contacts')
-        
-        self.stdout.write(self.style.SUCCESS(f'Successfully encrypted {clients_count} clients and {contacts_count} contacts'))
-    
-    def _is_encrypted(self, value):
-        """Check if a value is already encrypted."""
-        if not value or not isinstance(value, str):
-            return False
-            
-        # Try to decode as base64 to check if it's encrypted
-        try:
-            base64.b64decode(value)
-            return True
-        except:
-            return False
+
+        counts = {}
+        for model in (Client, ClientContact):
+            checkpoint = KeyRotation(
+                model,
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                rows_per_second=options['rows_per_second'],
+                stdout=self.stdout,
+            ).run()
+            counts[model] = checkpoint.rows_updated
+            if checkpoint.values_failed:
+                self.stdout.write(self.style.WARNING(
+                    f'{checkpoint.values_failed} {model._meta.verbose_name} values could not be decrypted '
+                    f'with any configured key'
+                ))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully encrypted {counts[Client]} clients and {counts[ClientContact]} contacts'
+        ))
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.7 on 2026-10-17 03:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0004_alter_client_address_line1_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='company_name_bidx',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='email_bidx',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='first_name_bidx',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='last_name_bidx',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=32),
+        ),
+        migrations.CreateModel(
+            name='ClientSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=50, verbose_name='Field')),
+                ('token', models.CharField(max_length=32, verbose_name='Token')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='clients.client')),
+            ],
+            options={
+                'verbose_name': 'Client Search Token',
+                'verbose_name_plural': 'Client Search Tokens',
+                'indexes': [models.Index(fields=['field', 'token'], name='clients_cli_field_08b1db_idx')],
+            },
+        ),
+    ]
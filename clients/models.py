@@ -1,5 +1,5 @@
 # clients/models.py
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from accounts.models import User  # Import the custom User model
 from core.fields import EncryptedCharField, EncryptedTextField
@@ -48,6 +48,12 @@ class Client(models.Model):
     created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
     updated_at = models.DateTimeField(_('Updated At'), auto_now=True)
 
+    # Blind indexes of encrypted fields, for exact search (see clients.search)
+    first_name_bidx = models.CharField(max_length=32, blank=True, editable=False, db_index=True)
+    last_name_bidx = models.CharField(max_length=32, blank=True, editable=False, db_index=True)
+    email_bidx = models.CharField(max_length=32, blank=True, editable=False, db_index=True)
+    company_name_bidx = models.CharField(max_length=32, blank=True, editable=False, db_index=True)
+
     def __str__(self):
         if self.client_type == 'INDIVIDUAL':
             if self.first_name or self.last_name:
@@ -66,6 +72,20 @@ class Client(models.Model):
         ]
         return "\n".join(filter(None, address_parts))
 
+    def save(self, *args, **kwargs):
+        # Keep the blind indexes of changed searchable fields up to date
+        from .search import index_column, update_blind_indexes, update_search_tokens
+
+        update_fields = kwargs.get('update_fields')
+        changed = update_blind_indexes(self, update_fields)
+        if update_fields is not None and changed:
+            kwargs['update_fields'] = set(update_fields) | {index_column(name) for name in changed}
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if changed:
+                update_search_tokens(self, changed)
+
     def get_display_name(self):
         """Return the appropriate display name based on client type."""
         if self.client_type == 'INDIVIDUAL':
@@ -78,6 +98,25 @@ class Client(models.Model):
         verbose_name_plural = _('Clients')
         ordering = ['last_name', 'first_name', 'company_name']
 
+class ClientSearchToken(models.Model):
+    """
+    Blind-index token of a word prefix or trigram of an encrypted client
+    field, for prefix and substring search (see clients.search).
+    """
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='search_tokens')
+    field = models.CharField(_('Field'), max_length=50)
+    token = models.CharField(_('Token'), max_length=32)
+
+    def __str__(self):
+        return f"{self.field} token of client #{self.client_id}"
+
+    class Meta:
+        verbose_name = _('Client Search Token')
+        verbose_name_plural = _('Client Search Tokens')
+        indexes = [
+            models.Index(fields=['field', 'token']),
+        ]
+
 class ClientContact(models.Model):
     """
     Additional contacts for organizational clients.
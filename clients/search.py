@@ -0,0 +1,188 @@
+"""
+Search over encrypted client fields through blind indexes.
+
+The fields in BLIND_INDEXED_FIELDS keep an exact blind index in a
+``<field>_bidx`` column of Client, and their word prefixes and trigrams as
+ClientSearchToken rows (see core.utils.blind_index). Client.save keeps both
+up to date for the fields whose value changed; rows written with
+queryset.update() or bulk_update() are indexed by the
+build_client_search_index command.
+
+A search term is matched per field in one of three modes:
+
+    exact       the whole value equals the term
+    prefix      every word of the term starts a word of the value
+    contains    every word of the term occurs inside a word of the value
+
+Exact and prefix searches are indexed lookups. Contains searches select
+candidates by trigram tokens and decrypt only the candidates to drop
+false positives; words shorter than three characters can't be looked up
+by trigram and fall back to prefix matching.
+"""
+
+import operator
+from functools import reduce
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from django.db.models import Count, Q
+
+from core.fields import Ciphertext
+from core.utils.blind_index import (
+    EXACT, PREFIX, PREFIX_MAX_LENGTH, PREFIX_MIN_LENGTH, TRIGRAM,
+    blind_index, exact_index, normalize, search_tokens, trigrams, words,
+)
+from .models import Client, ClientSearchToken
+
+CONTAINS = 'contains'
+
+# Encrypted fields that can be searched, with the tokens kept for each
+BLIND_INDEXED_FIELDS = {
+    'first_name': (PREFIX, TRIGRAM),
+    'last_name': (PREFIX, TRIGRAM),
+    'email': (PREFIX,),
+    'company_name': (PREFIX, TRIGRAM),
+}
+
+
+def index_column(field_name: str) -> str:
+    """Name of the column holding the exact blind index of a field."""
+    return f'{field_name}_bidx'
+
+
+def _domain(field_name: str) -> str:
+    return f'{Client._meta.label}.{field_name}'
+
+
+def update_blind_indexes(client: Client, field_names: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    Recompute the exact blind indexes of a client's searchable fields.
+
+    Values loaded from the database and never read are unchanged and are
+    skipped without decrypting them.
+
+    Args:
+        client: Client about to be saved
+        field_names: Fields to consider, defaults to all indexed fields
+
+    Returns:
+        Names of the fields whose index changed
+    """
+    if field_names is None:
+        field_names = BLIND_INDEXED_FIELDS
+    changed = []
+    for name in field_names:
+        if name not in BLIND_INDEXED_FIELDS or name not in client.__dict__:
+            continue
+        if isinstance(client.__dict__[name], Ciphertext):
+            continue
+        index = exact_index(_domain(name), getattr(client, name))
+        if index != getattr(client, index_column(name)):
+            setattr(client, index_column(name), index)
+            changed.append(name)
+    return changed
+
+
+def build_search_tokens(client: Client, field_names: Iterable[str]) -> List[ClientSearchToken]:
+    """
+    Unsaved prefix and trigram tokens of a client's fields.
+
+    Args:
+        client: Saved client
+        field_names: Indexed fields to tokenize
+
+    Returns:
+        List of ClientSearchToken
+    """
+    tokens = []
+    for name in field_names:
+        for token in search_tokens(_domain(name), getattr(client, name), BLIND_INDEXED_FIELDS[name]):
+            tokens.append(ClientSearchToken(client_id=client.pk, field=name, token=token))
+    return tokens
+
+
+def update_search_tokens(client: Client, field_names: Iterable[str]):
+    """
+    Replace the stored tokens of some of a client's fields.
+
+    Args:
+        client: Saved client
+        field_names: Indexed fields whose value changed
+    """
+    field_names = list(field_names)
+    ClientSearchToken.objects.filter(client=client, field__in=field_names).delete()
+    ClientSearchToken.objects.bulk_create(build_search_tokens(client, field_names))
+
+
+def _matching_tokens(field_name: str, tokens: set):
+    """Subquery of the ids of clients having every token for a field."""
+    queryset = ClientSearchToken.objects.filter(field=field_name, token__in=tokens)
+    if len(tokens) > 1:
+        queryset = queryset.values('client_id').annotate(
+            matched=Count('token', distinct=True)
+        ).filter(matched=len(tokens))
+    return queryset.values('client_id')
+
+
+def _verified(field_name: str, candidates, predicate: Callable[[List[str]], bool]) -> Q:
+    """Decrypt the candidates' field and keep the clients the predicate accepts."""
+    rows = Client.objects.filter(pk__in=candidates).values_list('pk', field_name)
+    return Q(pk__in=[pk for pk, value in rows if value and predicate(words(normalize(str(value))))])
+
+
+def _prefix_q(field_name: str, term_words: List[str]) -> Q:
+    searchable = [word for word in term_words if len(word) >= PREFIX_MIN_LENGTH]
+    if not searchable:
+        return Q(pk__in=[])
+    domain = _domain(field_name)
+    tokens = {blind_index(domain, PREFIX, word[:PREFIX_MAX_LENGTH]) for word in searchable}
+    candidates = _matching_tokens(field_name, tokens)
+    if searchable == term_words and all(len(word) <= PREFIX_MAX_LENGTH for word in searchable):
+        # The tokens are exactly the prefixes searched for
+        return Q(pk__in=candidates)
+    return _verified(field_name, candidates, lambda value_words: all(
+        any(value_word.startswith(word) for value_word in value_words) for word in term_words
+    ))
+
+
+def _contains_q(field_name: str, term_words: List[str]) -> Q:
+    grams = set().union(*(trigrams(word) for word in term_words))
+    if not grams:
+        if PREFIX in BLIND_INDEXED_FIELDS[field_name]:
+            return _prefix_q(field_name, term_words)
+        return Q(pk__in=[])
+    domain = _domain(field_name)
+    candidates = _matching_tokens(field_name, {blind_index(domain, TRIGRAM, gram) for gram in grams})
+    return _verified(field_name, candidates, lambda value_words: all(
+        any(word in value_word for value_word in value_words) for word in term_words
+    ))
+
+
+def client_search_q(term: str, fields: Iterable[Tuple[str, str]]) -> Q:
+    """
+    Filter matching clients with a search term in any of the given fields.
+
+    Args:
+        term: Search term as typed
+        fields: Pairs of (indexed field name, EXACT, PREFIX or CONTAINS)
+
+    Returns:
+        Q object for Client querysets
+    """
+    normalized = normalize(term)
+    term_words = words(normalized)
+    conditions = []
+    for name, mode in fields:
+        if name not in BLIND_INDEXED_FIELDS:
+            raise ValueError(f"Client.{name} has no blind index")
+        if not term_words:
+            continue
+        kinds = BLIND_INDEXED_FIELDS[name]
+        if mode == EXACT:
+            conditions.append(Q(**{index_column(name): exact_index(_domain(name), normalized)}))
+        elif mode == PREFIX or (mode == CONTAINS and TRIGRAM not in kinds):
+            conditions.append(_prefix_q(name, term_words))
+        else:
+            conditions.append(_contains_q(name, term_words))
+    if not conditions:
+        return Q(pk__in=[])
+    return reduce(operator.or_, conditions)
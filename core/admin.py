@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import AuditLog, SystemSetting
+from .models import AuditLog, KeyRotationCheckpoint, SystemSetting
 
 @admin.register(AuditLog)
 class AuditLogAdmin(admin.ModelAdmin):
@@ -33,3 +33,19 @@ class SystemSettingAdmin(admin.ModelAdmin):
             'fields': ('description', 'category', 'is_public')
         }),
     )
+
+
+@admin.register(KeyRotationCheckpoint)
+class KeyRotationCheckpointAdmin(admin.ModelAdmin):
+    """Admin interface for KeyRotationCheckpoint model."""
+    list_display = ('model_label', 'key_fingerprint', 'rows_scanned', 'rows_updated',
+                    'values_failed', 'updated_at', 'completed_at')
+    list_filter = ('model_label',)
+
+    def has_add_permission(self, request):
+        """Checkpoints are written by rotate_encryption_keys."""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        """Checkpoints are written by rotate_encryption_keys."""
+        return False
@@ -5,12 +5,23 @@ This module provides custom Django model fields, including fields for
 encrypted data storage.
 """
 
+import base64
 import os
+import tempfile
 import uuid
+from typing import Iterable, Optional
+from django.conf import settings
 from django.db import models
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
-from .utils.encryption import encrypt_file, decrypt_file, encrypt_text, decrypt_text
+from django.db.models.query_utils import DeferredAttribute
+from django.core.files import File
+from .utils.encryption import COMPACT_PREFIX, encrypt_text, decrypt_text, decrypt_many
+from .utils.file_encryption import encrypt_stream, FRAME_SIZE
+
+# Encrypted uploads up to this size are buffered in memory, larger ones on disk
+SPOOL_MAX_SIZE = 16 * FRAME_SIZE
+
+# Keep loaded ciphertext and decrypt each column on first access
+LAZY_DECRYPTION = getattr(settings, 'ENCRYPTED_FIELDS_LAZY_DECRYPTION', True)
 
 class EncryptedFileField(models.FileField):
     """
@@ -25,35 +36,25 @@ class EncryptedFileField(models.FileField):
 
     def pre_save(self, model_instance, add):
         """
-        Process the file before saving to encrypt its contents.
+        Encrypt a newly assigned file into storage before saving.
+
+        The upload is streamed through encrypt_stream into a spooled
+        temporary file, so memory use doesn't grow with the file size and
+        the plaintext never reaches storage.
         """
-        file = super().pre_save(model_instance, add)
-        if file and not getattr(file, '_encrypted', False):
+        file = getattr(model_instance, self.attname)
+        if file and not file._committed:
             # Get or generate salt
-            if self.salt_field:
-                salt = getattr(model_instance, self.salt_field)
-                if not salt:
-                    salt = uuid.uuid4().bytes
-                    setattr(model_instance, self.salt_field, salt)
-            else:
-                salt = None
-
-            # Read file content
-            file_content = file.read()
-            file.seek(0)
-
-            # Encrypt content
-            encrypted_content = encrypt_file(file_content, salt)
-
-            # Create a new file with encrypted content
-            encrypted_file_name = f"{os.path.splitext(file.name)[0]}.enc"
-            encrypted_file = ContentFile(encrypted_content)
-            encrypted_file.name = encrypted_file_name
-            encrypted_file._encrypted = True
-
-            # Replace the original file with the encrypted one
-            setattr(model_instance, self.attname, encrypted_file)
-            return encrypted_file
+            if self.salt_field and not getattr(model_instance, self.salt_field):
+                setattr(model_instance, self.salt_field, uuid.uuid4().bytes)
+
+            encrypted_file_name = f"{os.path.splitext(os.path.basename(file.name))[0]}.enc"
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as encrypted:
+                source = file.file
+                source.seek(0)
+                encrypt_stream(source, encrypted)
+                encrypted.seek(0)
+                file.save(encrypted_file_name, File(encrypted), save=False)
         return file
 
     def generate_filename(self, instance, filename):
@@ -75,75 +76,83 @@ class EncryptedFileField(models.FileField):
         return name, path, args, kwargs
 
 
-class EncryptedTextField(models.TextField):
+class Ciphertext:
     """
-    A TextField that stores its content encrypted.
+    A loaded encrypted column value that has not been decrypted yet.
 
-    This field ensures that sensitive text data is stored encrypted at rest.
+    Model attributes of encrypted fields decrypt it on first access (see
+    EncryptedAttribute). values() and values_list() return it as is;
+    str() decrypts it.
     """
+    __slots__ = ('token', '_plaintext')
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def __init__(self, token: str):
+        self.token = token
+        self._plaintext = None
 
-    def get_prep_value(self, value):
-        """
-        Prepare the value for database storage by encrypting it.
-        """
-        if value is None or value == '':
-            return value
+    def decrypt(self) -> str:
+        """Return the plaintext, decrypting on first use."""
+        if self._plaintext is None:
+            try:
+                self._plaintext = decrypt_text(self.token)
+            except Exception:
+                # Data that hasn't been encrypted yet
+                self._plaintext = self.token
+        return self._plaintext
 
-        # Encrypt the value using the global encryption key
-        return encrypt_text(value)
+    def __str__(self):
+        return self.decrypt()
 
-    def from_db_value(self, value, expression, connection):
-        """
-        Convert the database value to a Python value.
-        """
-        if value is None or value == '':
-            return value
+    def __repr__(self):
+        return '<Ciphertext>'
 
-        # Decrypt the value using the global encryption key
-        try:
-            return decrypt_text(value)
-        except Exception as e:
-            # If decryption fails, return the original value
-            # This handles the case where data hasn't been encrypted yet
-            return value
+    def __eq__(self, other):
+        if isinstance(other, Ciphertext):
+            other = other.decrypt()
+        return self.decrypt() == other
 
-    def to_python(self, value):
-        """
-        Convert the value to a Python object.
-        """
-        if value is None or not isinstance(value, str) or value == '':
-            return value
+    def __hash__(self):
+        return hash(self.decrypt())
 
-        # If the value is already decrypted, return it
-        try:
-            # Try to decode as base64 to check if it's encrypted
-            import base64
-            base64.b64decode(value)
 
-            # If we get here, it might be encrypted, try to decrypt
-            try:
-                decrypted = decrypt_text(value)
-                return decrypted
-            except:
-                # If decryption fails, assume it's already decrypted
-                return value
-        except:
-            # If it's not base64, it's not encrypted
-            return value
+class EncryptedAttribute(DeferredAttribute):
+    """
+    Attribute of an encrypted field that decrypts the loaded ciphertext on
+    first access and keeps the plaintext on the instance.
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, Ciphertext):
+            value = value.decrypt()
+            instance.__dict__[self.field.attname] = value
+        return value
 
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
 
-class EncryptedCharField(models.CharField):
+
+class EncryptedFieldMixin:
     """
-    A CharField that stores its content encrypted.
+    Encryption of text columns shared by EncryptedTextField and EncryptedCharField.
 
-    This field ensures that sensitive character data is stored encrypted at rest.
+    With ENCRYPTED_FIELDS_LAZY_DECRYPTION (the default), loading a row keeps
+    each value as Ciphertext and only the columns that are actually read
+    are decrypted, so list pages showing a name don't pay for every
+    encrypted column. Values that were never read are saved back as the
+    same ciphertext instead of being encrypted again.
     """
+    descriptor_class = EncryptedAttribute
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def pre_save(self, model_instance, add):
+        """
+        Return the value to save, without decrypting an unread value.
+        """
+        if self.attname in model_instance.__dict__:
+            return model_instance.__dict__[self.attname]
+        return super().pre_save(model_instance, add)
 
     def get_prep_value(self, value):
         """
@@ -152,6 +161,10 @@ class EncryptedCharField(models.CharField):
         if value is None or value == '':
             return value
 
+        if isinstance(value, Ciphertext):
+            # Loaded and never read: store the same ciphertext again
+            return value.token
+
         # Encrypt the value using the global encryption key
         return encrypt_text(value)
 
@@ -162,6 +175,9 @@ class EncryptedCharField(models.CharField):
         if value is None or value == '':
             return value
 
+        if LAZY_DECRYPTION:
+            return Ciphertext(value)
+
         # Decrypt the value using the global encryption key
         try:
             return decrypt_text(value)
@@ -174,13 +190,21 @@ class EncryptedCharField(models.CharField):
         """
         Convert the value to a Python object.
         """
+        if isinstance(value, Ciphertext):
+            return value.decrypt()
+
         if value is None or not isinstance(value, str) or value == '':
             return value
 
+        if value.startswith(COMPACT_PREFIX):
+            try:
+                return decrypt_text(value)
+            except Exception:
+                return value
+
         # If the value is already decrypted, return it
         try:
             # Try to decode as base64 to check if it's encrypted
-            import base64
             base64.b64decode(value)
 
             # If we get here, it might be encrypted, try to decrypt
@@ -193,3 +217,53 @@ class EncryptedCharField(models.CharField):
         except:
             # If it's not base64, it's not encrypted
             return value
+
+
+class EncryptedTextField(EncryptedFieldMixin, models.TextField):
+    """
+    A TextField that stores its content encrypted.
+
+    This field ensures that sensitive text data is stored encrypted at rest.
+    """
+
+
+class EncryptedCharField(EncryptedFieldMixin, models.CharField):
+    """
+    A CharField that stores its content encrypted.
+
+    This field ensures that sensitive character data is stored encrypted at rest.
+    """
+
+
+def decrypt_fields(instances: Iterable[models.Model], field_names: Optional[Iterable[str]] = None) -> None:
+    """
+    Decrypt the loaded encrypted columns of many instances in one batch.
+
+    Useful before rendering many rows that read most of their encrypted
+    fields; the plaintexts are memoized on the instances.
+
+    Args:
+        instances: Model instances of one model
+        field_names: Encrypted fields to decrypt (default: all of them)
+    """
+    instances = list(instances)
+    if not instances:
+        return
+    if field_names is not None:
+        field_names = set(field_names)
+    fields = [
+        field for field in instances[0]._meta.concrete_fields
+        if isinstance(field, EncryptedFieldMixin)
+        and (field_names is None or field.name in field_names)
+    ]
+
+    pending = []
+    for instance in instances:
+        for field in fields:
+            value = instance.__dict__.get(field.attname)
+            if isinstance(value, Ciphertext):
+                pending.append((instance, field.attname, value.token))
+
+    plaintexts = decrypt_many(token for _, _, token in pending)
+    for (instance, attname, _), plaintext in zip(pending, plaintexts):
+        instance.__dict__[attname] = plaintext
@@ -0,0 +1,144 @@
+"""
+Management command to benchmark loading rows with encrypted fields.
+
+Builds synthetic rows of a model with encrypted columns (Client by
+default), then times turning them into model instances the way a
+queryset does and reading them like a list page (the display name only)
+and like a detail page or export (every encrypted field). Eager
+decryption on load is compared with lazy decryption on access and with
+batch decryption through decrypt_fields.
+
+The rows are encrypted with a throwaway key; no database or real data is
+touched.
+"""
+
+import random
+import string
+import time
+
+from cryptography.fernet import Fernet
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.test.utils import override_settings
+
+from core import fields as encrypted_fields
+from core.fields import EncryptedFieldMixin, decrypt_fields
+from core.utils import encryption
+
+
+class Command(BaseCommand):
+    help = 'Benchmark eager, lazy and batch decryption of encrypted model fields'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            default='clients.Client',
+            help='Model with encrypted fields (default: clients.Client)',
+        )
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=1000,
+            help='Rows per page load (default: 1000)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Timed repetitions; the best is reported (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options['model'])
+        except (LookupError, ValueError):
+            raise CommandError(f"Unknown model {options['model']}")
+        encrypted = [field for field in model._meta.concrete_fields if isinstance(field, EncryptedFieldMixin)]
+        if not encrypted:
+            raise CommandError(f'{model._meta.label} has no encrypted fields')
+
+        with override_settings(ENCRYPTION_KEY=Fernet.generate_key().decode()):
+            encryption.encryption_service = None
+            try:
+                self.run(model, encrypted, options)
+            finally:
+                encryption.encryption_service = None
+
+    def run(self, model, encrypted, options):
+        rows = options['rows']
+        field_names = [field.attname for field in model._meta.concrete_fields]
+        encrypted_names = {field.attname for field in encrypted}
+        rng = random.Random(0)
+
+        def sample(field):
+            if field.attname in encrypted_names:
+                return encryption.encrypt_text(''.join(rng.choices(string.ascii_letters, k=12)))
+            return field.get_default() if field.has_default() else None
+
+        raw_rows = [[sample(field) for field in model._meta.concrete_fields] for _ in range(rows)]
+        for i, row in enumerate(raw_rows):
+            row[field_names.index(model._meta.pk.attname)] = i + 1
+
+        def load():
+            # What the SQL compiler does: apply from_db_value, then build instances
+            instances = []
+            for row in raw_rows:
+                values = [
+                    field.from_db_value(value, None, connection) if field.attname in encrypted_names else value
+                    for field, value in zip(model._meta.concrete_fields, row)
+                ]
+                instances.append(model.from_db(DEFAULT_DB_ALIAS, field_names, values))
+            return instances
+
+        def list_page():
+            for instance in load():
+                str(instance)
+
+        def detail_page():
+            for instance in load():
+                for name in encrypted_names:
+                    getattr(instance, name)
+
+        def batch_detail_page():
+            instances = load()
+            decrypt_fields(instances)
+            for instance in instances:
+                for name in encrypted_names:
+                    getattr(instance, name)
+
+        self.stdout.write(
+            f'{model._meta.label}: {rows} rows, {len(encrypted)} encrypted fields per row'
+        )
+        results = {}
+        for label, lazy, page in (
+            ('list page, eager', False, list_page),
+            ('list page, lazy', True, list_page),
+            ('all fields, eager', False, detail_page),
+            ('all fields, lazy', True, detail_page),
+            ('all fields, decrypt_fields', True, batch_detail_page),
+        ):
+            results[label] = self.time(page, lazy, options['repeat'])
+            self.stdout.write(
+                f'  {label:28s} {results[label] * 1000:9.1f} ms  '
+                f'({results[label] / rows * 1e6:7.1f} us/row)'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"List page speedup from lazy decryption: "
+            f"{results['list page, eager'] / max(results['list page, lazy'], 1e-9):.1f}x"
+        ))
+
+    def time(self, page, lazy, repeat):
+        """Best wall time of page() over repeat runs with lazy decryption on or off."""
+        previous = encrypted_fields.LAZY_DECRYPTION
+        encrypted_fields.LAZY_DECRYPTION = lazy
+        try:
+            best = float('inf')
+            for _ in range(max(repeat, 1)):
+                started = time.perf_counter()
+                page()
+                best = min(best, time.perf_counter() - started)
+            return best
+        finally:
+            encrypted_fields.LAZY_DECRYPTION = previous
@@ -59,6 +59,14 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR('   ✗ ENCRYPTION_KEY not configured'))
         else:
             self.stdout.write(self.style.SUCCESS('   ✓ ENCRYPTION_KEY is configured'))
+        if not getattr(settings, 'BLIND_INDEX_KEY', None):
+            issues.append('BLIND_INDEX_KEY is not set')
+            self.stdout.write(self.style.ERROR('   ✗ BLIND_INDEX_KEY not configured (encrypted fields cannot be searched)'))
+        elif settings.BLIND_INDEX_KEY == settings.ENCRYPTION_KEY:
+            warnings.append('BLIND_INDEX_KEY equals ENCRYPTION_KEY')
+            self.stdout.write(self.style.WARNING('   ! BLIND_INDEX_KEY equals ENCRYPTION_KEY; keep it when rotating ENCRYPTION_KEY'))
+        else:
+            self.stdout.write(self.style.SUCCESS('   ✓ BLIND_INDEX_KEY is configured'))
         
         # Check HTTPS settings
         self.stdout.write('\n6. HTTPS Settings:')
@@ -0,0 +1,96 @@
+"""
+Management command to rewrite encrypted text columns in the compact format.
+
+Legacy values are a Fernet token base64-encoded a second time; the
+compact format stores the token itself behind a short prefix (see
+core.utils.encryption). The token is kept as is, so nothing is decrypted
+and no key is needed.
+
+Every model with encrypted text fields is walked in primary-key order with
+keyset pagination. Each batch is read with its rows locked and written
+with one executemany in its own transaction, so the command can run
+alongside the application, be interrupted and be rerun at any time;
+values that are already compact are left alone.
+"""
+
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.db.models import ExpressionWrapper, F
+
+from core.fields import EncryptedFieldMixin
+from core.utils.encryption import compact_encrypted_value
+from core.utils.key_rotation import write_stored_values
+
+
+class Command(BaseCommand):
+    help = 'Rewrite legacy encrypted text columns in the compact format'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows rewritten per transaction (default: 500)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.0,
+            help='Seconds to pause after each batch, to limit load (default: 0)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count legacy values without rewriting them',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        for model in apps.get_models():
+            fields = [field for field in model._meta.concrete_fields if isinstance(field, EncryptedFieldMixin)]
+            if fields:
+                self.compact_model(model, fields, options)
+
+    def compact_model(self, model, fields, options):
+        """Rewrite the legacy values of one model's encrypted fields."""
+        # Read the stored values without the fields' decryption
+        raw = {f'raw_{field.attname}': ExpressionWrapper(F(field.attname), output_field=models.TextField())
+               for field in fields}
+        queryset = model._default_manager.order_by('pk')
+        counts = {'rows': 0, 'values': 0}
+
+        last_pk = None
+        while True:
+            with transaction.atomic():
+                batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+                if not options['dry_run']:
+                    batch = batch.select_for_update()
+                rows = list(batch.values('pk', **raw)[:options['batch_size']])
+                if not rows:
+                    break
+                last_pk = rows[-1]['pk']
+
+                updates = []
+                for row in rows:
+                    stored = [row[f'raw_{field.attname}'] for field in fields]
+                    compact = [compact_encrypted_value(value) for value in stored]
+                    if any(compact):
+                        counts['values'] += sum(1 for value in compact if value)
+                        updates.append((row['pk'], [new or old for new, old in zip(compact, stored)]))
+
+                counts['rows'] += len(updates)
+                if not options['dry_run']:
+                    write_stored_values(model, fields, updates)
+
+            if updates and options['sleep'] and not options['dry_run']:
+                time.sleep(options['sleep'])
+
+        verb = 'would be rewritten' if options['dry_run'] else 'rewritten'
+        self.stdout.write(self.style.SUCCESS(
+            f"{model._meta.label}: {counts['values']} values in {counts['rows']} rows {verb}"
+        ))
@@ -0,0 +1,141 @@
+"""
+Management command to rewrite v1 encrypted files in the streaming v2 format.
+
+Every model field that is an EncryptedFileField is walked in primary-key
+order with keyset pagination. Files that already start with a v2 header
+are skipped after reading their first bytes, so the command can be
+interrupted and rerun at any time. With --rotate, v2 files encrypted with
+a retired key (see core.utils.keys) are rewritten with the current one
+too, which is checked by authenticating their first frame.
+
+Each converted file is written under a new name, the row is pointed at
+it, and the old blob is deleted once the update has committed.
+"""
+
+import tempfile
+import time
+
+from django.apps import apps
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.fields import EncryptedFileField, SPOOL_MAX_SIZE
+from core.utils.encryption import decrypt_file
+from core.utils.file_encryption import (
+    HEADER_SIZE, decrypt_stream, encrypt_stream, is_encrypted_v2, uses_current_key,
+)
+
+
+class Command(BaseCommand):
+    help = 'Rewrite files encrypted in the v1 format in the streaming v2 format'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Rows fetched per query (default: 100)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.0,
+            help='Seconds to pause after each converted file, to limit load (default: 0)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count files to rewrite without rewriting them',
+        )
+        parser.add_argument(
+            '--rotate',
+            action='store_true',
+            help='Also rewrite v2 files encrypted with a retired key',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        for model in apps.get_models():
+            for field in model._meta.get_fields():
+                if isinstance(field, EncryptedFileField):
+                    self.convert_field(model, field, options)
+
+    def convert_field(self, model, field, options):
+        """Convert the v1 (and, with --rotate, retired-key) files of one EncryptedFileField."""
+        label = f'{model._meta.label}.{field.name}'
+        queryset = model._default_manager.exclude(**{field.attname: ''}).exclude(
+            **{f'{field.attname}__isnull': True}
+        ).order_by('pk')
+        counts = {'checked': 0, 'converted': 0, 'failed': 0}
+
+        last_pk = None
+        while True:
+            batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            rows = list(batch.values_list('pk', field.attname)[:options['batch_size']])
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+
+            for pk, name in rows:
+                counts['checked'] += 1
+                try:
+                    if self.needs_rewrite(field.storage, name, options['rotate']):
+                        if not options['dry_run']:
+                            self.convert_file(model, field, pk, name)
+                            if options['sleep']:
+                                time.sleep(options['sleep'])
+                        counts['converted'] += 1
+                except Exception as e:
+                    counts['failed'] += 1
+                    self.stderr.write(f'Error converting {label} {pk} ({name}): {str(e)}')
+
+        verb = 'would be converted' if options['dry_run'] else 'converted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{label}: {counts['checked']} files checked, {counts['converted']} {verb}, "
+            f"{counts['failed']} failed"
+        ))
+
+    def needs_rewrite(self, storage, name, rotate):
+        """Whether a stored file is in the v1 format or, with rotate, uses a retired key."""
+        with storage.open(name, 'rb') as f:
+            prefix = f.read(HEADER_SIZE)
+            if not prefix:
+                return False
+            if not is_encrypted_v2(prefix):
+                return True
+            if not rotate:
+                return False
+            f.seek(0)
+            return not uses_current_key(f)
+
+    def convert_file(self, model, field, pk, name):
+        """Rewrite one file as v2 with the current key and point its row at the new file."""
+        storage = field.storage
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as plaintext:
+            with storage.open(name, 'rb') as f:
+                if is_encrypted_v2(f.read(HEADER_SIZE)):
+                    f.seek(0)
+                    decrypt_stream(f, plaintext)
+                else:
+                    # v1 files can only be decrypted whole
+                    f.seek(0)
+                    plaintext.write(decrypt_file(f.read()))
+            plaintext.seek(0)
+
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as encrypted:
+                encrypt_stream(plaintext, encrypted)
+                encrypted.seek(0)
+                new_name = storage.save(name, File(encrypted))
+
+        with transaction.atomic():
+            updated = model._default_manager.filter(pk=pk, **{field.attname: name}).update(
+                **{field.attname: new_name}
+            )
+            if updated:
+                transaction.on_commit(lambda: storage.delete(name))
+        if not updated:
+            # The row was changed or deleted meanwhile; keep its file as it is
+            storage.delete(new_name)
@@ -0,0 +1,85 @@
+"""
+Management command to re-encrypt encrypted text columns with the current key.
+
+To rotate keys: set ENCRYPTION_KEY to a new key, move the previous one to
+the front of ENCRYPTION_OLD_KEYS and deploy. Everything stays readable.
+Then run this command, which re-encrypts every encrypted text field of
+every model (or of the models given with --model) in resumable,
+throttled batches while the application keeps running (see
+core.utils.key_rotation). Run reencrypt_files --rotate for encrypted
+files, and remove the old key once both report nothing left to do.
+"""
+
+import os
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from core.fields import EncryptedFieldMixin
+from core.utils.key_rotation import KeyRotation
+
+
+class Command(BaseCommand):
+    help = 'Re-encrypt encrypted text fields with the current ENCRYPTION_KEY'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            action='append',
+            dest='models',
+            help='Model to process, e.g. clients.Client (repeatable; default: all with encrypted fields)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows per batch and transaction (default: 500)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=min(os.cpu_count() or 1, 4),
+            help='Worker processes for the crypto (default: CPU count, at most 4)',
+        )
+        parser.add_argument(
+            '--rows-per-second',
+            type=float,
+            default=None,
+            help='Throughput cap (default: KEY_ROTATION_ROWS_PER_SECOND, 0 for none)',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore saved progress and start from the first row',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        if options['models']:
+            try:
+                models = [apps.get_model(label) for label in options['models']]
+            except (LookupError, ValueError) as e:
+                raise CommandError(str(e))
+        else:
+            models = [
+                model for model in apps.get_models()
+                if any(isinstance(field, EncryptedFieldMixin) for field in model._meta.concrete_fields)
+            ]
+
+        for model in models:
+            checkpoint = KeyRotation(
+                model,
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                rows_per_second=options['rows_per_second'],
+                stdout=self.stdout,
+            ).run(restart=options['restart'])
+            style = self.style.WARNING if checkpoint.values_failed else self.style.SUCCESS
+            self.stdout.write(style(
+                f'{checkpoint.model_label}: {checkpoint.rows_scanned} rows, '
+                f'{checkpoint.values_rotated} values re-encrypted, '
+                f'{checkpoint.values_encrypted} plaintext values encrypted, '
+                f'{checkpoint.values_failed} failed'
+            ))
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.7 on 2026-10-17 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KeyRotationCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=100, verbose_name='Model')),
+                ('key_fingerprint', models.CharField(max_length=16, verbose_name='Key Fingerprint')),
+                ('last_pk', models.CharField(blank=True, max_length=255, verbose_name='Last Primary Key')),
+                ('rows_scanned', models.PositiveBigIntegerField(default=0, verbose_name='Rows Scanned')),
+                ('rows_updated', models.PositiveBigIntegerField(default=0, verbose_name='Rows Updated')),
+                ('values_rotated', models.PositiveBigIntegerField(default=0, verbose_name='Values Re-encrypted')),
+                ('values_encrypted', models.PositiveBigIntegerField(default=0, verbose_name='Plaintext Values Encrypted')),
+                ('values_failed', models.PositiveBigIntegerField(default=0, verbose_name='Values Failed')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='Started At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='Completed At')),
+            ],
+            options={
+                'verbose_name': 'Key Rotation Checkpoint',
+                'verbose_name_plural': 'Key Rotation Checkpoints',
+                'ordering': ['-updated_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='keyrotationcheckpoint',
+            constraint=models.UniqueConstraint(fields=('model_label', 'key_fingerprint'), name='unique_key_rotation_checkpoint'),
+        ),
+    ]
@@ -185,3 +185,36 @@ class SystemSetting(models.Model):
             return setting.typed_value
         except cls.DoesNotExist:
             return default
+
+
+class KeyRotationCheckpoint(models.Model):
+    """
+    Progress of re-encrypting the encrypted columns of one model with the
+    current key (see core.utils.key_rotation).
+
+    Saved in the same transaction as each batch, so an interrupted rotation
+    resumes after the last committed batch.
+    """
+    model_label = models.CharField(_('Model'), max_length=100)
+    key_fingerprint = models.CharField(_('Key Fingerprint'), max_length=16)
+    last_pk = models.CharField(_('Last Primary Key'), max_length=255, blank=True)
+    rows_scanned = models.PositiveBigIntegerField(_('Rows Scanned'), default=0)
+    rows_updated = models.PositiveBigIntegerField(_('Rows Updated'), default=0)
+    values_rotated = models.PositiveBigIntegerField(_('Values Re-encrypted'), default=0)
+    values_encrypted = models.PositiveBigIntegerField(_('Plaintext Values Encrypted'), default=0)
+    values_failed = models.PositiveBigIntegerField(_('Values Failed'), default=0)
+    started_at = models.DateTimeField(_('Started At'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('Updated At'), auto_now=True)
+    completed_at = models.DateTimeField(_('Completed At'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('Key Rotation Checkpoint')
+        verbose_name_plural = _('Key Rotation Checkpoints')
+        ordering = ['-updated_at']
+        constraints = [
+            models.UniqueConstraint(fields=['model_label', 'key_fingerprint'], name='unique_key_rotation_checkpoint'),
+        ]
+
+    def __str__(self):
+        state = 'completed' if self.completed_at else f'at pk {self.last_pk or "-"}'
+        return f"{self.model_label} rotation to key {self.key_fingerprint} ({state})"
@@ -0,0 +1,167 @@
+"""
+Keyed blind indexes for searching encrypted columns.
+
+Encrypted fields use Fernet with a random IV, so equal values have
+unrelated ciphertexts and the database cannot compare them. A blind index
+is an HMAC-SHA256 of the normalized value under a key derived from
+BLIND_INDEX_KEY, truncated to TOKEN_LENGTH hex characters. Equal values
+have equal indexes, so exact lookups become indexed equality queries,
+while the index reveals nothing about the value to anyone without the
+key beyond which rows share it.
+
+Besides the exact index of the whole value, a field can be tokenized into
+the word prefixes (for "starts with" search) and word trigrams (for
+"contains" search) of its value. Every token is keyed with its domain (the
+model field) and kind, so equal tokens of different fields or kinds never
+match.
+
+BLIND_INDEX_KEY is a dedicated key that is not rotated with ENCRYPTION_KEY:
+re-encrypting the values leaves their indexes valid. Changing it
+invalidates every index; rebuild them with the commands that maintain
+them (build_client_search_index, build_party_registry --rebuild).
+Deployments whose indexes were built with ENCRYPTION_KEY before it
+became required can set BLIND_INDEX_KEY to that key's value to keep them.
+"""
+
+import hashlib
+import hmac
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Iterable, List, Set
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from django.conf import settings
+
+from core.exceptions import SecurityException
+
+EXACT = 'exact'
+PREFIX = 'prefix'
+TRIGRAM = 'trigram'
+
+# Hex characters kept of each HMAC (128 bits)
+TOKEN_LENGTH = 32
+
+# Word prefixes indexed for "starts with" search
+PREFIX_MIN_LENGTH = getattr(settings, 'BLIND_INDEX_PREFIX_MIN_LENGTH', 2)
+PREFIX_MAX_LENGTH = getattr(settings, 'BLIND_INDEX_PREFIX_MAX_LENGTH', 12)
+
+KEY_INFO = b'legal-case-management blind index v1'
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def normalize(value: str) -> str:
+    """
+    Normalize a value before indexing or searching.
+
+    Case, accents and runs of whitespace are ignored, so "José  Núñez" and
+    "jose nunez" have the same index.
+
+    Args:
+        value: Plaintext value
+
+    Returns:
+        Normalized value
+    """
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(value))
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.casefold().split())
+
+
+def words(value: str) -> List[str]:
+    """Words of a normalized value, punctuation removed."""
+    return WORD_PATTERN.findall(value)
+
+
+def prefixes(value: str) -> Set[str]:
+    """
+    Word prefixes of a normalized value, PREFIX_MIN_LENGTH to PREFIX_MAX_LENGTH long.
+    """
+    result = set()
+    for word in words(value):
+        for length in range(PREFIX_MIN_LENGTH, min(len(word), PREFIX_MAX_LENGTH) + 1):
+            result.add(word[:length])
+    return result
+
+
+def trigrams(value: str) -> Set[str]:
+    """Character trigrams of each word of a normalized value."""
+    result = set()
+    for word in words(value):
+        for i in range(len(word) - 2):
+            result.add(word[i:i + 3])
+    return result
+
+
+@lru_cache(maxsize=4)
+def _derive_key(secret: bytes) -> bytes:
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=KEY_INFO)
+    return hkdf.derive(secret)
+
+
+def _index_key() -> bytes:
+    # Never fall back to ENCRYPTION_KEY; rotating it would void every index
+    secret = getattr(settings, 'BLIND_INDEX_KEY', None)
+    if not secret:
+        raise SecurityException("BLIND_INDEX_KEY not configured")
+    if isinstance(secret, str):
+        secret = secret.encode()
+    return _derive_key(secret)
+
+
+def blind_index(domain: str, kind: str, value: str) -> str:
+    """
+    Keyed index of an already normalized value or token.
+
+    Args:
+        domain: Field the value belongs to, e.g. "clients.Client.email"
+        kind: EXACT, PREFIX or TRIGRAM
+        value: Normalized value or token
+
+    Returns:
+        Hex token
+    """
+    message = f'{domain}\x00{kind}\x00{value}'.encode()
+    return hmac.new(_index_key(), message, hashlib.sha256).hexdigest()[:TOKEN_LENGTH]
+
+
+def exact_index(domain: str, value: str) -> str:
+    """
+    Exact index of a plaintext value.
+
+    Args:
+        domain: Field the value belongs to
+        value: Plaintext value
+
+    Returns:
+        Hex token, or '' for an empty value
+    """
+    value = normalize(value)
+    return blind_index(domain, EXACT, value) if value else ''
+
+
+def search_tokens(domain: str, value: str, kinds: Iterable[str]) -> Set[str]:
+    """
+    Prefix and trigram tokens of a plaintext value.
+
+    Args:
+        domain: Field the value belongs to
+        value: Plaintext value
+        kinds: Token kinds to produce (PREFIX, TRIGRAM)
+
+    Returns:
+        Set of hex tokens
+    """
+    value = normalize(value)
+    tokens = set()
+    if PREFIX in kinds:
+        tokens.update(blind_index(domain, PREFIX, prefix)
+                      for prefix in prefixes(value))
+    if TRIGRAM in kinds:
+        tokens.update(blind_index(domain, TRIGRAM, trigram)
+                      for trigram in trigrams(value))
+    return tokens
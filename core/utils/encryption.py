@@ -2,30 +2,81 @@
 Encryption utilities for handling sensitive data.
 """
 import base64
+import io
 import os
-from cryptography.fernet import Fernet
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from django.conf import settings
 from core.exceptions import SecurityException
+from core.utils.file_encryption import HEADER_SIZE, encrypt_stream, is_encrypted_v2, iter_decrypt
+from core.utils.keys import encryption_keys
+
+# Values in the compact format are this prefix followed by the Fernet
+# token. Legacy values are the token base64-encoded a second time, which
+# makes them a third longer and never contains the ':' of the prefix.
+COMPACT_PREFIX = 'v2:'
+
+# Write new values in the compact format; disable while servers running a
+# release that can't read it are still up
+COMPACT_FORMAT = getattr(settings, 'ENCRYPTION_COMPACT_FORMAT', True)
+
+# Every Fernet token starts with the version byte 0x80 and a timestamp
+# whose high bytes are zero
+FERNET_TOKEN_PREFIX = b'gAAAAA'
 
 
 class EncryptionService:
     """
     Service for encrypting and decrypting sensitive data.
+
+    Data is encrypted with ENCRYPTION_KEY and decrypted with it or any of
+    ENCRYPTION_OLD_KEYS (see core.utils.keys).
     """
 
     def __init__(self):
-        """Initialize encryption service with key from settings."""
-        self.key = settings.ENCRYPTION_KEY
-        if not self.key:
-            raise SecurityException("Encryption key not configured")
+        """Initialize encryption service with the keys from settings."""
+        self.keys = encryption_keys()
+        self.key = self.keys[0]
+
+        # Encrypts with the current key, decrypts with any key
+        self.fernet = MultiFernet([Fernet(key) for key in self.keys])
+        self.current_fernet = Fernet(self.key)
 
-        # Convert string key to bytes if needed
-        if isinstance(self.key, str):
-            self.key = self.key.encode()
+    def needs_rotation(self, encrypted_data: str) -> bool:
+        """
+        Whether an encrypted value was not encrypted with the current key.
 
-        self.fernet = Fernet(self.key)
+        Only the token's HMAC is checked, which is much cheaper than
+        decrypting it.
+
+        Args:
+            encrypted_data: Encrypted value in the compact or legacy format
+
+        Returns:
+            True if the current key does not authenticate the value
+        """
+        try:
+            self.current_fernet.extract_timestamp(fernet_token(encrypted_data))
+            return False
+        except (InvalidToken, ValueError):
+            return True
+
+    def rotate(self, encrypted_data: str) -> str:
+        """
+        Re-encrypt an encrypted value with the current key.
+
+        Args:
+            encrypted_data: Value encrypted with any configured key
+
+        Returns:
+            Value encrypted with the current key, in the current format
+        """
+        try:
+            return encode_token(self.fernet.rotate(fernet_token(encrypted_data)))
+        except Exception as e:
+            raise SecurityException(f"Key rotation failed: {str(e)}")
 
     def encrypt(self, data: str) -> str:
         """
@@ -35,7 +86,7 @@ class EncryptionService:
             data: String data to encrypt
 
         Returns:
-            Encrypted data as base64 string
+            Encrypted data as a compact (or, if disabled, legacy base64) string
         """
         if not data:
             return data
@@ -47,8 +98,7 @@ class EncryptionService:
             # Encrypt the data
             encrypted_bytes = self.fernet.encrypt(data_bytes)
 
-            # Return as base64 string for storage
-            return base64.b64encode(encrypted_bytes).decode()
+            return encode_token(encrypted_bytes)
 
         except Exception as e:
             raise SecurityException(f"Encryption failed: {str(e)}")
@@ -58,7 +108,7 @@ class EncryptionService:
         Decrypt encrypted string data.
 
         Args:
-            encrypted_data: Base64 encoded encrypted data
+            encrypted_data: Encrypted data in the compact or legacy format
 
         Returns:
             Decrypted string data
@@ -67,11 +117,8 @@ class EncryptionService:
             return encrypted_data
 
         try:
-            # Decode from base64
-            encrypted_bytes = base64.b64decode(encrypted_data.encode())
-
             # Decrypt the data
-            decrypted_bytes = self.fernet.decrypt(encrypted_bytes)
+            decrypted_bytes = self.fernet.decrypt(fernet_token(encrypted_data))
 
             # Return as string
             return decrypted_bytes.decode()
@@ -80,6 +127,78 @@ class EncryptionService:
             raise SecurityException(f"Decryption failed: {str(e)}")
 
 
+def encode_token(token: bytes) -> str:
+    """
+    Stored form of a Fernet token.
+
+    Args:
+        token: Fernet token
+
+    Returns:
+        Compact value, or legacy base64 if ENCRYPTION_COMPACT_FORMAT is off
+    """
+    # The token is already urlsafe base64
+    if COMPACT_FORMAT:
+        return COMPACT_PREFIX + token.decode()
+    return base64.b64encode(token).decode()
+
+
+def fernet_token(encrypted_data: str) -> bytes:
+    """
+    Fernet token of an encrypted value in the compact or legacy format.
+
+    Args:
+        encrypted_data: Encrypted value
+
+    Returns:
+        Token bytes
+    """
+    if encrypted_data.startswith(COMPACT_PREFIX):
+        return encrypted_data[len(COMPACT_PREFIX):].encode()
+    return base64.b64decode(encrypted_data.encode())
+
+
+def is_encrypted_value(value: str) -> bool:
+    """
+    Whether a stored value is an encrypted value rather than plaintext.
+
+    Args:
+        value: Stored value
+
+    Returns:
+        True for values in the compact or legacy format
+    """
+    if not value:
+        return False
+    return value.startswith(COMPACT_PREFIX) or compact_encrypted_value(value) is not None
+
+
+def compact_encrypted_value(encrypted_data: str) -> Optional[str]:
+    """
+    Re-encode a legacy encrypted value in the compact format.
+
+    The token is unchanged, so no decryption or key is needed.
+
+    Args:
+        encrypted_data: Stored value
+
+    Returns:
+        Compact value, or None if the value is not a legacy encrypted value
+    """
+    if not encrypted_data or encrypted_data.startswith(COMPACT_PREFIX):
+        return None
+    try:
+        token = base64.b64decode(encrypted_data.encode(), validate=True)
+    except ValueError:
+        return None
+    if not token.startswith(FERNET_TOKEN_PREFIX):
+        return None
+    try:
+        return COMPACT_PREFIX + token.decode('ascii')
+    except UnicodeDecodeError:
+        return None
+
+
 def generate_encryption_key() -> str:
     """
     Generate a new Fernet encryption key.
@@ -145,7 +264,7 @@ def encrypt_text(text: str) -> str:
         text: Text to encrypt
 
     Returns:
-        Encrypted text as base64 string
+        Encrypted text
     """
     if not text:
         return text
@@ -171,13 +290,43 @@ def decrypt_text(encrypted_text: str) -> str:
     return service.decrypt(encrypted_text)
 
 
+def decrypt_many(encrypted_values: Iterable[str]) -> List[str]:
+    """
+    Decrypt a batch of values with the shared Fernet instance.
+
+    Skips the per-call overhead of decrypt_text. Values that fail to
+    decrypt (data that hasn't been encrypted yet) are returned unchanged,
+    as the encrypted model fields do.
+
+    Args:
+        encrypted_values: Encrypted values in the compact or legacy format
+
+    Returns:
+        Decrypted values in input order
+    """
+    fernet = get_encryption_service().fernet
+    results = []
+    for value in encrypted_values:
+        if not value:
+            results.append(value)
+            continue
+        try:
+            results.append(fernet.decrypt(fernet_token(value)).decode())
+        except Exception:
+            results.append(value)
+    return results
+
+
 def encrypt_file(file_content: bytes, salt: bytes = None) -> bytes:
     """
-    Encrypt file content.
+    Encrypt file content in the v2 format.
+
+    Large files should be encrypted with file_encryption.encrypt_stream
+    instead, which does not hold the file in memory.
 
     Args:
         file_content: File content as bytes
-        salt: Optional salt for encryption
+        salt: Unused; v2 files carry their own random salt
 
     Returns:
         Encrypted file content as bytes
@@ -185,21 +334,25 @@ def encrypt_file(file_content: bytes, salt: bytes = None) -> bytes:
     if not file_content:
         return file_content
 
-    # Use the encryption service for now
-    # In a real implementation, we might want to use a different approach for files
+    encrypted = io.BytesIO()
+    encrypt_stream(io.BytesIO(file_content), encrypted)
+    return encrypted.getvalue()
+
+
+def _decrypt_file_v1(encrypted_content: bytes) -> bytes:
+    """Decrypt a v1 file: base64 of a Fernet token of the base64-encoded content."""
     service = get_encryption_service()
 
-    # Convert to base64 string first (since encrypt expects string)
-    content_b64 = base64.b64encode(file_content).decode()
+    # Decrypt the content (convert bytes to string first)
+    decrypted_b64 = service.decrypt(encrypted_content.decode())
 
-    # Encrypt and convert back to bytes
-    encrypted = service.encrypt(content_b64)
-    return encrypted.encode()
+    # Convert from base64 back to bytes
+    return base64.b64decode(decrypted_b64)
 
 
 def decrypt_file(encrypted_content: bytes, salt: bytes = None) -> bytes:
     """
-    Decrypt file content.
+    Decrypt file content in either the v1 or the v2 format.
 
     Args:
         encrypted_content: Encrypted file content as bytes
@@ -211,11 +364,30 @@ def decrypt_file(encrypted_content: bytes, salt: bytes = None) -> bytes:
     if not encrypted_content:
         return encrypted_content
 
-    # Use the encryption service
-    service = get_encryption_service()
+    if is_encrypted_v2(encrypted_content):
+        return b''.join(iter_decrypt(io.BytesIO(encrypted_content)))
+    return _decrypt_file_v1(encrypted_content)
 
-    # Decrypt the content (convert bytes to string first)
-    decrypted_b64 = service.decrypt(encrypted_content.decode())
 
-    # Convert from base64 back to bytes
-    return base64.b64decode(decrypted_b64)
+def iter_decrypted_file(source: BinaryIO) -> Iterator[bytes]:
+    """
+    Decrypt an encrypted file stream in either format.
+
+    v2 files are decrypted frame by frame with constant memory; v1 files
+    can only be decrypted whole and are yielded as a single block.
+
+    Args:
+        source: Seekable binary stream positioned at the start of the encrypted file
+
+    Yields:
+        Blocks of plaintext
+    """
+    prefix = source.read(HEADER_SIZE)
+    if not prefix:
+        return
+    source.seek(0)
+    if is_encrypted_v2(prefix):
+        yield from iter_decrypt(source)
+    else:
+        yield _decrypt_file_v1(source.read())
+
@@ -0,0 +1,311 @@
+"""
+Streaming encryption of files at rest (format v2).
+
+Layout of a v2 file:
+
+    header  MAGIC (4 bytes) | version (1 byte) | frame size (4 bytes, big-endian) | salt (16 bytes)
+    frames  AES-256-GCM ciphertext of each frame followed by its 16-byte tag
+
+Every frame except the last holds exactly ``frame size`` plaintext bytes,
+so files are encrypted and decrypted one frame at a time with constant
+memory, and the frame containing any plaintext offset can be located
+without reading the frames before it (see iter_decrypt_range).
+
+The key of each file is derived from ENCRYPTION_KEY and the random
+header salt with HKDF; files written before a key rotation are decrypted
+with the retired key in ENCRYPTION_OLD_KEYS that authenticates them. The
+nonce of a frame is its index plus a last-frame flag, and the header is
+authenticated with every frame, so reordered, dropped, truncated or
+transplanted frames fail authentication.
+"""
+
+import math
+import os
+import struct
+from typing import BinaryIO, Iterator
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from django.conf import settings
+
+from core.exceptions import SecurityException
+from core.utils.keys import encryption_keys
+
+MAGIC = b'LCMF'
+VERSION = 2
+
+# MAGIC, version, frame size, salt
+HEADER_FORMAT = '>4sBI16s'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+SALT_SIZE = 16
+TAG_SIZE = 16
+
+# Plaintext bytes per frame of newly encrypted files
+FRAME_SIZE = getattr(settings, 'ENCRYPTED_FILE_FRAME_SIZE', 64 * 1024)
+
+# Frames larger than this are rejected as corrupt rather than allocated
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+KEY_INFO = b'legal-case-management file encryption v2'
+
+
+def is_encrypted_v2(prefix: bytes) -> bool:
+    """
+    Whether data starts with a v2 header.
+
+    v1 files are base64 text, which never contains the version byte.
+
+    Args:
+        prefix: At least the first five bytes of the file
+    """
+    return prefix[:len(MAGIC) + 1] == MAGIC + bytes([VERSION])
+
+
+def _file_cipher(salt: bytes, key: bytes = None) -> AESGCM:
+    key = key or encryption_keys()[0]
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=KEY_INFO)
+    return AESGCM(hkdf.derive(key))
+
+
+class _FileCipher:
+    """
+    Cipher of one v2 file for decryption.
+
+    The header doesn't say which key encrypted the file, so files written
+    before a key rotation are decrypted with the first configured key that
+    authenticates a frame; that key is then used for the rest of the file.
+    """
+
+    def __init__(self, salt: bytes):
+        self.salt = salt
+        self.cipher = None
+        self.current_key = None
+
+    def decrypt(self, nonce: bytes, data: bytes, associated_data: bytes) -> bytes:
+        if self.cipher is not None:
+            return self.cipher.decrypt(nonce, data, associated_data)
+        for index, key in enumerate(encryption_keys()):
+            cipher = _file_cipher(self.salt, key)
+            try:
+                plaintext = cipher.decrypt(nonce, data, associated_data)
+            except InvalidTag:
+                continue
+            self.cipher = cipher
+            self.current_key = index == 0
+            return plaintext
+        raise InvalidTag()
+
+
+def _nonce(index: int, last: bool) -> bytes:
+    return struct.pack('>QI', index, 1 if last else 0)
+
+
+def _read_exactly(source: BinaryIO, size: int) -> bytes:
+    """Read size bytes, or fewer only at the end of the stream."""
+    data = source.read(size)
+    if not data or len(data) == size:
+        return data or b''
+    parts = [data]
+    remaining = size - len(data)
+    while remaining:
+        data = source.read(remaining)
+        if not data:
+            break
+        parts.append(data)
+        remaining -= len(data)
+    return b''.join(parts)
+
+
+def encrypt_stream(source: BinaryIO, destination: BinaryIO, frame_size: int = None) -> int:
+    """
+    Encrypt a stream into the v2 format, one frame at a time.
+
+    Args:
+        source: Readable binary stream of plaintext
+        destination: Writable binary stream for the encrypted file
+        frame_size: Plaintext bytes per frame (default: ENCRYPTED_FILE_FRAME_SIZE)
+
+    Returns:
+        Number of bytes written
+    """
+    frame_size = frame_size or FRAME_SIZE
+    if not 0 < frame_size <= MAX_FRAME_SIZE:
+        raise SecurityException(f"Invalid frame size: {frame_size}")
+
+    salt = os.urandom(SALT_SIZE)
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, frame_size, salt)
+    cipher = _file_cipher(salt)
+    destination.write(header)
+    written = len(header)
+
+    # Read one frame ahead to know which frame is the last
+    index = 0
+    frame = _read_exactly(source, frame_size)
+    while True:
+        following = _read_exactly(source, frame_size) if len(frame) == frame_size else b''
+        last = not following
+        encrypted = cipher.encrypt(_nonce(index, last), frame, header)
+        destination.write(encrypted)
+        written += len(encrypted)
+        if last:
+            return written
+        frame = following
+        index += 1
+
+
+def read_header(source: BinaryIO) -> tuple:
+    """
+    Read and validate the header of a v2 file.
+
+    Args:
+        source: Binary stream positioned at the start of the file
+
+    Returns:
+        Tuple of (header bytes, frame size, cipher)
+    """
+    header = _read_exactly(source, HEADER_SIZE)
+    if len(header) < HEADER_SIZE or not is_encrypted_v2(header):
+        raise SecurityException("Not a v2 encrypted file")
+    _, _, frame_size, salt = struct.unpack(HEADER_FORMAT, header)
+    if not 0 < frame_size <= MAX_FRAME_SIZE:
+        raise SecurityException(f"Invalid frame size: {frame_size}")
+    return header, frame_size, _FileCipher(salt)
+
+
+def iter_decrypt(source: BinaryIO) -> Iterator[bytes]:
+    """
+    Decrypt a v2 file frame by frame.
+
+    Each frame is authenticated before it is yielded; a tampered or
+    truncated file raises SecurityException at the offending frame.
+
+    Args:
+        source: Binary stream positioned at the start of the file
+
+    Yields:
+        Plaintext of each frame
+    """
+    header, frame_size, cipher = read_header(source)
+    encrypted_size = frame_size + TAG_SIZE
+
+    index = 0
+    encrypted = _read_exactly(source, encrypted_size)
+    while True:
+        following = _read_exactly(source, encrypted_size) if len(encrypted) == encrypted_size else b''
+        last = not following
+        try:
+            yield cipher.decrypt(_nonce(index, last), encrypted, header)
+        except InvalidTag:
+            raise SecurityException(f"Encrypted file failed authentication at frame {index}")
+        if last:
+            return
+        encrypted = following
+        index += 1
+
+
+def decrypt_stream(source: BinaryIO, destination: BinaryIO) -> int:
+    """
+    Decrypt a v2 file into a writable stream.
+
+    Args:
+        source: Binary stream positioned at the start of the file
+        destination: Writable binary stream for the plaintext
+
+    Returns:
+        Number of plaintext bytes written
+    """
+    written = 0
+    for frame in iter_decrypt(source):
+        destination.write(frame)
+        written += len(frame)
+    return written
+
+
+def _layout(source: BinaryIO) -> tuple:
+    """
+    Read the header of a seekable v2 file and work out its frames from its length.
+
+    Returns:
+        Tuple of (header bytes, frame size, cipher, number of frames, plaintext size)
+    """
+    source.seek(0, os.SEEK_END)
+    body_size = source.tell() - HEADER_SIZE
+    source.seek(0)
+    header, frame_size, cipher = read_header(source)
+
+    frame_count = max(1, math.ceil(body_size / (frame_size + TAG_SIZE)))
+    size = body_size - frame_count * TAG_SIZE
+    if size < 0:
+        raise SecurityException("Encrypted file is truncated")
+    return header, frame_size, cipher, frame_count, size
+
+
+def decrypted_size(source: BinaryIO) -> int:
+    """
+    Plaintext size of a seekable v2 file, computed from its length without decrypting.
+
+    Args:
+        source: Seekable binary stream of the encrypted file
+
+    Returns:
+        Size in bytes
+    """
+    return _layout(source)[4]
+
+
+def iter_decrypt_range(source: BinaryIO, start: int = 0, stop: int = None) -> Iterator[bytes]:
+    """
+    Decrypt a byte range of a seekable v2 file.
+
+    Only the frames overlapping the range are read and authenticated,
+    starting with a seek to the frame containing start.
+
+    Args:
+        source: Seekable binary stream of the encrypted file
+        start: First plaintext offset
+        stop: Plaintext offset after the range (default: end of file)
+
+    Yields:
+        Plaintext blocks covering the range
+    """
+    header, frame_size, cipher, frame_count, size = _layout(source)
+    stop = size if stop is None else min(stop, size)
+    if start >= stop:
+        return
+
+    index = start // frame_size
+    position = index * frame_size
+    source.seek(HEADER_SIZE + index * (frame_size + TAG_SIZE))
+    while position < stop:
+        encrypted = _read_exactly(source, frame_size + TAG_SIZE)
+        try:
+            frame = cipher.decrypt(_nonce(index, index == frame_count - 1), encrypted, header)
+        except InvalidTag:
+            raise SecurityException(f"Encrypted file failed authentication at frame {index}")
+        yield frame[max(start - position, 0):stop - position]
+        position += len(frame)
+        index += 1
+
+
+def uses_current_key(source: BinaryIO) -> bool:
+    """
+    Whether a v2 file is encrypted with the current ENCRYPTION_KEY.
+
+    Only the first frame is read and authenticated.
+
+    Args:
+        source: Binary stream positioned at the start of the file
+
+    Returns:
+        True for the current key, False for a retired one
+    """
+    header, frame_size, cipher = read_header(source)
+    encrypted = _read_exactly(source, frame_size + TAG_SIZE)
+    last = len(encrypted) < frame_size + TAG_SIZE or not source.read(1)
+    try:
+        cipher.decrypt(_nonce(0, last), encrypted, header)
+    except InvalidTag:
+        raise SecurityException("Encrypted file failed authentication at frame 0")
+    return cipher.current_key
@@ -0,0 +1,273 @@
+"""
+Bulk re-encryption of encrypted text columns.
+
+KeyRotation walks one model in primary-key order with keyset pagination
+and, for every encrypted text field, re-encrypts values encrypted with a
+retired key (see core.utils.keys) and encrypts values still stored as
+plaintext. Values already encrypted with the current key are recognised
+by their HMAC alone and are not rewritten.
+
+Each batch is processed in three steps:
+
+1. the stored values are read without locking;
+2. the crypto runs in a pool of worker processes, outside any transaction;
+3. in a short transaction the batch is locked and rows changed meanwhile
+   are recomputed, then the changed rows are written with one executemany
+   and the checkpoint is saved.
+
+Progress is kept in KeyRotationCheckpoint, per model and current key, so
+an interrupted run resumes after the last committed batch; a run that
+finished starts a new pass. The rows per second can be capped to spare
+the database during business hours.
+
+Blind indexes (core.utils.blind_index) are keyed with the separate
+BLIND_INDEX_KEY, so they stay valid when ENCRYPTION_KEY is rotated.
+"""
+
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections, models, router, transaction
+from django.db.models import ExpressionWrapper, F
+from django.utils import timezone
+
+from core.fields import EncryptedFieldMixin
+from core.models import KeyRotationCheckpoint
+from core.utils.encryption import compact_encrypted_value, get_encryption_service, is_encrypted_value
+from core.utils.keys import key_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Default cap on rows processed per second; 0 for no limit
+ROWS_PER_SECOND = getattr(settings, 'KEY_ROTATION_ROWS_PER_SECOND', 0)
+
+CURRENT = 'current'
+ROTATED = 'rotated'
+ENCRYPTED = 'encrypted'
+FAILED = 'failed'
+
+
+def reencrypt_values(values: List[str]) -> List[Tuple[str, Optional[str]]]:
+    """
+    Bring stored values of encrypted fields up to the current key.
+
+    Runs in worker processes; it only needs the keys.
+
+    Args:
+        values: Stored values, none of them empty
+
+    Returns:
+        (status, new value) per input value; the new value is None when
+        the stored value should be kept
+    """
+    service = get_encryption_service()
+    results = []
+    for value in values:
+        try:
+            if not is_encrypted_value(value):
+                results.append((ENCRYPTED, service.encrypt(value)))
+            elif service.needs_rotation(value):
+                results.append((ROTATED, service.rotate(value)))
+            else:
+                # Current key; switch legacy values to the compact format on the way
+                results.append((CURRENT, compact_encrypted_value(value)))
+        except Exception:
+            results.append((FAILED, None))
+    return results
+
+
+def write_stored_values(model, fields, rows: List[Tuple[object, list]]):
+    """
+    Store values of encrypted fields as given, bypassing the fields' encryption.
+
+    One executemany of plain UPDATE statements is used: with bulk_update,
+    compiling its CASE expressions costs milliseconds per row.
+
+    Args:
+        model: Model of the rows
+        fields: Encrypted fields written
+        rows: Pairs of (primary key, stored values in the order of fields)
+    """
+    if not rows:
+        return
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    sql = (
+        f"UPDATE {quote(model._meta.db_table)} SET "
+        + ', '.join(f'{quote(field.column)} = %s' for field in fields)
+        + f" WHERE {quote(model._meta.pk.column)} = %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [list(values) + [pk] for pk, values in rows])
+
+
+def _chunks(values: list, count: int) -> List[list]:
+    size = max(1, -(-len(values) // count))
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+class KeyRotation:
+    """
+    Re-encrypts the encrypted text columns of one model with the current key.
+    """
+
+    def __init__(self, model, batch_size: int = 500, workers: int = 1,
+                 rows_per_second: Optional[float] = None, stdout=None):
+        """
+        Args:
+            model: Model with encrypted text fields
+            batch_size: Rows per batch and transaction
+            workers: Worker processes for the crypto; 1 runs it in-process
+            rows_per_second: Cap on throughput (default: KEY_ROTATION_ROWS_PER_SECOND, 0 for none)
+            stdout: Stream for progress lines (default: logging only)
+        """
+        self.model = model
+        self.fields = [field for field in model._meta.concrete_fields if isinstance(field, EncryptedFieldMixin)]
+        self.batch_size = batch_size
+        self.workers = workers
+        self.rows_per_second = ROWS_PER_SECOND if rows_per_second is None else rows_per_second
+        self.stdout = stdout
+
+        # Read the stored values without the fields' decryption
+        self.raw = {
+            f'raw_{field.attname}': ExpressionWrapper(F(field.attname), output_field=models.TextField())
+            for field in self.fields
+        }
+
+    def run(self, restart: bool = False) -> KeyRotationCheckpoint:
+        """
+        Process the model from its checkpoint to the end.
+
+        Args:
+            restart: Ignore the checkpoint and start from the first row
+
+        Returns:
+            The completed checkpoint
+        """
+        label = self.model._meta.label
+        checkpoint, _ = KeyRotationCheckpoint.objects.get_or_create(
+            model_label=label,
+            key_fingerprint=key_fingerprint(get_encryption_service().key),
+        )
+        if restart or checkpoint.completed_at:
+            self._reset(checkpoint)
+        elif checkpoint.last_pk:
+            self._write(f'{label}: resuming after pk {checkpoint.last_pk}')
+
+        executor = self._executor()
+        started = time.monotonic()
+        processed = 0
+        try:
+            while True:
+                rows = self._next_batch(checkpoint)
+                if not rows:
+                    break
+                self._process_batch(rows, checkpoint, executor)
+                processed += len(rows)
+                self._write(
+                    f'{label}: {checkpoint.rows_scanned} rows scanned, {checkpoint.rows_updated} updated'
+                )
+                self._throttle(started, processed)
+        finally:
+            if executor:
+                executor.shutdown()
+
+        checkpoint.completed_at = timezone.now()
+        checkpoint.save(update_fields=['completed_at', 'updated_at'])
+        return checkpoint
+
+    def _reset(self, checkpoint):
+        checkpoint.last_pk = ''
+        checkpoint.rows_scanned = checkpoint.rows_updated = 0
+        checkpoint.values_rotated = checkpoint.values_encrypted = checkpoint.values_failed = 0
+        checkpoint.completed_at = None
+        checkpoint.save()
+
+    def _executor(self):
+        if self.workers <= 1:
+            return None
+        try:
+            # Forked workers inherit the configured settings and keys
+            context = multiprocessing.get_context('fork')
+        except ValueError:
+            logger.warning("Worker processes need fork; re-encrypting in-process")
+            return None
+        # Fork every worker now, without database connections to inherit;
+        # a child closing a copied connection would end the parent's session
+        connections.close_all()
+        executor = ProcessPoolExecutor(self.workers, mp_context=context)
+        list(executor.map(int, range(self.workers)))
+        return executor
+
+    def _next_batch(self, checkpoint) -> List[dict]:
+        queryset = self.model._default_manager.order_by('pk')
+        if checkpoint.last_pk:
+            queryset = queryset.filter(pk__gt=self.model._meta.pk.to_python(checkpoint.last_pk))
+        return list(queryset.values('pk', **self.raw)[:self.batch_size])
+
+    def _plan(self, rows: List[dict], executor) -> Dict[object, Dict[str, Tuple[str, Optional[str]]]]:
+        """Re-encrypt the non-empty values of rows, in the worker pool if there is one."""
+        cells = [
+            (row['pk'], field.attname, row[f'raw_{field.attname}'])
+            for row in rows for field in self.fields
+            if row[f'raw_{field.attname}']
+        ]
+        values = [value for _, _, value in cells]
+        if executor and len(values) > 1:
+            results = [result for chunk in executor.map(reencrypt_values, _chunks(values, self.workers))
+                       for result in chunk]
+        else:
+            results = reencrypt_values(values)
+
+        plan = {row['pk']: {} for row in rows}
+        for (pk, attname, _), result in zip(cells, results):
+            plan[pk][attname] = result
+        return plan
+
+    def _process_batch(self, rows: List[dict], checkpoint, executor):
+        plan = self._plan(rows, executor)
+
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            locked = {
+                row['pk']: row for row in
+                self.model._default_manager.filter(pk__in=[row['pk'] for row in rows])
+                .select_for_update().values('pk', **self.raw)
+            }
+            changed = [locked[row['pk']] for row in rows if row['pk'] in locked and locked[row['pk']] != row]
+            if changed:
+                # Saved while the batch was re-encrypted: redo those rows under the lock
+                plan.update(self._plan(changed, None))
+
+            updates = []
+            for pk, current in locked.items():
+                results = plan[pk]
+                statuses = [status for status, _ in results.values()]
+                checkpoint.values_rotated += statuses.count(ROTATED)
+                checkpoint.values_encrypted += statuses.count(ENCRYPTED)
+                checkpoint.values_failed += statuses.count(FAILED)
+                if any(new_value for _, new_value in results.values()):
+                    updates.append((pk, [
+                        results.get(field.attname, (None, None))[1] or current[f'raw_{field.attname}']
+                        for field in self.fields
+                    ]))
+            write_stored_values(self.model, self.fields, updates)
+
+            checkpoint.last_pk = str(rows[-1]['pk'])
+            checkpoint.rows_scanned += len(rows)
+            checkpoint.rows_updated += len(updates)
+            checkpoint.save()
+
+    def _throttle(self, started: float, processed: int):
+        if self.rows_per_second and self.rows_per_second > 0:
+            delay = processed / self.rows_per_second - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+    def _write(self, message: str):
+        logger.info(message)
+        if self.stdout:
+            self.stdout.write(message)
@@ -0,0 +1,45 @@
+"""
+Encryption keys.
+
+ENCRYPTION_KEY encrypts all new data. When it is rotated, the previous
+keys move to ENCRYPTION_OLD_KEYS (newest first): data encrypted with them
+stays readable, and rotate_encryption_keys re-encrypts it with the
+current key, after which the old keys can be removed.
+"""
+
+import hashlib
+from typing import List
+
+from django.conf import settings
+
+from core.exceptions import SecurityException
+
+
+def _as_bytes(key) -> bytes:
+    return key.encode() if isinstance(key, str) else key
+
+
+def encryption_keys() -> List[bytes]:
+    """
+    The current key followed by the retired keys still accepted for decryption.
+
+    Returns:
+        Keys as bytes, current key first
+    """
+    key = settings.ENCRYPTION_KEY
+    if not key:
+        raise SecurityException("Encryption key not configured")
+    old_keys = getattr(settings, 'ENCRYPTION_OLD_KEYS', None) or []
+    if isinstance(old_keys, (str, bytes)):
+        old_keys = [old_keys]
+    keys = [_as_bytes(key)]
+    for old_key in old_keys:
+        old_key = _as_bytes(old_key)
+        if old_key and old_key not in keys:
+            keys.append(old_key)
+    return keys
+
+
+def key_fingerprint(key: bytes) -> str:
+    """Short identifier of a key that does not reveal it, for logs and checkpoints."""
+    return hashlib.sha256(b'key fingerprint\x00' + _as_bytes(key)).hexdigest()[:16]
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     Document, DocumentCategory, DocumentTag,
-    DocumentTagged, DocumentTemplate, SensitiveDocument
+    DocumentTagged, DocumentTemplate, SensitiveDocument, ExtractedText, Blob
 )
 
 @admin.register(Document)
@@ -48,3 +48,19 @@ class DocumentTemplateAdmin(admin.ModelAdmin):
     list_filter = ('document_type', 'is_active')
     search_fields = ('name', 'description')
     readonly_fields = ('created_at', 'updated_at')
+
+@admin.register(ExtractedText)
+class ExtractedTextAdmin(admin.ModelAdmin):
+    """Admin interface for ExtractedText model."""
+    list_display = ('content_hash', 'extractor_version', 'char_count', 'created_at')
+    list_filter = ('extractor_version',)
+    search_fields = ('content_hash',)
+    readonly_fields = ('content_hash', 'extractor_version', 'char_count', 'created_at')
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    """Admin interface for Blob model."""
+    list_display = ('name', 'size', 'ref_count', 'created_at', 'released_at')
+    list_filter = ('ref_count',)
+    search_fields = ('name', 'content_hash')
+    readonly_fields = ('name', 'content_hash', 'size', 'ref_count', 'created_at', 'released_at')
@@ -0,0 +1,74 @@
+"""
+Reference counting of content-addressed blobs.
+
+Each Document, DocumentVersion and DocumentTemplate whose file is a blob
+holds one reference to it. References are taken and dropped by the
+signal handlers in documents.signals as rows are saved with a new file or
+deleted; blobs whose count drops to zero are removed by the gc_blobs
+command after a grace period. Counts can drift if rows are changed with
+queryset updates or raw SQL, so gc_blobs can recount them from the
+referencing tables, and never deletes a blob that is still referenced.
+"""
+
+from collections import Counter
+from typing import Dict, Optional
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Blob, Document, DocumentTemplate, DocumentVersion
+from .storage import BLOB_DIRECTORY, blob_content_hash, blob_storage
+
+# Models whose file field stores blobs
+BLOB_MODELS = (Document, DocumentVersion, DocumentTemplate)
+
+
+def acquire_blob(name: Optional[str]) -> None:
+    """
+    Add a reference to a blob, registering it on first use.
+
+    Args:
+        name: Storage name of the file (non-blob names are ignored)
+    """
+    content_hash = blob_content_hash(name)
+    if not content_hash:
+        return
+    if not Blob.objects.filter(name=name).update(ref_count=F('ref_count') + 1, released_at=None):
+        blob, created = Blob.objects.get_or_create(
+            name=name,
+            defaults={'content_hash': content_hash, 'size': blob_storage.size(name), 'ref_count': 1}
+        )
+        if not created:
+            Blob.objects.filter(name=name).update(ref_count=F('ref_count') + 1, released_at=None)
+
+
+def release_blob(name: Optional[str]) -> None:
+    """
+    Drop a reference to a blob.
+
+    Args:
+        name: Storage name of the file (non-blob names are ignored)
+    """
+    if not blob_content_hash(name):
+        return
+    Blob.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    Blob.objects.filter(name=name, ref_count=0, released_at__isnull=True).update(released_at=timezone.now())
+
+
+def count_references() -> Dict[str, int]:
+    """
+    Count the rows referencing each blob by scanning the referencing tables.
+
+    Returns:
+        Dictionary mapping blob names to reference counts
+    """
+    references = Counter()
+    for model in BLOB_MODELS:
+        names = model._default_manager.filter(file__startswith=f'{BLOB_DIRECTORY}/').values_list('file', flat=True)
+        references.update(name for name in names.iterator() if blob_content_hash(name))
+    return references
+
+
+def is_referenced(name: str) -> bool:
+    """Whether any row currently uses the file, regardless of its recorded count."""
+    return any(model._default_manager.filter(file=name).exists() for model in BLOB_MODELS)
@@ -0,0 +1,194 @@
+"""
+HTTP responses for downloading stored files.
+
+Plain files are answered with a FileResponse over the open file, which
+WSGI servers hand to ``os.sendfile`` through ``wsgi.file_wrapper``, or,
+when DOCUMENT_DOWNLOAD_OFFLOAD is set, with an empty response carrying an
+``X-Accel-Redirect`` (nginx) or ``X-Sendfile`` (Apache, lighttpd) header
+so the web server sends the file itself. Either way the view has already
+checked permissions. Responses carry an ETag (the content hash) and
+Last-Modified, and conditional requests are answered with 304 before the
+file is opened.
+
+Encrypted files are decrypted frame by frame into a StreamingHttpResponse,
+so time to first byte and worker memory don't depend on the file size.
+Single byte ranges (``Range: bytes=...``) are answered with 206 Partial
+Content by seeking to the encrypted frame containing the first requested
+byte, which lets PDF viewers load large exhibits page by page.
+"""
+
+import mimetypes
+import os
+import re
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+
+from core.utils.encryption import decrypt_file
+from core.utils.file_encryption import HEADER_SIZE, decrypted_size, is_encrypted_v2, iter_decrypt_range
+from .storage import blob_content_hash
+
+# Let the web server send files: None, 'x-accel-redirect' or 'x-sendfile'
+DOWNLOAD_OFFLOAD = getattr(settings, 'DOCUMENT_DOWNLOAD_OFFLOAD', None)
+
+# Internal nginx location mapped to MEDIA_ROOT, for X-Accel-Redirect
+ACCEL_REDIRECT_PREFIX = getattr(settings, 'DOCUMENT_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a Range header lies entirely outside the file."""
+
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range Range header.
+
+    Multiple ranges and malformed headers are ignored, which lets the
+    caller send the whole file as HTTP allows.
+
+    Args:
+        header: Value of the Range header, if any
+        size: Size of the file in bytes
+
+    Returns:
+        Tuple of (start, stop) with stop exclusive, or None for the whole file
+
+    Raises:
+        RangeNotSatisfiable: If the range starts beyond the end of the file
+    """
+    match = RANGE_PATTERN.match((header or '').strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if not length:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size
+
+    start = int(first)
+    stop = min(int(last) + 1, size) if last else size
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, stop
+
+
+def file_response(request, field_file, filename: str, as_attachment: bool = True,
+                  content_hash: Optional[str] = None):
+    """
+    Serve a stored file without reading it into the worker.
+
+    Args:
+        request: HTTP request
+        field_file: FieldFile to serve
+        filename: File name presented to the client
+        as_attachment: Ask the browser to save rather than display the file
+        content_hash: SHA-256 of the file, used as its ETag if known
+
+    Returns:
+        FileResponse, offload HttpResponse, or 304 Not Modified
+    """
+    storage = field_file.storage
+    try:
+        path = storage.path(field_file.name)
+    except NotImplementedError:
+        # Remote storage: no sendfile, stream through Django
+        return FileResponse(field_file.open('rb'), as_attachment=as_attachment, filename=filename)
+
+    stat = os.stat(path)
+    content_hash = content_hash or blob_content_hash(field_file.name)
+    etag = f'"{content_hash}"' if content_hash else f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        if DOWNLOAD_OFFLOAD == 'x-accel-redirect':
+            response = HttpResponse()
+            response['X-Accel-Redirect'] = ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(field_file.name)
+        elif DOWNLOAD_OFFLOAD == 'x-sendfile':
+            response = HttpResponse()
+            response['X-Sendfile'] = path
+        else:
+            response = FileResponse(open(path, 'rb'))
+        response['Content-Type'] = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def encrypted_file_response(request, field_file, filename: str, as_attachment: bool = False):
+    """
+    Stream a decrypted EncryptedFileField file, honouring Range requests.
+
+    Files still in the v1 format can only be decrypted whole; they are
+    served from memory until reencrypt_files has converted them.
+
+    Args:
+        request: HTTP request
+        field_file: FieldFile of an EncryptedFileField
+        filename: File name presented to the client
+        as_attachment: Ask the browser to save rather than display the file
+
+    Returns:
+        HttpResponse or StreamingHttpResponse
+    """
+    source = field_file.storage.open(field_file.name, 'rb')
+    try:
+        encrypted_v2 = is_encrypted_v2(source.read(HEADER_SIZE))
+        if encrypted_v2:
+            size = decrypted_size(source)
+        else:
+            source.seek(0)
+            content = decrypt_file(source.read())
+            source.close()
+            size = len(content)
+
+        try:
+            byte_range = parse_range_header(request.headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            source.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        start, stop = byte_range or (0, size)
+
+        if encrypted_v2:
+            response = StreamingHttpResponse(_closing(iter_decrypt_range(source, start, stop), source))
+        else:
+            response = HttpResponse(content[start:stop])
+    except Exception:
+        source.close()
+        raise
+
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+    response['Content-Length'] = str(stop - start)
+    response['Content-Type'] = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+def _closing(blocks, source):
+    """Yield from blocks and close source when the response is finished or closed."""
+    try:
+        yield from blocks
+    finally:
+        source.close()
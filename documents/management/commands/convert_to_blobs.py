@@ -0,0 +1,92 @@
+"""
+Management command to move files stored before blob storage into blobs.
+
+Documents, versions and templates whose file still lives under its upload
+name are rewritten into content-addressed storage in primary-key batches,
+so identical files collapse into one blob. A converted row's old file is
+deleted once its update has committed and no other row refers to it.
+Converted rows are skipped, so the command can be stopped and rerun.
+"""
+
+import time
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from documents.blobs import BLOB_MODELS, acquire_blob, is_referenced
+from documents.storage import BLOB_DIRECTORY, blob_content_hash
+
+
+class Command(BaseCommand):
+    help = 'Move document, version and template files into deduplicated blob storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Rows fetched per query (default: 100)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.0,
+            help='Seconds to pause after each batch, to limit load (default: 0)',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        for model in BLOB_MODELS:
+            self.convert_model(model, options)
+
+    def convert_model(self, model, options):
+        """Convert the legacy files of one model."""
+        label = model._meta.label
+        storage = model._meta.get_field('file').storage
+        queryset = model._default_manager.exclude(file='').exclude(
+            file__startswith=f'{BLOB_DIRECTORY}/'
+        ).order_by('pk')
+        counts = {'converted': 0, 'missing': 0, 'failed': 0}
+        has_content_hash = any(field.name == 'content_hash' for field in model._meta.fields)
+
+        last_pk = 0
+        while True:
+            rows = list(queryset.filter(pk__gt=last_pk).values_list('pk', 'file')[:options['batch_size']])
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+
+            for pk, name in rows:
+                if not storage.exists(name):
+                    counts['missing'] += 1
+                    continue
+                try:
+                    with storage.open(name, 'rb') as f:
+                        new_name = storage.save(name, File(f))
+                    with transaction.atomic():
+                        changes = {'file': new_name}
+                        if has_content_hash:
+                            changes['content_hash'] = blob_content_hash(new_name)
+                        if model._default_manager.filter(pk=pk, file=name).update(**changes):
+                            acquire_blob(new_name)
+                            transaction.on_commit(lambda name=name: self.delete_legacy_file(storage, name))
+                    counts['converted'] += 1
+                except Exception as e:
+                    counts['failed'] += 1
+                    self.stderr.write(f'Error converting {label} {pk} ({name}): {str(e)}')
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{label}: {counts['converted']} files converted, {counts['missing']} missing, "
+            f"{counts['failed']} failed"
+        ))
+
+    def delete_legacy_file(self, storage, name):
+        """Delete a converted file unless another row still uses it."""
+        if not is_referenced(name):
+            storage.delete(name)
@@ -0,0 +1,131 @@
+"""
+Management command to delete content-addressed blobs no row references.
+
+Blobs whose reference count has been zero for longer than the grace
+period are deleted, after checking that no document, version or template
+uses them. Files in the blob directory without a Blob row (uploads whose
+transaction rolled back, interrupted writes) are deleted once they are
+older than the grace period too.
+"""
+
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from documents.blobs import count_references, is_referenced
+from documents.models import Blob
+from documents.storage import BLOB_DIRECTORY, blob_content_hash, blob_storage
+
+
+class Command(BaseCommand):
+    help = 'Delete stored document blobs that are no longer referenced'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24.0,
+            help='Keep unreferenced blobs and stray files younger than this (default: 24)',
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Recompute reference counts from the document, version and template tables first',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be deleted without deleting anything',
+        )
+
+    def handle(self, *args, **options):
+        if options['grace_hours'] < 0:
+            raise CommandError('--grace-hours must not be negative')
+        dry_run = options['dry_run']
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+
+        if options['recount']:
+            self.recount(dry_run)
+
+        deleted = freed = 0
+        candidates = Blob.objects.filter(ref_count=0).filter(
+            Q(released_at__lt=cutoff) | Q(released_at__isnull=True, created_at__lt=cutoff)
+        )
+        for blob in candidates.iterator():
+            if is_referenced(blob.name):
+                self.stderr.write(f'Blob {blob.name} is still referenced; run with --recount')
+                continue
+            if self.modified_since(blob.name, cutoff):
+                # Uploaded again recently; the new row may not be saved yet
+                continue
+            deleted += 1
+            freed += blob.size
+            if not dry_run:
+                with transaction.atomic():
+                    if Blob.objects.filter(pk=blob.pk, ref_count=0).delete()[0]:
+                        transaction.on_commit(lambda name=blob.name: blob_storage.delete(name))
+
+        strays, stray_bytes = self.delete_stray_files(cutoff.timestamp(), dry_run)
+
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {deleted} unreferenced blobs ({freed / (1024 * 1024):.1f} MB) '
+            f'and {strays} stray files ({stray_bytes / (1024 * 1024):.1f} MB)'
+        ))
+
+    def modified_since(self, name, cutoff):
+        """Whether a blob file was written or deduplicated against after cutoff."""
+        try:
+            return os.stat(blob_storage.path(name)).st_mtime >= cutoff.timestamp()
+        except FileNotFoundError:
+            return False
+
+    def recount(self, dry_run):
+        """Set every blob's reference count to the number of rows using it."""
+        references = count_references()
+        fixed = 0
+        for blob in Blob.objects.iterator():
+            count = references.pop(blob.name, 0)
+            if blob.ref_count != count:
+                fixed += 1
+                if not dry_run:
+                    Blob.objects.filter(pk=blob.pk).update(
+                        ref_count=count,
+                        released_at=timezone.now() if count == 0 else None,
+                    )
+
+        # Referenced files that were never registered
+        missing = [name for name in references if blob_storage.exists(name)]
+        if not dry_run:
+            Blob.objects.bulk_create([
+                Blob(name=name, content_hash=blob_content_hash(name),
+                     size=blob_storage.size(name), ref_count=references[name])
+                for name in missing
+            ], ignore_conflicts=True)
+        self.stdout.write(f'Corrected {fixed} reference counts, registered {len(missing)} blobs')
+
+    def delete_stray_files(self, cutoff, dry_run):
+        """Delete old files in the blob directory that have no Blob row."""
+        root = blob_storage.path(BLOB_DIRECTORY)
+        count = size = 0
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, blob_storage.location).replace(os.sep, '/')
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime >= cutoff:
+                    continue
+                if blob_content_hash(name) and (Blob.objects.filter(name=name).exists() or is_referenced(name)):
+                    continue
+                count += 1
+                size += stat.st_size
+                if not dry_run:
+                    os.remove(path)
+        return count, size
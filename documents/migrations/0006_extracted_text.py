@@ -0,0 +1,34 @@
+# Generated by Django 5.0.7 on 2026-10-17 03:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_documentversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 of the file contents', max_length=64, verbose_name='Content Hash'),
+        ),
+        migrations.CreateModel(
+            name='ExtractedText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(help_text='SHA-256 of the file contents', max_length=64, verbose_name='Content Hash')),
+                ('extractor_version', models.PositiveSmallIntegerField(verbose_name='Extractor Version')),
+                ('text_data', models.BinaryField(help_text='zlib-compressed UTF-8 text', verbose_name='Text Data')),
+                ('char_count', models.PositiveIntegerField(verbose_name='Character Count')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+            ],
+            options={
+                'verbose_name': 'Extracted Text',
+                'verbose_name_plural': 'Extracted Texts',
+                'unique_together': {('content_hash', 'extractor_version')},
+            },
+        ),
+    ]
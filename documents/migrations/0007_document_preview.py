@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-17 03:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_extracted_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='preview',
+            field=models.TextField(blank=True, editable=False, help_text='Beginning of the extracted text, shown in document lists', verbose_name='Preview'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.7 on 2026-10-17 03:28
+
+import documents.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0007_document_preview'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='file',
+            field=models.FileField(storage=documents.storage.ContentAddressedStorage(), upload_to='case_documents/', verbose_name='File'),
+        ),
+        migrations.AlterField(
+            model_name='documenttemplate',
+            name='file',
+            field=models.FileField(storage=documents.storage.ContentAddressedStorage(), upload_to='document_templates/', verbose_name='Template File'),
+        ),
+        migrations.AlterField(
+            model_name='documentversion',
+            name='file',
+            field=models.FileField(storage=documents.storage.ContentAddressedStorage(), upload_to='document_versions/', verbose_name='File'),
+        ),
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Name')),
+                ('content_hash', models.CharField(db_index=True, help_text='SHA-256 of the file contents', max_length=64, verbose_name='Content Hash')),
+                ('size', models.BigIntegerField(verbose_name='Size')),
+                ('ref_count', models.PositiveIntegerField(default=0, help_text='Documents, versions and templates using this file', verbose_name='Reference Count')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('released_at', models.DateTimeField(blank=True, help_text='When the last reference was dropped', null=True, verbose_name='Released At')),
+            ],
+            options={
+                'verbose_name': 'Blob',
+                'verbose_name_plural': 'Blobs',
+                'indexes': [models.Index(fields=['ref_count', 'released_at'], name='documents_b_ref_cou_9bf968_idx')],
+            },
+        ),
+    ]
@@ -3,9 +3,13 @@ from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from cases.models import Case
 import os
+import hashlib
+import zlib
 from django.utils import timezone
 import uuid
 from core.fields import EncryptedFileField
+from .storage import blob_content_hash, blob_storage, download_filename
+
 
 class DocumentCategory(models.Model):
     """
@@ -65,9 +69,13 @@ class Document(models.Model):
     description = models.TextField(_('Description'), blank=True)
 
     # File information
-    file = models.FileField(_('File'), upload_to='case_documents/')
+    file = models.FileField(_('File'), upload_to='case_documents/', storage=blob_storage)
     file_size = models.BigIntegerField(_('File Size'), null=True, blank=True, editable=False)
     file_type = models.CharField(_('File Type'), max_length=50, blank=True, editable=False)
+    content_hash = models.CharField(_('Content Hash'), max_length=64, blank=True, editable=False,
+                                    help_text=_('SHA-256 of the file contents'))
+    preview = models.TextField(_('Preview'), blank=True, editable=False,
+                               help_text=_('Beginning of the extracted text, shown in document lists'))
 
     # Relationships
     case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='documents', verbose_name=_('Case'))
@@ -98,8 +106,20 @@ class Document(models.Model):
     def save(self, *args, **kwargs):
         # Set file size and type
         if self.file:
+            new_file = not self.file._committed
+            if new_file:
+                # Store the upload first; blob storage names it by its SHA-256
+                self.file.save(self.file.name, self.file.file, save=False)
+                # A new file invalidates the stored preview; it is rebuilt after commit
+                self.preview = ''
             self.file_size = self.file.size
             self.file_type = os.path.splitext(self.file.name)[1].lower()
+            # Hash new files (and files saved before hashes were kept)
+            if new_file or not self.content_hash:
+                try:
+                    self.content_hash = blob_content_hash(self.file.name) or self.compute_content_hash()
+                except OSError:
+                    self.content_hash = ''
 
         # If this is a new version of an existing document
         if self.previous_version and self.is_latest_version:
@@ -109,6 +129,13 @@ class Document(models.Model):
 
         super().save(*args, **kwargs)
 
+    def compute_content_hash(self):
+        """Return the SHA-256 hex digest of the file contents."""
+        digest = hashlib.sha256()
+        for chunk in self.file.chunks():
+            digest.update(chunk)
+        return digest.hexdigest()
+
     def get_file_size_display(self):
         """Return human-readable file size."""
         if not self.file_size:
@@ -126,6 +153,10 @@ class Document(models.Model):
             return os.path.splitext(self.file.name)[1].lower()
         return ""
 
+    def get_download_filename(self):
+        """Return the file name offered on download (blob names are content hashes)."""
+        return download_filename(self.file.name, self.title)
+
     def create_new_version(self, new_file, uploaded_by):
         """Create a new version of this document."""
         # Increment version number
@@ -162,6 +193,53 @@ class Document(models.Model):
             models.Index(fields=['document_type', '-uploaded_at']),
         ]
 
+class ExtractedText(models.Model):
+    """
+    Text extracted from a file, stored once per file content and extractor version.
+    """
+    content_hash = models.CharField(_('Content Hash'), max_length=64,
+                                    help_text=_('SHA-256 of the file contents'))
+    extractor_version = models.PositiveSmallIntegerField(_('Extractor Version'))
+    text_data = models.BinaryField(_('Text Data'), editable=False, help_text=_('zlib-compressed UTF-8 text'))
+    char_count = models.PositiveIntegerField(_('Character Count'))
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+
+    def __str__(self):
+        return f"Text of {self.content_hash[:12]} (v{self.extractor_version})"
+
+    def get_text(self):
+        """Return the decompressed text."""
+        return zlib.decompress(bytes(self.text_data)).decode('utf-8')
+
+    class Meta:
+        verbose_name = _('Extracted Text')
+        verbose_name_plural = _('Extracted Texts')
+        unique_together = ['content_hash', 'extractor_version']
+
+class Blob(models.Model):
+    """
+    A file in content-addressed storage, shared by every row with the same file content.
+    """
+    name = models.CharField(_('Name'), max_length=255, unique=True)
+    content_hash = models.CharField(_('Content Hash'), max_length=64, db_index=True,
+                                    help_text=_('SHA-256 of the file contents'))
+    size = models.BigIntegerField(_('Size'))
+    ref_count = models.PositiveIntegerField(_('Reference Count'), default=0,
+                                            help_text=_('Documents, versions and templates using this file'))
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+    released_at = models.DateTimeField(_('Released At'), null=True, blank=True,
+                                       help_text=_('When the last reference was dropped'))
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = _('Blob')
+        verbose_name_plural = _('Blobs')
+        indexes = [
+            models.Index(fields=['ref_count', 'released_at']),
+        ]
+
 class DocumentTag(models.Model):
     """
     Tags for categorizing documents.
@@ -195,7 +273,7 @@ class DocumentVersion(models.Model):
     """
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='versions')
     version_number = models.PositiveIntegerField(_('Version Number'))
-    file = models.FileField(_('File'), upload_to='document_versions/')
+    file = models.FileField(_('File'), upload_to='document_versions/', storage=blob_storage)
     comment = models.TextField(_('Comment'), blank=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
                                  related_name='document_versions', verbose_name=_('Created By'))
@@ -216,7 +294,7 @@ class DocumentTemplate(models.Model):
     """
     name = models.CharField(_('Name'), max_length=200)
     description = models.TextField(_('Description'), blank=True)
-    file = models.FileField(_('Template File'), upload_to='document_templates/')
+    file = models.FileField(_('Template File'), upload_to='document_templates/', storage=blob_storage)
     document_type = models.CharField(_('Document Type'), max_length=20, choices=Document.DOCUMENT_TYPE_CHOICES)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
                                   related_name='created_templates', verbose_name=_('Created By'))
@@ -227,6 +305,10 @@ class DocumentTemplate(models.Model):
     def __str__(self):
         return self.name
 
+    def get_download_filename(self):
+        """Return the file name offered on download (blob names are content hashes)."""
+        return download_filename(self.file.name, self.name)
+
 
 class SensitiveDocument(models.Model):
     """
@@ -0,0 +1,96 @@
+"""
+Signal handlers for document uploads.
+
+The text of uploaded files and new versions is extracted once, after the
+saving transaction commits, into the extracted-text store, so later
+analysis, previews and indexing read it instead of re-parsing the file.
+The preview column is rebuilt from it whenever the file changed. Saves
+that keep the file are not processed.
+
+Extraction runs in the saving request, so an upload is answered only
+once its file is parsed (every page of a PDF). Where that is too slow,
+DOCUMENT_EXTRACT_TEXT_ON_SAVE = 'off' leaves text and previews to be
+extracted on first use.
+
+The same handlers keep the reference counts of content-addressed blobs
+(see documents.blobs) in step with the rows using them.
+"""
+
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .blobs import BLOB_MODELS, acquire_blob, release_blob
+from .models import Document
+
+logger = logging.getLogger(__name__)
+
+# True (text and preview), False (preview only) or 'off' (both on first use)
+EXTRACT_TEXT_ON_SAVE = getattr(settings, 'DOCUMENT_EXTRACT_TEXT_ON_SAVE', True)
+
+
+def _process_upload(document_id):
+    from .utils import precompute_document_text, update_document_preview
+
+    try:
+        document = Document.objects.get(id=document_id)
+        if EXTRACT_TEXT_ON_SAVE:
+            precompute_document_text(document)
+        # Only queued for a new file, so a preview the row has is stale
+        update_document_preview(document)
+    except Document.DoesNotExist:
+        pass
+    except Exception as e:
+        # Never fail an upload because of text extraction
+        logger.error(f"Error extracting text of document {document_id}: {str(e)}")
+
+
+@receiver(post_save, sender=Document)
+def handle_document_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Store the extracted text and preview of a new file once the transaction commits.
+
+    Args:
+        sender: The model class (Document)
+        instance: The Document instance that was saved
+        created: True if the instance was created, False if it was updated
+        raw: True when loading fixtures
+    """
+    if raw or not instance.file or EXTRACT_TEXT_ON_SAVE == 'off':
+        return
+    # Runs before track_blob_on_save, so _blob_name is still the file the row was loaded with
+    if not created and instance.file.name == getattr(instance, '_blob_name', None):
+        return
+
+    document_id = instance.id
+    transaction.on_commit(lambda: _process_upload(document_id))
+
+
+def track_blob_on_init(sender, instance, **kwargs):
+    """Remember the file a row was loaded with, to notice when it is replaced."""
+    # Read the raw value; instance.file would build a FieldFile for every row
+    name = instance.__dict__.get('file')
+    instance._blob_name = name if isinstance(name, str) else None
+
+
+def track_blob_on_save(sender, instance, created, raw=False, **kwargs):
+    """Move the blob reference of a row whose file changed."""
+    name = instance.file.name or None
+    previous = None if created else (getattr(instance, '_blob_name', None) or None)
+    if name != previous:
+        acquire_blob(name)
+        release_blob(previous)
+    instance._blob_name = name
+
+
+def track_blob_on_delete(sender, instance, **kwargs):
+    """Drop the blob reference of a deleted row."""
+    release_blob(instance.file.name)
+
+
+for model in BLOB_MODELS:
+    post_init.connect(track_blob_on_init, sender=model, dispatch_uid=f'track_blob_on_init_{model.__name__}')
+    post_save.connect(track_blob_on_save, sender=model, dispatch_uid=f'track_blob_on_save_{model.__name__}')
+    post_delete.connect(track_blob_on_delete, sender=model, dispatch_uid=f'track_blob_on_delete_{model.__name__}')
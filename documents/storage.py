@@ -0,0 +1,114 @@
+"""
+Content-addressed file storage for documents, versions and templates.
+
+Files are stored once per content under ``blobs/<aa>/<bb>/<sha256><ext>``,
+where the name is the SHA-256 of the file. Uploading a file that is
+already stored writes nothing and returns the existing name, so the same
+exhibit uploaded to several cases, or an unchanged new version, shares one
+file on disk. The upload is hashed while it is written, so the hash costs
+no extra pass over the file.
+
+The rows referencing each blob are counted in the Blob model (see
+documents.blobs); unreferenced blobs are removed by the gc_blobs command.
+Files stored under their upload name before blob storage was introduced
+are still served from their old paths.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from typing import Optional
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIRECTORY = 'blobs'
+
+# Suffix of partially written uploads in the blob directory
+UPLOAD_SUFFIX = '.upload'
+
+BLOB_NAME_PATTERN = re.compile(r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})(\.[^/]*)?$')
+
+# Characters replaced when a title is used as a file name
+UNSAFE_FILENAME_PATTERN = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+
+def blob_name(content_hash: str, extension: str = '') -> str:
+    """Storage name of the blob with the given SHA-256 and file extension."""
+    return f'{BLOB_DIRECTORY}/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{extension}'
+
+
+def blob_content_hash(name: Optional[str]) -> Optional[str]:
+    """
+    SHA-256 of a stored file, read from its name.
+
+    Args:
+        name: Storage name of a file
+
+    Returns:
+        Hex digest, or None if the file is not a blob
+    """
+    match = BLOB_NAME_PATTERN.match(name or '')
+    return match.group(1) if match else None
+
+
+def download_filename(name: Optional[str], title: str) -> str:
+    """
+    File name to present for a stored file.
+
+    Args:
+        name: Storage name of the file
+        title: Title of the owning row, used when the stored name is a blob hash
+
+    Returns:
+        File name with extension
+    """
+    if not name:
+        return ''
+    if blob_content_hash(name):
+        stem = UNSAFE_FILENAME_PATTERN.sub('_', title).strip() or 'document'
+        return f"{stem}{os.path.splitext(name)[1]}"
+    return os.path.basename(name)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files by the SHA-256 of their content."""
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save
+        return name
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1].lower()
+        directory = self.path(BLOB_DIRECTORY)
+        os.makedirs(directory, exist_ok=True)
+
+        digest = hashlib.sha256()
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix=UPLOAD_SUFFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    f.write(chunk)
+
+            stored_name = blob_name(digest.hexdigest(), extension)
+            path = self.path(stored_name)
+            if os.path.exists(path):
+                # Same content is already stored; the new mtime keeps gc_blobs off it
+                os.remove(temporary)
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.chmod(temporary, self.file_permissions_mode or 0o644)
+                # A concurrent upload of the same content replaces it with identical bytes
+                os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return stored_name
+
+
+blob_storage = ContentAddressedStorage()
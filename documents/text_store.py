@@ -0,0 +1,150 @@
+"""
+Persistent store of text extracted from document files.
+
+Parsing a PDF or Word file is far more expensive than reading a row, so
+extracted text is stored once per (SHA-256 of the file contents,
+extractor version) and shared by every caller: embeddings, analysis
+prompts, previews and keyword indexing. Identical files uploaded to
+several cases share one entry, and bumping the extractor version makes
+old entries unreachable so texts are re-extracted with the new code.
+
+Texts are stored zlib-compressed and only decompressed when read. Text
+that is extracted piece by piece can be compressed as it streams with a
+StoredTextWriter.
+"""
+
+import logging
+import zlib
+from typing import Dict, Iterable, Optional, Set
+
+from .models import Document, ExtractedText
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_LEVEL = 6
+
+
+def document_content_hash(document: Document) -> str:
+    """
+    Get the content hash of a document's file, computing and saving it if missing.
+
+    Args:
+        document: The Document model instance
+
+    Returns:
+        SHA-256 hex digest of the file contents
+    """
+    if not document.content_hash:
+        document.content_hash = document.compute_content_hash()
+        # Update the column only; a full save() would re-run upload handling
+        Document.objects.filter(pk=document.pk).update(content_hash=document.content_hash)
+    return document.content_hash
+
+
+def has_stored_text(content_hash: str, extractor_version: int) -> bool:
+    """Whether text of this file content and extractor version is stored."""
+    return ExtractedText.objects.filter(content_hash=content_hash, extractor_version=extractor_version).exists()
+
+
+def get_stored_text(content_hash: str, extractor_version: int) -> Optional[str]:
+    """
+    Look up stored text.
+
+    Args:
+        content_hash: SHA-256 of the file contents
+        extractor_version: Version of the extraction code
+
+    Returns:
+        The extracted text, or None if it is not stored
+    """
+    rows = ExtractedText.objects.filter(
+        content_hash=content_hash, extractor_version=extractor_version
+    ).values_list('text_data', flat=True)[:1]
+    for text_data in rows:
+        return zlib.decompress(bytes(text_data)).decode('utf-8')
+    return None
+
+
+def stored_hashes(content_hashes: Iterable[str], extractor_version: int) -> Set[str]:
+    """
+    Find which of several file contents have stored text.
+
+    Args:
+        content_hashes: SHA-256 digests of file contents
+        extractor_version: Version of the extraction code
+
+    Returns:
+        The digests whose text is stored
+    """
+    return set(ExtractedText.objects.filter(
+        content_hash__in=list(content_hashes), extractor_version=extractor_version
+    ).values_list('content_hash', flat=True))
+
+
+def store_text(content_hash: str, extractor_version: int, text: str) -> None:
+    """
+    Store extracted text; an existing entry for the same content is kept.
+
+    Args:
+        content_hash: SHA-256 of the file contents
+        extractor_version: Version of the extraction code
+        text: Extracted text
+    """
+    store_texts({content_hash: text}, extractor_version)
+
+
+def store_texts(texts: Dict[str, str], extractor_version: int) -> None:
+    """
+    Store several extracted texts in one insert; existing entries are kept.
+
+    Args:
+        texts: Dictionary mapping content hashes to extracted texts
+        extractor_version: Version of the extraction code
+    """
+    ExtractedText.objects.bulk_create([
+        ExtractedText(
+            content_hash=content_hash,
+            extractor_version=extractor_version,
+            text_data=zlib.compress(text.encode('utf-8'), COMPRESSION_LEVEL),
+            char_count=len(text),
+        )
+        for content_hash, text in texts.items()
+    ], ignore_conflicts=True)
+
+
+class StoredTextWriter:
+    """
+    Compress extracted text piece by piece and store it once complete.
+
+    Only the compressed bytes are kept, so the full text is never held in
+    memory while it streams through.
+    """
+
+    def __init__(self, content_hash: str, extractor_version: int):
+        """
+        Initialize the writer.
+
+        Args:
+            content_hash: SHA-256 of the file contents
+            extractor_version: Version of the extraction code
+        """
+        self.content_hash = content_hash
+        self.extractor_version = extractor_version
+        self.char_count = 0
+        self._compressor = zlib.compressobj(COMPRESSION_LEVEL)
+        self._blocks = []
+
+    def write(self, piece: str) -> None:
+        """Compress the next piece of the text."""
+        self._blocks.append(self._compressor.compress(piece.encode('utf-8')))
+        self.char_count += len(piece)
+
+    def save(self) -> None:
+        """Store the text written so far; an existing entry for the same content is kept."""
+        self._blocks.append(self._compressor.flush())
+        ExtractedText.objects.bulk_create([ExtractedText(
+            content_hash=self.content_hash,
+            extractor_version=self.extractor_version,
+            text_data=b''.join(self._blocks),
+            char_count=self.char_count,
+        )], ignore_conflicts=True)
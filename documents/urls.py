@@ -10,6 +10,9 @@ urlpatterns = [
     path('recent/', views.recent_documents, name='recent_documents'),
     path('<int:case_id>/', views.document_list, name='document_list'),
     path('delete/<int:document_id>/', views.document_delete, name='document_delete'),
+    path('download/<int:document_id>/', views.document_download, name='document_download'),
+    path('sensitive/<int:document_id>/download/', views.sensitive_document_download,
+         name='sensitive_document_download'),
 
     # Document Template URLs
     path('templates/', views.template_list, name='template_list'),
@@ -4,19 +4,45 @@ Utility functions for document handling.
 
 import os
 import logging
+import multiprocessing
 import tempfile
-from typing import Optional
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterator, Optional, Tuple
 from django.conf import settings
 from .models import Document
+from .text_store import (
+    StoredTextWriter, document_content_hash, get_stored_text, has_stored_text, store_text,
+)
 
 logger = logging.getLogger(__name__)
 
-def extract_text_from_document(document: Document) -> Optional[str]:
+# Bump when extraction output changes so stored texts are re-extracted
+TEXT_EXTRACTOR_VERSION = 1
+
+# Characters read per block from text files
+TEXT_READ_CHARS = 64 * 1024
+
+# Length of the precomputed preview column, and PDF pages read to build a preview
+PREVIEW_LENGTH = 1000
+PREVIEW_MAX_PAGES = getattr(settings, 'DOCUMENT_PREVIEW_MAX_PAGES', 3)
+
+# Parallel PDF extraction: processes (0 = serial), minimum pages and pages per task
+PDF_EXTRACTION_WORKERS = getattr(settings, 'PDF_EXTRACTION_WORKERS', 0)
+PDF_PARALLEL_MIN_PAGES = getattr(settings, 'PDF_PARALLEL_MIN_PAGES', 200)
+PDF_PAGES_PER_TASK = getattr(settings, 'PDF_PAGES_PER_TASK', 50)
+
+def extract_text_from_document(document: Document, use_store: bool = True) -> Optional[str]:
     """
     Extract text content from a document file.
     
+    The text is read from the extracted-text store if this file content
+    was extracted before, and stored after a successful extraction.
+    
     Args:
         document: The Document model instance
+        use_store: Whether to read and write the extracted-text store
         
     Returns:
         Extracted text or None if extraction failed
@@ -24,62 +50,266 @@ def extract_text_from_document(document: Document) -> Optional[str]:
     if not document.file:
         logger.warning(f"Document {document.id} has no file")
         return None
+    if not use_store:
+        return _extract_text(document)
+    
+    content_hash = None
+    try:
+        content_hash = document_content_hash(document)
+        text = get_stored_text(content_hash, TEXT_EXTRACTOR_VERSION)
+        if text is not None:
+            return text
+    except Exception as e:
+        logger.warning(f"Error reading stored text of document {document.id}: {str(e)}")
+    
+    text = _extract_text(document)
+    if text is not None and content_hash:
+        try:
+            store_text(content_hash, TEXT_EXTRACTOR_VERSION, text)
+        except Exception as e:
+            logger.warning(f"Error storing text of document {document.id}: {str(e)}")
+    return text
+
+def stream_document_text(document: Document) -> Iterator[str]:
+    """
+    Get the text of a document piece by piece, storing it as it streams.
+    
+    A stored text is yielded as one piece. Otherwise the file is parsed
+    with iter_document_text and every piece is compressed into the
+    extracted-text store as it passes, so consumers such as the chunker
+    never need the whole text at once. The entry is written when the
+    stream is exhausted.
+    
+    Args:
+        document: The Document model instance
         
-    file_path = document.file.path
-    file_extension = os.path.splitext(file_path)[1].lower()
+    Returns:
+        Iterator of text pieces; extraction errors are raised while iterating
+    """
+    if not document.file:
+        logger.warning(f"Document {document.id} has no file")
+        return
     
+    writer = None
     try:
-        # Plain text files
-        if file_extension in ['.txt', '.md', '.csv']:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
-                
-        # PDF files
-        elif file_extension == '.pdf':
-            try:
-                import PyPDF2
-                
-                with open(file_path, 'rb') as f:
-                    pdf_reader = PyPDF2.PdfReader(f)
-                    text = ""
-                    for page_num in range(len(pdf_reader.pages)):
-                        text += pdf_reader.pages[page_num].extract_text() + "\n"
-                    return text
-            except ImportError:
-                logger.warning("PyPDF2 not installed, falling back to basic text extraction")
-                # Fall back to basic text extraction
-                with open(file_path, 'rb') as f:
-                    return str(f.read())
-                    
-        # Word documents
-        elif file_extension in ['.doc', '.docx']:
-            try:
-                import docx
-                
-                doc = docx.Document(file_path)
-                text = ""
-                for para in doc.paragraphs:
-                    text += para.text + "\n"
-                return text
-            except ImportError:
-                logger.warning("python-docx not installed, falling back to basic text extraction")
-                # Fall back to basic text extraction
-                with open(file_path, 'rb') as f:
-                    return str(f.read())
+        content_hash = document_content_hash(document)
+        text = get_stored_text(content_hash, TEXT_EXTRACTOR_VERSION)
+        if text is None:
+            writer = StoredTextWriter(content_hash, TEXT_EXTRACTOR_VERSION)
+    except Exception as e:
+        logger.warning(f"Error reading stored text of document {document.id}: {str(e)}")
+        text = None
+    if text is not None:
+        yield text
+        return
+    
+    for piece in iter_document_text(document):
+        if writer is not None:
+            writer.write(piece)
+        yield piece
+    
+    if writer is not None:
+        try:
+            writer.save()
+        except Exception as e:
+            logger.warning(f"Error storing text of document {document.id}: {str(e)}")
+
+def precompute_document_text(document: Document) -> bool:
+    """
+    Extract and store a document's text unless it is stored already.
+    
+    Args:
+        document: The Document model instance
         
-        # Other file types - just read as binary and convert to string
-        else:
-            with open(file_path, 'rb') as f:
-                return str(f.read())
-                
+    Returns:
+        True if the text was extracted, False if it was stored already or extraction failed
+    """
+    if not document.file:
+        return False
+    if has_stored_text(document_content_hash(document), TEXT_EXTRACTOR_VERSION):
+        return False
+    return extract_text_from_document(document) is not None
+
+def _extract_text(document: Document) -> Optional[str]:
+    """Parse the document file, bypassing the extracted-text store."""
+    try:
+        return ''.join(iter_document_text(document))
     except Exception as e:
         logger.error(f"Error extracting text from document {document.id}: {str(e)}")
         return None
+
+def iter_document_text(document: Document, workers: Optional[int] = None) -> Iterator[str]:
+    """
+    Extract the text of a document file piece by piece.
+    
+    Pieces are pages for PDFs, paragraphs for Word documents and blocks of
+    TEXT_READ_CHARS characters for text files; joined, they give the full
+    text. Consumers such as the chunker can process them as they arrive,
+    so only a window of the text is in memory at a time.
+    
+    Args:
+        document: The Document model instance
+        workers: Processes extracting PDF page ranges in parallel
+            (default: PDF_EXTRACTION_WORKERS)
+        
+    Returns:
+        Iterator of text pieces; errors are raised while iterating
+    """
+    file_path = document.file.path
+    file_extension = os.path.splitext(file_path)[1].lower()
+    
+    # Plain text files
+    if file_extension in ['.txt', '.md', '.csv']:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            for block in iter(lambda: f.read(TEXT_READ_CHARS), ''):
+                yield block
+    
+    # PDF files
+    elif file_extension == '.pdf':
+        try:
+            import PyPDF2  # noqa: F401
+        except ImportError:
+            logger.warning("PyPDF2 not installed, falling back to basic text extraction")
+            # Fall back to basic text extraction
+            with open(file_path, 'rb') as f:
+                yield str(f.read())
+            return
+        yield from iter_pdf_text(file_path, workers)
+    
+    # Word documents
+    elif file_extension in ['.doc', '.docx']:
+        try:
+            import docx
+        except ImportError:
+            logger.warning("python-docx not installed, falling back to basic text extraction")
+            # Fall back to basic text extraction
+            with open(file_path, 'rb') as f:
+                yield str(f.read())
+            return
+        for para in docx.Document(file_path).paragraphs:
+            yield para.text + "\n"
+    
+    # Other file types - just read as binary and convert to string
+    else:
+        with open(file_path, 'rb') as f:
+            yield str(f.read())
+
+def iter_pdf_text(file_path: str, workers: Optional[int] = None) -> Iterator[str]:
+    """
+    Extract the text of a PDF page by page.
+    
+    PDFs with at least PDF_PARALLEL_MIN_PAGES pages are split into ranges
+    of PDF_PAGES_PER_TASK pages that are extracted by a process pool; at
+    most two ranges per worker are in flight, so memory stays bounded.
+    
+    Args:
+        file_path: Path of the PDF file
+        workers: Number of worker processes (default: PDF_EXTRACTION_WORKERS;
+            0 or 1 extracts serially)
         
-def get_document_preview(document: Document, max_length: int = 1000) -> Optional[str]:
+    Returns:
+        Iterator of page texts, or of page range texts when parallel
+    """
+    import PyPDF2
+    
+    if workers is None:
+        workers = PDF_EXTRACTION_WORKERS
+    
+    with open(file_path, 'rb') as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        page_count = len(pdf_reader.pages)
+        # Daemonic processes (e.g. Celery prefork workers) cannot start a pool
+        if workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES or multiprocessing.current_process().daemon:
+            for page in pdf_reader.pages:
+                yield (page.extract_text() or '') + "\n"
+            return
+    
+    logger.info(f"Extracting {page_count} pages of {file_path} with {workers} processes")
+    ranges = iter([
+        (start, min(start + PDF_PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PDF_PAGES_PER_TASK)
+    ])
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = deque(
+            executor.submit(_extract_pdf_pages, file_path, start, end)
+            for start, end in islice(ranges, workers * 2)
+        )
+        while pending:
+            text = pending.popleft().result()
+            for start, end in islice(ranges, 1):
+                pending.append(executor.submit(_extract_pdf_pages, file_path, start, end))
+            yield text
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> str:
+    """Extract the text of pages [start, end) of a PDF (runs in a worker process)."""
+    import PyPDF2
+    
+    with open(file_path, 'rb') as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        return ''.join((pdf_reader.pages[i].extract_text() or '') + "\n" for i in range(start, end))
+        
+def extract_text_prefix(document: Document, max_chars: int,
+                        max_pages: Optional[int] = None) -> Tuple[Optional[str], bool]:
+    """
+    Extract the beginning of a document's text without reading the whole file.
+    
+    A stored full text is sliced; otherwise extraction stops once max_chars
+    characters or, for PDFs, max_pages pages have been read.
+    
+    Args:
+        document: The Document model instance
+        max_chars: Maximum number of characters to return
+        max_pages: Maximum number of PDF pages to read (default: PREVIEW_MAX_PAGES)
+        
+    Returns:
+        Tuple of (text prefix or None if extraction failed, whether the text continues)
+    """
+    if not document.file:
+        return None, False
+    if max_pages is None:
+        max_pages = PREVIEW_MAX_PAGES
+    
+    if document.content_hash:
+        try:
+            text = get_stored_text(document.content_hash, TEXT_EXTRACTOR_VERSION)
+            if text is not None:
+                return text[:max_chars], len(text) > max_chars
+        except Exception as e:
+            logger.warning(f"Error reading stored text of document {document.id}: {str(e)}")
+    
+    is_pdf = document.get_file_extension() == '.pdf'
+    pieces = []
+    size = 0
+    stopped_early = False
+    try:
+        stream = iter_document_text(document, workers=0)
+        try:
+            for count, piece in enumerate(stream, start=1):
+                pieces.append(piece)
+                size += len(piece)
+                if size > max_chars or (is_pdf and count >= max_pages):
+                    stopped_early = True
+                    break
+        finally:
+            stream.close()
+    except Exception as e:
+        logger.error(f"Error extracting text from document {document.id}: {str(e)}")
+        return None, False
+    
+    text = ''.join(pieces)
+    return text[:max_chars], stopped_early and (len(text) > max_chars or is_pdf)
+
+def get_document_preview(document: Document, max_length: int = PREVIEW_LENGTH) -> Optional[str]:
     """
     Get a preview of the document content.
     
+    Uses the precomputed preview column when it covers max_length, so
+    list pages do no file I/O; otherwise only the beginning of the file
+    is extracted.
+    
     Args:
         document: The Document model instance
         max_length: Maximum length of the preview
@@ -87,10 +317,51 @@ def get_document_preview(document: Document, max_length: int = 1000) -> Optional
     Returns:
         Document preview or None if extraction failed
     """
-    text = extract_text_from_document(document)
+    preview = document.preview
+    if preview:
+        # The column holds the first PREVIEW_LENGTH characters, plus "..." if the text continues
+        text = preview[:PREVIEW_LENGTH]
+        truncated = len(preview) > PREVIEW_LENGTH
+        if max_length <= PREVIEW_LENGTH or not truncated:
+            return _truncate(text, max_length, truncated)
+    
+    text, truncated = extract_text_prefix(document, max_length)
     if text:
-        # Truncate to max_length
-        if len(text) > max_length:
-            return text[:max_length] + "..."
-        return text
+        return _truncate(text, max_length, truncated)
     return None
+
+def preview_from_text(text: Optional[str]) -> str:
+    """
+    Build the preview column value from a document's full text.
+    
+    Args:
+        text: Extracted text
+        
+    Returns:
+        The first PREVIEW_LENGTH characters, with "..." if the text continues
+    """
+    return _truncate(text, PREVIEW_LENGTH) if text else ''
+
+def update_document_preview(document: Document) -> str:
+    """
+    Recompute and save the preview column of a document.
+    
+    Args:
+        document: The Document model instance
+        
+    Returns:
+        The new preview ('' if no text could be extracted)
+    """
+    text, truncated = extract_text_prefix(document, PREVIEW_LENGTH)
+    document.preview = _truncate(text, PREVIEW_LENGTH, truncated) if text else ''
+    # Update the column only; a full save() would re-run upload handling
+    Document.objects.filter(pk=document.pk).update(preview=document.preview)
+    return document.preview
+
+def _truncate(text: str, max_length: int, continues: bool = False) -> str:
+    """Cut text to max_length characters, adding "..." if anything was cut."""
+    if len(text) > max_length:
+        return text[:max_length] + "..."
+    if continues:
+        return text + "..."
+    return text
@@ -2,11 +2,14 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse
+from django.http import Http404
+from django.core.exceptions import PermissionDenied
 from django.core.paginator import Paginator
-from .models import Document, DocumentTemplate
+from .downloads import encrypted_file_response, file_response
+from .models import Document, DocumentTemplate, SensitiveDocument
 from .forms import DocumentForm, DocumentTemplateForm
 from cases.models import Case
+from core.models import AuditLog
 import os
 
 @login_required
@@ -126,7 +129,7 @@ def template_detail(request, template_id):
             template.icon_class = 'fa-file'
 
         # Get filename
-        template.filename = template.file.name.split('/')[-1]
+        template.filename = template.get_download_filename()
     else:
         file_ext = ''
         template.icon_class = 'fa-file'
@@ -160,9 +163,45 @@ def template_delete(request, template_id):
 def template_download(request, template_id):
     """View for downloading a document template."""
     template = get_object_or_404(DocumentTemplate, id=template_id)
+    if not template.file:
+        raise Http404
+    return file_response(request, template.file, template.get_download_filename(),
+                         as_attachment=request.GET.get('inline') != '1')
 
-    # Open the file and create a response with the file content
-    response = HttpResponse(template.file, content_type='application/octet-stream')
-    response['Content-Disposition'] = f'attachment; filename="{template.file.name.split("/")[-1]}"'
+@login_required
+def document_download(request, document_id):
+    """View for downloading a document file (clients use the portal)."""
+    document = get_object_or_404(Document, id=document_id)
+    if request.user.is_client:
+        raise PermissionDenied
+    if not document.file:
+        raise Http404
+    return file_response(request, document.file, document.get_download_filename(),
+                         as_attachment=request.GET.get('download') == '1',
+                         content_hash=document.content_hash)
 
-    return response
\ No newline at end of file
+@login_required
+def sensitive_document_download(request, document_id):
+    """View for streaming the decrypted file of a sensitive document."""
+    document = get_object_or_404(SensitiveDocument, id=document_id)
+
+    if not (request.user.has_perm('documents.view_any_sensitive_document')
+            or document.uploaded_by_id == request.user.id
+            or document.authorized_users.filter(id=request.user.id).exists()):
+        raise PermissionDenied
+
+    # Viewers fetch large files in many ranges; audit the opening request only
+    byte_range = request.headers.get('Range', '')
+    if not byte_range or byte_range.startswith('bytes=0-'):
+        AuditLog.log(
+            user=request.user,
+            action='VIEW',
+            obj=document,
+            ip_address=request.META.get('REMOTE_ADDR'),
+            user_agent=request.META.get('HTTP_USER_AGENT', ''),
+            additional_data={'download': True}
+        )
+
+    filename = f"{os.path.splitext(os.path.basename(document.file.name))[0]}{document.file_type}"
+    return encrypted_file_response(request, document.file, filename,
+                                   as_attachment=request.GET.get('download') == '1')
@@ -82,6 +82,9 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+        # Build the test database from the models; the migration history
+        # contains hand-written fixes that only apply to existing databases
+        "TEST": {"MIGRATE": False},
     }
 }
 
@@ -133,6 +136,8 @@ LOGIN_REDIRECT_URL = 'core:role_based_redirect'
 
 # Document encryption settings
 ENCRYPTION_KEY = 'development-key-only'
+# Keys the blind indexes of encrypted fields; never rotated with ENCRYPTION_KEY
+BLIND_INDEX_KEY = 'development-blind-index-key-only'
 
 # AI Services settings
 ENABLE_AI_FEATURES = True
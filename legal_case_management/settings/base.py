@@ -151,6 +151,12 @@ ENCRYPTION_KEY = os.getenv('DOCUMENT_ENCRYPTION_KEY', None)
 if not ENCRYPTION_KEY and not DEBUG:
     raise ValueError("DOCUMENT_ENCRYPTION_KEY must be set in production!")
 
+# Keys the blind indexes of encrypted fields; it is never rotated with
+# ENCRYPTION_KEY, as changing it means rebuilding every index
+BLIND_INDEX_KEY = os.getenv('BLIND_INDEX_KEY', None)
+if not BLIND_INDEX_KEY and not DEBUG:
+    raise ValueError("BLIND_INDEX_KEY must be set in production!")
+
 # AI Services settings - from environment
 ENABLE_AI_FEATURES = os.getenv('ENABLE_AI_FEATURES', 'True') == 'True'
 DEFAULT_LLM_MODEL = os.getenv('DEFAULT_LLM_MODEL', 'gemma-3-12b-it-qat')
@@ -45,6 +45,7 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 # For development, we can use a simpler encryption key
 ENCRYPTION_KEY = "development-key-DO-NOT-USE-IN-PRODUCTION"
+BLIND_INDEX_KEY = "development-blind-index-key-DO-NOT-USE-IN-PRODUCTION"
 
 # Disable security features for development
 SECURE_SSL_REDIRECT = False
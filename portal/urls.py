@@ -11,6 +11,7 @@ urlpatterns = [
     path('cases/', views.client_cases, name='cases'),
     path('cases/<int:case_id>/', views.client_case_detail, name='case_detail'),
     path('documents/', views.client_documents, name='documents'),
+    path('documents/<int:document_id>/download/', views.document_download, name='document_download'),
     path('messages/', views.client_messages, name='messages'),
     path('messages/create/', views.create_message, name='create_message'),
     path('messages/<int:thread_id>/', views.message_thread, name='message_thread'),
@@ -4,11 +4,12 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
 from django.db.models import Q, Count, Prefetch
-from django.http import HttpResponseForbidden
+from django.http import Http404, HttpResponseForbidden
 
 from .models import PortalAccess, ClientTask, MessageThread, Message, Notification
 from .forms import MessageForm, MessageThreadForm, ClientTaskForm
 from cases.models import Case
+from documents.downloads import file_response
 from documents.models import Document
 from clients.models import Client
 
@@ -84,7 +85,7 @@ def client_dashboard(request):
 
         # Get recent documents
         documents = Document.objects.filter(
-            case__in=cases
+            case__in=cases, is_private=False
         ).order_by('-uploaded_at')[:5]
 
         context = {
@@ -128,7 +129,7 @@ def client_case_detail(request, case_id):
         case = get_object_or_404(Case, id=case_id, client=client)
 
         # Get case documents
-        documents = Document.objects.filter(case=case).order_by('-uploaded_at')
+        documents = Document.objects.filter(case=case, is_private=False).order_by('-uploaded_at')
 
         # Get case tasks
         tasks = ClientTask.objects.filter(case=case).order_by('due_date')
@@ -162,7 +163,7 @@ def client_documents(request):
     try:
         client = Client.objects.filter(user=request.user).first()
         cases = Case.objects.filter(client=client)
-        documents = Document.objects.filter(case__in=cases).order_by('-uploaded_at')
+        documents = Document.objects.filter(case__in=cases, is_private=False).order_by('-uploaded_at')
 
         return render(request, 'portal/documents.html', {'documents': documents})
 
@@ -170,6 +171,19 @@ def client_documents(request):
         messages.error(request, f"Error loading documents: {str(e)}")
         return render(request, 'portal/documents.html', {'error': str(e)})
 
+@client_required
+def document_download(request, document_id):
+    """
+    Download a document of one of the client's cases.
+    """
+    client = Client.objects.filter(user=request.user).first()
+    document = get_object_or_404(Document, id=document_id, case__client=client, is_private=False)
+    if not document.file:
+        raise Http404
+    return file_response(request, document.file, document.get_download_filename(),
+                         as_attachment=request.GET.get('download') == '1',
+                         content_hash=document.content_hash)
+
 @client_required
 def client_messages(request):
     """
@@ -2,88 +2,78 @@
 Management command to migrate client data to secure storage.
 
 This command copies sensitive client data to the secure client data models.
+Clients and contacts without secure data are copied in primary-key order
+with keyset pagination, one bulk_create and transaction per batch, so the
+command can be interrupted and rerun. Encrypted values are copied as the
+stored ciphertext, without decrypting and encrypting them again.
 """
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from clients.models import Client, ClientContact
 from secure_clients.models import SecureClientData, SecureContactData
 
+CLIENT_FIELDS = (
+    'first_name', 'last_name', 'ssn_last_four', 'email', 'phone', 'mobile',
+    'address_line1', 'address_line2', 'city', 'state', 'postal_code', 'country',
+    'company_name', 'tax_id', 'notes',
+)
+
+CONTACT_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'mobile', 'notes')
+
 
 class Command(BaseCommand):
     help = 'Migrates sensitive client data to secure storage'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows copied per transaction (default: 500)',
+        )
+
     def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
         self.stdout.write(self.style.NOTICE('Starting client data migration...'))
-        
-        # Migrate client data
-        with transaction.atomic():
-            clients_count = self._migrate_clients()
-            contacts_count = self._migrate_contacts()
-        
+
+        clients_count = self._migrate(
+            Client.objects.filter(secure_data__isnull=True), SecureClientData, 'client',
+            CLIENT_FIELDS, options['batch_size'], 'clients',
+        )
+        contacts_count = self._migrate(
+            ClientContact.objects.filter(secure_data__isnull=True), SecureContactData, 'contact',
+            CONTACT_FIELDS, options['batch_size'], 'contacts',
+        )
+
         self.stdout.write(self.style.SUCCESS(
             f'Successfully migrated {clients_count} clients and {contacts_count} contacts to secure storage'
         ))
-    
-    def _migrate_clients(self):
-        """Migrate client data to secure storage."""
-        count = 0
-        
-        for client in Client.objects.all():
-            # Skip if secure data already exists
-            if hasattr(client, 'secure_data'):
-                continue
-                
-            # Create secure client data
-            secure_data = SecureClientData(
-                client=client,
-                first_name=client.first_name,
-                last_name=client.last_name,
-                ssn_last_four=client.ssn_last_four,
-                email=client.email,
-                phone=client.phone,
-                mobile=client.mobile,
-                address_line1=client.address_line1,
-                address_line2=client.address_line2,
-                city=client.city,
-                state=client.state,
-                postal_code=client.postal_code,
-                country=client.country,
-                company_name=client.company_name,
-                tax_id=client.tax_id,
-                notes=client.notes
-            )
-            secure_data.save()
-            count += 1
-            
-            if count % 10 == 0:
-                self.stdout.write(f'Migrated {count} clients')
-        
-        return count
-    
-    def _migrate_contacts(self):
-        """Migrate contact data to secure storage."""
+
+    def _migrate(self, queryset, secure_model, relation, fields, batch_size, label):
+        """Copy rows of queryset into secure_model in batches."""
         count = 0
-        
-        for contact in ClientContact.objects.all():
-            # Skip if secure data already exists
-            if hasattr(contact, 'secure_data'):
-                continue
-                
-            # Create secure contact data
-            secure_data = SecureContactData(
-                contact=contact,
-                first_name=contact.first_name,
-                last_name=contact.last_name,
-                email=contact.email,
-                phone=contact.phone,
-                mobile=contact.mobile,
-                notes=contact.notes
-            )
-            secure_data.save()
-            count += 1
-            
-            if count % 10 == 0:
-                self.stdout.write(f'Migrated {count} contacts')
-        
+        queryset = queryset.order_by('pk').only('pk', *fields)
+
+        last_pk = None
+        while True:
+            batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            rows = list(batch[:batch_size])
+            if not rows:
+                break
+            last_pk = rows[-1].pk
+
+            # Loaded values are still ciphertext and are stored unchanged
+            secure_rows = [
+                secure_model(**{relation: row}, **{name: row.__dict__[name] for name in fields})
+                for row in rows
+            ]
+            with transaction.atomic():
+                # ignore_conflicts skips rows given secure data meanwhile
+                secure_model.objects.bulk_create(secure_rows, ignore_conflicts=True)
+            count += len(rows)
+            self.stdout.write(f'Migrated {count} {label}')
+
         return count
@@ -0,0 +1,83 @@
+"""
+Test cases for content-addressed document storage and file downloads.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from django.core.files.base import ContentFile
+from django.db.models.fields.files import FieldFile
+from django.http import FileResponse
+from django.test import RequestFactory, SimpleTestCase
+from documents import downloads
+from documents.models import Document
+from documents.storage import ContentAddressedStorage, blob_content_hash, download_filename
+
+
+class BlobStorageTests(SimpleTestCase):
+    """Test cases for ContentAddressedStorage."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def test_files_are_named_by_content(self):
+        """Test a file is stored under the SHA-256 of its content, keeping its extension."""
+        name = self.storage.save('case_documents/Exhibit A.PDF', ContentFile(b'exhibit'))
+        digest = hashlib.sha256(b'exhibit').hexdigest()
+        self.assertEqual(name, f'blobs/{digest[:2]}/{digest[2:4]}/{digest}.pdf')
+        self.assertEqual(blob_content_hash(name), digest)
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'exhibit')
+
+    def test_identical_files_are_stored_once(self):
+        """Test uploading the same content twice shares one file and leaves no temporary files."""
+        first = self.storage.save('case_documents/a.pdf', ContentFile(b'exhibit'))
+        second = self.storage.save('document_versions/b.pdf', ContentFile(b'exhibit'))
+        self.assertEqual(first, second)
+        files = [name for _, _, names in os.walk(self.location) for name in names]
+        self.assertEqual(len(files), 1)
+
+    def test_download_filename(self):
+        """Test blob files are offered under the title and legacy files under their own name."""
+        name = self.storage.save('a.docx', ContentFile(b'lease'))
+        self.assertEqual(download_filename(name, 'Lease: "final"'), 'Lease_ _final_.docx')
+        self.assertEqual(download_filename('case_documents/lease.docx', 'Lease'), 'lease.docx')
+        self.assertIsNone(blob_content_hash('case_documents/lease.docx'))
+
+
+class FileDownloadTests(SimpleTestCase):
+    """Test cases for file_response."""
+
+    def setUp(self):
+        """Set up test data."""
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        storage = ContentAddressedStorage(location=location)
+        name = storage.save('brief.pdf', ContentFile(b'%PDF brief'))
+        self.file = FieldFile(Document(), Document._meta.get_field('file'), name)
+        self.file.storage = storage
+        self.etag = f'"{blob_content_hash(name)}"'
+
+    def test_file_is_streamed_with_validators(self):
+        """Test the file is served from disk with an ETag, and a matching If-None-Match gets 304."""
+        response = downloads.file_response(RequestFactory().get('/'), self.file, 'Brief.pdf')
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF brief')
+        response.close()
+
+        request = RequestFactory().get('/', HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(downloads.file_response(request, self.file, 'Brief.pdf').status_code, 304)
+
+    @patch.object(downloads, 'DOWNLOAD_OFFLOAD', 'x-accel-redirect')
+    def test_offload_to_web_server(self):
+        """Test X-Accel-Redirect hands the file to nginx without a body."""
+        response = downloads.file_response(RequestFactory().get('/'), self.file, 'Brief.pdf')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.file.name}')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="Brief.pdf"')
+        self.assertEqual(response.content, b'')
@@ -1,12 +1,22 @@
 """
 Test cases for the cases app.
 """
-from django.test import TestCase, Client
+from unittest.mock import patch
+from cryptography.fernet import Fernet
+from django.test import SimpleTestCase, TestCase, Client, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from accounts.models import User
-from clients.models import Client
-from cases.models import Case, CaseNote, CaseEvent, PracticeArea, Court, ConflictCheck
+from clients.models import Client, ClientContact
+from cases import screening
+from cases.models import Case, CaseNote, CaseEvent, PracticeArea, Court, ConflictCheck, Party, PartyNameToken
+from cases.parties import (
+    MATCH_THRESHOLD, checked_parties, compare_names, jaro_winkler, match_names, normalize_party_name,
+    party_name_key,
+)
+from core.utils import encryption
+
+TEST_KEY = Fernet.generate_key().decode()
 
 
 class CaseModelTests(TestCase):
@@ -264,6 +274,259 @@ class ConflictCheckTests(TestCase):
         self.assertIn('type', conflict_check.conflict_details)
 
 
+class PartyRegistryTests(SimpleTestCase):
+    """Test cases for the conflict check party registry keys."""
+
+    def test_names_differing_in_case_accents_and_punctuation_share_a_key(self):
+        """Test party names are normalized before they are keyed."""
+        self.assertEqual(normalize_party_name('  ACME  Corp. '), 'acme corp')
+        self.assertEqual(party_name_key('José Núñez'), party_name_key('jose nunez'))
+        self.assertNotEqual(party_name_key('Acme Corp'), party_name_key('Acme Corporation'))
+        self.assertEqual(party_name_key(' , '), '')
+
+    def test_checked_parties(self):
+        """Test form entries and plain names are read from parties_checked."""
+        parties = checked_parties([{'name': 'Road Runner', 'type': 'OPPOSING_PARTY'}, 'Party B', {'name': ''}])
+        self.assertEqual(parties, [('Road Runner', 'OPPOSING_PARTY'), ('Party B', '')])
+
+    def test_jaro_winkler(self):
+        """Test the Jaro-Winkler similarity of known pairs."""
+        self.assertAlmostEqual(jaro_winkler('martha', 'marhta'), 0.961, places=3)
+        self.assertAlmostEqual(jaro_winkler('dwayne', 'duane'), 0.84, places=3)
+        self.assertEqual(jaro_winkler('abc', 'xyz'), 0.0)
+
+    def test_fuzzy_name_matches(self):
+        """Test variants of a name match and are explained, while a bare first name does not."""
+        def score(checked, registered):
+            return compare_names(normalize_party_name(checked), normalize_party_name(registered))
+
+        explanation = score('Acme Corp.', 'ACME Corporation')
+        self.assertEqual(explanation['score'], 1.0)
+        self.assertEqual(explanation['ignored_words'], ['corp', 'corporation'])
+        self.assertEqual(score('Nunez Jose', 'José Núñez')['method'], 'token_set')
+        self.assertEqual(score('Nunez Jose', 'José Núñez')['score'], 1.0)
+        self.assertGreaterEqual(score('Seton Corporatoin', 'Seton Corporation')['score'], MATCH_THRESHOLD)
+        self.assertGreaterEqual(score('Mohammed Al-Rashid', 'Muhammad Alrashid')['score'], MATCH_THRESHOLD)
+        self.assertLess(score('John', 'John Smith')['score'], MATCH_THRESHOLD)
+
+    @patch.object(screening, 'RESCREEN_ON_SAVE', 'async')
+    def test_new_parties_are_rescreened_through_celery(self):
+        """Test new registry entries are queued for re-screening, and nothing else."""
+        with patch('cases.tasks.rescreen_parties.delay') as delay, \
+                patch('cases.screening.transaction.on_commit', side_effect=lambda func: func()):
+            screening.schedule_rescreening([Party(pk=3), Party(pk=4)], skip_case_id=7)
+            screening.schedule_rescreening([])
+        delay.assert_called_once_with([3, 4], 7)
+
+
+class PartyRegistryFixture:
+    """Two organization clients with a case each, assigned to a test lawyer."""
+
+    def setUp(self):
+        """Set up test data."""
+        encryption.encryption_service = None
+        self.user = User.objects.create_user(
+            username='testlawyer',
+            email='lawyer@test.com',
+            password='TestPass123!',
+            role='LAWYER'
+        )
+        self.acme = self.create_client('Acme Corporation')
+        self.acme_case = self.create_case(self.acme, 'AC001', opposing_counsel='Road Runner LLP')
+        self.beta = self.create_client('Beta Industries')
+        self.beta_case = self.create_case(self.beta, 'BI001')
+
+    def tearDown(self):
+        """Drop the encryption service built with the test key."""
+        encryption.encryption_service = None
+
+    def create_client(self, company_name):
+        """Create an organization client with its own user account."""
+        username = company_name.split()[0].lower()
+        user = User.objects.create_user(username=username, email=f'{username}@test.com', password='TestPass123!')
+        return Client.objects.create(user=user, client_type='ORGANIZATION', company_name=company_name)
+
+    def create_case(self, client, case_number, **fields):
+        """Create an open case of a client assigned to the test lawyer."""
+        return Case.objects.create(
+            title=f'Matter {case_number}',
+            case_number=case_number,
+            client=client,
+            case_type='CORPORATE',
+            description='Test matter',
+            assigned_attorney=self.user,
+            **fields
+        )
+
+    def check(self, case, *parties):
+        """Run a conflict check of a case for (name, type) parties."""
+        conflict_check = ConflictCheck.objects.create(
+            case=case,
+            checked_by=self.user,
+            parties_checked=[{'name': name, 'type': party_type} for name, party_type in parties],
+        )
+        conflict_check.perform_check()
+        return conflict_check
+
+
+@override_settings(ENCRYPTION_KEY=TEST_KEY)
+class PartyRegistryDatabaseTests(PartyRegistryFixture, TestCase):
+    """Test cases for registering parties and checking cases against the registry."""
+
+    def test_clients_contacts_and_counsel_are_registered(self):
+        """Test saving clients, contacts and cases registers their names with trigram tokens."""
+        contact = ClientContact.objects.create(client=self.acme, first_name='Wile', last_name='Coyote')
+
+        registered = {(party.role, party.name, party.client_id, party.case_id)
+                      for party in Party.objects.filter(client=self.acme) | Party.objects.filter(case=self.acme_case)}
+        self.assertEqual(registered, {
+            ('CLIENT', 'Acme Corporation', self.acme.pk, None),
+            ('CLIENT_CONTACT', 'Wile Coyote', self.acme.pk, None),
+            ('OPPOSING_COUNSEL', 'Road Runner LLP', None, self.acme_case.pk),
+        })
+        self.assertTrue(PartyNameToken.objects.filter(party__contact=contact).exists())
+
+        contact.last_name = 'E. Coyote'
+        contact.save()
+        self.assertEqual([party.name for party in Party.objects.filter(contact=contact)], ['Wile E. Coyote'])
+
+    def test_check_matches_parties_of_other_clients_and_cases(self):
+        """Test a check finds variants of other clients' names and registers the checked parties."""
+        conflict_check = self.check(self.beta_case, ('ACME Corp.', 'OPPOSING_PARTY'), ('Roadrunner LLP', 'WITNESS'))
+
+        self.assertTrue(conflict_check.conflicts_found)
+        conflicts = {(entry['party_name'], entry['role'], entry['case_id'])
+                     for entry in conflict_check.conflict_details['potential_conflicts']}
+        self.assertEqual(conflicts, {
+            ('ACME Corp.', 'CLIENT', self.acme_case.pk),
+            ('Roadrunner LLP', 'OPPOSING_COUNSEL', self.acme_case.pk),
+        })
+        self.assertEqual(
+            sorted(Party.objects.filter(case=self.beta_case).values_list('role', flat=True)),
+            ['OPPOSING_PARTY', 'WITNESS'],
+        )
+
+    def test_candidates_are_capped_after_the_registry_filter(self):
+        """Test excluded entries sharing more trigrams don't crowd out the allowed ones."""
+        Party.objects.create(name='Acme Corporations', role='RELATED_ENTITY', case=self.beta_case)
+
+        with patch('cases.parties.MAX_CANDIDATES', 1):
+            matches = match_names(['Acme Corporation'], Party.objects.exclude(client=self.acme))
+
+        self.assertEqual([party.name for party, _ in matches['Acme Corporation']], ['Acme Corporations'])
+
+    def test_check_excludes_the_case_and_its_client(self):
+        """Test a case's own client, its other cases and its own parties are not conflicts."""
+        other_acme_case = self.create_case(self.acme, 'AC002')
+
+        conflict_check = self.check(other_acme_case, ('Acme Corporation', 'CLIENT'), ('Road Runner LLP', 'OPPOSING_COUNSEL'))
+
+        self.assertFalse(conflict_check.conflicts_found)
+        self.assertEqual(conflict_check.conflict_details['potential_conflicts'], [])
+
+
+@override_settings(ENCRYPTION_KEY=TEST_KEY)
+class RescreeningTests(PartyRegistryFixture, TestCase):
+    """Test cases for re-screening new parties against the registry."""
+
+    def setUp(self):
+        """Set up test data."""
+        super().setUp()
+        self.acme_party = Party.objects.get(client=self.acme, role='CLIENT')
+
+    def add_party(self, name, role, case):
+        """Register a party of a case."""
+        return Party.objects.create(name=name, role=role, case=case)
+
+    def test_saving_a_client_rescreens_it_once_committed(self):
+        """Test a new client matching a registered party gets flagged by default, without a broker."""
+        party = self.add_party('Gamma Holdings', 'OPPOSING_PARTY', self.beta_case)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            gamma = self.create_client('Gamma Holdings Inc.')
+
+        check = ConflictCheck.objects.get()
+        self.assertEqual(check.case, self.beta_case)
+        self.assertEqual(check.check_source, 'AUTOMATED')
+        gamma_party = Party.objects.get(client=gamma, role='CLIENT')
+        self.assertEqual(check.conflict_details['details']['party_pairs'], [sorted([party.pk, gamma_party.pk])])
+
+    def test_client_match_flags_the_cases_on_both_sides(self):
+        """Test a new party matching a client flags its own case and the client's cases."""
+        party = self.add_party('ACME Corp.', 'OPPOSING_PARTY', self.beta_case)
+
+        screening.rescreen_parties([party.pk])
+
+        self.assertEqual(ConflictCheck.objects.count(), 2)
+        checks = {check.case_id: check for check in ConflictCheck.objects.all()}
+        self.assertEqual(set(checks), {self.acme_case.pk, self.beta_case.pk})
+        for check in checks.values():
+            self.assertEqual(check.checked_by, self.user)
+            self.assertEqual(check.check_source, 'AUTOMATED')
+            self.assertEqual(check.resolution_status, 'POTENTIAL_CONFLICT')
+            self.assertTrue(check.conflicts_found)
+            details = check.conflict_details['details']
+            self.assertTrue(details['rescreening'])
+            self.assertEqual(details['new_parties'], [party.pk])
+            self.assertEqual(details['party_pairs'], [sorted([party.pk, self.acme_party.pk])])
+
+        beta_check = checks[self.beta_case.pk]
+        self.assertEqual(beta_check.parties_checked, [{'name': 'ACME Corp.', 'type': 'OPPOSING_PARTY'}])
+        self.assertEqual(
+            [(entry['party_name'], entry['party_id'], entry['role'], entry['case_id'])
+             for entry in beta_check.conflict_details['potential_conflicts']],
+            [('ACME Corp.', self.acme_party.pk, 'CLIENT', self.acme_case.pk)],
+        )
+        acme_check = checks[self.acme_case.pk]
+        self.assertEqual(acme_check.parties_checked, [{'name': 'Acme Corporation', 'type': 'CLIENT'}])
+        self.assertEqual(
+            [(entry['party_name'], entry['party_id'], entry['role'], entry['case_id'])
+             for entry in acme_check.conflict_details['potential_conflicts']],
+            [('Acme Corporation', party.pk, 'OPPOSING_PARTY', self.beta_case.pk)],
+        )
+
+    def test_matches_without_a_client_are_not_flagged(self):
+        """Test a match between parties that are neither clients nor contacts is not a conflict."""
+        party = self.add_party('Roadrunner LLP', 'OPPOSING_PARTY', self.beta_case)
+
+        self.assertEqual(screening.rescreen_parties([party.pk]), [])
+        self.assertFalse(ConflictCheck.objects.exists())
+
+    def test_matches_within_a_client_or_case_are_not_flagged(self):
+        """Test matches with parties of the same client or case are not conflicts."""
+        other_acme_case = self.create_case(self.acme, 'AC002')
+        parties = [
+            self.add_party('Acme Corp.', 'RELATED_ENTITY', other_acme_case),
+            self.add_party('Roadrunner LLP', 'CLIENT_CONTACT', self.acme_case),
+        ]
+
+        self.assertEqual(screening.rescreen_parties([party.pk for party in parties]), [])
+        self.assertFalse(ConflictCheck.objects.exists())
+
+    def test_closed_and_skipped_cases_are_not_flagged(self):
+        """Test closed cases and the skipped case get no check."""
+        party = self.add_party('ACME Corp.', 'OPPOSING_PARTY', self.beta_case)
+        Case.objects.filter(pk=self.acme_case.pk).update(status='CLOSED')
+
+        self.assertEqual(screening.rescreen_parties([party.pk], skip_case_id=self.beta_case.pk), [])
+        self.assertFalse(ConflictCheck.objects.exists())
+
+        checks = screening.rescreen_parties([party.pk])
+        self.assertEqual([check.case_id for check in checks], [self.beta_case.pk])
+
+    def test_unresolved_pairs_are_not_flagged_again(self):
+        """Test re-screening skips pairs an unresolved check already flags, but not resolved ones."""
+        party = self.add_party('ACME Corp.', 'OPPOSING_PARTY', self.beta_case)
+        screening.rescreen_parties([party.pk])
+
+        self.assertEqual(screening.rescreen_parties([party.pk]), [])
+        self.assertEqual(ConflictCheck.objects.count(), 2)
+
+        ConflictCheck.objects.filter(case=self.acme_case).update(resolution_status='CONFLICT_WAIVED')
+        checks = screening.rescreen_parties([party.pk])
+        self.assertEqual([check.case_id for check in checks], [self.acme_case.pk])
+
+
 class CaseViewTests(TestCase):
     """Test cases for case views."""
     
@@ -0,0 +1,157 @@
+"""
+Test cases for document text extraction and the extracted-text store.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import zlib
+from unittest.mock import patch
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from documents import signals
+from documents.models import Document, ExtractedText
+from documents.text_store import get_stored_text
+from documents.utils import (
+    extract_text_from_document, extract_text_prefix, get_document_preview, iter_document_text,
+    stream_document_text, PREVIEW_LENGTH, TEXT_EXTRACTOR_VERSION
+)
+
+
+class ExtractedTextStoreTests(SimpleTestCase):
+    """Test cases for the extracted-text store."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.document = Document(id=1, title='Lease', content_hash='a' * 64)
+        self.document.file = ContentFile(b'The tenant shall pay rent.', name='lease.txt')
+
+    def test_content_hash_of_file(self):
+        """Test the content hash is the SHA-256 of the file bytes."""
+        self.assertEqual(self.document.compute_content_hash(),
+                         hashlib.sha256(b'The tenant shall pay rent.').hexdigest())
+
+    def test_stored_text_is_decompressed(self):
+        """Test stored text round-trips through compression."""
+        entry = ExtractedText(text_data=zlib.compress('Überweisung'.encode('utf-8')))
+        self.assertEqual(entry.get_text(), 'Überweisung')
+
+    @patch('documents.utils._extract_text')
+    @patch('documents.utils.get_stored_text', return_value='stored text')
+    def test_stored_text_skips_parsing(self, get_stored_text, extract_text):
+        """Test a stored text is returned without parsing the file."""
+        self.assertEqual(extract_text_from_document(self.document), 'stored text')
+        get_stored_text.assert_called_once_with('a' * 64, TEXT_EXTRACTOR_VERSION)
+        extract_text.assert_not_called()
+
+    @patch('documents.utils.store_text')
+    @patch('documents.utils._extract_text', return_value='parsed text')
+    @patch('documents.utils.get_stored_text', return_value=None)
+    def test_extracted_text_is_stored(self, get_stored_text, extract_text, store_text):
+        """Test a newly extracted text is stored under the content hash."""
+        self.assertEqual(extract_text_from_document(self.document), 'parsed text')
+        store_text.assert_called_once_with('a' * 64, TEXT_EXTRACTOR_VERSION, 'parsed text')
+
+
+class StreamingExtractionTests(SimpleTestCase):
+    """Test cases for piecewise text extraction."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.media_root = tempfile.mkdtemp()
+        with open(os.path.join(self.media_root, 'notes.txt'), 'w', encoding='utf-8') as f:
+            f.write('Zeugenaussage über den Vertrag. ' * 100)
+
+    def tearDown(self):
+        """Remove test files."""
+        shutil.rmtree(self.media_root)
+
+    @patch('documents.utils.TEXT_READ_CHARS', 64)
+    def test_text_file_is_read_in_blocks(self):
+        """Test text files are yielded in bounded blocks that join to the full text."""
+        with override_settings(MEDIA_ROOT=self.media_root):
+            document = Document(id=1, title='Notes', file='notes.txt')
+            pieces = list(iter_document_text(document))
+
+        self.assertGreater(len(pieces), 1)
+        self.assertTrue(all(len(piece) <= 64 for piece in pieces))
+        self.assertEqual(''.join(pieces), 'Zeugenaussage über den Vertrag. ' * 100)
+
+    @patch('documents.utils.TEXT_READ_CHARS', 64)
+    def test_prefix_stops_reading_early(self):
+        """Test bounded extraction of an unstored text returns the prefix and flags the rest."""
+        with override_settings(MEDIA_ROOT=self.media_root):
+            document = Document(id=1, title='Notes', file='notes.txt')
+            with patch('documents.utils.get_stored_text') as get_stored_text:
+                text, truncated = extract_text_prefix(document, 100)
+
+        self.assertEqual(text, ('Zeugenaussage über den Vertrag. ' * 100)[:100])
+        self.assertTrue(truncated)
+        get_stored_text.assert_not_called()
+
+    @patch('documents.utils.iter_document_text')
+    def test_preview_column_avoids_file_access(self, stream):
+        """Test previews up to the column length come from the preview column."""
+        document = Document(id=1, title='Notes', file='notes.txt', preview='x' * PREVIEW_LENGTH + '...')
+
+        self.assertEqual(get_document_preview(document), 'x' * PREVIEW_LENGTH + '...')
+        self.assertEqual(get_document_preview(document, max_length=10), 'x' * 10 + '...')
+        stream.assert_not_called()
+
+
+class UploadProcessingTests(SimpleTestCase):
+    """Test cases for extracting the text of saved documents."""
+
+    def save(self, document, created=False):
+        """Run the post_save handler, returning whether the document was queued."""
+        with patch('documents.signals.transaction.on_commit') as on_commit:
+            signals.handle_document_save(Document, document, created)
+        return on_commit.called
+
+    def test_only_new_files_are_processed(self):
+        """Test saves keeping the loaded file are not queued for extraction."""
+        document = Document(id=1, title='Notes', file='notes.txt')
+
+        self.assertTrue(self.save(document, created=True))
+        self.assertFalse(self.save(document))
+        document.file = 'minutes.txt'
+        self.assertTrue(self.save(document))
+
+    @patch.object(signals, 'EXTRACT_TEXT_ON_SAVE', False)
+    def test_empty_previews_are_not_recomputed(self):
+        """Test a document whose preview came out empty is not reprocessed when saved again."""
+        document = Document(id=1, title='Scan', file='scan.pdf', preview='')
+
+        self.assertFalse(self.save(document))
+
+    @patch.object(signals, 'EXTRACT_TEXT_ON_SAVE', 'off')
+    def test_extraction_can_be_deferred(self):
+        """Test nothing is queued when extraction on save is off."""
+        self.assertFalse(self.save(Document(title='Notes', file='notes.txt'), created=True))
+
+
+class StreamedTextStoreTests(TestCase):
+    """Test cases for storing text while it streams."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.media_root = tempfile.mkdtemp()
+        with open(os.path.join(self.media_root, 'notes.txt'), 'w', encoding='utf-8') as f:
+            f.write('Zeugenaussage über den Vertrag. ' * 100)
+
+    def tearDown(self):
+        """Remove test files."""
+        shutil.rmtree(self.media_root)
+
+    @patch('documents.utils.TEXT_READ_CHARS', 64)
+    def test_streamed_text_is_stored_compressed(self):
+        """Test the pieces are stored as one entry and later read back in one piece."""
+        with override_settings(MEDIA_ROOT=self.media_root):
+            document = Document(id=1, title='Notes', file='notes.txt', content_hash='b' * 64)
+            pieces = list(stream_document_text(document))
+            stored = list(stream_document_text(document))
+
+        self.assertGreater(len(pieces), 1)
+        self.assertEqual(stored, [''.join(pieces)])
+        self.assertEqual(get_stored_text('b' * 64, TEXT_EXTRACTOR_VERSION), 'Zeugenaussage über den Vertrag. ' * 100)
+        self.assertEqual(ExtractedText.objects.get(content_hash='b' * 64).char_count, 3200)
@@ -0,0 +1,137 @@
+"""
+Test cases for batched embedding requests and text chunking.
+"""
+from unittest.mock import patch, MagicMock
+from django.test import SimpleTestCase
+import numpy as np
+from ai_services import settings as ai_settings
+from ai_services.models import VectorStore
+from ai_services.services.embedding_service import EmbeddingService
+from ai_services.services.text_chunker import chunk_text, iter_chunk_text
+
+
+def fake_embedding_response(payload):
+    """Build a response returning items in reverse order, as some servers do."""
+    response = MagicMock()
+    response.json.return_value = {
+        'data': [
+            {'index': index, 'embedding': [float(len(text)), float(index), 1.0]}
+            for index, text in reversed(list(enumerate(payload['input'])))
+        ]
+    }
+    return response
+
+
+class BatchedEmbeddingTests(SimpleTestCase):
+    """Test cases for EmbeddingService.get_embeddings."""
+
+    def setUp(self):
+        """Set up test data."""
+        with patch.object(ai_settings, 'ENABLE_EMBEDDING_CACHE', False):
+            self.service = EmbeddingService(VectorStore(name='test', embedding_model='test-model', dimensions=3))
+
+    @patch('ai_services.services.embedding_service.requests.post')
+    def test_results_are_mapped_back_by_index(self, mock_post):
+        """Test one request is sent and results keep input order."""
+        mock_post.side_effect = lambda url, json, **kwargs: fake_embedding_response(json)
+
+        vectors = self.service.get_embeddings(['a', 'bbb', 'cc'])
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual([vector[0] for vector in vectors], [1.0, 3.0, 2.0])
+
+    @patch('ai_services.services.embedding_service.requests.post')
+    def test_duplicates_are_sent_once_and_batches_respect_budget(self, mock_post):
+        """Test identical texts are coalesced and requests are split by size."""
+        mock_post.side_effect = lambda url, json, **kwargs: fake_embedding_response(json)
+
+        with patch.object(ai_settings, 'EMBEDDING_BATCH_SIZE', 2):
+            vectors = self.service.get_embeddings(['a', 'b', 'a', 'c'])
+
+        self.assertEqual(mock_post.call_count, 2)
+        sent = [call.kwargs['json']['input'] for call in mock_post.call_args_list]
+        self.assertEqual(sent, [['a', 'b'], ['c']])
+        self.assertTrue(np.array_equal(vectors[0], vectors[2]))
+
+    @patch('ai_services.services.embedding_service.requests.post')
+    def test_failed_batch_returns_zero_vectors(self, mock_post):
+        """Test a failed request yields zero vectors like get_embedding."""
+        mock_post.side_effect = ConnectionError('unreachable')
+
+        vectors = self.service.get_embeddings(['a', 'b'])
+
+        self.assertEqual(len(vectors), 2)
+        self.assertFalse(any(np.any(vector) for vector in vectors))
+
+
+class TextChunkerTests(SimpleTestCase):
+    """Test cases for sentence-aware chunking."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.text = ' '.join(f'Sentence number {i} of the pleading.' for i in range(40))
+
+    def test_chunks_respect_size_and_offsets(self):
+        """Test chunks fit the budget, align with sentences and map back to the text."""
+        chunks = chunk_text(self.text, max_chars=200, overlap=50)
+
+        self.assertGreater(len(chunks), 1)
+        for position, chunk in enumerate(chunks):
+            self.assertEqual(chunk.index, position)
+            self.assertLessEqual(len(chunk.text), 200)
+            self.assertEqual(self.text[chunk.start:chunk.end], chunk.text)
+            self.assertTrue(chunk.text.startswith('Sentence'))
+            self.assertTrue(chunk.text.endswith('.'))
+        self.assertEqual(chunks[-1].end, len(self.text))
+
+    def test_adjacent_chunks_overlap(self):
+        """Test each chunk starts before the previous one ends."""
+        chunks = chunk_text(self.text, max_chars=200, overlap=50)
+
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertLess(chunk.start, previous.end)
+            self.assertGreater(chunk.start, previous.start)
+
+    def test_long_sentence_is_split(self):
+        """Test a sentence longer than the budget is split at whitespace."""
+        text = 'word ' * 100
+        chunks = chunk_text(text, max_chars=60, overlap=0)
+
+        self.assertTrue(all(len(chunk.text) <= 60 for chunk in chunks))
+        self.assertEqual(sum(chunk.text.count('word') for chunk in chunks), 100)
+
+    def test_edit_only_changes_nearby_chunks(self):
+        """Test chunks after an inserted sentence line up with those of the original text."""
+        text = ' '.join(f'Clause {i} binds the parties to term {i * 7}.' for i in range(300))
+        edited = text.replace('Clause 6 binds', 'The parties further agree to arbitration. Clause 6 binds')
+
+        original = {chunk.text for chunk in chunk_text(text, max_chars=500, overlap=100)}
+        changed = [chunk for chunk in chunk_text(edited, max_chars=500, overlap=100)
+                   if chunk.text not in original]
+
+        self.assertLessEqual(len(changed), 3)
+
+    def test_streamed_pieces_give_same_chunks(self):
+        """Test chunking pages as they arrive matches chunking the whole text."""
+        text = ' '.join(f'Clause {i} binds the parties to term {i * 7}.' for i in range(300))
+        pages = [text[start:start + 333] for start in range(0, len(text), 333)]
+
+        self.assertEqual(list(iter_chunk_text(pages, max_chars=500, overlap=100)),
+                         chunk_text(text, max_chars=500, overlap=100))
+
+    @patch('ai_services.services.embedding_service.index_document_terms')
+    @patch('ai_services.services.embedding_service.is_indexed', return_value=False)
+    @patch('documents.utils.stream_document_text')
+    def test_document_text_is_chunked_as_it_streams(self, stream, is_indexed, index_terms):
+        """Test extracted pages go straight to the chunker and the keyword index."""
+        text = ' '.join(f'Clause {i} binds the parties to term {i * 7}.' for i in range(300))
+        stream.return_value = iter([text[start:start + 333] for start in range(0, len(text), 333)])
+        service = EmbeddingService.__new__(EmbeddingService)
+
+        with patch.object(ai_settings, 'EMBEDDING_CHUNK_CHARS', 500), \
+                patch.object(ai_settings, 'EMBEDDING_CHUNK_OVERLAP', 100):
+            chunks = service._stream_chunks(MagicMock(id=1))
+
+        self.assertEqual(chunks, chunk_text(text, max_chars=500, overlap=100))
+        terms = index_terms.call_args[0][1]
+        self.assertEqual(terms.frequencies['clause'], 300)
@@ -0,0 +1,161 @@
+"""
+Test cases for encrypted model fields.
+"""
+from unittest.mock import patch
+from cryptography.fernet import Fernet
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.test import SimpleTestCase, override_settings
+from clients.models import Client
+from clients.search import update_blind_indexes
+from core import fields
+from core.fields import Ciphertext, decrypt_fields
+from core.exceptions import SecurityException
+from core.utils import blind_index, encryption
+from core.utils.key_rotation import CURRENT, ENCRYPTED, FAILED, ROTATED, reencrypt_values
+
+TEST_KEY = Fernet.generate_key().decode()
+
+
+def load_client(**values):
+    """Build a Client the way a queryset does, from encrypted column values."""
+    names = [field.attname for field in Client._meta.concrete_fields]
+    row = []
+    for field in Client._meta.concrete_fields:
+        value = values.get(field.attname, field.get_default())
+        if isinstance(field, fields.EncryptedFieldMixin) and value:
+            value = field.from_db_value(encryption.encrypt_text(value), None, connection)
+        row.append(value)
+    return Client.from_db(DEFAULT_DB_ALIAS, names, row)
+
+
+@override_settings(ENCRYPTION_KEY=TEST_KEY)
+@patch.object(encryption, 'encryption_service', None)
+@patch.object(fields, 'LAZY_DECRYPTION', True)
+class LazyDecryptionTests(SimpleTestCase):
+    """Test cases for lazy decryption of encrypted fields."""
+
+    def test_columns_are_decrypted_on_access(self):
+        """Test only the columns that are read are decrypted, once each."""
+        client = load_client(id=1, first_name='Ada', last_name='Lovelace', email='ada@example.com')
+        self.assertIsInstance(client.__dict__['email'], Ciphertext)
+
+        with patch('core.fields.decrypt_text', wraps=encryption.decrypt_text) as decrypt:
+            self.assertEqual(client.first_name, 'Ada')
+            self.assertEqual(client.first_name, 'Ada')
+            self.assertEqual(decrypt.call_count, 1)
+        self.assertIsInstance(client.__dict__['email'], Ciphertext)
+
+    def test_unread_value_is_saved_unchanged(self):
+        """Test a value that was never read is written back as the same ciphertext."""
+        client = load_client(id=1, email='ada@example.com')
+        field = Client._meta.get_field('email')
+        token = client.__dict__['email'].token
+        self.assertEqual(field.get_prep_value(field.pre_save(client, add=False)), token)
+
+        client.email = 'new@example.com'
+        self.assertNotEqual(field.get_prep_value(field.pre_save(client, add=False)), token)
+
+    def test_decrypt_fields_in_batch(self):
+        """Test decrypt_fields decrypts every loaded column of many rows."""
+        clients = [load_client(id=i, first_name=f'Client {i}', city='Paris') for i in range(1, 4)]
+        decrypt_fields(clients)
+        for i, client in enumerate(clients, start=1):
+            self.assertEqual(client.__dict__['first_name'], f'Client {i}')
+            self.assertEqual(client.__dict__['city'], 'Paris')
+
+
+@override_settings(ENCRYPTION_KEY=TEST_KEY)
+class BlindIndexTests(SimpleTestCase):
+    """Test cases for blind indexes of encrypted fields."""
+
+    def test_exact_index_ignores_case_accents_and_spacing(self):
+        """Test equal normalized values share an index that depends on the field."""
+        index = blind_index.exact_index('clients.Client.last_name', '  Núñez ')
+        self.assertEqual(index, blind_index.exact_index('clients.Client.last_name', 'nunez'))
+        self.assertNotEqual(index, blind_index.exact_index('clients.Client.first_name', 'nunez'))
+        self.assertEqual(len(index), blind_index.TOKEN_LENGTH)
+        self.assertEqual(blind_index.exact_index('clients.Client.last_name', ''), '')
+
+    def test_index_survives_encryption_key_rotation(self):
+        """Test indexes use BLIND_INDEX_KEY only, never the rotating ENCRYPTION_KEY."""
+        index = blind_index.exact_index('clients.Client.last_name', 'nunez')
+        with override_settings(ENCRYPTION_KEY=Fernet.generate_key().decode(), ENCRYPTION_OLD_KEYS=[TEST_KEY]):
+            self.assertEqual(blind_index.exact_index('clients.Client.last_name', 'nunez'), index)
+        with override_settings(BLIND_INDEX_KEY=None):
+            with self.assertRaises(SecurityException):
+                blind_index.exact_index('clients.Client.last_name', 'nunez')
+
+    def test_tokens(self):
+        """Test word prefixes and trigrams are produced for each word."""
+        self.assertEqual(blind_index.prefixes("o'brien"), {'br', 'bri', 'brie', 'brien'})
+        self.assertEqual(blind_index.trigrams('acme co'), {'acm', 'cme'})
+        tokens = blind_index.search_tokens('d', 'Acme', [blind_index.PREFIX, blind_index.TRIGRAM])
+        self.assertEqual(len(tokens), 5)
+
+    @patch.object(fields, 'LAZY_DECRYPTION', True)
+    @patch.object(encryption, 'encryption_service', None)
+    def test_only_assigned_values_are_reindexed(self):
+        """Test a client's indexes are recomputed for assigned values, not unread ones."""
+        client = load_client(id=1, first_name='Ada', email='ada@example.com')
+        client.first_name = 'Grace'
+        self.assertEqual(update_blind_indexes(client), ['first_name'])
+        self.assertEqual(client.first_name_bidx, blind_index.exact_index('clients.Client.first_name', 'grace'))
+        self.assertEqual(client.email_bidx, '')
+
+
+@override_settings(ENCRYPTION_KEY=TEST_KEY)
+@patch.object(encryption, 'encryption_service', None)
+class CompactFormatTests(SimpleTestCase):
+    """Test cases for the compact encoding of encrypted values."""
+
+    def test_compact_values_are_smaller_and_legacy_values_still_decrypt(self):
+        """Test new values are compact and both formats decrypt."""
+        compact = encryption.encrypt_text('Ada Lovelace')
+        self.assertTrue(compact.startswith(encryption.COMPACT_PREFIX))
+        with patch.object(encryption, 'COMPACT_FORMAT', False):
+            legacy = encryption.encrypt_text('Ada Lovelace')
+        self.assertLess(len(compact), len(legacy))
+
+        self.assertEqual(encryption.decrypt_text(compact), 'Ada Lovelace')
+        self.assertEqual(encryption.decrypt_text(legacy), 'Ada Lovelace')
+        self.assertEqual(encryption.decrypt_many([compact, legacy, 'plain']), ['Ada Lovelace'] * 2 + ['plain'])
+
+    def test_legacy_values_are_re_encoded_without_decrypting(self):
+        """Test compact_encrypted_value keeps the token and skips other values."""
+        with patch.object(encryption, 'COMPACT_FORMAT', False):
+            legacy = encryption.encrypt_text('Ada Lovelace')
+        compact = encryption.compact_encrypted_value(legacy)
+        self.assertEqual(encryption.fernet_token(compact), encryption.fernet_token(legacy))
+        self.assertEqual(encryption.decrypt_text(compact), 'Ada Lovelace')
+
+        self.assertIsNone(encryption.compact_encrypted_value(compact))
+        self.assertIsNone(encryption.compact_encrypted_value('abcd'))
+        self.assertIsNone(encryption.compact_encrypted_value(''))
+
+
+@override_settings(ENCRYPTION_KEY=TEST_KEY)
+@patch.object(encryption, 'encryption_service', None)
+class KeyRotationTests(SimpleTestCase):
+    """Test cases for re-encrypting values with a new key."""
+
+    def test_values_are_brought_up_to_the_current_key(self):
+        """Test old-key values are re-encrypted, plaintext encrypted and current values kept."""
+        old_value = encryption.encrypt_text('Ada Lovelace')
+        new_key = Fernet.generate_key().decode()
+        with override_settings(ENCRYPTION_KEY=new_key, ENCRYPTION_OLD_KEYS=[TEST_KEY]):
+            encryption.encryption_service = None
+            service = encryption.get_encryption_service()
+            self.assertEqual(service.decrypt(old_value), 'Ada Lovelace')
+            self.assertTrue(service.needs_rotation(old_value))
+            current_value = service.encrypt('Grace Hopper')
+            self.assertFalse(service.needs_rotation(current_value))
+
+            results = reencrypt_values([old_value, current_value, 'plain', 'v2:gAAAAAbroken'])
+            self.assertEqual([status for status, _ in results], [ROTATED, CURRENT, ENCRYPTED, FAILED])
+            self.assertIsNone(results[1][1])
+            self.assertIsNone(results[3][1])
+
+        with override_settings(ENCRYPTION_KEY=new_key):
+            encryption.encryption_service = None
+            self.assertEqual(encryption.decrypt_text(results[0][1]), 'Ada Lovelace')
+            self.assertEqual(encryption.decrypt_text(results[2][1]), 'plain')
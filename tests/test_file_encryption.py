@@ -0,0 +1,147 @@
+"""
+Test cases for the streaming file encryption format.
+"""
+import base64
+import io
+import shutil
+import tempfile
+from unittest.mock import patch
+from cryptography.fernet import Fernet
+from django.core.files.base import ContentFile
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from core.exceptions import SecurityException
+from core.utils import encryption
+from core.utils.encryption import decrypt_file, encrypt_file, iter_decrypted_file
+from core.utils.file_encryption import (
+    HEADER_SIZE, TAG_SIZE, decrypt_stream, decrypted_size, encrypt_stream, iter_decrypt, iter_decrypt_range,
+    uses_current_key,
+)
+from documents.downloads import RangeNotSatisfiable, encrypted_file_response, parse_range_header
+from documents.models import SensitiveDocument
+
+TEST_KEY = Fernet.generate_key().decode()
+
+
+@override_settings(ENCRYPTION_KEY=TEST_KEY)
+class FileEncryptionTests(SimpleTestCase):
+    """Test cases for v2 encrypted files."""
+
+    def encrypt(self, data, frame_size=16):
+        encrypted = io.BytesIO()
+        encrypt_stream(io.BytesIO(data), encrypted, frame_size=frame_size)
+        return encrypted.getvalue()
+
+    def test_round_trip(self):
+        """Test files of any length decrypt to the original bytes."""
+        for length in (0, 1, 15, 16, 17, 32, 100):
+            data = bytes(range(256))[:length]
+            encrypted = self.encrypt(data)
+            output = io.BytesIO()
+            self.assertEqual(decrypt_stream(io.BytesIO(encrypted), output), length)
+            self.assertEqual(output.getvalue(), data)
+
+    def test_frames_are_decrypted_separately(self):
+        """Test decryption yields one block per frame and the overhead is fixed."""
+        encrypted = self.encrypt(b'x' * 40)
+        self.assertEqual(len(encrypted), HEADER_SIZE + 40 + 3 * TAG_SIZE)
+        self.assertEqual([len(frame) for frame in iter_decrypt(io.BytesIO(encrypted))], [16, 16, 8])
+
+    def test_tampered_frame_is_rejected(self):
+        """Test a modified ciphertext byte fails authentication."""
+        encrypted = bytearray(self.encrypt(b'x' * 40))
+        encrypted[HEADER_SIZE + 20] ^= 1
+        with self.assertRaises(SecurityException):
+            list(iter_decrypt(io.BytesIO(bytes(encrypted))))
+
+    def test_truncated_file_is_rejected(self):
+        """Test dropping the last frame is detected."""
+        encrypted = self.encrypt(b'x' * 40)
+        with self.assertRaises(SecurityException):
+            list(iter_decrypt(io.BytesIO(encrypted[:HEADER_SIZE + 2 * (16 + TAG_SIZE)])))
+
+    def test_files_from_before_a_key_rotation_still_decrypt(self):
+        """Test files encrypted with a retired key decrypt and are reported as such."""
+        encrypted = self.encrypt(b'x' * 40)
+        new_key = Fernet.generate_key().decode()
+        with override_settings(ENCRYPTION_KEY=new_key, ENCRYPTION_OLD_KEYS=[TEST_KEY]):
+            self.assertEqual(b''.join(iter_decrypt(io.BytesIO(encrypted))), b'x' * 40)
+            self.assertFalse(uses_current_key(io.BytesIO(encrypted)))
+            self.assertTrue(uses_current_key(io.BytesIO(self.encrypt(b'x' * 40))))
+        with override_settings(ENCRYPTION_KEY=new_key):
+            with self.assertRaises(SecurityException):
+                list(iter_decrypt(io.BytesIO(encrypted)))
+
+    @patch.object(encryption, 'encryption_service', None)
+    def test_v1_files_still_decrypt(self):
+        """Test files in the legacy format are still readable."""
+        service = encryption.get_encryption_service()
+        v1 = service.encrypt(base64.b64encode(b'legacy exhibit').decode()).encode()
+        self.assertEqual(decrypt_file(v1), b'legacy exhibit')
+        self.assertEqual(b''.join(iter_decrypted_file(io.BytesIO(v1))), b'legacy exhibit')
+        self.assertEqual(decrypt_file(encrypt_file(b'new exhibit')), b'new exhibit')
+
+    def test_field_stores_only_ciphertext(self):
+        """Test saving a sensitive document writes the encrypted file to storage."""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with self.settings(MEDIA_ROOT=media_root):
+            document = SensitiveDocument(title='Exhibit')
+            document.file = ContentFile(b'privileged' * 10000, name='exhibit.pdf')
+            field = SensitiveDocument._meta.get_field('file')
+            stored = field.pre_save(document, add=True)
+
+            self.assertTrue(stored.name.endswith('.enc'))
+            self.assertIsNotNone(document.encryption_salt)
+            with stored.storage.open(stored.name, 'rb') as f:
+                self.assertNotIn(b'privileged', f.read())
+                f.seek(0)
+                self.assertEqual(b''.join(iter_decrypted_file(f)), b'privileged' * 10000)
+
+
+@override_settings(ENCRYPTION_KEY=TEST_KEY)
+class EncryptedDownloadTests(SimpleTestCase):
+    """Test cases for streaming and ranged decryption."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.data = bytes(range(256)) * 4
+        encrypted = io.BytesIO()
+        encrypt_stream(io.BytesIO(self.data), encrypted, frame_size=100)
+        self.encrypted = encrypted.getvalue()
+
+    def test_range_decryption(self):
+        """Test any range decrypts to the same bytes as slicing the plaintext."""
+        source = io.BytesIO(self.encrypted)
+        self.assertEqual(decrypted_size(source), len(self.data))
+        for start, stop in ((0, 1024), (0, 1), (99, 101), (150, 950), (1000, 2000), (1023, 1024), (500, 500)):
+            self.assertEqual(b''.join(iter_decrypt_range(source, start, stop)), self.data[start:stop])
+
+    def test_parse_range_header(self):
+        """Test single byte ranges are parsed and others ignored."""
+        self.assertEqual(parse_range_header('bytes=0-99', 1024), (0, 100))
+        self.assertEqual(parse_range_header('bytes=1000-', 1024), (1000, 1024))
+        self.assertEqual(parse_range_header('bytes=-24', 1024), (1000, 1024))
+        self.assertEqual(parse_range_header('bytes=10-5000', 1024), (10, 1024))
+        self.assertIsNone(parse_range_header('bytes=0-1,5-6', 1024))
+        self.assertIsNone(parse_range_header(None, 1024))
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range_header('bytes=2000-', 1024)
+
+    def test_partial_response(self):
+        """Test a Range request is answered with the decrypted bytes of the range."""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with self.settings(MEDIA_ROOT=media_root):
+            document = SensitiveDocument(title='Exhibit', file='exhibit.enc')
+            document.file.storage.save('exhibit.enc', ContentFile(self.encrypted))
+
+            request = RequestFactory().get('/', HTTP_RANGE='bytes=150-349')
+            response = encrypted_file_response(request, document.file, 'exhibit.pdf')
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response['Content-Range'], 'bytes 150-349/1024')
+            self.assertEqual(response['Content-Type'], 'application/pdf')
+            self.assertEqual(b''.join(response.streaming_content), self.data[150:350])
+            response.close()
+
+            request = RequestFactory().get('/', HTTP_RANGE='bytes=5000-')
+            self.assertEqual(encrypted_file_response(request, document.file, 'exhibit.pdf').status_code, 416)
@@ -0,0 +1,363 @@
+"""
+Test cases for the in-process vector indexes, vector storage codec,
+memory-mapped segment store and search caches.
+"""
+import shutil
+import tempfile
+import datetime
+from unittest.mock import MagicMock, patch
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase
+import numpy as np
+from ai_services.services.ann_index import IVFIndex
+from ai_services.models import VectorStore
+from ai_services.services.chroma_pool import get_chroma_collection, release_chroma_client
+from ai_services.services.chunk_index import ChunkIndex
+from ai_services.services.query_cache import (
+    LRUCache, get_query_embedding, search_result_key, get_cached_results, cache_results
+)
+from ai_services.services.service_monitor import ServiceMonitor
+from ai_services.services.rank_fusion import reciprocal_rank_fusion
+from ai_services.services.segment_store import SegmentStore
+from ai_services.services.text_index import tokenize, bm25_scores
+from ai_services.services.vector_index import (
+    VectorIndex, NO_CASE, bump_store_generation, discard_document_vector, get_store_generation,
+    get_vector_index, invalidate_vector_index
+)
+from ai_services.services.vector_codec import encode_vector, decode_vector, VectorDecodeError
+
+
+class VectorIndexTests(SimpleTestCase):
+    """Test cases for VectorIndex search and incremental updates."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.index = VectorIndex()
+        self.index.upsert(1, 10, [1.0, 0.0, 0.0])
+        self.index.upsert(2, 10, [0.9, 0.1, 0.0])
+        self.index.upsert(3, 20, [0.0, 1.0, 0.0])
+        self.index.upsert(4, None, [0.7, 0.7, 0.0])
+
+    def test_search_ranks_by_cosine_similarity(self):
+        """Test results are ordered by similarity and limited."""
+        hits = self.index.search([2.0, 0.0, 0.0], limit=2, threshold=0.0)
+        self.assertEqual([doc_id for doc_id, _ in hits], [1, 2])
+        self.assertAlmostEqual(hits[0][1], 1.0, places=5)
+
+    def test_search_applies_threshold_and_case_mask(self):
+        """Test threshold and case filtering."""
+        hits = self.index.search([1.0, 0.0, 0.0], limit=10, threshold=0.5, case_id=10)
+        self.assertEqual([doc_id for doc_id, _ in hits], [1, 2])
+
+        hits = self.index.search([1.0, 0.0, 0.0], limit=10, threshold=0.5, exclude_document_id=1)
+        self.assertEqual([doc_id for doc_id, _ in hits], [2, 4])
+
+    def test_upsert_replaces_and_remove_compacts(self):
+        """Test incremental patching keeps the index consistent."""
+        self.index.upsert(1, 10, [0.0, 0.0, 1.0])
+        self.assertEqual(len(self.index), 4)
+        self.assertTrue(np.allclose(self.index.get_vector(1), [0.0, 0.0, 1.0]))
+
+        self.assertTrue(self.index.remove(2))
+        self.assertFalse(self.index.remove(2))
+        self.assertEqual(len(self.index), 3)
+
+        hits = self.index.search([0.0, 1.0, 0.0], limit=10, threshold=0.5)
+        self.assertEqual([doc_id for doc_id, _ in hits], [3, 4])
+
+    def test_rejects_zero_and_mismatched_vectors(self):
+        """Test invalid vectors are not indexed."""
+        self.assertFalse(self.index.upsert(5, 10, [0.0, 0.0, 0.0]))
+        self.assertFalse(self.index.upsert(6, 10, [1.0, 0.0]))
+        self.assertEqual(self.index.search([0.0, 0.0, 0.0], limit=5, threshold=0.0), [])
+
+
+class VectorCodecTests(SimpleTestCase):
+    """Test cases for the binary vector encoding."""
+
+    def test_round_trip_float32(self):
+        """Test float32 vectors decode to the same values."""
+        vector = np.array([0.25, -1.5, 3.0], dtype=np.float32)
+        data = encode_vector(vector)
+        self.assertEqual(len(data), 8 + 3 * 4)
+        decoded = decode_vector(memoryview(data))
+        self.assertEqual(decoded.dtype, np.float32)
+        self.assertTrue(np.array_equal(decoded, vector))
+
+    def test_round_trip_float16(self):
+        """Test float16 storage halves the payload."""
+        data = encode_vector([0.5, 1.0, -2.0, 4.0], dtype='float16')
+        self.assertEqual(len(data), 8 + 4 * 2)
+        self.assertTrue(np.array_equal(decode_vector(data), [0.5, 1.0, -2.0, 4.0]))
+
+    def test_rejects_malformed_blobs(self):
+        """Test truncated blobs raise and empty values decode to None."""
+        self.assertIsNone(decode_vector(None))
+        with self.assertRaises(VectorDecodeError):
+            decode_vector(encode_vector([1.0, 2.0])[:-1])
+
+
+class SegmentStoreTests(SimpleTestCase):
+    """Test cases for the memory-mapped segment store."""
+
+    def setUp(self):
+        """Set up a temporary store directory."""
+        self.directory = tempfile.mkdtemp()
+        self.store = SegmentStore(self.directory, segment_rows=4, tail_rows=2)
+        for doc_id in range(1, 7):
+            vector = np.zeros(3, dtype=np.float32)
+            vector[doc_id % 3] = 1.0
+            self.store.upsert([(doc_id, doc_id % 2, vector)])
+
+    def tearDown(self):
+        """Remove the temporary store directory."""
+        shutil.rmtree(self.directory)
+
+    def test_search_is_visible_to_other_readers(self):
+        """Test a second reader sees writes through the manifest."""
+        reader = SegmentStore(self.directory)
+        hits = reader.search([1.0, 0.0, 0.0], limit=10, threshold=0.5)
+        self.assertEqual(sorted(doc_id for doc_id, _ in hits), [3, 6])
+
+        hits = reader.search([1.0, 0.0, 0.0], limit=10, threshold=0.5, case_id=1)
+        self.assertEqual([doc_id for doc_id, _ in hits], [3])
+
+    def test_update_and_remove_tombstone_old_rows(self):
+        """Test updates replace and removals hide earlier rows."""
+        self.store.upsert([(3, 1, [0.0, 1.0, 0.0])])
+        self.store.remove([6])
+        self.assertEqual(len(self.store), 5)
+        self.assertEqual(self.store.search([1.0, 0.0, 0.0], limit=10, threshold=0.5), [])
+        self.assertTrue(np.allclose(self.store.get_vector(3), [0.0, 1.0, 0.0]))
+
+    def test_compact_drops_tombstoned_rows(self):
+        """Test compaction keeps only live rows."""
+        self.store.remove([1, 2])
+        stats = self.store.compact()
+        self.assertEqual(stats['rows_after'], 4)
+        self.assertEqual(len(SegmentStore(self.directory)), 4)
+
+
+class IVFIndexTests(SimpleTestCase):
+    """Test cases for the IVF-Flat approximate index."""
+
+    def setUp(self):
+        """Set up test data."""
+        rng = np.random.default_rng(1)
+        self.vectors = rng.normal(size=(500, 16)).astype(np.float32)
+        self.document_ids = np.arange(1, 501)
+        self.index = IVFIndex.train(
+            self.document_ids, np.full(500, NO_CASE), self.vectors, nlist=10, nprobe=2
+        )
+        self.exact = VectorIndex()
+        self.exact.add_many(self.document_ids, np.full(500, NO_CASE), self.vectors)
+
+    def test_full_probe_matches_exact_search(self):
+        """Test scanning every list returns the exact results."""
+        query = self.vectors[0]
+        expected = self.exact.search(query, limit=10, threshold=-1.0)
+        hits = self.index.search(query, limit=10, threshold=-1.0, nprobe=self.index.nlist)
+        self.assertEqual([doc_id for doc_id, _ in hits], [doc_id for doc_id, _ in expected])
+
+    def test_default_probe_finds_indexed_vector(self):
+        """Test a stored vector is its own nearest neighbour."""
+        hits = self.index.search(self.vectors[42], limit=1, threshold=0.0)
+        self.assertEqual(hits[0][0], 43)
+
+    def test_upsert_moves_and_remove_deletes(self):
+        """Test incremental updates keep a single copy per document."""
+        self.assertTrue(self.index.upsert(1, None, self.vectors[99]))
+        self.assertEqual(len(self.index), 500)
+        hits = self.index.search(self.vectors[99], limit=2, threshold=0.0)
+        self.assertEqual({doc_id for doc_id, _ in hits}, {1, 100})
+
+        self.assertTrue(self.index.remove(1))
+        self.assertFalse(self.index.remove(1))
+        self.assertIsNone(self.index.get_vector(1))
+        self.assertEqual(len(self.index), 499)
+
+
+class ChunkIndexTests(SimpleTestCase):
+    """Test cases for passage search aggregation."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.index = ChunkIndex()
+        # Document 1 has one strong passage, document 2 several good ones
+        self.index.replace_document(1, 10, [11, 12], [(0, 100), (90, 200)],
+                                    [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+        self.index.replace_document(2, 20, [21, 22, 23], [(0, 80), (70, 150), (140, 220)],
+                                    [[0.8, 0.6, 0.0], [0.8, 0.6, 0.0], [0.8, 0.6, 0.0]])
+
+    def test_max_aggregation_uses_best_passage(self):
+        """Test 'max' ranks by the single best passage and returns its offsets."""
+        hits = self.index.search([1.0, 0.0, 0.0], limit=2, threshold=0.5, aggregation='max')
+        self.assertEqual([hit[0] for hit in hits], [1, 2])
+        self.assertEqual(hits[0][2:], (0, 100))
+
+    def test_sum_aggregation_rewards_repeated_matches(self):
+        """Test 'sum' adds up the top passages of a document."""
+        hits = self.index.search([1.0, 0.0, 0.0], limit=2, threshold=0.5, aggregation='sum', top_k=3)
+        self.assertEqual([hit[0] for hit in hits], [2, 1])
+        self.assertAlmostEqual(hits[0][1], 2.4, places=5)
+
+    def test_filters_and_replacement(self):
+        """Test case filtering, exclusion and replacing a document's passages."""
+        hits = self.index.search([1.0, 0.0, 0.0], limit=5, threshold=0.5, case_id=20)
+        self.assertEqual([hit[0] for hit in hits], [2])
+        hits = self.index.search([1.0, 0.0, 0.0], limit=5, threshold=0.5, exclude_document_id=1)
+        self.assertEqual([hit[0] for hit in hits], [2])
+
+        self.index.replace_document(1, 10, [13], [(0, 50)], [[0.0, 0.0, 1.0]])
+        self.assertEqual(len(self.index), 4)
+        hits = self.index.search([1.0, 0.0, 0.0], limit=5, threshold=0.5)
+        self.assertEqual([hit[0] for hit in hits], [2])
+
+        self.index.remove_document(2)
+        self.assertEqual(len(self.index), 1)
+
+
+class SearchCacheTests(SimpleTestCase):
+    """Test cases for the query embedding and search result caches."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+
+    def test_lru_evicts_least_recently_used(self):
+        """Test the LRU keeps recently read entries."""
+        lru = LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+
+    def test_repeated_query_is_embedded_once(self):
+        """Test the query embedding is reused and hits are counted."""
+        service = MagicMock(embedding_model='cache-test-model', dimensions=3)
+        service.get_embedding.return_value = np.array([1.0, 0.0, 0.0])
+
+        get_query_embedding(service, 'breach of  contract')
+        get_query_embedding(service, 'breach of contract')
+
+        self.assertEqual(service.get_embedding.call_count, 1)
+        self.assertEqual(ServiceMonitor.get_cache_stats('query_embedding'), {
+            'hits': 1, 'misses': 1, 'hit_rate': 0.5
+        })
+
+
+class StoreGenerationTests(TestCase):
+    """Test cases for the database-backed write generation of a vector store."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.store = VectorStore.objects.create(name='local', store_type='mock', dimensions=3)
+
+    def tearDown(self):
+        """Drop resident test indexes."""
+        invalidate_vector_index(self.store.id)
+
+    def test_bumps_are_stored_on_the_store_row(self):
+        """Test the generation is read from the database, not the cache."""
+        bump_store_generation(self.store.id)
+        cache.clear()
+        self.assertEqual(bump_store_generation(self.store.id), 2)
+        self.assertEqual(get_store_generation(self.store.id), 2)
+        self.assertEqual(VectorStore.objects.get(pk=self.store.id).generation, 2)
+
+    def test_rolled_back_write_leaves_generation_unchanged(self):
+        """Test the bump is part of the transaction writing the embedding."""
+        with transaction.atomic():
+            discard_document_vector(self.store, 1)
+            transaction.set_rollback(True)
+        self.assertEqual(get_store_generation(self.store.id), 0)
+
+    def test_write_from_another_process_rebuilds_index(self):
+        """Test a committed bump makes the resident index stale."""
+        index = get_vector_index(self.store)
+        self.assertIs(get_vector_index(self.store), index)
+
+        # Another process only leaves the new generation in the database
+        VectorStore.objects.filter(pk=self.store.id).update(generation=F('generation') + 1)
+        self.assertIsNot(get_vector_index(self.store), index)
+
+    def test_results_are_invalidated_by_embedding_writes(self):
+        """Test a generation bump makes cached results unreachable."""
+        key = search_result_key(self.store.id, 'lease', case_id=None, limit=5)
+        cache_results(key, [{'id': 7, 'title': 'Lease', 'similarity': 0.9}])
+        self.assertEqual(get_cached_results(key), [{'id': 7, 'similarity': 0.9}])
+
+        bump_store_generation(self.store.id)
+        new_key = search_result_key(self.store.id, 'lease', case_id=None, limit=5)
+        self.assertNotEqual(new_key, key)
+        self.assertIsNone(get_cached_results(new_key))
+
+class ChromaPoolTests(SimpleTestCase):
+    """Test cases for pooled ChromaDB clients."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.store = VectorStore(id=998, name='chroma', store_type='chroma', connection_string=':memory:',
+                                 updated_at=datetime.datetime(2024, 1, 1))
+
+    def tearDown(self):
+        """Drop pooled test clients."""
+        release_chroma_client(self.store.id)
+
+    @patch('ai_services.services.chroma_pool.create_chroma_client')
+    def test_client_and_collection_are_reused(self, create_client):
+        """Test repeated lookups share one client and collection handle."""
+        first = get_chroma_collection(self.store, create=True)
+        second = get_chroma_collection(self.store)
+
+        self.assertIs(first, second)
+        create_client.assert_called_once_with(':memory:')
+        create_client.return_value.get_or_create_collection.assert_called_once()
+
+    @patch('ai_services.services.chroma_pool.create_chroma_client')
+    def test_store_changes_and_release_recreate_client(self, create_client):
+        """Test editing the store row or releasing the pool builds a new client."""
+        get_chroma_collection(self.store)
+        self.store.updated_at = datetime.datetime(2024, 1, 2)
+        get_chroma_collection(self.store)
+        release_chroma_client(self.store.id)
+        get_chroma_collection(self.store)
+
+        self.assertEqual(create_client.call_count, 3)
+
+
+class TextIndexTests(SimpleTestCase):
+    """Test cases for BM25 scoring and rank fusion."""
+
+    def test_tokenize_drops_stopwords_and_keeps_numbers(self):
+        """Test tokenization of legal text."""
+        self.assertEqual(
+            tokenize("The Plaintiff's motion under Rule 12(b)(6) is DENIED."),
+            ['plaintiff', 'motion', 'under', 'rule', '12', '6', 'denied']
+        )
+
+    def test_bm25_prefers_rare_terms_and_short_documents(self):
+        """Test IDF and length normalization."""
+        postings = {
+            'contract': [(1, 1), (2, 1), (3, 1)],
+            'indemnity': [(2, 1), (3, 1)],
+        }
+        document_frequencies = {'contract': 3, 'indemnity': 2}
+        lengths = {1: 10, 2: 10, 3: 40}
+
+        scores = bm25_scores(['contract', 'indemnity'], postings, document_frequencies, lengths,
+                             document_count=10, average_length=40.0)
+
+        self.assertGreater(scores[2], scores[3])
+        self.assertGreater(scores[3], scores[1])
+
+    def test_reciprocal_rank_fusion(self):
+        """Test documents ranked well by both lists come first."""
+        fused = reciprocal_rank_fusion([[1, 2, 3], [2, 3, 4]], k=60)
+
+        self.assertEqual([doc_id for doc_id, _ in fused], [2, 3, 1, 4])
+        self.assertAlmostEqual(fused[0][1], 1 / 62 + 1 / 61)